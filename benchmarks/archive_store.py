@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2019 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, 51 Franklin Street, Fifth Floor, Boston, MA 02110-1335, USA.
+#
+# Authors:
+#     Santiago Dueñas <sduenas@bitergia.com>
+#
+
+"""Benchmark of the cost of archiving HTTP responses.
+
+Stores the same set of synthetic responses using different write
+modes and formats of `Archive` and prints the cost per archived
+item and the size of the archive. Use `--dirpath` to run it on the
+disk where the archives are stored.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import requests
+
+from perceval.archive import Archive
+
+
+WRITE_MODES = [
+    # (name, format version, wal, batch_size, compression)
+    ('pickle, commit per item', 0, False, 1, None),
+    ('rollback journal, commit per item', 1, False, 1, None),
+    ('wal, commit per item', 1, True, 1, None),
+    ('wal, batches of 100', 1, True, 100, None),
+    ('wal, batches of 1000', 1, True, 1000, None),
+    ('wal, batches of 1000, zlib', 1, True, 1000, 'zlib'),
+    ('wal, batches of 1000, lzma', 1, True, 1000, 'lzma')
+]
+
+
+def make_response(n, body_size):
+    """Build a synthetic response like the ones sent by GitHub"""
+
+    response = requests.Response()
+    response.status_code = 200
+    response.url = 'https://api.github.com/repos/owner/repo/issues?page=%s' % n
+    response.encoding = 'utf-8'
+    response.headers['Content-Type'] = 'application/json; charset=utf-8'
+    response.headers['X-RateLimit-Remaining'] = '4999'
+    response.headers['X-RateLimit-Reset'] = '1500000000'
+
+    words = ['perceval', 'archive', 'issue', 'comment', 'user', 'login']
+    text = ' '.join(words[(n + i) % len(words)] for i in range(body_size // 6))
+    item = {'id': n, 'body': text}
+    response._content = json.dumps(item).encode('utf-8')
+
+    return response
+
+
+def run(dirpath, nitems, body_size):
+    responses = [make_response(n, body_size) for n in range(nitems)]
+
+    print("%-36s %10s %12s %14s %12s" % ("write mode", "items", "total (s)",
+                                         "per item (us)", "size (KB)"))
+
+    for n, mode in enumerate(WRITE_MODES):
+        name, version, wal, batch_size, compression = mode
+
+        archive_path = os.path.join(dirpath, 'archive-%s' % n)
+        archive = Archive.create(archive_path, wal=wal, batch_size=batch_size,
+                                 compression=compression)
+        archive.format_version = version
+        archive.init_metadata('https://github.com/owner/repo', 'GitHub', '0.1.0',
+                              'issue', {})
+
+        before = time.perf_counter()
+        for n, response in enumerate(responses):
+            archive.store(response.url, {'page': n}, {}, response)
+        archive.flush()
+        elapsed = time.perf_counter() - before
+
+        # Move the write-ahead log to the archive before measuring it
+        archive._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        size = os.path.getsize(archive_path)
+
+        print("%-36s %10d %12.3f %14.1f %12d" % (name, nitems, elapsed,
+                                                 elapsed / nitems * 1000000,
+                                                 size // 1024))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--dirpath', dest='dirpath', default=None,
+                        help="directory where the archives will be created")
+    parser.add_argument('--items', dest='items', type=int, default=2000,
+                        help="number of responses to archive")
+    parser.add_argument('--body-size', dest='body_size', type=int, default=4096,
+                        help="size of the body of each response")
+    args = parser.parse_args()
+
+    dirpath = tempfile.mkdtemp(prefix='perceval_', dir=args.dirpath)
+
+    try:
+        run(dirpath, args.items, args.body_size)
+    finally:
+        shutil.rmtree(dirpath)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2019 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, 51 Franklin Street, Fifth Floor, Boston, MA 02110-1335, USA.
+#
+# Authors:
+#     Santiago Dueñas <sduenas@bitergia.com>
+#
+
+"""Benchmark of the Git log parsers.
+
+Creates a synthetic repository with a large history, reads its log
+using the pretty and the machine-readable formats and prints the
+time spent running `git log` and parsing its output with `GitParser`
+and `GitMachineParser`. It also checks both parsers generate the
+same commits. Use `--repo` to run it on an existing bare repository.
+
+It also compares the time needed to read and parse the log for each
+level of detail: files with renames and copies detection (`full`),
+files without that detection (`files`) and no files at all
+(`commits`).
+
+With `--workers`, it also measures the time the Git backend needs to
+fetch the commits when the log is read in shards by that number of
+processes.
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+from perceval.backends.core.git import (DETAIL_LEVELS,
+                                        Git,
+                                        GitMachineParser,
+                                        GitParser,
+                                        GitRepository)
+
+
+def write_data(stream, text):
+    data = text.encode('utf-8')
+    stream.write(b'data %d\n' % len(data))
+    stream.write(data)
+    stream.write(b'\n')
+
+
+def make_repository(dirpath, ncommits, nfiles):
+    """Create a bare repository with a synthetic history.
+
+    Each commit modifies some files; some of them rename a file
+    and every 100 commits a commit from a side branch is merged.
+    """
+    subprocess.check_call(['git', 'init', '-q', '--bare', dirpath])
+
+    proc = subprocess.Popen(['git', 'fast-import', '--quiet'],
+                            stdin=subprocess.PIPE, cwd=dirpath)
+    stream = proc.stdin
+    files = ['src/module_%d/file_%d.py' % (n % 20, n) for n in range(nfiles)]
+    heads = {}
+    ts = 1300000000
+
+    for n in range(1, ncommits + 1):
+        ts += 600
+        branch = 'side' if n % 100 == 50 else 'master'
+
+        stream.write(b'commit refs/heads/%s\n' % branch.encode('utf-8'))
+        stream.write(b'mark :%d\n' % n)
+        stream.write(b'author Developer %d <dev%d@example.com> %d +0200\n' % (n % 50, n % 50, ts))
+        stream.write(b'committer Maintainer <maintainer@example.com> %d +0200\n' % ts)
+
+        message = "Change number %d in the synthetic history\n\n" \
+                  "This commit modifies several files to\ngenerate a large log.\n\n" \
+                  "Signed-off-by: Developer %d <dev%d@example.com>\n" % (n, n % 50, n % 50)
+        write_data(stream, message)
+
+        parent = heads.get('master')
+        if parent:
+            stream.write(b'from :%d\n' % parent)
+        if branch == 'master' and n % 100 == 0 and 'side' in heads:
+            stream.write(b'merge :%d\n' % heads['side'])
+        heads[branch] = n
+
+        touched = files if n == 1 else [files[(n * 7 + i) % nfiles] for i in range(3)]
+        for path in touched:
+            content = "# revision %d of %s\n" % (n, path) * 10
+            stream.write(b'M 100644 inline %s\n' % path.encode('utf-8'))
+            write_data(stream, content)
+
+        if branch == 'master' and n % 25 == 0:
+            idx = n % nfiles
+            old_path = files[idx]
+            files[idx] = old_path.replace('file_', 'renamed_%d_' % n)
+            stream.write(b'R %s %s\n' % (old_path.encode('utf-8'), files[idx].encode('utf-8')))
+
+        stream.write(b'\n')
+
+    stream.close()
+    proc.wait()
+
+
+def measure(func):
+    before = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - before
+
+
+def fetch(repo_path, log_workers=None):
+    git = Git(repo_path, repo_path, machine_log=True, log_workers=log_workers)
+    return [item['data'] for item in git.fetch(no_update=True)]
+
+
+def run(repo_path, workers):
+    repo = GitRepository(repo_path, repo_path)
+
+    pretty, log_pretty = measure(lambda: list(repo.log()))
+    machine, log_machine = measure(lambda: list(repo.log(machine=True)))
+
+    commits, parse_pretty = measure(lambda: list(GitParser(pretty).parse()))
+    machine_commits, parse_machine = measure(lambda: list(GitMachineParser(machine).parse()))
+
+    ncommits = len(commits)
+
+    print("%-12s %10s %14s %14s %16s" % ("format", "commits", "git log (s)",
+                                         "parsing (s)", "per commit (us)"))
+    print("%-12s %10d %14.3f %14.3f %16.1f" % ("pretty", ncommits, log_pretty, parse_pretty,
+                                               parse_pretty / max(ncommits, 1) * 1000000))
+    print("%-12s %10d %14.3f %14.3f %16.1f" % ("machine", len(machine_commits), log_machine, parse_machine,
+                                               parse_machine / max(ncommits, 1) * 1000000))
+    print("Parsing speedup: %.1fx; same commits: %s" % (parse_pretty / max(parse_machine, 1e-9),
+                                                        commits == machine_commits))
+
+    print()
+    print("%-12s %-10s %10s %14s %14s %14s" % ("detail", "format", "files", "git log (s)",
+                                               "parsing (s)", "total (s)"))
+
+    for detail in DETAIL_LEVELS:
+        for machine in [False, True]:
+            output, log_time = measure(lambda: list(repo.log(machine=machine, detail=detail)))
+            parser = GitMachineParser(output) if machine else GitParser(output)
+            parsed, parse_time = measure(lambda: list(parser.parse()))
+            nfiles = sum(len(commit['files']) for commit in parsed)
+
+            print("%-12s %-10s %10d %14.3f %14.3f %14.3f" % (detail, "machine" if machine else "pretty",
+                                                             nfiles, log_time, parse_time,
+                                                             log_time + parse_time))
+
+    if workers < 2:
+        return
+
+    print()
+
+    items, fetch_single = measure(lambda: fetch(repo_path))
+    sharded_items, fetch_sharded = measure(lambda: fetch(repo_path, log_workers=workers))
+
+    print("Fetch: %.3fs with one process; %.3fs with %d workers (%.1fx); same commits: %s"
+          % (fetch_single, fetch_sharded, workers, fetch_single / max(fetch_sharded, 1e-9),
+             items == sharded_items))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repo', dest='repo', default=None,
+                        help="path to an existing bare repository")
+    parser.add_argument('--commits', dest='commits', type=int, default=20000,
+                        help="number of commits of the synthetic history")
+    parser.add_argument('--files', dest='files', type=int, default=500,
+                        help="number of files of the synthetic history")
+    parser.add_argument('--workers', dest='workers', type=int,
+                        default=multiprocessing.cpu_count(),
+                        help="number of processes reading the log in shards")
+    args = parser.parse_args()
+
+    if args.repo:
+        run(args.repo, args.workers)
+        return
+
+    dirpath = tempfile.mkdtemp(prefix='perceval_')
+    repo_path = os.path.join(dirpath, 'synthetic.git')
+
+    try:
+        make_repository(repo_path, args.commits, args.files)
+        run(repo_path, args.workers)
+    finally:
+        shutil.rmtree(dirpath)
+
+
+if __name__ == '__main__':
+    main()
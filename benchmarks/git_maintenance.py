@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2019 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, 51 Franklin Street, Fifth Floor, Boston, MA 02110-1335, USA.
+#
+# Authors:
+#     Santiago Dueñas <sduenas@bitergia.com>
+#
+
+"""Benchmark of the maintenance of Git repositories.
+
+Creates a synthetic repository whose history is stored in many small
+packs, like a mirror grown by several syncs. Then, it prints the time
+spent reading its log and listing its commits before and after running
+`GitRepository.maintain`, which repacks it and writes its commit-graph.
+Use `--repo` to run it on an existing bare repository; take into
+account it will be modified.
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+from perceval.backends.core.git import GitRepository
+
+
+def write_data(stream, text):
+    data = text.encode('utf-8')
+    stream.write(b'data %d\n' % len(data))
+    stream.write(data)
+    stream.write(b'\n')
+
+
+def import_commits(dirpath, first, ncommits):
+    """Add commits to master; each import creates a new pack"""
+
+    proc = subprocess.Popen(['git', 'fast-import', '--quiet'],
+                            stdin=subprocess.PIPE, cwd=dirpath)
+    stream = proc.stdin
+
+    for n in range(first, first + ncommits):
+        stream.write(b'commit refs/heads/master\n')
+        stream.write(b'committer Developer <dev@example.com> %d +0000\n' % (1300000000 + n * 60))
+        write_data(stream, "Change %d\n\nSynthetic commit.\n" % n)
+
+        if n == first and first > 1:
+            stream.write(b'from refs/heads/master^0\n')
+
+        stream.write(b'M 100644 inline src/file_%d.txt\n' % (n % 100))
+        write_data(stream, "revision %d\n" % n)
+        stream.write(b'\n')
+
+        if n % 500 == 0:
+            stream.write(b'reset refs/tags/v%d\nfrom refs/heads/master^0\n\n' % n)
+
+    stream.close()
+    proc.wait()
+
+
+def make_repository(dirpath, ncommits, npacks):
+    subprocess.check_call(['git', 'init', '-q', '--bare', dirpath])
+
+    chunk = max(ncommits // npacks, 1)
+    for first in range(1, ncommits + 1, chunk):
+        import_commits(dirpath, first, min(chunk, ncommits - first + 1))
+
+
+def measure(func):
+    before = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - before
+
+
+def read_history(repo):
+    _, log_time = measure(lambda: sum(1 for _ in repo.log(machine=True)))
+    _, rev_time = measure(lambda: sum(1 for _ in repo.rev_list()))
+    return log_time, rev_time
+
+
+def run(repo_path, max_packs):
+    repo = GitRepository(repo_path, repo_path)
+
+    print("%-14s %8s %12s %14s" % ("state", "packs", "log (s)", "rev-list (s)"))
+
+    npacks = repo.count_packs()
+    log_time, rev_time = read_history(repo)
+    print("%-14s %8d %12.3f %14.3f" % ("before", npacks, log_time, rev_time))
+
+    _, maintain_time = measure(lambda: repo.maintain(max_packs=max_packs))
+
+    npacks = repo.count_packs()
+    log_time, rev_time = read_history(repo)
+    print("%-14s %8d %12.3f %14.3f" % ("after", npacks, log_time, rev_time))
+    print("Maintenance took %.3fs" % maintain_time)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repo', dest='repo', default=None,
+                        help="path to an existing bare repository")
+    parser.add_argument('--commits', dest='commits', type=int, default=50000,
+                        help="number of commits of the synthetic history")
+    parser.add_argument('--packs', dest='packs', type=int, default=300,
+                        help="number of packs of the synthetic repository")
+    parser.add_argument('--max-packs', dest='max_packs', type=int,
+                        default=GitRepository.DEFAULT_MAX_PACKS,
+                        help="maximum number of packs before repacking")
+    args = parser.parse_args()
+
+    if args.repo:
+        run(args.repo, args.max_packs)
+        return
+
+    dirpath = tempfile.mkdtemp(prefix='perceval_')
+    repo_path = os.path.join(dirpath, 'synthetic.git')
+
+    try:
+        make_repository(repo_path, args.commits, args.packs)
+        run(repo_path, args.max_packs)
+    finally:
+        shutil.rmtree(dirpath)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2019 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, 51 Franklin Street, Fifth Floor, Boston, MA 02110-1335, USA.
+#
+# Authors:
+#     Santiago Dueñas <sduenas@bitergia.com>
+#
+
+"""Benchmark of the sync process of Git repositories.
+
+Creates a synthetic repository with many tags, mirrors it and adds
+some commits, branches and tags to the origin. Then, it syncs the
+mirror, reads the new commits and prints the time spent and the
+number of subprocesses spawned, updating the references in a single
+transaction and one by one.
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import unittest.mock
+
+from perceval.backends.core.git import GitRepository
+
+
+def write_data(stream, text):
+    data = text.encode('utf-8')
+    stream.write(b'data %d\n' % len(data))
+    stream.write(data)
+    stream.write(b'\n')
+
+
+def import_history(dirpath, first, ncommits, tags_every):
+    """Add commits to the master branch, tagging some of them"""
+
+    proc = subprocess.Popen(['git', 'fast-import', '--quiet'],
+                            stdin=subprocess.PIPE, cwd=dirpath)
+    stream = proc.stdin
+
+    for n in range(first, first + ncommits):
+        stream.write(b'commit refs/heads/master\n')
+        stream.write(b'mark :%d\n' % n)
+        stream.write(b'committer Maintainer <maintainer@example.com> %d +0000\n' % (1300000000 + n))
+        write_data(stream, "Release %d\n" % n)
+
+        if n == first and first > 1:
+            stream.write(b'from refs/heads/master^0\n')
+
+        stream.write(b'M 100644 inline VERSION\n')
+        write_data(stream, "%d\n" % n)
+        stream.write(b'\n')
+
+        if n % tags_every == 0:
+            stream.write(b'reset refs/tags/release-%d\nfrom :%d\n\n' % (n, n))
+
+    stream.write(b'reset refs/heads/branch-%d\nfrom :%d\n\n' % (first, first))
+
+    stream.close()
+    proc.wait()
+
+
+def update_refs_one_by_one(repo, updates):
+    for ref, delete in updates:
+        repo._update_ref(ref, delete=delete)
+
+
+def sync(origin_path, mirror_path, one_by_one=False):
+    repo = GitRepository(origin_path, mirror_path)
+    GitRepository.spawned_processes.clear()
+
+    before = time.perf_counter()
+
+    if one_by_one:
+        with unittest.mock.patch.object(GitRepository, '_update_refs_transaction',
+                                        new=update_refs_one_by_one):
+            commits = repo.sync()
+    else:
+        commits = repo.sync()
+
+    # Read the new commits like `--latest-items` does
+    _ = [line for line in repo.show(commits)]
+
+    elapsed = time.perf_counter() - before
+
+    return len(commits), elapsed, dict(GitRepository.spawned_processes)
+
+
+def run(ncommits, ntags, nnew):
+    dirpath = tempfile.mkdtemp(prefix='perceval_')
+    origin_path = os.path.join(dirpath, 'origin.git')
+
+    try:
+        subprocess.check_call(['git', 'init', '-q', '--bare', origin_path])
+        import_history(origin_path, 1, ncommits, max(ncommits // ntags, 1))
+
+        mirrors = {}
+        for mode in ['transaction', 'one by one']:
+            mirror_path = os.path.join(dirpath, mode.replace(' ', '_') + '.git')
+            GitRepository.clone(origin_path, mirror_path)
+            mirrors[mode] = mirror_path
+
+        import_history(origin_path, ncommits + 1, nnew, 1)
+
+        print("%-12s %10s %10s %14s %14s" % ("refs update", "commits", "time (s)",
+                                             "subprocesses", "count-objects"))
+
+        for mode, mirror_path in mirrors.items():
+            nfetched, elapsed, nprocs = sync(origin_path, mirror_path,
+                                             one_by_one=(mode == 'one by one'))
+            print("%-12s %10d %10.3f %14d %14d" % (mode, nfetched, elapsed, sum(nprocs.values()),
+                                                   nprocs.get('count-objects', 0)))
+    finally:
+        shutil.rmtree(dirpath)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--commits', dest='commits', type=int, default=20000,
+                        help="number of commits of the synthetic history")
+    parser.add_argument('--tags', dest='tags', type=int, default=10000,
+                        help="number of tags of the synthetic history")
+    parser.add_argument('--new-commits', dest='new_commits', type=int, default=10,
+                        help="number of tagged commits added before syncing")
+    args = parser.parse_args()
+
+    run(args.commits, args.tags, args.new_commits)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2019 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, 51 Franklin Street, Fifth Floor, Boston, MA 02110-1335, USA.
+#
+# Authors:
+#     Santiago Dueñas <sduenas@bitergia.com>
+#
+
+"""Benchmark of the parsing of mbox files.
+
+Creates a set of synthetic monthly mboxes with a mix of plain text
+messages, multipart messages with HTML alternatives and messages
+with binary attachments. Then, it fetches them with the MBox backend
+and prints the time spent and the peak of memory allocated for
+these modes:
+
+- full: every message is parsed and converted eagerly, decoding
+  all its headers and its body, and filtered by date afterwards.
+- lazy: the default mode, where only the headers are parsed at
+  first; bodies are parsed and decoded only for the messages sent
+  since the given date.
+- headers-only: the bodies are neither parsed nor included.
+
+Each mode is measured fetching all the messages and fetching only
+the messages of the last month. Use `--dirpath` to run it on a
+directory of existing mboxes.
+"""
+
+import argparse
+import base64
+import datetime
+import email.utils
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+import unittest.mock
+
+import dateutil.tz
+
+from perceval.backends.core.mbox import MBox, _MBoxReader
+from perceval.utils import message_to_dict
+
+
+PLAIN_MESSAGE = """From dev{n}@example.com {unixdate}
+From: Developer {n} <dev{n}@example.com>
+To: devel@lists.example.com
+Subject: =?utf-8?q?Re=3A_Proposal_n=C3=BAmero_{n}?=
+Message-ID: <{month}.{n}@example.com>
+In-Reply-To: <{month}.{parent}@example.com>
+References: <{month}.{parent}@example.com>
+Date: {date}
+Content-Type: text/plain; charset=utf-8
+
+{text}
+"""
+
+MULTIPART_MESSAGE = """From dev{n}@example.com {unixdate}
+From: Developer {n} <dev{n}@example.com>
+To: devel@lists.example.com
+Subject: [devel] Release notes {n}
+Message-ID: <{month}.{n}@example.com>
+Date: {date}
+MIME-Version: 1.0
+Content-Type: multipart/mixed; boundary="BOUNDARY"
+
+--BOUNDARY
+Content-Type: multipart/alternative; boundary="ALTERNATIVE"
+
+--ALTERNATIVE
+Content-Type: text/plain; charset=utf-8
+
+{text}
+--ALTERNATIVE
+Content-Type: text/html; charset=utf-8
+
+<html><body><p>{text}</p></body></html>
+--ALTERNATIVE--
+{attachment}
+--BOUNDARY--
+"""
+
+ATTACHMENT = """--BOUNDARY
+Content-Type: application/octet-stream; name="build-{n}.tar.gz"
+Content-Transfer-Encoding: base64
+Content-Disposition: attachment; filename="build-{n}.tar.gz"
+
+{data}
+"""
+
+
+def make_mboxes(dirpath, nmonths, nmessages, attachment_size):
+    """Write a mbox per month; one message in ten has an attachment"""
+
+    text = "This line is part of the body of a message to the list.\n" * 20
+    data = base64.encodebytes(os.urandom(attachment_size)).decode('ascii')
+
+    for month in range(nmonths):
+        filepath = os.path.join(dirpath, '2019-%02d.mbox' % (month + 1))
+        first = datetime.datetime(2019, 1, 1, tzinfo=dateutil.tz.tzutc()) + datetime.timedelta(days=30 * month)
+
+        with open(filepath, 'w') as fd:
+            for n in range(nmessages):
+                dt = first + datetime.timedelta(minutes=n)
+                fields = {
+                    'n': n,
+                    'parent': max(n - 1, 0),
+                    'month': month,
+                    'unixdate': dt.strftime('%a %b %d %H:%M:%S %Y'),
+                    'date': email.utils.format_datetime(dt),
+                    'text': text
+                }
+
+                if n % 10 == 0:
+                    attachment = ATTACHMENT.format(n=n, data=data)
+                    fd.write(MULTIPART_MESSAGE.format(attachment=attachment, **fields))
+                elif n % 10 < 4:
+                    fd.write(MULTIPART_MESSAGE.format(attachment='', **fields))
+                else:
+                    fd.write(PLAIN_MESSAGE.format(**fields))
+                fd.write('\n')
+
+
+def eager_message_to_dict(data, headers_only=False):
+    return message_to_dict(_MBoxReader.build_message(data))
+
+
+def fetch(dirpath, mode, from_date):
+    backend = MBox('http://example.com/', dirpath, headers_only=(mode == 'headers-only'))
+
+    if mode == 'full':
+        with unittest.mock.patch('perceval.backends.core.mbox._lazy_message_to_dict',
+                                 new=eager_message_to_dict):
+            return [item for item in backend.fetch(from_date=from_date)]
+    else:
+        return [item for item in backend.fetch(from_date=from_date)]
+
+
+def measure(dirpath, mode, from_date):
+    before = time.perf_counter()
+    items = fetch(dirpath, mode, from_date)
+    elapsed = time.perf_counter() - before
+
+    tracemalloc.start()
+    items = fetch(dirpath, mode, from_date)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return len(items), elapsed, peak
+
+
+def last_month_date(dirpath):
+    dates = [item['updated_on'] for item in fetch(dirpath, 'headers-only', None)]
+    last = datetime.datetime.fromtimestamp(max(dates), tz=dateutil.tz.tzutc())
+    return last - datetime.timedelta(days=30)
+
+
+def run(dirpath):
+    last_month = last_month_date(dirpath)
+
+    print("%-14s %-12s %10s %10s %12s" % ("mode", "messages", "fetched", "time (s)", "memory (MB)"))
+
+    for label, from_date in [("all", None), ("last month", last_month)]:
+        for mode in ['full', 'lazy', 'headers-only']:
+            nitems, elapsed, peak = measure(dirpath, mode, from_date)
+            print("%-14s %-12s %10d %10.3f %12.1f" % (mode, label, nitems, elapsed,
+                                                      peak / (1024 * 1024)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--dirpath', dest='dirpath', default=None,
+                        help="path to a directory of existing mboxes")
+    parser.add_argument('--months', dest='months', type=int, default=12,
+                        help="number of monthly mboxes")
+    parser.add_argument('--messages', dest='messages', type=int, default=1000,
+                        help="number of messages per mbox")
+    parser.add_argument('--attachment-size', dest='attachment_size', type=int, default=256 * 1024,
+                        help="size in bytes of the attachments")
+    args = parser.parse_args()
+
+    if args.dirpath:
+        run(args.dirpath)
+        return
+
+    dirpath = tempfile.mkdtemp(prefix='perceval_')
+
+    try:
+        make_mboxes(dirpath, args.months, args.messages, args.attachment_size)
+        run(dirpath)
+    finally:
+        shutil.rmtree(dirpath)
+
+
+if __name__ == '__main__':
+    main()
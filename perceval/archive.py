@@ -24,10 +24,16 @@
 import hashlib
 import json
 import logging
+import lzma
 import os
 import pickle
 import sqlite3
+import threading
+import time
 import uuid
+import zlib
+
+import requests
 
 from grimoirelab_toolkit.datetime import (datetime_utcnow,
                                           datetime_to_utc,
@@ -56,7 +62,35 @@ class Archive:
     initialized calling to `init_metadata` method after creating
     a new archive.
 
+    Archives are versioned. Version 0 archives store every item using
+    pickle protocol 0. Since version 1, `requests.Response` objects are
+    reduced to a minimal record (status, URL, headers, encoding and
+    body) which is serialized using a binary protocol. Bodies of the
+    responses and any other data might be compressed using `zlib` or
+    `lzma` (see `compression`). Retrieved responses are rebuilt as
+    `ArchivedResponse` objects which decompress their bodies on the
+    first access. Version 2 archives are version 1 archives which keep
+    the bodies of the responses in a shared `ArchiveBlobStore`, storing
+    only references to them (see `create`). Any of these versions can
+    be read.
+
+    By default, each stored item is committed to the archive file
+    straight away. Setting `batch_size` and/or `batch_timeout`, items
+    are grouped in transactions which are committed when `batch_size`
+    items were stored or when `batch_timeout` seconds passed since
+    the transaction was opened, whichever happens first. Pending items
+    are written calling `flush` method. Archives created in WAL mode
+    (see `create`) reduce the number of disk synchronizations even more.
+
+    An archive can be shared by the threads of a process; items are
+    stored and retrieved one at a time.
+
     :param archive_path: path where this archive is stored
+    :param batch_size: number of items stored on each transaction
+    :param batch_timeout: maximum number of seconds a transaction
+        is kept open
+    :param compression: compress the data stored using this algorithm;
+        valid values are `None`, 'zlib' or 'lzma'
 
     :raises ArchiveError: when the archive does not exist or is invalid
     """
@@ -81,9 +115,27 @@ class Archive:
                            "backend_params BLOB, " \
                            "created_on TEXT)"
 
-    def __init__(self, archive_path):
+    BLOB_STORE_TABLE = "blob_store"
+
+    BLOB_STORE_CREATE_STMT = "CREATE TABLE " + BLOB_STORE_TABLE + " ( " \
+                             "path TEXT)"
+
+    WAL_JOURNAL_MODE = 'wal'
+
+    # Versions of the format used to store the data
+    PICKLE_FORMAT_VERSION = 0
+    RECORD_FORMAT_VERSION = 1
+    DEDUP_FORMAT_VERSION = 2
+    FORMAT_VERSION = RECORD_FORMAT_VERSION
+
+    def __init__(self, archive_path, batch_size=1, batch_timeout=None,
+                 compression=None):
         if not os.path.exists(archive_path):
             raise ArchiveError(cause="archive %s does not exist" % (archive_path))
+        if batch_size < 1:
+            raise ArchiveError(cause="batch size must be greater than 0; %s given" % batch_size)
+        if compression not in _CODECS:
+            raise ArchiveError(cause="compression %s not supported" % compression)
 
         self.archive_path = archive_path
         self.origin = None
@@ -93,18 +145,50 @@ class Archive:
         self.backend_params = None
         self.created_on = None
 
-        self._db = sqlite3.connect(self.archive_path)
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.compression = compression
+        self.format_version = None
+        self.blob_store = None
+        self.catalog = None
+        self._pending = 0
+        self._batch_started_on = None
+        self._lock = threading.RLock()
+
+        self._db = sqlite3.connect(self.archive_path, check_same_thread=False)
 
         self._verify_archive()
         self._load_metadata()
+        self._load_format_version()
+        self._load_blob_store()
+        self._setup_journal()
 
     def __del__(self):
+        self.close()
+
+    def close(self):
+        """Close the archive.
+
+        Pending items are written before closing the archive file.
+        """
         conn = getattr(self, '_db', None)
-        if conn:
+        if not conn:
+            return
+
+        with self._lock:
+            if getattr(self, '_pending', 0):
+                try:
+                    self.flush()
+                except ArchiveError:
+                    pass
             conn.close()
+            self._db = None
+
+            if self.blob_store:
+                self.blob_store.close()
 
     def init_metadata(self, origin, backend_name, backend_version,
-                      category, backend_params):
+                      category, backend_params, created_on=None):
         """Init metadata information.
 
         Metatada is composed by basic information needed to identify
@@ -116,10 +200,14 @@ class Archive:
         :param: backend_version: version of the backend
         :param: category: category of the items fetched
         :param: backend_params: dict representation of the fetch parameters
+        :param: created_on: datetime when the archive was created;
+            by default, the current date
 
         raises ArchiveError: when an error occurs initializing the metadata
         """
-        created_on = datetime_to_utc(datetime_utcnow())
+        if not created_on:
+            created_on = datetime_utcnow()
+        created_on = datetime_to_utc(created_on)
         created_on_dumped = created_on.isoformat()
         backend_params_dumped = pickle.dumps(backend_params, 0)
 
@@ -147,6 +235,10 @@ class Archive:
         self.backend_params = backend_params
         self.created_on = created_on
 
+        if self.catalog:
+            self.catalog.add(self.archive_path, origin, backend_name,
+                             category, created_on)
+
         logger.debug("Metadata of archive %s initialized to %s",
                      self.archive_path, metadata)
 
@@ -165,31 +257,92 @@ class Archive:
         :raises ArchiveError: when an error occurs storing the given data
         """
         hashcode = self.make_hashcode(uri, payload, headers)
-        payload_dump = pickle.dumps(payload, 0)
-        headers_dump = pickle.dumps(headers, 0)
-        data_dump = pickle.dumps(data, 0)
 
-        logger.debug("Archiving %s with %s %s %s in %s",
-                     hashcode, uri, payload, headers, self.archive_path)
+        with self._lock:
+            if self.format_version == self.PICKLE_FORMAT_VERSION:
+                payload_dump = pickle.dumps(payload, 0)
+                headers_dump = pickle.dumps(headers, 0)
+                data_dump = pickle.dumps(data, 0)
+            else:
+                payload_dump = pickle.dumps(payload, pickle.HIGHEST_PROTOCOL)
+                headers_dump = pickle.dumps(headers, pickle.HIGHEST_PROTOCOL)
+                data_dump = encode_record(data, compression=self.compression,
+                                          blob_store=self.blob_store)
 
-        try:
-            cursor = self._db.cursor()
-            insert_stmt = "INSERT INTO " + self.ARCHIVE_TABLE + " (" \
-                          "id, hashcode, uri, payload, headers, data) " \
-                          "VALUES(?,?,?,?,?,?)"
-            cursor.execute(insert_stmt, (None, hashcode, uri,
-                                         payload_dump, headers_dump, data_dump))
-            self._db.commit()
-            cursor.close()
-        except sqlite3.IntegrityError as e:
-            msg = "data storage error; cause: duplicated entry %s" % hashcode
-            raise ArchiveError(cause=msg)
-        except sqlite3.DatabaseError as e:
-            msg = "data storage error; cause: %s" % str(e)
-            raise ArchiveError(cause=msg)
+            logger.debug("Archiving %s with %s %s %s in %s",
+                         hashcode, uri, payload, headers, self.archive_path)
+
+            try:
+                cursor = self._db.cursor()
+                insert_stmt = "INSERT INTO " + self.ARCHIVE_TABLE + " (" \
+                              "id, hashcode, uri, payload, headers, data) " \
+                              "VALUES(?,?,?,?,?,?)"
+                cursor.execute(insert_stmt, (None, hashcode, uri,
+                                             payload_dump, headers_dump, data_dump))
+                cursor.close()
+
+                if not self._pending:
+                    self._batch_started_on = time.time()
+                self._pending += 1
+
+                if self._is_batch_completed():
+                    self._db.commit()
+                    self._pending = 0
+            except sqlite3.IntegrityError as e:
+                msg = "data storage error; cause: duplicated entry %s" % hashcode
+                raise ArchiveError(cause=msg)
+            except sqlite3.DatabaseError as e:
+                msg = "data storage error; cause: %s" % str(e)
+                raise ArchiveError(cause=msg)
 
         logger.debug("%s data archived in %s", hashcode, self.archive_path)
 
+    def flush(self):
+        """Write the pending items to the archive.
+
+        Items stored in the current transaction are committed
+        to the archive file.
+
+        :raises ArchiveError: when an error occurs writing the data
+        """
+        with self._lock:
+            if not self._pending:
+                return
+
+            try:
+                self._db.commit()
+            except sqlite3.DatabaseError as e:
+                msg = "data storage error; cause: %s" % str(e)
+                raise ArchiveError(cause=msg)
+
+            logger.debug("%s pending items flushed to %s",
+                         self._pending, self.archive_path)
+
+            self._pending = 0
+
+    def discard(self):
+        """Discard the pending items of the archive.
+
+        Items stored in the current transaction are rolled back,
+        so they are never written to the archive file.
+
+        :raises ArchiveError: when an error occurs discarding the data
+        """
+        with self._lock:
+            if not self._pending:
+                return
+
+            try:
+                self._db.rollback()
+            except sqlite3.DatabaseError as e:
+                msg = "data storage error; cause: %s" % str(e)
+                raise ArchiveError(cause=msg)
+
+            logger.debug("%s pending items discarded from %s",
+                         self._pending, self.archive_path)
+
+            self._pending = 0
+
     def retrieve(self, uri, payload, headers):
         """Retrieve a raw item from the archive.
 
@@ -209,36 +362,57 @@ class Archive:
         logger.debug("Retrieving entry %s with %s %s %s in %s",
                      hashcode, uri, payload, headers, self.archive_path)
 
-        self._db.row_factory = sqlite3.Row
+        with self._lock:
+            self._db.row_factory = sqlite3.Row
 
-        try:
-            cursor = self._db.cursor()
-            select_stmt = "SELECT data " \
-                          "FROM " + self.ARCHIVE_TABLE + " " \
-                          "WHERE hashcode = ?"
-            cursor.execute(select_stmt, (hashcode,))
-            row = cursor.fetchone()
-            cursor.close()
-        except sqlite3.DatabaseError as e:
-            msg = "data retrieval error; cause: %s" % str(e)
-            raise ArchiveError(cause=msg)
-
-        if row:
-            found = pickle.loads(row['data'])
-        else:
-            msg = "entry %s not found in archive %s" % (hashcode, self.archive_path)
-            raise ArchiveError(cause=msg)
+            try:
+                cursor = self._db.cursor()
+                select_stmt = "SELECT data " \
+                              "FROM " + self.ARCHIVE_TABLE + " " \
+                              "WHERE hashcode = ?"
+                cursor.execute(select_stmt, (hashcode,))
+                row = cursor.fetchone()
+                cursor.close()
+            except sqlite3.DatabaseError as e:
+                msg = "data retrieval error; cause: %s" % str(e)
+                raise ArchiveError(cause=msg)
+
+            if row and self.format_version == self.PICKLE_FORMAT_VERSION:
+                found = pickle.loads(row['data'])
+            elif row:
+                found = decode_record(row['data'], blob_store=self.blob_store)
+            else:
+                msg = "entry %s not found in archive %s" % (hashcode, self.archive_path)
+                raise ArchiveError(cause=msg)
 
         return found
 
     @classmethod
-    def create(cls, archive_path):
+    def create(cls, archive_path, wal=False, batch_size=1, batch_timeout=None,
+               compression=None, blob_store=None):
         """Create a brand new archive.
 
          Call this method to create a new and empty archive. It will initialize
          the storage file in the path defined by `archive_path`.
 
+         When `wal` is set, the archive will use SQLite write-ahead log
+         journal mode. Under this mode, transactions are appended to a
+         log file which is synchronized with the disk less often than
+         the default rollback journal.
+
+         When `blob_store` is given, the bodies of the archived responses
+         will be stored in that `ArchiveBlobStore`. The archive keeps the
+         path to the store relative to its own location.
+
         :param archive_path: absolute path where the archive file will be created
+        :param wal: create the archive using write-ahead log mode
+        :param batch_size: number of items stored on each transaction
+        :param batch_timeout: maximum number of seconds a transaction
+            is kept open
+        :param compression: compress the data stored using this algorithm;
+            valid values are `None`, 'zlib' or 'lzma'
+        :param blob_store: `ArchiveBlobStore` where the response bodies
+            will be stored
 
         :raises ArchiveError: when the archive file already exists
         """
@@ -249,15 +423,29 @@ class Archive:
         conn = sqlite3.connect(archive_path)
 
         cursor = conn.cursor()
+        if wal:
+            cursor.execute("PRAGMA journal_mode=" + cls.WAL_JOURNAL_MODE)
         cursor.execute(cls.METADATA_CREATE_STMT)
         cursor.execute(cls.ARCHIVE_CREATE_STMT)
+
+        if blob_store:
+            blob_store_path = os.path.relpath(blob_store.blob_store_path,
+                                              os.path.dirname(archive_path))
+            cursor.execute(cls.BLOB_STORE_CREATE_STMT)
+            cursor.execute("INSERT INTO " + cls.BLOB_STORE_TABLE + " (path) VALUES (?)",
+                           (blob_store_path,))
+            cursor.execute("PRAGMA user_version=%d" % cls.DEDUP_FORMAT_VERSION)
+        else:
+            cursor.execute("PRAGMA user_version=%d" % cls.FORMAT_VERSION)
         conn.commit()
 
         cursor.close()
         conn.close()
 
         logger.debug("Creating archive %s", archive_path)
-        archive = cls(archive_path)
+        archive = cls(archive_path, batch_size=batch_size,
+                      batch_timeout=batch_timeout,
+                      compression=compression)
         logger.debug("Achive %s was created", archive_path)
 
         return archive
@@ -327,6 +515,103 @@ class Archive:
 
         logger.debug("Metadata of archive %s loaded", self.archive_path)
 
+    def _load_format_version(self):
+        """Load the version of the format used to store the data"""
+
+        cursor = self._db.cursor()
+        cursor.execute("PRAGMA user_version")
+        version = cursor.fetchone()[0]
+        cursor.close()
+
+        if version > self.DEDUP_FORMAT_VERSION:
+            msg = "archive %s format version %s not supported" % (self.archive_path, version)
+            raise ArchiveError(cause=msg)
+
+        self.format_version = version
+
+        logger.debug("Archive %s uses format version %s",
+                     self.archive_path, version)
+
+    def _load_blob_store(self):
+        """Open the blob store used by version 2 archives"""
+
+        if self.format_version != self.DEDUP_FORMAT_VERSION:
+            return
+
+        cursor = self._db.cursor()
+
+        try:
+            cursor.execute("SELECT path FROM " + self.BLOB_STORE_TABLE + " LIMIT 1")
+            row = cursor.fetchone()
+        except sqlite3.DatabaseError as e:
+            msg = "invalid archive file; cause: %s" % str(e)
+            raise ArchiveError(cause=msg)
+        finally:
+            cursor.close()
+
+        if not row:
+            msg = "archive %s blob store not found" % self.archive_path
+            raise ArchiveError(cause=msg)
+
+        blob_store_path = os.path.join(os.path.dirname(self.archive_path), row[0])
+        self.blob_store = ArchiveBlobStore(os.path.dirname(blob_store_path))
+
+        logger.debug("Archive %s uses blob store %s",
+                     self.archive_path, self.blob_store.blob_store_path)
+
+    def _setup_journal(self):
+        """Set the synchronization level based on the journal mode.
+
+        Archives in WAL mode are only synchronized with the disk on
+        checkpoints. The archive will be consistent in the case of
+        a crash, although the last transactions might be lost.
+        """
+        cursor = self._db.cursor()
+        cursor.execute("PRAGMA journal_mode")
+        journal_mode = cursor.fetchone()[0]
+
+        if journal_mode == self.WAL_JOURNAL_MODE:
+            cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
+        logger.debug("Journal mode of archive %s set to %s",
+                     self.archive_path, journal_mode)
+
+    def _entries(self):
+        """Get the raw items stored in the archive.
+
+        :returns: a generator of (uri, payload, headers, data) tuples
+        """
+        cursor = self._db.cursor()
+        select_stmt = "SELECT uri, payload, headers, data " \
+                      "FROM " + self.ARCHIVE_TABLE + " " \
+                      "ORDER BY id"
+
+        try:
+            cursor.execute(select_stmt)
+
+            for row in cursor:
+                if self.format_version == self.PICKLE_FORMAT_VERSION:
+                    data = pickle.loads(row[3])
+                else:
+                    data = decode_record(row[3], blob_store=self.blob_store)
+                yield row[0], pickle.loads(row[1]), pickle.loads(row[2]), data
+        except sqlite3.DatabaseError as e:
+            msg = "data retrieval error; cause: %s" % str(e)
+            raise ArchiveError(cause=msg)
+        finally:
+            cursor.close()
+
+    def _is_batch_completed(self):
+        """Check whether the current transaction has to be committed"""
+
+        if self._pending >= self.batch_size:
+            return True
+        if self.batch_timeout is not None:
+            elapsed = time.time() - self._batch_started_on
+            return elapsed >= self.batch_timeout
+        return False
+
     def _count_table_rows(self, table_name):
         """Fetch the number of rows in a table"""
 
@@ -345,6 +630,457 @@ class Archive:
         return row[0]
 
 
+class ArchivedResponse(requests.Response):
+    """HTTP response rebuilt from an archive.
+
+    This class is a `requests.Response` created from the minimal
+    record stored in an archive. The body of the response is kept
+    as it was stored (i.e, compressed) and it is only decoded the
+    first time its content is accessed.
+
+    :param status_code: HTTP status code
+    :param url: final URL of the response
+    :param reason: textual reason of the status code
+    :param encoding: encoding used to decode the body
+    :param headers: list of header (name, value) pairs
+    :param body: body of the response, as it was stored
+    :param codec: algorithm used to compress the body
+    """
+    def __init__(self, status_code, url, reason, encoding, headers,
+                 body, codec=None):
+        super().__init__()
+        self.status_code = status_code
+        self.url = url
+        self.reason = reason
+        self.encoding = encoding
+        self.headers = requests.structures.CaseInsensitiveDict(headers)
+        self._body = body
+        self._codec = codec
+
+    @property
+    def content(self):
+        if self._content is False:
+            self._content = _decompress(self._body, self._codec)
+            self._content_consumed = True
+            self._body = None
+        return self._content
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        # Make sure the content is decoded before iterating it
+        _ = self.content
+        return super().iter_content(chunk_size=chunk_size,
+                                    decode_unicode=decode_unicode)
+
+
+# Types of the records stored in version 1 and 2 archives
+_RESPONSE_RECORD = b'r'
+_PICKLE_RECORD = b'p'
+_BLOB_RESPONSE_RECORD = b'b'
+
+# Compression algorithms
+_CODECS = {
+    None: b'n',
+    'zlib': b'z',
+    'lzma': b'x'
+}
+_CODECS_IDS = {v: k for k, v in _CODECS.items()}
+
+
+def encode_record(data, compression=None, blob_store=None):
+    """Encode data using the archive record format.
+
+    Responses (`requests.Response` objects) are reduced to a record
+    with the minimal information needed to rebuild them. Their bodies
+    are compressed using `compression` algorithm. Any other object is
+    serialized using the highest pickle protocol available and then
+    compressed.
+
+    When `blob_store` is given, the bodies of the responses are saved
+    in that store and the record only keeps their hash codes.
+
+    The first byte of an encoded record identifies its type while the
+    second stores the compression algorithm.
+
+    :param data: object to encode
+    :param compression: compression algorithm; `None`, 'zlib' or 'lzma'
+    :param blob_store: `ArchiveBlobStore` where bodies are saved
+
+    :returns: the record encoded as bytes
+    """
+    codec = _CODECS[compression]
+
+    if isinstance(data, requests.Response) and blob_store:
+        hashcode = blob_store.put(data.content, compression=compression)
+        record = (data.status_code, data.url, data.reason, data.encoding,
+                  list(data.headers.items()), hashcode)
+        dump = pickle.dumps(record, pickle.HIGHEST_PROTOCOL)
+        return _BLOB_RESPONSE_RECORD + codec + dump
+    elif isinstance(data, requests.Response):
+        record = (data.status_code, data.url, data.reason, data.encoding,
+                  list(data.headers.items()),
+                  _compress(data.content, compression))
+        dump = pickle.dumps(record, pickle.HIGHEST_PROTOCOL)
+        return _RESPONSE_RECORD + codec + dump
+    else:
+        dump = pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+        return _PICKLE_RECORD + codec + _compress(dump, compression)
+
+
+def decode_record(record, blob_store=None):
+    """Decode a record encoded with `encode_record`.
+
+    :param record: record as bytes
+    :param blob_store: `ArchiveBlobStore` where the bodies of the
+        responses were saved, if any
+
+    :returns: the decoded object; responses are returned as
+        `ArchivedResponse` objects
+
+    :raises ArchiveError: when the record is not valid
+    """
+    record_type = record[0:1]
+    codec = record[1:2]
+
+    if codec not in _CODECS_IDS:
+        raise ArchiveError(cause="invalid record; unknown codec %s" % codec)
+
+    compression = _CODECS_IDS[codec]
+
+    if record_type == _RESPONSE_RECORD:
+        status_code, url, reason, encoding, headers, body = pickle.loads(record[2:])
+        return ArchivedResponse(status_code, url, reason, encoding, headers,
+                                body, codec=compression)
+    elif record_type == _BLOB_RESPONSE_RECORD:
+        if not blob_store:
+            raise ArchiveError(cause="invalid record; blob store not available")
+        status_code, url, reason, encoding, headers, hashcode = pickle.loads(record[2:])
+        body, compression = blob_store.get(hashcode)
+        return ArchivedResponse(status_code, url, reason, encoding, headers,
+                                body, codec=compression)
+    elif record_type == _PICKLE_RECORD:
+        return pickle.loads(_decompress(record[2:], compression))
+    else:
+        raise ArchiveError(cause="invalid record; unknown type %s" % record_type)
+
+
+def _compress(data, compression):
+    if data is None:
+        return None
+    elif compression == 'zlib':
+        return zlib.compress(data)
+    elif compression == 'lzma':
+        return lzma.compress(data)
+    else:
+        return data
+
+
+def _decompress(data, compression):
+    if data is None:
+        return None
+    elif compression == 'zlib':
+        return zlib.decompress(data)
+    elif compression == 'lzma':
+        return lzma.decompress(data)
+    else:
+        return data
+
+
+class ArchiveBlobStore:
+    """Content-addressed store of response bodies.
+
+    The store is a SQLite database, saved in `dirpath`, which keeps
+    the bodies of the responses archived by version 2 archives. Each
+    body is stored once, using the SHA256 of its content as key, so
+    responses which did not change between fetch runs are shared by
+    all the archives which reference them.
+
+    The store is shared by several archives and processes, so it
+    always runs in write-ahead log mode. Each blob added with `put`
+    is written in its own short transaction, apart from the batches
+    of the archives, so the store is never locked while an archive
+    has pending items. Blobs are always written before the entries
+    which reference them.
+
+    :param dirpath: directory where the store is saved
+
+    :raises ArchiveError: when an error occurs opening the store
+    """
+    BLOB_STORE_NAME = 'blobs.sqlite3'
+    BLOBS_TABLE = 'blobs'
+    BLOB_STORE_TIMEOUT = 60
+
+    BLOBS_CREATE_STMT = "CREATE TABLE IF NOT EXISTS " + BLOBS_TABLE + " ( " \
+                        "hashcode TEXT PRIMARY KEY, " \
+                        "codec BLOB, " \
+                        "data BLOB)"
+
+    def __init__(self, dirpath):
+        self.dirpath = dirpath
+        self.blob_store_path = os.path.join(dirpath, self.BLOB_STORE_NAME)
+
+        try:
+            self._db = sqlite3.connect(self.blob_store_path,
+                                       timeout=self.BLOB_STORE_TIMEOUT,
+                                       check_same_thread=False)
+            cursor = self._db.cursor()
+            cursor.execute("PRAGMA journal_mode=" + Archive.WAL_JOURNAL_MODE)
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute(self.BLOBS_CREATE_STMT)
+            self._db.commit()
+            cursor.close()
+        except sqlite3.DatabaseError as e:
+            msg = "blob store %s error; cause: %s" % (self.blob_store_path, str(e))
+            raise ArchiveError(cause=msg)
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        """Close the store"""
+
+        conn = getattr(self, '_db', None)
+        if not conn:
+            return
+
+        conn.close()
+        self._db = None
+
+    def put(self, content, compression=None):
+        """Add a blob to the store.
+
+        The content is only compressed and added when the store does
+        not have it yet.
+
+        :param content: content of the blob, as bytes
+        :param compression: compression algorithm; `None`, 'zlib' or 'lzma'
+
+        :returns: the hash code of the blob
+
+        :raises ArchiveError: when an error occurs adding the blob
+        """
+        if content is None:
+            return None
+
+        hashcode = hashlib.sha256(content).hexdigest()
+
+        try:
+            cursor = self._db.cursor()
+            cursor.execute("SELECT 1 FROM " + self.BLOBS_TABLE + " WHERE hashcode = ?",
+                           (hashcode,))
+
+            if not cursor.fetchone():
+                insert_stmt = "INSERT OR IGNORE INTO " + self.BLOBS_TABLE + " " \
+                              "(hashcode, codec, data) VALUES (?, ?, ?)"
+                cursor.execute(insert_stmt, (hashcode, _CODECS[compression],
+                                             _compress(content, compression)))
+                self._db.commit()
+            cursor.close()
+        except sqlite3.DatabaseError as e:
+            msg = "blob store %s error; cause: %s" % (self.blob_store_path, str(e))
+            raise ArchiveError(cause=msg)
+
+        return hashcode
+
+    def get(self, hashcode):
+        """Get a blob from the store.
+
+        :param hashcode: hash code of the blob
+
+        :returns: a tuple with the blob, as it was stored, and its
+            compression algorithm
+
+        :raises ArchiveError: when the blob is not found
+        """
+        if hashcode is None:
+            return None, None
+
+        try:
+            cursor = self._db.cursor()
+            cursor.execute("SELECT codec, data FROM " + self.BLOBS_TABLE + " WHERE hashcode = ?",
+                           (hashcode,))
+            row = cursor.fetchone()
+            cursor.close()
+        except sqlite3.DatabaseError as e:
+            msg = "blob store %s error; cause: %s" % (self.blob_store_path, str(e))
+            raise ArchiveError(cause=msg)
+
+        if not row:
+            msg = "blob %s not found in %s" % (hashcode, self.blob_store_path)
+            raise ArchiveError(cause=msg)
+
+        return row[1], _CODECS_IDS[row[0]]
+
+
+class ArchiveCatalog:
+    """Index of the archives stored in a directory.
+
+    The catalog is a SQLite database, stored in `dirpath`, which
+    keeps the metadata of the archives found under that directory.
+    Archives are indexed by origin, backend name, category and
+    creation date, so they can be searched without opening each
+    one of them. Paths are stored relative to `dirpath`.
+
+    :param dirpath: directory where the archives are stored
+    """
+    CATALOG_NAME = 'catalog.sqlite3'
+    CATALOG_TABLE = 'catalog'
+    CATALOG_TIMEOUT = 60
+
+    CATALOG_CREATE_STMT = "CREATE TABLE IF NOT EXISTS " + CATALOG_TABLE + " ( " \
+                          "archive_path TEXT PRIMARY KEY, " \
+                          "origin TEXT, " \
+                          "backend_name TEXT, " \
+                          "category TEXT, " \
+                          "created_on REAL)"
+
+    CATALOG_INDEX_STMT = "CREATE INDEX IF NOT EXISTS " + CATALOG_TABLE + "_search " \
+                         "ON " + CATALOG_TABLE + " " \
+                         "(origin, backend_name, category, created_on)"
+
+    def __init__(self, dirpath):
+        self.dirpath = dirpath
+        self.catalog_path = os.path.join(dirpath, self.CATALOG_NAME)
+
+        self._execute([(self.CATALOG_CREATE_STMT, ()),
+                       (self.CATALOG_INDEX_STMT, ())])
+
+    def add(self, archive_path, origin=None, backend_name=None,
+            category=None, created_on=None):
+        """Add or update an archive in the catalog.
+
+        :param archive_path: path to the archive
+        :param origin: data origin
+        :param backend_name: backend used to fetch data
+        :param category: type of the items fetched by the backend
+        :param created_on: datetime when the archive was created
+
+        :raises ArchiveManagerError: when an error occurs updating
+            the catalog
+        """
+        stmt = "INSERT OR REPLACE INTO " + self.CATALOG_TABLE + " " \
+               "(archive_path, origin, backend_name, category, created_on) " \
+               "VALUES (?, ?, ?, ?, ?)"
+        entry = self.__entry(archive_path, origin, backend_name,
+                             category, created_on)
+
+        self._execute([(stmt, entry)])
+
+        logger.debug("Archive %s added to catalog %s",
+                     archive_path, self.catalog_path)
+
+    def remove(self, archive_path):
+        """Remove an archive from the catalog.
+
+        :param archive_path: path to the archive
+
+        :raises ArchiveManagerError: when an error occurs updating
+            the catalog
+        """
+        stmt = "DELETE FROM " + self.CATALOG_TABLE + " WHERE archive_path = ?"
+        self._execute([(stmt, (self.__relpath(archive_path),))])
+
+        logger.debug("Archive %s removed from catalog %s",
+                     archive_path, self.catalog_path)
+
+    def merge(self, entries):
+        """Add to the catalog the archives it does not have yet.
+
+        Entries already stored in the catalog are kept as they are,
+        so those added by other processes while `entries` were being
+        read are neither removed nor overwritten.
+
+        :param entries: list of tuples with the path, origin, backend
+            name, category and creation date of each archive
+
+        :raises ArchiveManagerError: when an error occurs updating
+            the catalog
+        """
+        insert_stmt = "INSERT OR IGNORE INTO " + self.CATALOG_TABLE + " " \
+                      "(archive_path, origin, backend_name, category, created_on) " \
+                      "VALUES (?, ?, ?, ?, ?)"
+
+        self._execute([(insert_stmt, self.__entry(*entry)) for entry in entries])
+
+    def reset(self, entries):
+        """Replace the contents of the catalog.
+
+        :param entries: list of tuples with the path, origin, backend
+            name, category and creation date of each archive
+
+        :raises ArchiveManagerError: when an error occurs updating
+            the catalog
+        """
+        insert_stmt = "INSERT OR REPLACE INTO " + self.CATALOG_TABLE + " " \
+                      "(archive_path, origin, backend_name, category, created_on) " \
+                      "VALUES (?, ?, ?, ?, ?)"
+
+        stmts = [("DELETE FROM " + self.CATALOG_TABLE, ())]
+        stmts.extend([(insert_stmt, self.__entry(*entry)) for entry in entries])
+
+        self._execute(stmts)
+
+    def search(self, origin, backend_name, category, archived_after):
+        """Search archives in the catalog.
+
+        :param origin: data origin
+        :param backend_name: backed used to fetch data
+        :param category: type of the items fetched by the backend
+        :param archived_after: get archives created on or after this date
+
+        :returns: a list with the paths of the archives which match
+            the search criteria, sorted by creation date
+
+        :raises ArchiveManagerError: when an error occurs accessing
+            the catalog
+        """
+        select_stmt = "SELECT archive_path " \
+                      "FROM " + self.CATALOG_TABLE + " " \
+                      "WHERE origin = ? AND backend_name = ? " \
+                      "AND category = ? AND created_on >= ? " \
+                      "ORDER BY created_on"
+        params = (origin, backend_name, category,
+                  datetime_to_utc(archived_after).timestamp())
+
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute(select_stmt, params)
+            rows = cursor.fetchall()
+            cursor.close()
+            conn.close()
+        except sqlite3.DatabaseError as e:
+            msg = "catalog %s search error; cause: %s" % (self.catalog_path, str(e))
+            raise ArchiveManagerError(cause=msg)
+
+        return [os.path.join(self.dirpath, row[0]) for row in rows]
+
+    def _connect(self):
+        return sqlite3.connect(self.catalog_path, timeout=self.CATALOG_TIMEOUT)
+
+    def _execute(self, stmts):
+        """Run a list of statements in a single transaction"""
+
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            for stmt, params in stmts:
+                cursor.execute(stmt, params)
+            conn.commit()
+            cursor.close()
+            conn.close()
+        except sqlite3.DatabaseError as e:
+            msg = "catalog %s update error; cause: %s" % (self.catalog_path, str(e))
+            raise ArchiveManagerError(cause=msg)
+
+    def __entry(self, archive_path, origin, backend_name, category, created_on):
+        created_on = created_on.timestamp() if created_on else None
+        return (self.__relpath(archive_path), origin, backend_name,
+                category, created_on)
+
+    def __relpath(self, archive_path):
+        return os.path.relpath(archive_path, self.dirpath)
+
+
 class ArchiveManager:
     """Manager for handling archives in Perceval.
 
@@ -354,17 +1090,69 @@ class ArchiveManager:
     be the name of the subdirectory; the remaining bytes, the archive
     name.
 
+    Archives are indexed in an `ArchiveCatalog` stored in `dirpath`.
+    The catalog is kept up to date when archives are created, their
+    metadata is initialized or they are removed, so searches do not
+    need to open every archive. The archives of a directory are
+    added to the catalog the first time the directory is managed,
+    keeping any entry added by other managers in the meantime;
+    directories modified by other means can be indexed again
+    calling `rebuild_catalog`.
+
+    New archives can be created in write-ahead log mode (`wal`)
+    grouping the stored items in transactions of `batch_size` items
+    or `batch_timeout` seconds. Their data can be compressed setting
+    `compression`. See `Archive` for more details.
+
+    When `dedup` is set, new archives store the bodies of the responses
+    in an `ArchiveBlobStore` saved in `dirpath`, shared by all of them.
+    Bodies which did not change between fetch runs are only stored once.
+    Existing archives can be moved to this layout calling `compact`.
+    Blobs are kept when the archives referencing them are removed.
+
     :param: dirpath: path where the archives are stored
+    :param wal: create archives using write-ahead log mode
+    :param batch_size: number of items stored on each transaction
+    :param batch_timeout: maximum number of seconds a transaction
+        is kept open
+    :param compression: compress archived data using this algorithm;
+        valid values are `None`, 'zlib' or 'lzma'
+    :param dedup: store the bodies of the responses in the shared
+        blob store
     """
 
     STORAGE_EXT = '.sqlite3'
+    JOURNAL_EXTS = ['-wal', '-shm', '-journal']
+    COMPACT_EXT = '.compact'
+    COMPACT_BATCH_SIZE = 1000
 
-    def __init__(self, dirpath):
+    def __init__(self, dirpath, wal=False, batch_size=1, batch_timeout=None,
+                 compression=None, dedup=False):
         self.dirpath = dirpath
+        self.wal = wal
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.compression = compression
+        self.dedup = dedup
 
         if not os.path.exists(self.dirpath):
             os.makedirs(self.dirpath)
 
+        self.blob_store_path = os.path.join(self.dirpath,
+                                            ArchiveBlobStore.BLOB_STORE_NAME)
+
+        catalog_path = os.path.join(self.dirpath, ArchiveCatalog.CATALOG_NAME)
+        catalog_exists = os.path.exists(catalog_path)
+
+        self.catalog = ArchiveCatalog(self.dirpath)
+
+        if not catalog_exists:
+            entries = self.__catalog_entries()
+            self.catalog.merge(entries)
+
+            logger.debug("Catalog of %s created; %s archives indexed",
+                         self.dirpath, len(entries))
+
     def create_archive(self):
         """Create a new archive.
 
@@ -387,17 +1175,26 @@ class ArchiveManager:
             os.makedirs(archive_dir)
 
         try:
-            archive = Archive.create(archive_path)
+            blob_store = ArchiveBlobStore(self.dirpath) if self.dedup else None
+            archive = Archive.create(archive_path,
+                                     wal=self.wal,
+                                     batch_size=self.batch_size,
+                                     batch_timeout=self.batch_timeout,
+                                     compression=self.compression,
+                                     blob_store=blob_store)
         except ArchiveError as e:
             raise ArchiveManagerError(cause=str(e))
 
+        self.catalog.add(archive_path)
+        archive.catalog = self.catalog
+
         return archive
 
     def remove_archive(self, archive_path):
         """Remove an archive.
 
         This method deletes from the filesystem the archive stored
-        in `archive_path`.
+        in `archive_path`, together with its journal files, if any.
 
         :param archive_path: path to the archive
 
@@ -409,7 +1206,8 @@ class ArchiveManager:
         except ArchiveError as e:
             raise ArchiveManagerError(cause=str(e))
 
-        os.remove(archive_path)
+        self.__remove_files(archive_path)
+        self.catalog.remove(archive_path)
 
     def search(self, origin, backend_name, category, archived_after):
         """Search archives.
@@ -423,6 +1221,9 @@ class ArchiveManager:
         The method returns a list with the file paths to those archives.
         The list is sorted by the date of creation of each archive.
 
+        Archives are searched using the catalog. Those archives found
+        in the catalog which no longer exist are removed from it.
+
         :param origin: data origin
         :param backend_name: backed used to fetch data
         :param category: type of the items fetched by the backend
@@ -430,36 +1231,168 @@ class ArchiveManager:
 
         :returns: a list with archive names which match the search criteria
         """
-        archives = self._search_archives(origin, backend_name,
-                                         category, archived_after)
-        archives = [(fp, date) for fp, date in archives]
-        archives = [fp for fp, _ in sorted(archives, key=lambda x: x[1])]
+        archives = []
+
+        for archive_path in self.catalog.search(origin, backend_name,
+                                                category, archived_after):
+            if not os.path.exists(archive_path):
+                logger.debug("Archive %s no longer exists; removed from the catalog",
+                             archive_path)
+                self.catalog.remove(archive_path)
+                continue
+            archives.append(archive_path)
 
         return archives
 
-    def _search_archives(self, origin, backend_name, category, archived_after):
-        """Search archives using filters."""
+    def rebuild_catalog(self):
+        """Rebuild the catalog of archives.
+
+        The method walks the directory of the manager, reading the
+        metadata of every archive found, and replaces the contents
+        of the catalog with it. Invalid archives are ignored.
+
+        Archives created by other processes while the catalog is
+        rebuilt might not be indexed, so the directory should not
+        be written in the meantime.
+
+        :returns: the number of archives indexed
+
+        :raises ArchiveManagerError: when an error occurs updating
+            the catalog
+        """
+        entries = self.__catalog_entries()
+        self.catalog.reset(entries)
+
+        logger.debug("Catalog of %s rebuilt; %s archives indexed",
+                     self.dirpath, len(entries))
+
+        return len(entries)
+
+    def compact(self):
+        """Move the archives to the deduplicated layout.
+
+        The method converts every archive stored in the directory which
+        does not use the blob store yet (see `dedup`). The entries and
+        the metadata of each archive are copied to a new archive which
+        saves the bodies of the responses in the blob store; then, the
+        new archive replaces the old one. Data is compressed using the
+        `compression` algorithm of the manager. Invalid archives are
+        ignored.
+
+        Archives should not be written while they are compacted.
+
+        :returns: a tuple with the number of archives compacted and the
+            size, in bytes, of the archives and the blob store before
+            and after compacting them
+
+        :raises ArchiveManagerError: when an error occurs compacting
+            the archives
+        """
+        size_before = self.__file_size(self.blob_store_path)
+        size_after = 0
+        narchives = 0
+
+        blob_store = ArchiveBlobStore(self.dirpath)
+
+        for archive_path in list(self._search_files()):
+            if archive_path.endswith(self.COMPACT_EXT):
+                continue
 
-        for archive_path in self._search_files():
             try:
                 archive = Archive(archive_path)
             except ArchiveError:
                 continue
 
-            match = archive.origin == origin and \
-                archive.backend_name == backend_name and \
-                archive.category == category and \
-                archive.created_on >= archived_after
-
-            if not match:
+            if archive.format_version == Archive.DEDUP_FORMAT_VERSION:
+                archive.close()
                 continue
 
-            yield archive_path, archive.created_on
+            size_before += self.__file_size(archive_path)
+
+            try:
+                self._compact_archive(archive, blob_store)
+            except ArchiveError as e:
+                raise ArchiveManagerError(cause=str(e))
+
+            size_after += self.__file_size(archive_path)
+            narchives += 1
+
+            logger.debug("Archive %s compacted", archive_path)
+
+        blob_store.close()
+        size_after += self.__file_size(self.blob_store_path)
+
+        logger.debug("%s archives compacted in %s; %s bytes before, %s bytes after",
+                     narchives, self.dirpath, size_before, size_after)
+
+        return narchives, size_before, size_after
+
+    def _compact_archive(self, archive, blob_store):
+        """Replace an archive by a copy which uses the blob store"""
+
+        archive_path = archive.archive_path
+        compact_path = archive_path + self.COMPACT_EXT
+
+        self.__remove_files(compact_path)
+
+        compacted = Archive.create(compact_path,
+                                   batch_size=self.COMPACT_BATCH_SIZE,
+                                   compression=self.compression,
+                                   blob_store=blob_store)
+
+        for uri, payload, headers, data in archive._entries():
+            compacted.store(uri, payload, headers, data)
+
+        if archive.created_on:
+            compacted.init_metadata(archive.origin, archive.backend_name,
+                                    archive.backend_version, archive.category,
+                                    archive.backend_params,
+                                    created_on=archive.created_on)
+        compacted.close()
+        archive.close()
+
+        self.__remove_files(archive_path)
+        os.replace(compact_path, archive_path)
 
     def _search_files(self):
         """Retrieve the file paths stored under the base path."""
 
         for root, _, files in os.walk(self.dirpath):
             for filename in files:
+                if filename.endswith(tuple(self.JOURNAL_EXTS)):
+                    continue
                 location = os.path.join(root, filename)
+                if location in (self.catalog.catalog_path, self.blob_store_path):
+                    continue
                 yield location
+
+    def __catalog_entries(self):
+        """Read the catalog entries of the archives in the directory"""
+
+        entries = []
+
+        for archive_path in self._search_files():
+            try:
+                archive = Archive(archive_path)
+            except ArchiveError:
+                continue
+
+            entries.append((archive_path, archive.origin, archive.backend_name,
+                            archive.category, archive.created_on))
+
+        return entries
+
+    def __remove_files(self, archive_path):
+        """Remove an archive file and its journal files"""
+
+        for ext in [''] + self.JOURNAL_EXTS:
+            filepath = archive_path + ext
+            if os.path.exists(filepath):
+                os.remove(filepath)
+
+    def __file_size(self, filepath):
+        """Size of a file and its journal files"""
+
+        return sum([os.path.getsize(filepath + ext)
+                    for ext in [''] + self.JOURNAL_EXTS
+                    if os.path.exists(filepath + ext)])
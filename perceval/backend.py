@@ -25,6 +25,7 @@ import hashlib
 import importlib
 import json
 import logging
+import multiprocessing
 import os
 import pkgutil
 import sys
@@ -33,7 +34,9 @@ from grimoirelab_toolkit.introspect import find_signature_parameters
 from grimoirelab_toolkit.datetime import (datetime_utcnow,
                                           str_to_datetime)
 from .archive import Archive, ArchiveManager
+from .client import HttpCache, SharedRateLimiter
 from .errors import ArchiveError, BackendError
+from .utils import pool_imap
 from ._version import __version__
 
 
@@ -124,8 +127,20 @@ class Backend:
 
         self.client = self._init_client()
 
-        for item in self.fetch_items(category, **kwargs):
-            yield self.metadata(item)
+        failed = False
+
+        try:
+            for item in self.fetch_items(category, **kwargs):
+                yield self.metadata(item)
+        except Exception:
+            # Pending items of a failed fetch are not written
+            failed = True
+            if self.archive:
+                self.archive.discard()
+            raise
+        finally:
+            if self.archive and not failed:
+                self.archive.flush()
 
     def fetch_from_archive(self):
         """Fetch the questions from an archive.
@@ -206,6 +221,8 @@ class BackendCommandArgumentParser:
     :param basic_auth: set basic authentication arguments
     :param token_auth: set token/key authentication arguments
     :param archive: set archiving arguments
+    :param http_cache: set HTTP cache arguments
+    :param rate_limiter: set shared rate limiter arguments
     :param aliases: define aliases for parsed arguments
 
     :raises AttributeArror: when both `from_date` and `offset` are set
@@ -213,7 +230,7 @@ class BackendCommandArgumentParser:
     """
     def __init__(self, from_date=False, to_date=False, offset=False,
                  basic_auth=False, token_auth=False, archive=False,
-                 aliases=None):
+                 http_cache=False, rate_limiter=False, aliases=None):
         self._from_date = from_date
         self._to_date = to_date
         self._archive = archive
@@ -249,6 +266,12 @@ class BackendCommandArgumentParser:
         if archive:
             self._set_archive_arguments()
 
+        if http_cache:
+            self._set_http_cache_arguments()
+
+        if rate_limiter:
+            self._set_rate_limiter_arguments()
+
         self._set_output_arguments()
 
     def parse(self, *args):
@@ -314,6 +337,50 @@ class BackendCommandArgumentParser:
                            help="fetch data from the archives")
         group.add_argument('--archived-since', dest='archived_since', default='1970-01-01',
                            help="retrieve items archived since the given date")
+        group.add_argument('--fetch-archive-workers', dest='fetch_archive_workers',
+                           type=int, default=None,
+                           help="number of processes used to fetch data from the archives")
+        group.add_argument('--fetch-archive-unordered', dest='fetch_archive_unordered',
+                           action='store_true',
+                           help="do not return the items fetched from the archives by date")
+        group.add_argument('--archive-wal', dest='archive_wal', action='store_true',
+                           help="create archives in write-ahead log mode")
+        group.add_argument('--archive-batch-size', dest='archive_batch_size',
+                           type=int, default=1,
+                           help="number of items archived on each transaction")
+        group.add_argument('--archive-batch-timeout', dest='archive_batch_timeout',
+                           type=float, default=None,
+                           help="maximum number of seconds to keep an archive transaction open")
+        group.add_argument('--archive-compression', dest='archive_compression',
+                           choices=['zlib', 'lzma'], default=None,
+                           help="compress archived data using this algorithm")
+        group.add_argument('--archive-dedup', dest='archive_dedup',
+                           action='store_true',
+                           help="store the bodies of the responses once, shared by all the archives")
+
+    def _set_http_cache_arguments(self):
+        """Activate HTTP cache arguments parsing"""
+
+        group = self.parser.add_argument_group('HTTP cache arguments')
+        group.add_argument('--http-cache-path', dest='http_cache_path', default=None,
+                           help="directory path to the HTTP cache; disabled when it is not set")
+        group.add_argument('--http-cache-max-size', dest='http_cache_max_size',
+                           type=int, default=HttpCache.DEFAULT_MAX_SIZE // (1024 * 1024),
+                           help="maximum size, in MB, of the HTTP cache")
+        group.add_argument('--http-cache-max-age', dest='http_cache_max_age',
+                           type=int, default=HttpCache.DEFAULT_MAX_AGE // (24 * 60 * 60),
+                           help="number of days a cached response is kept without being used")
+
+    def _set_rate_limiter_arguments(self):
+        """Activate shared rate limiter arguments parsing"""
+
+        group = self.parser.add_argument_group('rate limiter arguments')
+        group.add_argument('--rate-limiter-path', dest='rate_limiter_path', default=None,
+                           help="directory path to the rate limiter shared by the running processes; "
+                                "disabled when it is not set")
+        group.add_argument('--rate-limiter-burst', dest='rate_limiter_burst',
+                           type=int, default=SharedRateLimiter.DEFAULT_BURST,
+                           help="maximum number of requests sent without waiting")
 
     def _set_output_arguments(self):
         """Activate output arguments parsing"""
@@ -348,9 +415,13 @@ class BackendCommand:
         self.parsed_args = parser.parse(*args)
 
         self.archive_manager = None
+        self.http_cache = None
+        self.rate_limiter = None
 
         self._pre_init()
         self._initialize_archive()
+        self._initialize_http_cache()
+        self._initialize_rate_limiter()
         self._post_init()
 
         self.outfile = self.parsed_args.outfile
@@ -367,19 +438,7 @@ class BackendCommand:
         the inizialization of the instance, the items will be retrieved
         using the archive manager.
         """
-        backend_args = vars(self.parsed_args)
-        category = backend_args.pop('category', None)
-        archived_since = backend_args.pop('archived_since', None)
-
-        if self.archive_manager and self.parsed_args.fetch_archive:
-
-            items = fetch_from_archive(self.BACKEND, backend_args,
-                                       self.archive_manager,
-                                       category,
-                                       archived_since)
-        else:
-            items = fetch(self.BACKEND, backend_args, category,
-                          manager=self.archive_manager)
+        items = self.fetch()
 
         try:
             for item in items:
@@ -394,6 +453,38 @@ class BackendCommand:
         except Exception as e:
             raise RuntimeError(str(e))
 
+    def fetch(self):
+        """Fetch the items defined by the parsed arguments.
+
+        The method runs the backend using the arguments given during
+        the initialization of the instance. When `fetch-archive` was
+        set, the items will be retrieved using the archive manager.
+
+        :returns: a generator of items
+        """
+        backend_args = vars(self.parsed_args)
+        category = backend_args.pop('category', None)
+        archived_since = backend_args.pop('archived_since', None)
+
+        if self.archive_manager and self.parsed_args.fetch_archive:
+
+            items = fetch_from_archive(self.BACKEND, backend_args,
+                                       self.archive_manager,
+                                       category,
+                                       archived_since,
+                                       workers=self.parsed_args.fetch_archive_workers,
+                                       ordered=not self.parsed_args.fetch_archive_unordered)
+        else:
+            if self.http_cache:
+                backend_args['http_cache'] = self.http_cache
+            if self.rate_limiter:
+                backend_args['rate_limiter'] = self.rate_limiter
+
+            items = fetch(self.BACKEND, backend_args, category,
+                          manager=self.archive_manager)
+
+        return items
+
     def _pre_init(self):
         """Override to execute before backend is initialized."""
         pass
@@ -415,10 +506,43 @@ class BackendCommand:
             else:
                 archive_path = self.parsed_args.archive_path
 
-            manager = ArchiveManager(archive_path)
+            manager = ArchiveManager(archive_path,
+                                     wal=self.parsed_args.archive_wal,
+                                     batch_size=self.parsed_args.archive_batch_size,
+                                     batch_timeout=self.parsed_args.archive_batch_timeout,
+                                     compression=self.parsed_args.archive_compression,
+                                     dedup=self.parsed_args.archive_dedup)
 
         self.archive_manager = manager
 
+    def _initialize_http_cache(self):
+        """Initialize the HTTP cache based on the parsed parameters"""
+
+        if not getattr(self.parsed_args, 'http_cache_path', None):
+            cache = None
+        elif getattr(self.parsed_args, 'fetch_archive', False):
+            cache = None
+        else:
+            max_size = self.parsed_args.http_cache_max_size * 1024 * 1024
+            max_age = self.parsed_args.http_cache_max_age * 24 * 60 * 60
+            cache = HttpCache(self.parsed_args.http_cache_path,
+                              max_size=max_size, max_age=max_age)
+
+        self.http_cache = cache
+
+    def _initialize_rate_limiter(self):
+        """Initialize the shared rate limiter based on the parsed parameters"""
+
+        if not getattr(self.parsed_args, 'rate_limiter_path', None):
+            limiter = None
+        elif getattr(self.parsed_args, 'fetch_archive', False):
+            limiter = None
+        else:
+            limiter = SharedRateLimiter(self.parsed_args.rate_limiter_path,
+                                        burst=self.parsed_args.rate_limiter_burst)
+
+        self.rate_limiter = limiter
+
     @staticmethod
     def setup_cmd_parser():
         raise NotImplementedError
@@ -488,18 +612,27 @@ def fetch(backend_class, backend_args, category, manager=None):
                                            backend_args)
     items = backend.fetch(**fetch_args)
 
+    failed = False
+
     try:
         for item in items:
             yield item
     except Exception as e:
+        failed = True
         if manager:
+            archive.discard()
             archive_path = archive.archive_path
             manager.remove_archive(archive_path)
         raise e
+    finally:
+        # Write pending items when the generator is closed
+        if archive and not failed:
+            archive.flush()
 
 
 def fetch_from_archive(backend_class, backend_args, manager,
-                       category, archived_after):
+                       category, archived_after, workers=None,
+                       ordered=True):
     """Fetch items from an archive manager.
 
     Generator to get the items of a category (previously fetched
@@ -509,11 +642,22 @@ def fetch_from_archive(backend_class, backend_args, manager,
     The parameters needed to initialize `backend` and get the
     items are given using `backend_args` dict parameter.
 
+    Archives are replayed one after the other. When `workers` is
+    greater than one, they are spread across a pool of `workers`
+    processes. Items are returned following the date of creation
+    of their archives, unless `ordered` is not set; in that case,
+    the items of each archive are returned as soon as its replay
+    finishes. The items of the same archive keep their order. No
+    more than twice `workers` replayed archives are kept in memory
+    waiting to be consumed.
+
     :param backend_class: backend class to retrive items
     :param backend_args: dict of arguments needed to retrieve the items
     :param manager: archive manager where the items will be retrieved
     :param category: category of the items to retrieve
     :param archived_after: return items archived after this date
+    :param workers: number of processes used to replay the archives
+    :param ordered: return the items in archive date order
 
     :returns: a generator of archived items
     """
@@ -526,15 +670,49 @@ def fetch_from_archive(backend_class, backend_args, manager,
                                category,
                                archived_after)
 
-    for filepath in filepaths:
-        backend.archive = Archive(filepath)
-        items = backend.fetch_from_archive()
+    if not workers or workers < 2 or len(filepaths) < 2:
+        for filepath in filepaths:
+            for item in _replay_archive(backend, filepath):
+                yield item
+        return
 
-        try:
+    jobs = [(backend_class, init_args, filepath) for filepath in filepaths]
+
+    workers = min(workers, len(filepaths))
+    pool = multiprocessing.Pool(processes=workers)
+
+    try:
+        results = pool_imap(pool, _replay_archive_job, jobs,
+                            max_pending=workers * 2, ordered=ordered)
+
+        for items in results:
             for item in items:
                 yield item
-        except ArchiveError as e:
-            logger.warning("Ignoring %s archive due to: %s", filepath, str(e))
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _replay_archive(backend, filepath):
+    """Fetch the items stored in an archive, ignoring it when it is corrupted"""
+
+    backend.archive = Archive(filepath)
+    items = backend.fetch_from_archive()
+
+    try:
+        for item in items:
+            yield item
+    except ArchiveError as e:
+        logger.warning("Ignoring %s archive due to: %s", filepath, str(e))
+
+
+def _replay_archive_job(job):
+    """Replay an archive in a worker process"""
+
+    backend_class, init_args, filepath = job
+    backend = backend_class(**init_args)
+
+    return [item for item in _replay_archive(backend, filepath)]
 
 
 def find_backends(top_package):
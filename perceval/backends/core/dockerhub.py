@@ -57,12 +57,13 @@ class DockerHub(Backend):
     :param repository: DockerHub repository owned by `owner`
     :param tag: label used to mark the data
     :param archive: archive to store/retrieve items
+    :param http_cache: `HttpCache` used to send conditional requests
     """
-    version = '0.4.2'
+    version = '0.5.0'
 
     CATEGORIES = [CATEGORY_DOCKERHUB_DATA]
 
-    def __init__(self, owner, repository, tag=None, archive=None):
+    def __init__(self, owner, repository, tag=None, archive=None, http_cache=None):
         if owner == DOCKER_SHORTCUT_OWNER:
             owner = DOCKER_OWNER
 
@@ -71,6 +72,7 @@ class DockerHub(Backend):
         super().__init__(origin, tag=tag, archive=archive)
         self.owner = owner
         self.repository = repository
+        self.http_cache = http_cache
         self.client = None
 
     def fetch(self, category=CATEGORY_DOCKERHUB_DATA):
@@ -171,7 +173,8 @@ class DockerHub(Backend):
     def _init_client(self, from_archive=False):
         """Init client"""
 
-        return DockerHubClient(archive=self.archive, from_archive=from_archive)
+        return DockerHubClient(archive=self.archive, from_archive=from_archive,
+                               cache=self.http_cache)
 
 
 class DockerHubClient(HttpClient):
@@ -182,11 +185,13 @@ class DockerHubClient(HttpClient):
 
     :param archive: an archive to store/read fetched data
     :param from_archive: it tells whether to write/read the archive
+    :param cache: `HttpCache` used to send conditional requests
     """
     RREPOSITORY = 'repositories'
 
-    def __init__(self, archive=None, from_archive=False):
-        super().__init__(DOCKERHUB_API_URL, archive=archive, from_archive=from_archive)
+    def __init__(self, archive=None, from_archive=False, cache=None):
+        super().__init__(DOCKERHUB_API_URL, archive=archive, from_archive=from_archive,
+                         cache=cache)
 
     def repository(self, owner, repository):
         """Fetch information about a repository."""
@@ -209,7 +214,7 @@ class DockerHubCommand(BackendCommand):
     def setup_cmd_parser():
         """Returns the DockerHub argument parser."""
 
-        parser = BackendCommandArgumentParser(archive=True)
+        parser = BackendCommandArgumentParser(archive=True, http_cache=True)
 
         # Required arguments
         parser.parser.add_argument('owner',
@@ -22,13 +22,19 @@
 
 import collections
 import io
+import itertools
 import logging
+import mmap
+import multiprocessing
 import os
+import queue
 import re
 import subprocess
 import threading
 
 import dulwich.client
+import dulwich.objects
+import dulwich.pack
 import dulwich.repo
 
 from grimoirelab_toolkit.datetime import datetime_to_utc, str_to_datetime
@@ -37,10 +43,19 @@ from ...backend import (Backend,
                         BackendCommand,
                         BackendCommandArgumentParser)
 from ...errors import RepositoryError, ParseError
-from ...utils import DEFAULT_DATETIME, DEFAULT_LAST_DATETIME
+from ...utils import (DEFAULT_DATETIME,
+                      DEFAULT_LAST_DATETIME,
+                      open_compressed_file,
+                      pool_imap)
 
 CATEGORY_COMMIT = 'commit'
 
+# Levels of detail of the commits read from a repository
+DETAIL_FULL = 'full'
+DETAIL_FILES = 'files'
+DETAIL_COMMITS = 'commits'
+DETAIL_LEVELS = [DETAIL_FULL, DETAIL_FILES, DETAIL_COMMITS]
+
 logger = logging.getLogger(__name__)
 
 
@@ -60,20 +75,50 @@ class Git(Backend):
     :param gitpath: path to the repository or to the log file
     :param tag: label used to mark the data
     :param archive: archive to store/retrieve items
+    :param machine_log: read the commits from the repository using
+        the machine-readable log format, which is parsed faster
+    :param log_workers: number of processes reading and parsing the
+        log of the repository; when it is greater than one, the history
+        is split in shards of consecutive commits which are read in
+        parallel
+    :param maintenance: run maintenance tasks on the repository after
+        updating it, writing its commit-graph and repacking it when it
+        has more than `max_packs` packs
+    :param max_packs: maximum number of packs before they are repacked
+    :param detail: level of detail of the commits read from the
+        repository; `full` includes the files of each commit detecting
+        renames and copies, `files` includes them without detecting
+        renames nor copies and `commits` does not include any file
 
     :raises RepositoryError: raised when there was an error cloning or
         updating the repository.
     """
-    version = '0.11.0'
+    version = '0.16.0'
 
     CATEGORIES = [CATEGORY_COMMIT]
 
-    def __init__(self, uri, gitpath, tag=None, archive=None):
+    # Number of commits of each shard of the log read in parallel
+    LOG_SHARD_SIZE = 5000
+
+    def __init__(self, uri, gitpath, tag=None, archive=None, machine_log=False,
+                 log_workers=None, maintenance=False, max_packs=None, detail=DETAIL_FULL):
         origin = uri
 
+        if log_workers is not None and log_workers < 1:
+            msg = "log_workers must be greater than 0; %s given" % log_workers
+            raise ValueError(msg)
+        if detail not in DETAIL_LEVELS:
+            msg = "detail must be one of %s; %s given" % (', '.join(DETAIL_LEVELS), detail)
+            raise ValueError(msg)
+
         super().__init__(origin, tag=tag, archive=archive)
         self.uri = uri
         self.gitpath = gitpath
+        self.machine_log = machine_log
+        self.log_workers = log_workers
+        self.maintenance = maintenance
+        self.max_packs = max_packs if max_packs is not None else GitRepository.DEFAULT_MAX_PACKS
+        self.detail = detail
 
     def fetch(self, category=CATEGORY_COMMIT, from_date=DEFAULT_DATETIME, to_date=DEFAULT_LAST_DATETIME,
               branches=None, latest_items=False, no_update=False):
@@ -218,6 +263,10 @@ class Git(Backend):
         The method parses the Git log file and returns an iterator of
         dictionaries. Each one of this, contains a commit.
 
+        Log files compressed with gzip, bz2, xz or zstd are
+        decompressed while they are parsed, reading large blocks
+        of data and without writing any temporary copy.
+
         :param filepath: path to the log file
 
         :returns: a generator of parsed commits
@@ -226,9 +275,13 @@ class Git(Backend):
             is invalid
         :raises OSError: raised when an error occurs reading the
             given file
+        :raises ValueError: raised when the compression of the file
+            is not supported
         """
-        with open(filepath, 'r', errors='surrogateescape',
-                  newline=os.linesep) as f:
+        stream = open_compressed_file(filepath)
+
+        with io.TextIOWrapper(stream, errors='surrogateescape',
+                              newline=os.linesep) as f:
             parser = GitParser(f)
 
             for commit in parser.parse():
@@ -300,8 +353,58 @@ class Git(Backend):
         if not no_update:
             repo.update()
 
-        gitlog = repo.log(from_date, to_date, branches)
-        return self.parse_git_log_from_iter(gitlog)
+        if self.maintenance:
+            repo.maintain(max_packs=self.max_packs)
+
+        if self.log_workers and self.log_workers > 1:
+            return self.__fetch_commits_in_shards(repo, from_date, to_date, branches)
+
+        gitlog = repo.log(from_date, to_date, branches, machine=self.machine_log,
+                          detail=self.detail)
+        return self.__parse_repository_output(gitlog)
+
+    def __fetch_commits_in_shards(self, repo, from_date, to_date, branches):
+        """Read the log in shards using a pool of processes.
+
+        The commits are listed in the order `git log` would return them
+        and split in shards of `LOG_SHARD_SIZE` consecutive commits.
+        Each worker reads and parses the log of one shard. Shards are
+        returned in order, so commits keep the order of the log. No
+        more than twice `log_workers` parsed shards are kept waiting
+        to be consumed.
+        """
+        hashes = repo.rev_list(branches, from_date=from_date, to_date=to_date,
+                               reverse=True)
+
+        shards = []
+        shard = list(itertools.islice(hashes, self.LOG_SHARD_SIZE))
+        while shard:
+            shards.append(shard)
+            shard = list(itertools.islice(hashes, self.LOG_SHARD_SIZE))
+
+        logger.debug("Reading %s shards of commits from '%s' using %s workers",
+                     len(shards), self.uri, self.log_workers)
+
+        jobs = [(self.uri, repo.dirpath, shard, self.machine_log, self.detail)
+                for shard in shards]
+
+        if len(jobs) < 2:
+            for commits in map(_read_log_shard_job, jobs):
+                for commit in commits:
+                    yield commit
+            return
+
+        workers = min(self.log_workers, len(jobs))
+        pool = multiprocessing.Pool(processes=workers)
+
+        try:
+            for commits in pool_imap(pool, _read_log_shard_job, jobs,
+                                     max_pending=workers * 2):
+                for commit in commits:
+                    yield commit
+        finally:
+            pool.terminate()
+            pool.join()
 
     def __fetch_newest_commits_from_repo(self, repo):
         logger.info("Fetching latest commits: '%s' git repository",
@@ -311,8 +414,18 @@ class Git(Backend):
         if not hashes:
             return []
 
-        gitshow = repo.show(hashes)
-        return self.parse_git_log_from_iter(gitshow)
+        if self.maintenance:
+            repo.maintain(max_packs=self.max_packs)
+
+        gitshow = repo.show(hashes, machine=self.machine_log, detail=self.detail)
+        return self.__parse_repository_output(gitshow)
+
+    def __parse_repository_output(self, output):
+        if self.machine_log:
+            parser = GitMachineParser(output)
+            return parser.parse()
+        else:
+            return self.parse_git_log_from_iter(output)
 
     def __create_git_repository(self):
         if not os.path.exists(self.gitpath):
@@ -367,6 +480,22 @@ class GitCommand(BackendCommand):
         exgroup_fetch.add_argument('--no-update', dest='no_update',
                                    action='store_true',
                                    help="Fetch all commits without updating the repository")
+        group.add_argument('--machine-log', dest='machine_log',
+                           action='store_true',
+                           help="Read the commits using the machine-readable log format")
+        group.add_argument('--log-workers', dest='log_workers',
+                           type=int, default=None,
+                           help="Number of processes reading the log in parallel")
+        group.add_argument('--maintenance', dest='maintenance',
+                           action='store_true',
+                           help="Write the commit-graph and repack the repository after updating it")
+        group.add_argument('--max-packs', dest='max_packs',
+                           type=int, default=None,
+                           help="Maximum number of packs before repacking the repository")
+        group.add_argument('--detail', dest='detail',
+                           choices=DETAIL_LEVELS, default=DETAIL_FULL,
+                           help="Level of detail of the commits: files with renames "
+                                "('full'), files without renames ('files') or none ('commits')")
 
         # Required arguments
         parser.parser.add_argument('uri',
@@ -454,6 +583,10 @@ class GitParser:
 
     The commit ends with an empty line.
 
+    Logs generated without `--raw` and `--numstat` options, which do
+    not include any action or stats line, are also valid. In that
+    case, the list of files of each commit is empty.
+
     Take into account that one empty line is valid at the beginning
     of the log. This allows to parse empty logs without raising
     exceptions.
@@ -485,7 +618,10 @@ class GitParser:
 
     EMPTY_LINE_PATTERN = r"^$"
 
+    HASH_PATTERN = r"^[a-f0-9]{40}$"
+
     # Compiled patterns
+    GIT_HASH_REGEXP = re.compile(HASH_PATTERN)
     GIT_COMMIT_REGEXP = re.compile(COMMIT_PATTERN, re.VERBOSE)
     GIT_HEADER_TRAILER_REGEXP = re.compile(HEADER_TRAILER_PATTERN, re.VERBOSE)
     GIT_MESSAGE_REGEXP = re.compile(MESSAGE_LINE_PATTERN, re.VERBOSE)
@@ -648,6 +784,11 @@ class GitParser:
             self._handle_stats_data(data)
             return True
 
+        # Logs without files have no empty line after the message
+        if line.startswith('commit '):
+            self.state = self.COMMIT
+            return False
+
         # No match case
         logger.debug("Invalid action format on line %s. Skipping.",
                      str(self.nline))
@@ -725,6 +866,226 @@ class GitParser:
             return f
 
 
+class GitMachineParser(GitParser):
+    """Git log parser for the machine-readable format.
+
+    This class parses the output of a Git log or show command run
+    using `LOG_FORMAT` as custom format together with the `-z`
+    option, so fields, commits and file names are separated by
+    NUL characters instead of newlines. The stream is an iterator
+    of these NUL-separated fields.
+
+    The output of this format is not ambiguous and does not need
+    line-by-line regular expressions to be parsed, so it is parsed
+    much faster than the default one. Commits are converted to the
+    same dicts `GitParser` generates from the pretty log:
+
+      - the fields equivalent to 'Merge:', 'Author:' and 'Commit:'
+        headers are set using the same values; authors and
+        committers are mapped using '.mailmap', as the pretty
+        format does by default.
+      - messages are cleaned as Git does before printing them:
+        leading and trailing empty lines are removed, trailing
+        whitespaces are stripped and tabs are expanded.
+      - file names are quoted like Git quotes them on the pretty
+        log; the old name of a renamed file is taken from the log,
+        instead of guessing it from the stats line.
+
+    The log must be generated with the same options `GitParser`
+    needs, replacing `--pretty=fuller` by the custom format. This
+    example shows the command to generate it:
+
+        git log -z --raw --numstat --format=<LOG_FORMAT> --decorate=full \
+                --parents -M -C -c --remotes=origin --all
+
+    :param stream: an iterator of the NUL-separated fields of the log
+    """
+    # Commit hash, parents, abbreviated parents, refs, author,
+    # author date, committer, commit date and message
+    LOG_FORMAT = "%H%x00%P%x00%p%x00%D%x00%aN <%aE>%x00%ad%x00%cN <%cE>%x00%cd%x00%B"
+    NFIELDS = 9
+
+    # Characters quoted by Git on file names
+    PATH_QUOTE_REGEXP = re.compile(r'[\x00-\x1f"\\\x7f-\U0010ffff]')
+    PATH_QUOTE_ESCAPES = {
+        7: '\\a', 8: '\\b', 9: '\\t', 10: '\\n', 11: '\\v',
+        12: '\\f', 13: '\\r', 34: '\\"', 92: '\\\\'
+    }
+
+    # Spaces removed by Git at the end of the message lines
+    TRAILING_SPACES = ' \t\n\v\f\r'
+
+    # Width of the tabs on the messages
+    TAB_WIDTH = 8
+
+    def __init__(self, stream, encoding='utf-8'):
+        super().__init__(stream)
+        self.encoding = encoding
+        self.ncommit = 0
+
+    def parse(self):
+        """Parse the Git log stream."""
+
+        fields = iter(self.stream)
+        field = next(fields, None)
+
+        while field is not None:
+            # Skip the empty fields between commits
+            if not field.strip('\n'):
+                field = next(fields, None)
+                continue
+
+            self.ncommit += 1
+            header = [field]
+            header.extend(itertools.islice(fields, self.NFIELDS - 1))
+
+            if len(header) < self.NFIELDS:
+                msg = "commit %s is incomplete" % str(self.ncommit)
+                raise ParseError(cause=msg)
+
+            self._handle_commit_fields(header)
+
+            field = self._handle_file_fields(fields)
+
+            commit = self._build_commit()
+            logger.debug("Commit %s parsed", commit['commit'])
+            yield commit
+
+    def _handle_commit_fields(self, header):
+        commit_hash, parents, abbrev_parents, refs, \
+            author, author_date, committer, commit_date, message = header
+
+        commit_hash = commit_hash.lstrip('\n')
+
+        if not self.GIT_HASH_REGEXP.match(commit_hash):
+            msg = "commit expected on commit %s" % str(self.ncommit)
+            raise ParseError(cause=msg)
+
+        self.commit = {}
+        self.commit['commit'] = commit_hash
+        self.commit['parents'] = parents.split() if parents else []
+        self.commit['refs'] = [ref.strip() for ref in refs.split(',')] if refs else []
+
+        if len(self.commit['parents']) > 1:
+            self.commit['Merge'] = abbrev_parents
+        self.commit['Author'] = author.lstrip(' \t')
+        self.commit['AuthorDate'] = author_date
+        self.commit['Commit'] = committer.lstrip(' \t')
+        self.commit['CommitDate'] = commit_date
+
+        self._handle_message_field(message)
+
+    def _handle_message_field(self, message):
+        lines = [line.rstrip(self.TRAILING_SPACES) for line in message.split('\n')]
+
+        start = 0
+        end = len(lines)
+        while start < end and not lines[start]:
+            start += 1
+        while end > start and not lines[end - 1]:
+            end -= 1
+
+        if start == end:
+            return
+
+        lines = [line.expandtabs(self.TAB_WIDTH) if '\t' in line else line
+                 for line in lines[start:end]]
+        self.commit['message'] = '\n'.join(lines)
+
+        for line in lines:
+            for trailer in self.TRAILERS:
+                if line.startswith(trailer + ':'):
+                    self._handle_trailer(line)
+
+    def _handle_file_fields(self, fields):
+        """Parse the actions and stats of the files of a commit.
+
+        Returns the first field of the next commit, if any.
+        """
+        for field in fields:
+            line = field.lstrip('\n')
+
+            if not line:
+                continue
+            elif line[0] == ':':
+                self._handle_action_fields(line, fields)
+            elif '\t' in line:
+                self._handle_stats_fields(line, fields)
+            else:
+                return field
+
+        return None
+
+    def _handle_action_fields(self, line, fields):
+        parts = line.split(' ')
+        nparents = len(parts[0]) - len(parts[0].lstrip(':'))
+
+        modes = [parts[0][nparents:]] + parts[1:nparents + 1]
+        indexes = parts[nparents + 1:-1]
+        action = parts[-1]
+
+        filename = self.__quote_path(self.__next_field(fields))
+
+        # Copied or renamed files include the new name
+        if nparents == 1 and action[0] in ('C', 'R'):
+            newfile = self.__quote_path(self.__next_field(fields))
+        else:
+            newfile = None
+
+        if filename not in self.commit_files:
+            self.commit_files[filename] = {}
+
+        data = self.commit_files[filename]
+        data['modes'] = modes
+        data['indexes'] = indexes
+        data['action'] = action
+        data['file'] = filename
+        data['newfile'] = newfile
+
+    def _handle_stats_fields(self, line, fields):
+        added, removed, filename = line.split('\t', 2)
+
+        # Copied or renamed files include the old and the new name
+        if not filename:
+            filename = self.__next_field(fields)
+            self.__next_field(fields)
+
+        filename = self.__quote_path(filename)
+
+        if filename not in self.commit_files:
+            self.commit_files[filename] = {'file': filename}
+
+        data = self.commit_files[filename]
+        data['added'] = added
+        data['removed'] = removed
+
+    def __next_field(self, fields):
+        field = next(fields, None)
+
+        if field is None:
+            msg = "file name expected on commit %s" % str(self.ncommit)
+            raise ParseError(cause=msg)
+
+        return field
+
+    def __quote_path(self, path):
+        """Quote a file name the way Git does on the pretty log"""
+
+        if not self.PATH_QUOTE_REGEXP.search(path):
+            return path
+
+        quoted = []
+        for c in path.encode(self.encoding, errors='surrogateescape'):
+            if c in self.PATH_QUOTE_ESCAPES:
+                quoted.append(self.PATH_QUOTE_ESCAPES[c])
+            elif c < 0x20 or c >= 0x7f:
+                quoted.append('\\%03o' % c)
+            else:
+                quoted.append(chr(c))
+
+        return '"' + ''.join(quoted) + '"'
+
+
 class EmptyRepositoryError(RepositoryError):
     """Exception raised when a repository is empty"""
 
@@ -763,6 +1124,9 @@ class GitRepository:
     To create an instance from a remote repository, use `clone()`
     class method.
 
+    The number of processes spawned by all the repositories is
+    counted by Git command in `spawned_processes` class attribute.
+
     :param uri: URI of the repository
     :param dirpath: local directory where the repository is stored
     """
@@ -776,6 +1140,37 @@ class GitRepository:
         '-C',  # detect and report copies
         '-c',  # show merge info
     ]
+    GIT_MACHINE_OUTPUT_OPTS = [
+        '-z',  # separate fields with NULs
+        '--raw',  # show data in raw format
+        '--numstat',  # show added/deleted lines per file
+        '--format=' + GitMachineParser.LOG_FORMAT,  # machine-readable output
+        '--decorate=full',  # show full refs
+        '--parents',  # show parents information
+        '-M',  # detect and report renames
+        '-C',  # detect and report copies
+        '-c',  # show merge info
+    ]
+
+    # Options removed from the output options to read the commits
+    # with less detail; `--no-renames` and `--no-patch` are added
+    # because `git log` detects renames and `git show` prints the
+    # patch by default
+    GIT_RENAMES_OPTS = ['-M', '-C']
+    GIT_FILES_OPTS = ['--raw', '--numstat', '-M', '-C', '-c']
+
+    # Size of the blocks read from the output of the commands
+    READ_BLOCK_SIZE = 1024 * 1024
+
+    # Maximum number of packs before they are consolidated
+    DEFAULT_MAX_PACKS = 50
+
+    # Maximum number of commits sent to each `git show` process
+    SHOW_CHUNK_SIZE = 1000
+
+    # Number of processes spawned by any repository, by Git command
+    spawned_processes = collections.Counter()
+    _spawned_processes_lock = threading.Lock()
 
     def __init__(self, uri, dirpath):
         gitdir = os.path.join(dirpath, 'HEAD')
@@ -797,6 +1192,7 @@ class GitRepository:
             'PAGER': '',
             'HOME': os.getenv('HOME', '')
         }
+        self._empty = None
 
     @classmethod
     def clone(cls, uri, dirpath):
@@ -885,10 +1281,16 @@ class GitRepository:
         it checks the number of objects on the repository. When
         this number is 0, the repositoy is empty.
 
+        The result is cached until the repository is modified by
+        `update` or `sync`.
+
         :raises RepositoryError: when an error occurs accessing the
             repository
         """
-        return self.count_objects() == 0
+        if self._empty is None:
+            self._empty = self.count_objects() == 0
+
+        return self._empty
 
     def update(self):
         """Update repository from its remote.
@@ -902,7 +1304,11 @@ class GitRepository:
             repository
         """
         cmd_update = ['git', 'fetch', 'origin', '+refs/heads/*:refs/heads/*', '--prune']
-        self._exec(cmd_update, cwd=self.dirpath, env=self.gitenv)
+
+        try:
+            self._exec(cmd_update, cwd=self.dirpath, env=self.gitenv)
+        finally:
+            self._empty = None
 
         logger.debug("Git %s repository updated into %s",
                      self.uri, self.dirpath)
@@ -926,6 +1332,8 @@ class GitRepository:
         pack_name, refs = self._fetch_pack()
 
         if pack_name:
+            # The repository has objects after storing the new pack
+            self._empty = False
             commits = self._read_commits_from_pack(pack_name)
         else:
             commits = []
@@ -939,7 +1347,69 @@ class GitRepository:
 
         return commits
 
-    def rev_list(self, branches=None):
+    def maintain(self, max_packs=DEFAULT_MAX_PACKS):
+        """Run maintenance tasks on the repository.
+
+        Each sync stores the new objects in a new pack, so mirrors
+        accumulate lots of small packs over time. When the number of
+        packs is greater than `max_packs`, they are consolidated into
+        one using `git repack -a -d`.
+
+        After that, the commit-graph of the repository is written
+        (`git commit-graph write --reachable --split`), which makes
+        walking the history, as `log` and `rev_list` do, much faster.
+        The graph is written as a chain of files, so each run only
+        writes the commits added since the previous one and Git merges
+        the smaller files of the chain from time to time. When the
+        installed version of Git does not support split commit-graph
+        files, this step is skipped.
+
+        :param max_packs: maximum number of packs allowed before
+            consolidating them
+
+        :raises RepositoryError: when an error occurs repacking the
+            repository
+        """
+        if self.is_empty():
+            logger.debug("Git %s repository is empty; maintenance skipped",
+                         self.uri)
+            return
+
+        npacks = self.count_packs()
+
+        if npacks > max_packs:
+            cmd_repack = ['git', 'repack', '-a', '-d', '-q']
+            self._exec(cmd_repack, cwd=self.dirpath, env=self.gitenv)
+
+            logger.debug("Git %s repository repacked; %s packs consolidated",
+                         self.uri, npacks)
+
+        cmd_graph = ['git', 'commit-graph', 'write', '--reachable', '--split']
+
+        try:
+            self._exec(cmd_graph, cwd=self.dirpath, env=self.gitenv)
+        except RepositoryError as e:
+            logger.warning("Git %s commit-graph could not be written in %s; skipped. Cause: %s",
+                           self.uri, self.dirpath, str(e))
+        else:
+            logger.debug("Git %s repository commit-graph written in %s",
+                         self.uri, self.dirpath)
+
+    def count_packs(self):
+        """Count the packs of the repository.
+
+        :returns: the number of pack files of the repository
+        """
+        pack_path = os.path.join(self.dirpath, 'objects', 'pack')
+
+        if not os.path.isdir(pack_path):
+            return 0
+
+        packs = [name for name in os.listdir(pack_path) if name.endswith('.pack')]
+
+        return len(packs)
+
+    def rev_list(self, branches=None, from_date=None, to_date=None, reverse=False):
         """Read the list commits from the repository
 
         The list of branches is a list of strings, with the names of the
@@ -952,7 +1422,15 @@ class GitRepository:
 
             git rev-list --topo-order
 
+        When `from_date` or `to_date` are given, only the commits
+        within those dates are listed. With `reverse`, the commits
+        are listed in the same order `log` returns them.
+
         :param branches: names of branches to fetch from (default: None)
+        :param from_date: list commits newer than a specific
+            date (inclusive)
+        :param to_date: list commits older than a specific date
+        :param reverse: list the commits in reverse order
 
         :raises EmptyRepositoryError: when the repository is empty and
             the action cannot be performed
@@ -965,13 +1443,10 @@ class GitRepository:
 
         cmd_rev_list = ['git', 'rev-list', '--topo-order']
 
-        if branches is None:
-            cmd_rev_list.extend(['--branches', '--tags', '--remotes=origin'])
-        elif len(branches) == 0:
-            cmd_rev_list.append('--max-count=0')
-        else:
-            branches = ['refs/heads/' + branch for branch in branches]
-            cmd_rev_list.extend(branches)
+        if reverse:
+            cmd_rev_list.append('--reverse')
+
+        cmd_rev_list.extend(self.__log_range(from_date, to_date, branches))
 
         for line in self._exec_nb(cmd_rev_list, cwd=self.dirpath, env=self.gitenv):
             yield line.rstrip('\n')
@@ -979,7 +1454,8 @@ class GitRepository:
         logger.debug("Git rev-list fetched from %s repository (%s)",
                      self.uri, self.dirpath)
 
-    def log(self, from_date=None, to_date=None, branches=None, encoding='utf-8'):
+    def log(self, from_date=None, to_date=None, branches=None, encoding='utf-8',
+            machine=False, commits=None, detail=DETAIL_FULL):
         """Read the commit log from the repository.
 
         The method returns the Git log of the repository using the
@@ -989,6 +1465,12 @@ class GitRepository:
                 --all --reverse --topo-order --parents -M -C -c
                 --remotes=origin
 
+        When `machine` is set, the log is generated in the format
+        `GitMachineParser` reads, replacing `--pretty=fuller` by
+        a custom format and adding `-z`. In that case, each item
+        returned is a NUL-separated field of the log instead of
+        a line.
+
         When `from_date` is given, it gets the commits equal or older
         than that date. This date is given in a datetime object.
 
@@ -997,10 +1479,24 @@ class GitRepository:
         is fetched. If the list of branches is None, all commits
         for all branches will be fetched.
 
+        When a list of `commits` is given, the history is not walked:
+        the log only contains those commits, in the given order, and
+        `from_date`, `to_date` and `branches` are ignored.
+
+        The level of `detail` sets the data of the files included in
+        the log. With `files`, renames and copies are not detected and
+        `-M` and `-C` options are replaced by `--no-renames`. With
+        `commits`, no diff is generated (`--raw`, `--numstat` and
+        `-c` are replaced by `--no-patch`), so the log only includes
+        the commits data.
+
         :param from_date: fetch commits newer than a specific
             date (inclusive)
         :param branches: names of branches to fetch from (default: None)
         :param encoding: encode the log using this format
+        :param machine: generate the log in the machine-readable format
+        :param commits: list of commits to read instead of the history
+        :param detail: level of detail of the commits
 
         :returns: a generator where each item is a line from the log
 
@@ -1013,32 +1509,23 @@ class GitRepository:
                            self.uri)
             raise EmptyRepositoryError(repository=self.uri)
 
-        cmd_log = ['git', 'log', '--reverse', '--topo-order']
-        cmd_log.extend(self.GIT_PRETTY_OUTPUT_OPTS)
-
-        if from_date:
-            dt = from_date.strftime("%Y-%m-%d %H:%M:%S %z")
-            cmd_log.append('--since=' + dt)
-
-        if to_date:
-            dt = to_date.strftime("%Y-%m-%d %H:%M:%S %z")
-            cmd_log.append('--until=' + dt)
-
-        if branches is None:
-            cmd_log.extend(['--branches', '--tags', '--remotes=origin'])
-        elif len(branches) == 0:
-            cmd_log.append('--max-count=0')
+        if commits is not None:
+            cmd_log = ['git', 'log', '--no-walk=unsorted']
+            cmd_log.extend(self.__output_opts(machine, detail))
+            cmd_log.extend(commits)
         else:
-            branches = ['refs/heads/' + branch for branch in branches]
-            cmd_log.extend(branches)
+            cmd_log = ['git', 'log', '--reverse', '--topo-order']
+            cmd_log.extend(self.__output_opts(machine, detail))
+            cmd_log.extend(self.__log_range(from_date, to_date, branches))
 
-        for line in self._exec_nb(cmd_log, cwd=self.dirpath, env=self.gitenv):
+        for line in self._exec_nb(cmd_log, cwd=self.dirpath, env=self.gitenv,
+                                  encoding=encoding, delimiter=self.__delimiter(machine)):
             yield line
 
         logger.debug("Git log fetched from %s repository (%s)",
                      self.uri, self.dirpath)
 
-    def show(self, commits=None, encoding='utf-8'):
+    def show(self, commits=None, encoding='utf-8', machine=False, detail=DETAIL_FULL):
         """Show the data of a set of commits.
 
         The method returns the output of Git show command for a
@@ -1049,10 +1536,21 @@ class GitRepository:
 
         When the list of commits is empty, the command will return
         data about the last commit, like the default behaviour of
-        `git show`.
+        `git show`. Otherwise, the hashes are sent to the standard
+        input of the command in chunks of `SHOW_CHUNK_SIZE` commits,
+        so the length of the list is not limited by the maximum size
+        of the command line. The output of the next chunk is read while
+        the current one is consumed; commits are returned in the same
+        order they were given.
+
+        When `machine` is set, the output is generated in the format
+        `GitMachineParser` reads and each item returned is a
+        NUL-separated field instead of a line.
 
         :param commits: list of commits to show data
         :param encoding: encode the output using this format
+        :param machine: generate the output in the machine-readable format
+        :param detail: level of detail of the commits, like in `log`
 
         :returns: a generator where each item is a line from the show output
 
@@ -1065,19 +1563,81 @@ class GitRepository:
                            self.uri)
             raise EmptyRepositoryError(repository=self.uri)
 
-        if commits is None:
-            commits = []
-
-        cmd_show = ['git', 'show']
-        cmd_show.extend(self.GIT_PRETTY_OUTPUT_OPTS)
-        cmd_show.extend(commits)
+        if commits:
+            output = self.__show_chunks(commits, encoding, machine, detail)
+        else:
+            cmd_show = ['git', 'show']
+            cmd_show.extend(self.__output_opts(machine, detail))
+            output = self._exec_nb(cmd_show, cwd=self.dirpath, env=self.gitenv,
+                                   encoding=encoding, delimiter=self.__delimiter(machine))
 
-        for line in self._exec_nb(cmd_show, cwd=self.dirpath, env=self.gitenv):
+        for line in output:
             yield line
 
         logger.debug("Git show fetched from %s repository (%s)",
                      self.uri, self.dirpath)
 
+    def __show_chunks(self, commits, encoding, machine, detail):
+        """Run `git show` on chunks of commits read from its stdin.
+
+        When there is more than one chunk, a thread runs the commands
+        one after the other and stores the output of each chunk in a
+        queue of one element. Thus, the next chunk is already running
+        while the current one is parsed, and no more than a couple of
+        chunks are kept in memory.
+        """
+        cmd_show = ['git', 'show', '--stdin']
+        cmd_show.extend(self.__output_opts(machine, detail))
+        delimiter = self.__delimiter(machine)
+
+        size = self.SHOW_CHUNK_SIZE
+        chunks = [commits[i:i + size] for i in range(0, len(commits), size)]
+
+        def show_chunk(chunk):
+            hashes = ''.join(commit + '\n' for commit in chunk)
+            return self._exec_nb(cmd_show, cwd=self.dirpath, env=self.gitenv,
+                                 encoding=encoding, delimiter=delimiter,
+                                 input=hashes.encode('utf-8'))
+
+        if len(chunks) == 1:
+            for line in show_chunk(chunks[0]):
+                yield line
+            return
+
+        outputs = queue.Queue(maxsize=1)
+        done = threading.Event()
+
+        def put_output(item):
+            while not done.is_set():
+                try:
+                    outputs.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def read_chunks():
+            try:
+                for chunk in chunks:
+                    if not put_output((list(show_chunk(chunk)), None)):
+                        return
+            except RepositoryError as e:
+                put_output((None, e))
+
+        reader = threading.Thread(target=read_chunks, daemon=True)
+        reader.start()
+
+        try:
+            for _ in chunks:
+                lines, error = outputs.get()
+                if error:
+                    raise error
+                for line in lines:
+                    yield line
+        finally:
+            done.set()
+            reader.join()
+
     def _fetch_pack(self):
         """Fetch changes and store them in a pack."""
 
@@ -1115,27 +1675,53 @@ class GitRepository:
         return (pack_name, refs)
 
     def _read_commits_from_pack(self, packet_name):
-        """Read the commits of a pack."""
+        """Read the commits of a pack.
 
-        filepath = 'objects/pack/pack-' + packet_name
+        The objects of the pack are listed from its index and sorted
+        by their position in the pack. The type of each object is read
+        from its header; for deltas, the chain of base objects is
+        followed until a full object is found, so the data of the
+        objects is never decompressed.
+        """
+        filepath = os.path.join(self.dirpath, 'objects', 'pack', 'pack-' + packet_name)
 
-        cmd_verify_pack = ['git', 'verify-pack', '-v', filepath]
+        index = dulwich.pack.load_pack_index(filepath + '.idx')
 
-        outs = self._exec(cmd_verify_pack, cwd=self.dirpath, env=self.gitenv)
-        outs = outs.decode('utf-8', errors='surrogateescape').rstrip()
+        try:
+            entries = sorted((offset, sha) for sha, offset, _ in index.iterentries())
+
+            with open(filepath + '.pack', 'rb') as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
 
-        lines = [line.split(' ') for line in outs.split('\n')]
+                try:
+                    commits = []
+                    types = {}
+
+                    for offset, sha in entries:
+                        obj_type = self.__read_pack_object_type(data, index, offset, types)
+
+                        if obj_type == dulwich.objects.Commit.type_num:
+                            commits.append(dulwich.objects.sha_to_hex(sha).decode('utf-8'))
+                finally:
+                    data.close()
+        finally:
+            index.close()
 
         # Commits usually come in the pack ordered from newest to oldest
-        commits = [parts[0] for parts in lines if parts[1] == 'commit']
         commits.reverse()
 
         return commits
 
     def _update_references(self, refs):
-        """Update references removing old ones."""
+        """Update references removing old ones.
 
-        new_refs = [ref.refname for ref in refs]
+        All the references are deleted and updated in a single
+        transaction of `git update-ref --stdin`. When the transaction
+        fails, it is rolled back by Git and the references are updated
+        one by one, so the ones that cannot be updated are skipped.
+        """
+        new_refs = set(ref.refname for ref in refs)
+        updates = []
 
         # Delete old references
         for old_ref in self._discover_refs():
@@ -1143,7 +1729,7 @@ class GitRepository:
                 continue
             if old_ref.refname in new_refs:
                 continue
-            self._update_ref(old_ref, delete=True)
+            updates.append((old_ref, True))
 
         # Update new references
         for new_ref in refs:
@@ -1158,12 +1744,44 @@ class GitRepository:
                              refname)
                 continue
             else:
-                self._update_ref(new_ref)
+                updates.append((new_ref, False))
+
+        if updates:
+            self._update_refs_transaction(updates)
 
         # Prune repository to remove old branches
         cmd = ['git', 'remote', 'prune', 'origin']
         self._exec(cmd, cwd=self.dirpath, env=self.gitenv)
 
+    def _update_refs_transaction(self, updates):
+        """Update a list of references in a single transaction.
+
+        `updates` is a list of tuples with a reference and a flag
+        set when that reference has to be deleted.
+        """
+        commands = []
+
+        for ref, delete in updates:
+            if delete:
+                commands.append('delete %s\n' % ref.refname)
+            else:
+                commands.append('update %s %s\n' % (ref.refname, ref.hash))
+
+        cmd = ['git', 'update-ref', '--stdin']
+        data = ''.join(commands).encode('utf-8', errors='surrogateescape')
+
+        try:
+            self._exec(cmd, cwd=self.dirpath, env=self.gitenv, input=data)
+        except RepositoryError as e:
+            logger.debug("Git refs could not be updated in a single transaction in %s (%s): %s; "
+                         "updating them one by one", self.uri, self.dirpath, str(e))
+
+            for ref, delete in updates:
+                self._update_ref(ref, delete=delete)
+        else:
+            logger.debug("Git %s refs updated in %s (%s)",
+                         len(updates), self.uri, self.dirpath)
+
     def _discover_refs(self, remote=False):
         """Get the current list of local or remote refs."""
 
@@ -1220,7 +1838,8 @@ class GitRepository:
             logger.debug("Git %s ref %s in %s (%s)",
                          ref.refname, action, self.uri, self.dirpath)
 
-    def _exec_nb(self, cmd, cwd=None, env=None, encoding='utf-8'):
+    def _exec_nb(self, cmd, cwd=None, env=None, encoding='utf-8', delimiter=None,
+                 input=None):
         """Run a command with a non blocking call.
 
         Execute `cmd` command with a non blocking call. The command will
@@ -1229,6 +1848,13 @@ class GitRepository:
         as encoded bytes in an iterator. Each item will be a line of the
         output.
 
+        When a `delimiter` is given, the output is read in large blocks
+        and each item will be a piece of the output ended by that
+        delimiter, which is not included.
+
+        The bytes given in `input` are written to the standard input
+        of the command by a thread, while its output is read.
+
         :returns: an iterator with the output of the command as encoded bytes
 
         :raises RepositoryError: when an error occurs running the command
@@ -1238,8 +1864,11 @@ class GitRepository:
         logger.debug("Running command %s (cwd: %s, env: %s)",
                      ' '.join(cmd), cwd, str(env))
 
+        self._count_process(cmd)
+
         try:
             self.proc = subprocess.Popen(cmd,
+                                         stdin=subprocess.PIPE if input is not None else None,
                                          stdout=subprocess.PIPE,
                                          stderr=subprocess.PIPE,
                                          cwd=cwd,
@@ -1248,11 +1877,25 @@ class GitRepository:
                                           kwargs={'encoding': encoding},
                                           daemon=True)
             err_thread.start()
-            for line in self.proc.stdout:
-                yield line.decode(encoding, errors='surrogateescape')
+            if input is not None:
+                in_thread = threading.Thread(target=self._write_stdin,
+                                             args=(self.proc.stdin, input),
+                                             daemon=True)
+                in_thread.start()
+            if delimiter:
+                for field in self._read_fields(self.proc.stdout, delimiter, encoding):
+                    yield field
+            else:
+                for line in self.proc.stdout:
+                    yield line.decode(encoding, errors='surrogateescape')
             err_thread.join()
 
-            self.proc.communicate()
+            if input is not None:
+                # The writer thread already closed the standard input
+                in_thread.join()
+                self.proc.wait()
+            else:
+                self.proc.communicate()
             self.proc.stdout.close()
             self.proc.stderr.close()
         except OSError as e:
@@ -1264,6 +1907,153 @@ class GitRepository:
                 (self.failed_message, self.proc.returncode)
             raise RepositoryError(cause=cause)
 
+    def _read_fields(self, fd, delimiter, encoding='utf-8'):
+        """Read the fields of a stream split by a delimiter.
+
+        The stream is read in blocks of `READ_BLOCK_SIZE` bytes. Each
+        block is decoded and split at once, keeping the last incomplete
+        field for the next block.
+        """
+        sep = delimiter.encode(encoding)
+        pending = b''
+
+        while True:
+            block = fd.read1(self.READ_BLOCK_SIZE)
+            if not block:
+                break
+
+            data = pending + block
+            end = data.rfind(sep)
+
+            if end < 0:
+                pending = data
+                continue
+
+            pending = data[end + len(sep):]
+            fields = data[:end].decode(encoding, errors='surrogateescape')
+
+            for field in fields.split(delimiter):
+                yield field
+
+        if pending:
+            yield pending.decode(encoding, errors='surrogateescape')
+
+    def __output_opts(self, machine, detail=DETAIL_FULL):
+        opts = self.GIT_MACHINE_OUTPUT_OPTS if machine else self.GIT_PRETTY_OUTPUT_OPTS
+
+        if detail == DETAIL_FILES:
+            opts = [opt for opt in opts if opt not in self.GIT_RENAMES_OPTS]
+            opts.append('--no-renames')
+        elif detail == DETAIL_COMMITS:
+            opts = [opt for opt in opts if opt not in self.GIT_FILES_OPTS]
+            opts.append('--no-patch')
+
+        return opts
+
+    @staticmethod
+    def __delimiter(machine):
+        return '\0' if machine else None
+
+    @staticmethod
+    def __read_pack_object_type(data, index, offset, types):
+        """Get the type of an object of a pack, resolving its deltas"""
+
+        chain = []
+
+        while offset not in types:
+            obj_type, base_offset = GitRepository.__read_pack_object_header(data, index, offset)
+
+            if base_offset is None:
+                types[offset] = obj_type
+                break
+
+            chain.append(offset)
+            offset = base_offset
+
+        obj_type = types[offset]
+
+        for delta_offset in chain:
+            types[delta_offset] = obj_type
+
+        return obj_type
+
+    @staticmethod
+    def __read_pack_object_header(data, index, offset):
+        """Read the type of an object and the offset of its base, if any"""
+
+        byte = data[offset]
+        obj_type = (byte >> 4) & 0x07
+        pos = offset + 1
+
+        # Skip the size of the object
+        while byte & 0x80:
+            byte = data[pos]
+            pos += 1
+
+        if obj_type == dulwich.pack.OFS_DELTA:
+            byte = data[pos]
+            pos += 1
+            distance = byte & 0x7f
+
+            while byte & 0x80:
+                byte = data[pos]
+                pos += 1
+                distance = ((distance + 1) << 7) | (byte & 0x7f)
+
+            return obj_type, offset - distance
+        elif obj_type == dulwich.pack.REF_DELTA:
+            return obj_type, index.object_index(data[pos:pos + 20])
+        else:
+            return obj_type, None
+
+    @staticmethod
+    def __log_range(from_date, to_date, branches):
+        opts = []
+
+        if from_date:
+            dt = from_date.strftime("%Y-%m-%d %H:%M:%S %z")
+            opts.append('--since=' + dt)
+
+        if to_date:
+            dt = to_date.strftime("%Y-%m-%d %H:%M:%S %z")
+            opts.append('--until=' + dt)
+
+        if branches is None:
+            opts.extend(['--branches', '--tags', '--remotes=origin'])
+        elif len(branches) == 0:
+            opts.append('--max-count=0')
+        else:
+            branches = ['refs/heads/' + branch for branch in branches]
+            opts.extend(branches)
+
+        return opts
+
+    @classmethod
+    def _count_process(cls, cmd):
+        """Count a process spawned to run a Git command"""
+
+        command = cmd[1] if len(cmd) > 1 else cmd[0]
+
+        with cls._spawned_processes_lock:
+            cls.spawned_processes[command] += 1
+
+    @staticmethod
+    def _write_stdin(fd, data):
+        """Write data to the standard input of a process and close it.
+
+        Errors are ignored; when the process ends before reading all
+        the data, its return code will report the failure.
+        """
+        try:
+            fd.write(data)
+        except OSError:
+            pass
+        finally:
+            try:
+                fd.close()
+            except OSError:
+                pass
+
     def _read_stderr(self, encoding='utf-8'):
         """Reads self.proc.stderr.
 
@@ -1292,12 +2082,13 @@ class GitRepository:
 
     @staticmethod
     def _exec(cmd, cwd=None, env=None, ignored_error_codes=None,
-              encoding='utf-8'):
+              encoding='utf-8', input=None):
         """Run a command.
 
         Execute `cmd` command in the directory set by `cwd`. Environment
         variables can be set using the `env` dictionary. The output
-        data is returned as encoded bytes.
+        data is returned as encoded bytes. The bytes given in `input`
+        are sent to the standard input of the command.
 
         Commands which their returning status codes are non-zero will
         be treated as failed. Error codes considered as valid can be
@@ -1313,11 +2104,15 @@ class GitRepository:
         logger.debug("Running command %s (cwd: %s, env: %s)",
                      ' '.join(cmd), cwd, str(env))
 
+        GitRepository._count_process(cmd)
+
         try:
-            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+            stdin = subprocess.PIPE if input is not None else None
+            proc = subprocess.Popen(cmd, stdin=stdin,
+                                    stdout=subprocess.PIPE,
                                     stderr=subprocess.PIPE,
                                     cwd=cwd, env=env)
-            (outs, errs) = proc.communicate()
+            (outs, errs) = proc.communicate(input)
         except OSError as e:
             raise RepositoryError(cause=str(e))
 
@@ -1329,3 +2124,19 @@ class GitRepository:
             logger.debug(errs.decode(encoding, errors='surrogateescape'))
 
         return outs
+
+
+def _read_log_shard_job(job):
+    """Read and parse the log of a shard of commits in a worker process"""
+
+    uri, dirpath, shard, machine, detail = job
+
+    repo = GitRepository(uri, dirpath)
+    gitlog = repo.log(commits=shard, machine=machine, detail=detail)
+
+    if machine:
+        parser = GitMachineParser(gitlog)
+    else:
+        parser = GitParser(gitlog)
+
+    return [commit for commit in parser.parse()]
@@ -22,8 +22,13 @@
 #     Alberto Martín <alberto.martin@bitergia.com>
 #
 
+import collections
+import concurrent.futures
+import copy
 import json
 import logging
+import threading
+import time
 
 import requests
 from grimoirelab_toolkit.datetime import (datetime_to_utc,
@@ -34,6 +39,7 @@ from grimoirelab_toolkit.uris import urijoin
 from ...backend import (Backend,
                         BackendCommand,
                         BackendCommandArgumentParser)
+from ...errors import BackendError
 from ...client import HttpClient, RateLimitHandler
 from ...utils import DEFAULT_DATETIME, DEFAULT_LAST_DATETIME
 
@@ -57,6 +63,9 @@ PER_PAGE = 100
 DEFAULT_SLEEP_TIME = 1
 MAX_RETRIES = 5
 
+# Number of threads fetching the data of the items
+DEFAULT_ENRICH_WORKERS = 1
+
 TARGET_ISSUE_FIELDS = ['user', 'assignee', 'assignees', 'comments', 'reactions']
 TARGET_PULL_FIELDS = ['user', 'review_comments', 'requested_reviewers', "merged_by", "commits"]
 
@@ -84,8 +93,16 @@ class GitHub(Backend):
         before raising a RetryError exception
     :param sleep_time: time to sleep in case
         of connection problems
+    :param http_cache: `HttpCache` used to send conditional requests
+    :param rate_limiter: `SharedRateLimiter` used to share the rate limit
+        with other processes
+    :param enrich_workers: number of threads fetching the comments,
+        reactions, users and the rest of data of the items
+    :param graphql: fetch the comments, reactions, users and the
+        rest of data of issues and pull requests in batches using
+        GraphQL API; `enrich_workers` is ignored in this mode
     """
-    version = '0.20.0'
+    version = '0.23.0'
 
     CATEGORIES = [CATEGORY_ISSUE, CATEGORY_PULL_REQUEST, CATEGORY_REPO]
 
@@ -93,9 +110,14 @@ class GitHub(Backend):
                  api_token=None, base_url=None,
                  tag=None, archive=None,
                  sleep_for_rate=False, min_rate_to_sleep=MIN_RATE_LIMIT,
-                 max_retries=MAX_RETRIES, sleep_time=DEFAULT_SLEEP_TIME):
+                 max_retries=MAX_RETRIES, sleep_time=DEFAULT_SLEEP_TIME,
+                 http_cache=None, rate_limiter=None,
+                 enrich_workers=DEFAULT_ENRICH_WORKERS, graphql=False):
         if api_token is None:
             api_token = []
+        if enrich_workers < 1:
+            msg = "enrich_workers must be greater than 0; %s given" % enrich_workers
+            raise BackendError(cause=msg)
         origin = base_url if base_url else GITHUB_URL
         origin = urijoin(origin, owner, repository)
 
@@ -110,6 +132,10 @@ class GitHub(Backend):
         self.min_rate_to_sleep = min_rate_to_sleep
         self.max_retries = max_retries
         self.sleep_time = sleep_time
+        self.http_cache = http_cache
+        self.rate_limiter = rate_limiter
+        self.enrich_workers = enrich_workers
+        self.graphql = graphql
 
         self.client = None
         self._users = {}  # internal users cache
@@ -153,8 +179,12 @@ class GitHub(Backend):
         from_date = kwargs['from_date']
         to_date = kwargs['to_date']
 
-        if category == CATEGORY_ISSUE:
+        if category == CATEGORY_ISSUE and self.graphql:
+            items = self.__fetch_issues_graphql(from_date, to_date)
+        elif category == CATEGORY_ISSUE:
             items = self.__fetch_issues(from_date, to_date)
+        elif category == CATEGORY_PULL_REQUEST and self.graphql:
+            items = self.__fetch_pull_requests_graphql(from_date, to_date)
         elif category == CATEGORY_PULL_REQUEST:
             items = self.__fetch_pull_requests(from_date, to_date)
         else:
@@ -227,14 +257,25 @@ class GitHub(Backend):
     def _init_client(self, from_archive=False):
         """Init client"""
 
-        return GitHubClient(self.owner, self.repository, self.api_token, self.base_url,
+        client_class = GitHubGraphQLClient if self.graphql else GitHubClient
+
+        return client_class(self.owner, self.repository, self.api_token, self.base_url,
                             self.sleep_for_rate, self.min_rate_to_sleep,
                             self.sleep_time, self.max_retries,
-                            self.archive, from_archive)
+                            self.archive, from_archive, cache=self.http_cache,
+                            rate_limiter=self.rate_limiter)
 
     def __fetch_issues(self, from_date, to_date):
         """Fetch the issues"""
 
+        issues = self.__fetch_raw_issues(from_date, to_date)
+
+        for issue in self.__enrich_items(issues, TARGET_ISSUE_FIELDS, self.__get_issue_field):
+            yield issue
+
+    def __fetch_raw_issues(self, from_date, to_date):
+        """Fetch the issues without the data of their fields"""
+
         issues_groups = self.client.issues(from_date=from_date)
 
         for raw_issues in issues_groups:
@@ -245,28 +286,35 @@ class GitHub(Backend):
                     return
 
                 self.__init_extra_issue_fields(issue)
-                for field in TARGET_ISSUE_FIELDS:
-
-                    if not issue[field]:
-                        continue
-
-                    if field == 'user':
-                        issue[field + '_data'] = self.__get_user(issue[field]['login'])
-                    elif field == 'assignee':
-                        issue[field + '_data'] = self.__get_issue_assignee(issue[field])
-                    elif field == 'assignees':
-                        issue[field + '_data'] = self.__get_issue_assignees(issue[field])
-                    elif field == 'comments':
-                        issue[field + '_data'] = self.__get_issue_comments(issue['number'])
-                    elif field == 'reactions':
-                        issue[field + '_data'] = \
-                            self.__get_issue_reactions(issue['number'], issue['reactions']['total_count'])
-
                 yield issue
 
+    def __get_issue_field(self, issue, field):
+        """Get the data of an issue field"""
+
+        if field == 'user':
+            data = self.__get_user(issue[field]['login'])
+        elif field == 'assignee':
+            data = self.__get_issue_assignee(issue[field])
+        elif field == 'assignees':
+            data = self.__get_issue_assignees(issue[field])
+        elif field == 'comments':
+            data = self.__get_issue_comments(issue['number'])
+        elif field == 'reactions':
+            data = self.__get_issue_reactions(issue['number'], issue['reactions']['total_count'])
+
+        return data
+
     def __fetch_pull_requests(self, from_date, to_date):
         """Fetch the pull requests"""
 
+        pulls = self.__fetch_raw_pull_requests(from_date, to_date)
+
+        for pull in self.__enrich_items(pulls, TARGET_PULL_FIELDS, self.__get_pull_field):
+            yield pull
+
+    def __fetch_raw_pull_requests(self, from_date, to_date):
+        """Fetch the pull requests without the data of their fields"""
+
         raw_pulls = self.client.pulls(from_date=from_date)
         for raw_pull in raw_pulls:
             pull = json.loads(raw_pull)
@@ -275,23 +323,210 @@ class GitHub(Backend):
                 return
 
             self.__init_extra_pull_fields(pull)
-            for field in TARGET_PULL_FIELDS:
+            yield pull
 
-                if not pull[field]:
-                    continue
+    def __get_pull_field(self, pull, field):
+        """Get the data of a pull request field"""
 
-                if field == 'user':
-                    pull[field + '_data'] = self.__get_user(pull[field]['login'])
-                elif field == 'merged_by':
-                    pull[field + '_data'] = self.__get_user(pull[field]['login'])
-                elif field == 'review_comments':
-                    pull[field + '_data'] = self.__get_pull_review_comments(pull['number'])
-                elif field == 'requested_reviewers':
-                    pull[field + '_data'] = self.__get_pull_requested_reviewers(pull['number'])
-                elif field == 'commits':
-                    pull[field + '_data'] = self.__get_pull_commits(pull['number'])
+        if field == 'user':
+            data = self.__get_user(pull[field]['login'])
+        elif field == 'merged_by':
+            data = self.__get_user(pull[field]['login'])
+        elif field == 'review_comments':
+            data = self.__get_pull_review_comments(pull['number'])
+        elif field == 'requested_reviewers':
+            data = self.__get_pull_requested_reviewers(pull['number'])
+        elif field == 'commits':
+            data = self.__get_pull_commits(pull['number'])
 
-            yield pull
+        return data
+
+    def __fetch_issues_graphql(self, from_date, to_date):
+        """Fetch the issues getting the data of their fields with GraphQL"""
+
+        issues = self.__fetch_raw_issues(from_date, to_date)
+
+        for batch in self.__batch_items(issues):
+            numbers = [issue['number'] for issue in batch
+                       if issue['comments'] or issue['reactions']['total_count']]
+            data = self.client.issues_data(numbers)
+
+            for issue in batch:
+                issue_data = data.get(issue['number'], {})
+
+                if issue['comments']:
+                    issue['comments_data'] = issue_data.get('comments', [])
+                if issue['reactions']['total_count']:
+                    issue['reactions_data'] = issue_data.get('reactions', [])
+
+            self.__set_users_data(batch, self.__issue_users)
+
+            for issue in batch:
+                yield issue
+
+    def __fetch_pull_requests_graphql(self, from_date, to_date):
+        """Fetch the pull requests getting the data of their fields with GraphQL"""
+
+        pulls = self.__fetch_raw_pull_requests(from_date, to_date)
+
+        for batch in self.__batch_items(pulls):
+            numbers = [pull['number'] for pull in batch
+                       if pull['review_comments'] or pull['commits']]
+            data = self.client.pulls_data(numbers)
+
+            for pull in batch:
+                pull_data = data.get(pull['number'], {})
+
+                if pull['review_comments']:
+                    pull['review_comments_data'] = pull_data.get('review_comments', [])
+                if pull['commits']:
+                    pull['commits_data'] = pull_data.get('commits', [])
+
+            self.__set_users_data(batch, self.__pull_users)
+
+            for pull in batch:
+                yield pull
+
+    def __batch_items(self, items):
+        """Group the items in lists of `ITEMS_BATCH_SIZE` elements"""
+
+        batch = []
+
+        for item in items:
+            batch.append(item)
+
+            if len(batch) == GitHubGraphQLClient.ITEMS_BATCH_SIZE:
+                yield batch
+                batch = []
+
+        if batch:
+            yield batch
+
+    def __set_users_data(self, items, get_item_users):
+        """Fetch the users of the items and set their data.
+
+        `get_item_users` returns pairs of objects and login fields
+        of an item. The data of each login is set on the object
+        under `<field>_data`; when the field is a list of users, a
+        list of users is set instead. Users are requested in
+        batches; those which are not found with GraphQL, such as
+        bots, are fetched using the REST API.
+        """
+        targets = [target for item in items for target in get_item_users(item)]
+
+        logins = set()
+        for obj, field in targets:
+            value = obj[field]
+            users = value if isinstance(value, list) else [value]
+            logins.update(user['login'] for user in users if user and user['login'])
+
+        missing = sorted(login for login in logins if login not in self._users)
+        for login, user in self.client.users(missing).items():
+            self._users[login] = user if user else self.__get_user(login)
+
+        for obj, field in targets:
+            value = obj[field]
+
+            if isinstance(value, list):
+                obj[field + '_data'] = [self.__get_cached_user(user['login']) for user in value]
+            elif value:
+                obj[field + '_data'] = self.__get_cached_user(value['login'])
+
+    def __get_cached_user(self, login):
+        """Get a copy of the data of a user fetched before"""
+
+        if not login:
+            return {}
+
+        return copy.deepcopy(self._users[login])
+
+    @staticmethod
+    def __issue_users(issue):
+        """Get the objects and fields with users of an issue"""
+
+        targets = [(issue, 'user'), (issue, 'assignee'), (issue, 'assignees')]
+
+        for reaction in issue['reactions_data']:
+            targets.append((reaction, 'user'))
+        for comment in issue['comments_data']:
+            targets.append((comment, 'user'))
+            targets.extend((reaction, 'user') for reaction in comment['reactions_data'])
+
+        return targets
+
+    @staticmethod
+    def __pull_users(pull):
+        """Get the objects and fields with users of a pull request"""
+
+        targets = [(pull, 'user'), (pull, 'merged_by'), (pull, 'requested_reviewers')]
+
+        for comment in pull['review_comments_data']:
+            targets.append((comment, 'user'))
+            targets.extend((reaction, 'user') for reaction in comment['reactions_data'])
+
+        return targets
+
+    def __enrich_items(self, items, fields, get_field_data):
+        """Add the data of the given fields to the items.
+
+        With a single worker, fields are fetched one after the other.
+        Otherwise, the data of each field is fetched by a pool of
+        `enrich_workers` threads, so several fields and items are
+        fetched at the same time. Items are returned in the same
+        order they were received.
+
+        The number of fields waiting to be fetched is limited by the
+        API points the client can spend before sleeping; when the
+        limit is reached, the oldest items are completed before
+        fetching new ones.
+        """
+        if self.enrich_workers == 1:
+            for item in items:
+                for field in fields:
+                    if item[field]:
+                        item[field + '_data'] = get_field_data(item, field)
+                yield item
+            return
+
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.enrich_workers)
+        pending = collections.deque()
+        ntasks = 0
+
+        try:
+            for item in items:
+                tasks = [(field, executor.submit(get_field_data, item, field))
+                         for field in fields if item[field]]
+                pending.append((item, tasks))
+                ntasks += len(tasks)
+
+                while pending:
+                    budget = self.client.concurrency_budget(self.enrich_workers)
+                    ready = all(task.done() for _, task in pending[0][1])
+
+                    if ntasks <= budget and not ready:
+                        break
+
+                    item, tasks = pending.popleft()
+                    ntasks -= len(tasks)
+                    yield self.__complete_item(item, tasks)
+
+            while pending:
+                item, tasks = pending.popleft()
+                yield self.__complete_item(item, tasks)
+        finally:
+            for _, tasks in pending:
+                for _, task in tasks:
+                    task.cancel()
+            executor.shutdown(wait=True)
+
+    @staticmethod
+    def __complete_item(item, tasks):
+        """Set the data of the fields fetched for an item"""
+
+        for field, task in tasks:
+            item[field + '_data'] = task.result()
+
+        return item
 
     def __fetch_repo_info(self):
         """Get repo info about stars, watchers and forks"""
@@ -490,6 +725,9 @@ class GitHubClient(HttpClient, RateLimitHandler):
         before raising a RetryError exception
     :param archive: collect issues already retrieved from an archive
     :param from_archive: it tells whether to write/read the archive
+    :param cache: `HttpCache` used to send conditional requests
+    :param rate_limiter: `SharedRateLimiter` used to share the rate limit
+        with other processes
     """
     EXTRA_STATUS_FORCELIST = [403, 500, 502, 503]
 
@@ -499,13 +737,15 @@ class GitHubClient(HttpClient, RateLimitHandler):
     def __init__(self, owner, repository, tokens,
                  base_url=None, sleep_for_rate=False, min_rate_to_sleep=MIN_RATE_LIMIT,
                  sleep_time=DEFAULT_SLEEP_TIME, max_retries=MAX_RETRIES,
-                 archive=None, from_archive=False):
+                 archive=None, from_archive=False, cache=None, rate_limiter=None):
         self.owner = owner
         self.repository = repository
         self.tokens = tokens
         self.n_tokens = len(self.tokens)
         self.current_token = None
         self.last_rate_limit_checked = None
+        self._lock = threading.RLock()
+        self._login_locks = {}
 
         if base_url:
             base_url = urijoin(base_url, 'api', 'v3')
@@ -515,8 +755,9 @@ class GitHubClient(HttpClient, RateLimitHandler):
         super().__init__(base_url, sleep_time=sleep_time, max_retries=max_retries,
                          extra_headers=self._set_extra_headers(),
                          extra_status_forcelist=self.EXTRA_STATUS_FORCELIST,
-                         archive=archive, from_archive=from_archive)
-        super().setup_rate_limit_handler(sleep_for_rate=sleep_for_rate, min_rate_to_sleep=min_rate_to_sleep)
+                         archive=archive, from_archive=from_archive, cache=cache)
+        super().setup_rate_limit_handler(sleep_for_rate=sleep_for_rate, min_rate_to_sleep=min_rate_to_sleep,
+                                         rate_limiter=rate_limiter)
 
         # Choose best API token (with maximum API points remaining)
         if not self.from_archive:
@@ -532,6 +773,23 @@ class GitHubClient(HttpClient, RateLimitHandler):
 
         return time_to_reset
 
+    def concurrency_budget(self, max_requests):
+        """Number of requests that can be sent at the same time.
+
+        The number is limited by the API points left before the
+        client has to sleep until the rate limit is reset.
+
+        :param max_requests: maximum number of requests
+
+        :returns: the number of requests, between 1 and `max_requests`
+        """
+        with self._lock:
+            if self.rate_limit is None:
+                return max_requests
+            budget = self.rate_limit - self.min_rate_to_sleep
+
+        return max(1, min(max_requests, budget))
+
     def issue_reactions(self, issue_number):
         """Get reactions of an issue"""
 
@@ -657,37 +915,40 @@ class GitHubClient(HttpClient, RateLimitHandler):
         """Get the user information and update the user cache"""
         user = None
 
-        if login in self._users:
-            return self._users[login]
+        with self._login_lock(login):
+            if login in self._users:
+                return self._users[login]
 
-        url_user = urijoin(self.base_url, 'users', login)
+            url_user = urijoin(self.base_url, 'users', login)
 
-        logging.info("Getting info for %s" % (url_user))
+            logging.info("Getting info for %s" % (url_user))
 
-        r = self.fetch(url_user)
-        user = r.text
-        self._users[login] = user
+            r = self.fetch(url_user)
+            user = r.text
+            self._users[login] = user
 
         return user
 
     def user_orgs(self, login):
         """Get the user public organizations"""
-        if login in self._users_orgs:
-            return self._users_orgs[login]
 
-        url = urijoin(self.base_url, 'users', login, 'orgs')
-        try:
-            r = self.fetch(url)
-            orgs = r.text
-        except requests.exceptions.HTTPError as error:
-            # 404 not found is wrongly received sometimes
-            if error.response.status_code == 404:
-                logger.error("Can't get github login orgs: %s", error)
-                orgs = '[]'
-            else:
-                raise error
+        with self._login_lock(login):
+            if login in self._users_orgs:
+                return self._users_orgs[login]
+
+            url = urijoin(self.base_url, 'users', login, 'orgs')
+            try:
+                r = self.fetch(url)
+                orgs = r.text
+            except requests.exceptions.HTTPError as error:
+                # 404 not found is wrongly received sometimes
+                if error.response.status_code == 404:
+                    logger.error("Can't get github login orgs: %s", error)
+                    orgs = '[]'
+                else:
+                    raise error
 
-        self._users_orgs[login] = orgs
+            self._users_orgs[login] = orgs
 
         return orgs
 
@@ -703,15 +964,16 @@ class GitHubClient(HttpClient, RateLimitHandler):
         :returns a response object
         """
         if not self.from_archive:
-            self.sleep_for_rate_limit()
+            self._wait_for_rate_limit()
 
         response = super().fetch(url, payload, headers, method, stream, verify)
 
         if not self.from_archive:
-            if self._need_check_tokens():
-                self._choose_best_api_token()
-            else:
-                self.update_rate_limit(response)
+            with self._lock:
+                if self._need_check_tokens():
+                    self._choose_best_api_token()
+                else:
+                    self.update_rate_limit(response)
 
         return response
 
@@ -751,11 +1013,10 @@ class GitHubClient(HttpClient, RateLimitHandler):
     def _get_token_rate_limit(self, token):
         """Return token's remaining API points"""
 
-        rate_url = urijoin(self.base_url, "rate_limit")
         self.session.headers.update({'Authorization': 'token ' + token})
         remaining = 0
         try:
-            headers = super().fetch(rate_url).headers
+            headers = self._fetch_rate_limit().headers
             if self.rate_limit_header in headers:
                 remaining = int(headers[self.rate_limit_header])
         except requests.exceptions.HTTPError as error:
@@ -766,15 +1027,8 @@ class GitHubClient(HttpClient, RateLimitHandler):
         """Return array of all tokens remaining API points"""
 
         remainings = [0] * self.n_tokens
-        # Turn off archiving when checking rates, because that would cause
-        # archive key conflict (the same URLs giving different responses)
-        arch = self.archive
-        self.archive = None
         for idx, token in enumerate(self.tokens):
-            # Pass flag to skip disabling archiving because this function doies it
             remainings[idx] = self._get_token_rate_limit(token)
-        # Restore archiving to whatever state it was
-        self.archive = arch
         logger.debug("Remaining API points: {}".format(remainings))
         return remainings
 
@@ -827,14 +1081,8 @@ class GitHubClient(HttpClient, RateLimitHandler):
     def _update_current_rate_limit(self):
         """Update rate limits data for the current token"""
 
-        url = urijoin(self.base_url, "rate_limit")
         try:
-            # Turn off archiving when checking rates, because that would cause
-            # archive key conflict (the same URLs giving different responses)
-            arch = self.archive
-            self.archive = None
-            response = super().fetch(url)
-            self.archive = arch
+            response = self._fetch_rate_limit()
             self.update_rate_limit(response)
             self.last_rate_limit_checked = self.rate_limit
         except requests.exceptions.HTTPError as error:
@@ -843,6 +1091,55 @@ class GitHubClient(HttpClient, RateLimitHandler):
             else:
                 raise error
 
+    def _fetch_rate_limit(self):
+        """Fetch the rate limit of the current token.
+
+        Rate limit responses are neither archived nor cached. The
+        same URL gives different responses over time, which would
+        cause archive key conflicts.
+        """
+        url = urijoin(self.base_url, "rate_limit")
+
+        response = self.session.get(url)
+        response.raise_for_status()
+
+        return response
+
+    def _wait_for_rate_limit(self):
+        """Sleep until the rate limit allows to send a new request.
+
+        The rate limit is read holding the lock of the client, but
+        the thread waits for its turn or sleeps without it, so other
+        threads are not blocked meanwhile. When the rate limit was
+        updated by other threads while sleeping, it is checked again.
+        """
+        if self.rate_limiter:
+            with self._lock:
+                key = self.rate_limit_key()
+            self.rate_limiter.acquire(key)
+
+        slept = False
+        reset_ts = None
+
+        while True:
+            with self._lock:
+                if slept and self.rate_limit_reset_ts == reset_ts:
+                    return
+                seconds_to_reset = self._check_rate_limit()
+                reset_ts = self.rate_limit_reset_ts
+
+            if seconds_to_reset is None:
+                return
+
+            time.sleep(seconds_to_reset)
+            slept = True
+
+    def _login_lock(self, login):
+        """Get the lock used to fetch the data of a login once"""
+
+        with self._lock:
+            return self._login_locks.setdefault(login, threading.Lock())
+
     def _set_extra_headers(self):
         """Set extra headers for session"""
 
@@ -851,6 +1148,460 @@ class GitHubClient(HttpClient, RateLimitHandler):
         return headers
 
 
+GraphQLConnection = collections.namedtuple('GraphQLConnection', 'name page_size args fields nested')
+
+
+class GitHubGraphQLClient(GitHubClient):
+    """Client for retrieving information from GitHub GraphQL API v4.
+
+    Issues and pull requests are listed using the REST API, so
+    they keep the same shape. Their comments, reactions, review
+    comments, commits and users are fetched in batches using
+    GraphQL queries and converted to the objects the REST API
+    returns. Connections with more than one page are completed
+    with extra queries.
+
+    This client takes the same parameters as `GitHubClient`.
+    """
+    # Number of issues/pull requests and users requested on each query
+    ITEMS_BATCH_SIZE = 25
+    NODES_BATCH_SIZE = 50
+    USERS_BATCH_SIZE = 50
+
+    REACTION_CONTENTS = {
+        'THUMBS_UP': '+1',
+        'THUMBS_DOWN': '-1',
+        'LAUGH': 'laugh',
+        'HOORAY': 'hooray',
+        'CONFUSED': 'confused',
+        'HEART': 'heart',
+        'ROCKET': 'rocket',
+        'EYES': 'eyes'
+    }
+
+    USER_SUMMARY_FIELDS = "__typename id databaseId login avatarUrl url isSiteAdmin"
+    ACTOR_SUMMARY_FIELDS = "__typename login avatarUrl url " \
+                           "... on User { id databaseId isSiteAdmin } " \
+                           "... on Bot { id databaseId }"
+    REACTION_GROUPS_FIELDS = "reactionGroups { content reactors { totalCount } }"
+
+    USER_FIELDS = USER_SUMMARY_FIELDS + " " \
+        "name company websiteUrl location email isHireable bio createdAt updatedAt " \
+        "repositories(privacy: PUBLIC) { totalCount } " \
+        "gists(privacy: PUBLIC) { totalCount } " \
+        "followers { totalCount } " \
+        "following { totalCount } " \
+        "organizations(first: 100) { nodes { id databaseId login avatarUrl description } }"
+
+    REACTIONS = GraphQLConnection('reactions', 100, 'orderBy: {field: CREATED_AT, direction: ASC}',
+                                  "id databaseId content createdAt user { " + USER_SUMMARY_FIELDS + " }",
+                                  [])
+    ISSUE_COMMENTS = GraphQLConnection('comments', 100, None,
+                                       "id databaseId url body createdAt updatedAt authorAssociation "
+                                       "author { " + ACTOR_SUMMARY_FIELDS + " } " + REACTION_GROUPS_FIELDS,
+                                       [])
+    REVIEW_COMMENTS = GraphQLConnection('comments', 50, None,
+                                        "id databaseId url body createdAt updatedAt authorAssociation "
+                                        "diffHunk path position originalPosition "
+                                        "commit { oid } originalCommit { oid } "
+                                        "pullRequestReview { databaseId } replyTo { databaseId } "
+                                        "author { " + ACTOR_SUMMARY_FIELDS + " } " + REACTION_GROUPS_FIELDS,
+                                        [])
+    REVIEWS = GraphQLConnection('reviews', 50, None, "", [REVIEW_COMMENTS])
+    COMMITS = GraphQLConnection('commits', 100, None, "commit { oid }", [])
+
+    def __init__(self, owner, repository, tokens,
+                 base_url=None, sleep_for_rate=False, min_rate_to_sleep=MIN_RATE_LIMIT,
+                 sleep_time=DEFAULT_SLEEP_TIME, max_retries=MAX_RETRIES,
+                 archive=None, from_archive=False, cache=None, rate_limiter=None):
+        if base_url:
+            self.graphql_url = urijoin(base_url, 'api', 'graphql')
+        else:
+            self.graphql_url = urijoin(GITHUB_API_URL, 'graphql')
+
+        super().__init__(owner, repository, tokens, base_url=base_url,
+                         sleep_for_rate=sleep_for_rate, min_rate_to_sleep=min_rate_to_sleep,
+                         sleep_time=sleep_time, max_retries=max_retries,
+                         archive=archive, from_archive=from_archive,
+                         cache=cache, rate_limiter=rate_limiter)
+
+    def query(self, query, variables=None):
+        """Run a GraphQL query.
+
+        Errors caused by nodes which were not found are ignored;
+        those nodes are set to `None`.
+
+        :param query: GraphQL query
+        :param variables: dict with the values of the query variables
+
+        :returns: the data returned by the query
+
+        :raises BackendError: when the query returns errors
+        """
+        payload = json.dumps({'query': query, 'variables': variables or {}},
+                             sort_keys=True)
+        headers = {'Content-Type': 'application/json'}
+
+        response = self.fetch(self.graphql_url, payload=payload, headers=headers,
+                              method=HttpClient.POST)
+        result = json.loads(response.text)
+
+        errors = [error for error in result.get('errors', [])
+                  if error.get('type') != 'NOT_FOUND']
+        if errors or result.get('data', None) is None:
+            cause = errors[0].get('message') if errors else 'no data returned'
+            raise BackendError(cause="GraphQL query error; cause: %s" % cause)
+
+        return result['data']
+
+    def issues_data(self, numbers):
+        """Get the comments and reactions of a list of issues.
+
+        Pull requests are also issues, so their numbers can be
+        given too. Each comment includes its reactions under
+        `reactions_data`.
+
+        :param numbers: list of issue numbers
+
+        :returns: a dict with the comments (`comments`) and reactions
+            (`reactions`) of each issue, in the REST API format
+        """
+        connections = [self.ISSUE_COMMENTS, self.REACTIONS]
+        fields = " ".join(self._connection_text(conn) for conn in connections)
+        target = "issueOrPullRequest(number: %d) { ... on Issue { %s } ... on PullRequest { %s } }"
+
+        nodes = self._fetch_items_nodes(numbers, lambda n: target % (n, fields, fields),
+                                        connections)
+
+        data = {}
+        for number, node in nodes.items():
+            comments = [self._rest_issue_comment(comment, number)
+                        for comment in node['comments']]
+            self._set_comments_reactions(node['comments'], comments)
+
+            data[number] = {
+                'comments': comments,
+                'reactions': [self._rest_reaction(reaction) for reaction in node['reactions']]
+            }
+
+        return data
+
+    def pulls_data(self, numbers):
+        """Get the review comments and commits of a list of pull requests.
+
+        Each review comment includes its reactions under `reactions_data`.
+
+        :param numbers: list of pull request numbers
+
+        :returns: a dict with the review comments (`review_comments`)
+            and commit hashes (`commits`) of each pull request, in the
+            REST API format
+        """
+        connections = [self.REVIEWS, self.COMMITS]
+        fields = " ".join(self._connection_text(conn) for conn in connections)
+        target = "pullRequest(number: %d) { %s }"
+
+        nodes = self._fetch_items_nodes(numbers, lambda n: target % (n, fields),
+                                        connections)
+
+        data = {}
+        for number, node in nodes.items():
+            raw_comments = [comment for review in node['reviews']
+                            for comment in review['comments']]
+            raw_comments.sort(key=lambda c: (c['updatedAt'], c['databaseId']))
+
+            comments = [self._rest_review_comment(comment, number)
+                        for comment in raw_comments]
+            self._set_comments_reactions(raw_comments, comments)
+
+            data[number] = {
+                'review_comments': comments,
+                'commits': [commit['commit']['oid'] for commit in node['commits']]
+            }
+
+        return data
+
+    def users(self, logins):
+        """Get the data and the organizations of a list of users.
+
+        :param logins: list of user logins
+
+        :returns: a dict with the data of each user, in the REST
+            API format, or `None` when the login is not a user
+        """
+        users = {}
+
+        for batch in self._batches(logins, self.USERS_BATCH_SIZE):
+            variables = {'u%d' % x: login for x, login in enumerate(batch)}
+            params = ", ".join("$%s: String!" % var for var in sorted(variables))
+            targets = " ".join("%s: user(login: $%s) { %s }" % (var, var, self.USER_FIELDS)
+                               for var in sorted(variables))
+
+            result = self.query("query(%s) { %s }" % (params, targets), variables)
+
+            for var, login in variables.items():
+                users[login] = self._rest_user(result[var]) if result[var] else None
+
+        return users
+
+    def _fetch_items_nodes(self, numbers, target, connections):
+        """Fetch the nodes of some issues or pull requests in batches"""
+
+        nodes = {}
+
+        for batch in self._batches(numbers, self.ITEMS_BATCH_SIZE):
+            targets = " ".join("i%d: %s" % (number, target(number)) for number in batch)
+            query = "query($owner: String!, $name: String!) { " \
+                    "repository(owner: $owner, name: $name) { %s } }" % targets
+
+            result = self.query(query, {'owner': self.owner, 'name': self.repository})
+
+            for number in batch:
+                node = result['repository']['i%d' % number]
+                if not node:
+                    continue
+                self._complete_connections(node, connections)
+                nodes[number] = node
+
+        return nodes
+
+    def _set_comments_reactions(self, raw_comments, comments):
+        """Fetch the reactions of the comments which have some"""
+
+        ids = [raw['id'] for raw, comment in zip(raw_comments, comments)
+               if comment['reactions']['total_count'] > 0]
+        reactions = self._reactions(ids)
+
+        for raw, comment in zip(raw_comments, comments):
+            comment['reactions_data'] = [self._rest_reaction(reaction)
+                                         for reaction in reactions.get(raw['id'], [])]
+
+    def _reactions(self, ids):
+        """Fetch the reactions of a list of reactable nodes"""
+
+        reactions = {}
+        fields = self._connection_text(self.REACTIONS)
+
+        for batch in self._batches(ids, self.NODES_BATCH_SIZE):
+            variables = {'n%d' % x: node_id for x, node_id in enumerate(batch)}
+            params = ", ".join("$%s: ID!" % var for var in sorted(variables))
+            targets = " ".join("%s: node(id: $%s) { ... on Reactable { __typename id %s } }" % (var, var, fields)
+                               for var in sorted(variables))
+
+            result = self.query("query(%s) { %s }" % (params, targets), variables)
+
+            for var, node_id in variables.items():
+                node = result[var]
+                if not node:
+                    continue
+                self._complete_connections(node, [self.REACTIONS])
+                reactions[node_id] = node['reactions']
+
+        return reactions
+
+    def _complete_connections(self, node, connections):
+        """Fetch the pages left of the connections of a node.
+
+        The connections of the node are replaced by the list of
+        their nodes.
+        """
+        for conn in connections:
+            data = node[conn.name]
+            nodes = data['nodes']
+            page_info = data['pageInfo']
+
+            while page_info['hasNextPage']:
+                query = "query($id: ID!, $cursor: String!) { node(id: $id) { ... on %s { %s } } }" % \
+                        (node['__typename'], self._connection_text(conn, after='$cursor'))
+                result = self.query(query, {'id': node['id'], 'cursor': page_info['endCursor']})
+
+                data = result['node'][conn.name]
+                nodes.extend(data['nodes'])
+                page_info = data['pageInfo']
+
+            node[conn.name] = nodes
+
+            for child in nodes:
+                self._complete_connections(child, conn.nested)
+
+    @staticmethod
+    def _connection_text(conn, after=None):
+        """Build the text to query the first page of a connection"""
+
+        args = ["first: %d" % conn.page_size]
+        if after:
+            args.append("after: %s" % after)
+        if conn.args:
+            args.append(conn.args)
+
+        fields = conn.fields
+        if conn.nested:
+            nested = " ".join(GitHubGraphQLClient._connection_text(c) for c in conn.nested)
+            fields = "__typename id %s %s" % (fields, nested)
+
+        return "%s(%s) { pageInfo { hasNextPage endCursor } nodes { %s } }" % \
+               (conn.name, ", ".join(args), fields)
+
+    @staticmethod
+    def _batches(elements, size):
+        """Split a list in lists of `size` elements"""
+
+        for x in range(0, len(elements), size):
+            yield elements[x:x + size]
+
+    def _rest_user_summary(self, actor):
+        """Convert a GraphQL actor to a REST user summary"""
+
+        if not actor:
+            return None
+
+        url = urijoin(self.base_url, 'users', actor['login'])
+        user_type = actor['__typename'] if actor['__typename'] in ('User', 'Bot', 'Organization') else 'User'
+
+        return {
+            'login': actor['login'],
+            'id': actor.get('databaseId', None),
+            'node_id': actor.get('id', None),
+            'avatar_url': actor['avatarUrl'],
+            'gravatar_id': '',
+            'url': url,
+            'html_url': actor['url'],
+            'followers_url': url + '/followers',
+            'following_url': url + '/following{/other_user}',
+            'gists_url': url + '/gists{/gist_id}',
+            'starred_url': url + '/starred{/owner}{/repo}',
+            'subscriptions_url': url + '/subscriptions',
+            'organizations_url': url + '/orgs',
+            'repos_url': url + '/repos',
+            'events_url': url + '/events{/privacy}',
+            'received_events_url': url + '/received_events',
+            'type': user_type,
+            'site_admin': actor.get('isSiteAdmin', False)
+        }
+
+    def _rest_user(self, user):
+        """Convert a GraphQL user to a REST user with its organizations"""
+
+        rest_user = self._rest_user_summary(user)
+        rest_user.update({
+            'name': user['name'],
+            'company': user['company'],
+            'blog': user['websiteUrl'] or '',
+            'location': user['location'],
+            'email': user['email'] or None,
+            'hireable': True if user['isHireable'] else None,
+            'bio': user['bio'],
+            'public_repos': user['repositories']['totalCount'],
+            'public_gists': user['gists']['totalCount'],
+            'followers': user['followers']['totalCount'],
+            'following': user['following']['totalCount'],
+            'created_at': user['createdAt'],
+            'updated_at': user['updatedAt']
+        })
+
+        organizations = []
+        for org in user['organizations']['nodes']:
+            url = urijoin(self.base_url, 'orgs', org['login'])
+            organizations.append({
+                'login': org['login'],
+                'id': org['databaseId'],
+                'node_id': org['id'],
+                'url': url,
+                'repos_url': url + '/repos',
+                'events_url': url + '/events',
+                'hooks_url': url + '/hooks',
+                'issues_url': url + '/issues',
+                'members_url': url + '/members{/member}',
+                'public_members_url': url + '/public_members{/member}',
+                'avatar_url': org['avatarUrl'],
+                'description': org['description']
+            })
+        rest_user['organizations'] = organizations
+
+        return rest_user
+
+    def _rest_reaction(self, reaction):
+        """Convert a GraphQL reaction to a REST reaction"""
+
+        return {
+            'id': reaction['databaseId'],
+            'node_id': reaction['id'],
+            'user': self._rest_user_summary(reaction['user']),
+            'content': self.REACTION_CONTENTS.get(reaction['content'], reaction['content'].lower()),
+            'created_at': reaction['createdAt']
+        }
+
+    def _rest_reactions_summary(self, url, reaction_groups):
+        """Convert GraphQL reaction groups to a REST reactions summary"""
+
+        summary = {content: 0 for content in self.REACTION_CONTENTS.values()}
+        summary['url'] = url
+        summary['total_count'] = 0
+
+        for group in reaction_groups:
+            content = self.REACTION_CONTENTS.get(group['content'], group['content'].lower())
+            count = group['reactors']['totalCount']
+            summary[content] = count
+            summary['total_count'] += count
+
+        return summary
+
+    def _rest_issue_comment(self, comment, number):
+        """Convert a GraphQL issue comment to a REST issue comment"""
+
+        repo_url = urijoin(self.base_url, 'repos', self.owner, self.repository)
+        url = urijoin(repo_url, 'issues', 'comments', str(comment['databaseId']))
+
+        return {
+            'url': url,
+            'html_url': comment['url'],
+            'issue_url': urijoin(repo_url, 'issues', str(number)),
+            'id': comment['databaseId'],
+            'node_id': comment['id'],
+            'user': self._rest_user_summary(comment['author']),
+            'created_at': comment['createdAt'],
+            'updated_at': comment['updatedAt'],
+            'author_association': comment['authorAssociation'],
+            'body': comment['body'],
+            'reactions': self._rest_reactions_summary(urijoin(url, 'reactions'),
+                                                      comment['reactionGroups'])
+        }
+
+    def _rest_review_comment(self, comment, number):
+        """Convert a GraphQL review comment to a REST review comment"""
+
+        repo_url = urijoin(self.base_url, 'repos', self.owner, self.repository)
+        url = urijoin(repo_url, 'pulls', 'comments', str(comment['databaseId']))
+        review = comment['pullRequestReview']
+
+        rest_comment = {
+            'url': url,
+            'pull_request_review_id': review['databaseId'] if review else None,
+            'id': comment['databaseId'],
+            'node_id': comment['id'],
+            'diff_hunk': comment['diffHunk'],
+            'path': comment['path'],
+            'position': comment['position'],
+            'original_position': comment['originalPosition'],
+            'commit_id': comment['commit']['oid'] if comment['commit'] else None,
+            'original_commit_id': comment['originalCommit']['oid'] if comment['originalCommit'] else None,
+            'user': self._rest_user_summary(comment['author']),
+            'body': comment['body'],
+            'created_at': comment['createdAt'],
+            'updated_at': comment['updatedAt'],
+            'html_url': comment['url'],
+            'pull_request_url': urijoin(repo_url, 'pulls', str(number)),
+            'author_association': comment['authorAssociation'],
+            'reactions': self._rest_reactions_summary(urijoin(url, 'reactions'),
+                                                      comment['reactionGroups'])
+        }
+
+        if comment['replyTo']:
+            rest_comment['in_reply_to_id'] = comment['replyTo']['databaseId']
+
+        return rest_comment
+
+
 class GitHubCommand(BackendCommand):
     """Class to run GitHub backend from the command line."""
 
@@ -863,7 +1614,9 @@ class GitHubCommand(BackendCommand):
         parser = BackendCommandArgumentParser(from_date=True,
                                               to_date=True,
                                               token_auth=False,
-                                              archive=True)
+                                              archive=True,
+                                              http_cache=True,
+                                              rate_limiter=True)
         # GitHub options
         group = parser.parser.add_argument_group('GitHub arguments')
         group.add_argument('--enterprise-url', dest='base_url',
@@ -887,6 +1640,12 @@ class GitHubCommand(BackendCommand):
         group.add_argument('--sleep-time', dest='sleep_time',
                            default=DEFAULT_SLEEP_TIME, type=int,
                            help="sleeping time between API call retries")
+        group.add_argument('--enrich-workers', dest='enrich_workers',
+                           default=DEFAULT_ENRICH_WORKERS, type=int,
+                           help="number of threads fetching the data of the issues and pull requests")
+        group.add_argument('--graphql', dest='graphql',
+                           action='store_true',
+                           help="fetch the data of the issues and pull requests using GraphQL API")
 
         # Positional arguments
         parser.parser.add_argument('owner',
@@ -80,8 +80,10 @@ class GitLab(Backend):
         before raising a RetryError exception
     :param sleep_time: time to sleep in case
     :param blacklist_ids: ids of items that must not be retrieved
+    :param rate_limiter: `SharedRateLimiter` used to share the rate limit
+        with other processes
     """
-    version = '0.6.2'
+    version = '0.7.0'
 
     CATEGORIES = [CATEGORY_ISSUE, CATEGORY_MERGE_REQUEST]
 
@@ -89,7 +91,7 @@ class GitLab(Backend):
                  api_token=None, base_url=None, tag=None, archive=None,
                  sleep_for_rate=False, min_rate_to_sleep=MIN_RATE_LIMIT,
                  max_retries=MAX_RETRIES, sleep_time=DEFAULT_SLEEP_TIME,
-                 blacklist_ids=None):
+                 blacklist_ids=None, rate_limiter=None):
         origin = base_url if base_url else GITLAB_URL
         origin = urijoin(origin, owner, repository)
 
@@ -103,6 +105,7 @@ class GitLab(Backend):
         self.max_retries = max_retries
         self.sleep_time = sleep_time
         self.blacklist_ids = blacklist_ids
+        self.rate_limiter = rate_limiter
         self.client = None
         self._users = {}  # internal users cache
 
@@ -203,7 +206,8 @@ class GitLab(Backend):
         return GitLabClient(self.owner, self.repository, self.api_token, self.base_url,
                             self.sleep_for_rate, self.min_rate_to_sleep,
                             self.sleep_time, self.max_retries,
-                            self.archive, from_archive)
+                            self.archive, from_archive,
+                            rate_limiter=self.rate_limiter)
 
     def __fetch_issues(self, from_date):
         """Fetch the issues"""
@@ -372,6 +376,8 @@ class GitLabClient(HttpClient, RateLimitHandler):
          before raising a RetryError exception
     :param archive: an archive to store/read fetched data
     :param from_archive: it tells whether to write/read the archive
+    :param rate_limiter: `SharedRateLimiter` used to share the rate limit
+        with other processes
     """
 
     RATE_LIMIT_HEADER = "RateLimit-Remaining"
@@ -389,7 +395,7 @@ class GitLabClient(HttpClient, RateLimitHandler):
     def __init__(self, owner, repository, token, base_url=None,
                  sleep_for_rate=False, min_rate_to_sleep=MIN_RATE_LIMIT,
                  sleep_time=DEFAULT_SLEEP_TIME, max_retries=MAX_RETRIES,
-                 archive=None, from_archive=False):
+                 archive=None, from_archive=False, rate_limiter=None):
         self.owner = owner
         self.repository = repository
         self.token = token
@@ -408,7 +414,8 @@ class GitLabClient(HttpClient, RateLimitHandler):
         super().setup_rate_limit_handler(rate_limit_header=self.RATE_LIMIT_HEADER,
                                          rate_limit_reset_header=self.RATE_LIMIT_RESET_HEADER,
                                          sleep_for_rate=sleep_for_rate,
-                                         min_rate_to_sleep=min_rate_to_sleep)
+                                         min_rate_to_sleep=min_rate_to_sleep,
+                                         rate_limiter=rate_limiter)
 
         self._init_rate_limit()
 
@@ -608,6 +615,11 @@ class GitLabClient(HttpClient, RateLimitHandler):
 
         return headers
 
+    def _rate_limit_token(self):
+        """Token used to access the server"""
+
+        return self.token
+
     def _init_rate_limit(self):
         """Initialize rate limit information"""
 
@@ -633,7 +645,8 @@ class GitLabCommand(BackendCommand):
 
         parser = BackendCommandArgumentParser(from_date=True,
                                               token_auth=True,
-                                              archive=True)
+                                              archive=True,
+                                              rate_limiter=True)
 
         # GitLab options
         group = parser.parser.add_argument_group('GitLab arguments')
@@ -59,14 +59,19 @@ class Groupsio(MBox):
     :param verify: allows to disable SSL verification
     :param tag: label used to mark the data
     :param archive: archive to store/retrieve items
+    :param parse_workers: number of processes parsing the mboxes
+    :param mbox_index: keep an index of the messages of each mbox
+    :param headers_only: fetch only the headers of the messages
     """
-    version = '0.1.2'
+    version = '0.4.0'
 
     CATEGORIES = [CATEGORY_MESSAGE]
 
-    def __init__(self, group_name, dirpath, api_token, verify=True, tag=None, archive=None):
+    def __init__(self, group_name, dirpath, api_token, verify=True, tag=None, archive=None,
+                 parse_workers=None, mbox_index=False, headers_only=False):
         url = urijoin(GROUPSIO_URL, 'g', group_name)
-        super().__init__(url, dirpath, tag=tag, archive=archive)
+        super().__init__(url, dirpath, tag=tag, archive=archive, parse_workers=parse_workers,
+                         mbox_index=mbox_index, headers_only=headers_only)
         self.group_name = group_name
         self.api_token = api_token
         self.verify = verify
@@ -285,6 +290,15 @@ class GroupsioCommand(BackendCommand):
         group.add_argument('--no-verify', dest='verify',
                            action='store_false',
                            help="Value 'True' enable SSL verification")
+        group.add_argument('--parse-workers', dest='parse_workers',
+                           type=int, default=None,
+                           help="Number of processes parsing the mboxes in parallel")
+        group.add_argument('--mbox-index', dest='mbox_index',
+                           action='store_true',
+                           help="Index the messages of each mbox to speed up incremental fetches")
+        group.add_argument('--headers-only', dest='headers_only',
+                           action='store_true',
+                           help="Fetch only the headers of the messages")
 
         # Required arguments
         parser.parser.add_argument('group_name',
@@ -31,7 +31,7 @@ import dateutil.tz
 from grimoirelab_toolkit.datetime import datetime_to_utc, datetime_utcnow
 from grimoirelab_toolkit.uris import urijoin
 
-from .mbox import MBox, MailingList, CATEGORY_MESSAGE
+from .mbox import MBox, MBoxDownloader, MailingList, CATEGORY_MESSAGE
 from ...backend import (BackendCommand,
                         BackendCommandArgumentParser)
 from ...client import HttpClient
@@ -53,14 +53,21 @@ class HyperKitty(MBox):
     :param dirpath: directory path where the mboxes are stored
     :param tag: label used to mark the data
     :param archive: archive to store/retrieve items
+    :param parse_workers: number of processes parsing the mboxes
+    :param mbox_index: keep an index of the messages of each mbox
+    :param headers_only: fetch only the headers of the messages
+    :param download_workers: number of mboxes downloaded at the same time
     """
-    version = '0.4.2'
+    version = '0.8.0'
 
     CATEGORIES = [CATEGORY_MESSAGE]
 
-    def __init__(self, url, dirpath, tag=None, archive=None):
-        super().__init__(url, dirpath, tag=tag, archive=archive)
+    def __init__(self, url, dirpath, tag=None, archive=None, parse_workers=None,
+                 mbox_index=False, headers_only=False, download_workers=1):
+        super().__init__(url, dirpath, tag=tag, archive=archive, parse_workers=parse_workers,
+                         mbox_index=mbox_index, headers_only=headers_only)
         self.url = url
+        self.download_workers = download_workers
 
     def fetch(self, category=CATEGORY_MESSAGE, from_date=DEFAULT_DATETIME):
         """Fetch the messages from the HyperKitty mailing list archiver.
@@ -96,7 +103,8 @@ class HyperKitty(MBox):
         logger.info("Looking for messages from '%s' since %s",
                     self.url, str(from_date))
 
-        mailing_list = HyperKittyList(self.url, self.dirpath)
+        mailing_list = HyperKittyList(self.url, self.dirpath,
+                                      download_workers=self.download_workers)
         mailing_list.fetch(from_date=from_date)
 
         messages = self._fetch_and_parse_messages(mailing_list, from_date)
@@ -134,12 +142,17 @@ class HyperKittyList(MailingList):
     or greater. Previous versions do not export messages in MBox
     format.
 
+    Archives are downloaded with `MBoxDownloader`, so those which
+    were not modified since the last fetch are not downloaded again.
+
     :param url: URL to the HyperKitty archiver for this list
     :param dirpath: path to the local mboxes archives
+    :param download_workers: number of archives downloaded at the same time
     """
-    def __init__(self, url, dirpath):
+    def __init__(self, url, dirpath, download_workers=1):
         super().__init__(url, dirpath)
         self.client = HttpClient(url)
+        self.download_workers = download_workers
 
     def fetch(self, from_date=DEFAULT_DATETIME):
         """Fetch the mbox files from the remote archiver.
@@ -170,15 +183,12 @@ class HyperKittyList(MailingList):
 
         months = months_range(from_date, to_end)
 
-        fetched = []
+        archives = []
 
         if not os.path.exists(self.dirpath):
             os.makedirs(self.dirpath)
 
-        tmbox = 0
-
         for dts in months:
-            tmbox += 1
             start, end = dts[0], dts[1]
             filename = start.strftime("%Y-%m.mbox.gz")
             filepath = os.path.join(self.dirpath, filename)
@@ -190,12 +200,13 @@ class HyperKittyList(MailingList):
                 'end': end.strftime("%Y-%m-%d")
             }
 
-            success = self._download_archive(url, params, filepath)
+            archives.append((url, params, filepath))
 
-            if success:
-                fetched.append((url, filepath))
+        downloader = MBoxDownloader(self._fetch_archive,
+                                    max_workers=self.download_workers)
+        fetched = downloader.download(archives)
 
-        logger.info("%s/%s MBoxes downloaded", len(fetched), tmbox)
+        logger.info("%s/%s MBoxes downloaded", len(fetched), len(archives))
 
         return fetched
 
@@ -233,19 +244,8 @@ class HyperKittyList(MailingList):
 
         return dt
 
-    def _download_archive(self, url, params, filepath):
-        r = self.client.fetch(url, payload=params, stream=True)
-
-        try:
-            with open(filepath, 'wb') as fd:
-                fd.write(r.raw.read())
-        except OSError as e:
-            logger.warning("Ignoring %s archive due to: %s", url, str(e))
-            return False
-
-        logger.debug("%s archive downloaded and stored in %s", url, filepath)
-
-        return True
+    def _fetch_archive(self, url, params, headers):
+        return self.client.fetch(url, payload=params, headers=headers, stream=True)
 
 
 class HyperKittyCommand(BackendCommand):
@@ -274,6 +274,18 @@ class HyperKittyCommand(BackendCommand):
         group = parser.parser.add_argument_group('HyperKitty arguments')
         group.add_argument('--mboxes-path', dest='mboxes_path',
                            help="Path where mbox files will be stored")
+        group.add_argument('--parse-workers', dest='parse_workers',
+                           type=int, default=None,
+                           help="Number of processes parsing the mboxes in parallel")
+        group.add_argument('--mbox-index', dest='mbox_index',
+                           action='store_true',
+                           help="Index the messages of each mbox to speed up incremental fetches")
+        group.add_argument('--headers-only', dest='headers_only',
+                           action='store_true',
+                           help="Fetch only the headers of the messages")
+        group.add_argument('--download-workers', dest='download_workers',
+                           type=int, default=1,
+                           help="Number of mboxes downloaded at the same time")
 
         # Required arguments
         parser.parser.add_argument('url',
@@ -53,13 +53,15 @@ class Jenkins(Backend):
     :param detail_depth: control the detail level of the data returned by the API
     :param sleep_time: minimun waiting time due to a timeout connection exception
     :param archive: collect builds already retrieved from an archive
+    :param http_cache: `HttpCache` used to send conditional requests
     """
-    version = '0.11.2'
+    version = '0.12.0'
 
     CATEGORIES = [CATEGORY_BUILD]
 
     def __init__(self, url, tag=None, archive=None,
-                 blacklist_jobs=None, detail_depth=DETAIL_DEPTH, sleep_time=SLEEP_TIME):
+                 blacklist_jobs=None, detail_depth=DETAIL_DEPTH, sleep_time=SLEEP_TIME,
+                 http_cache=None):
         origin = url
 
         super().__init__(origin, tag=tag, archive=archive)
@@ -67,6 +69,7 @@ class Jenkins(Backend):
         self.sleep_time = sleep_time
         self.blacklist_jobs = blacklist_jobs
         self.detail_depth = detail_depth
+        self.http_cache = http_cache
 
         self.client = None
 
@@ -186,7 +189,8 @@ class Jenkins(Backend):
 
         return JenkinsClient(self.url, self.blacklist_jobs, self.detail_depth,
                              self.sleep_time,
-                             archive=self.archive, from_archive=from_archive)
+                             archive=self.archive, from_archive=from_archive,
+                             cache=self.http_cache)
 
 
 class JenkinsClient(HttpClient):
@@ -204,6 +208,7 @@ class JenkinsClient(HttpClient):
     :param sleep_time: minimun waiting time due to a timeout connection exception
     :param archive: an archive to store/read fetched data
     :param from_archive: it tells whether to write/read the archive
+    :param cache: `HttpCache` used to send conditional requests
 
     :raises HTTPError: when an error occurs doing the request
     """
@@ -211,9 +216,9 @@ class JenkinsClient(HttpClient):
     MAX_RETRIES = 5
 
     def __init__(self, url, blacklist_jobs=None, detail_depth=DETAIL_DEPTH, sleep_time=SLEEP_TIME,
-                 archive=None, from_archive=False):
+                 archive=None, from_archive=False, cache=None):
         super().__init__(url, sleep_time=sleep_time, extra_status_forcelist=self.EXTRA_STATUS_FORCELIST,
-                         archive=archive, from_archive=from_archive)
+                         archive=archive, from_archive=from_archive, cache=cache)
         self.blacklist_jobs = blacklist_jobs
         self.detail_depth = detail_depth
 
@@ -248,7 +253,7 @@ class JenkinsCommand(BackendCommand):
     def setup_cmd_parser():
         """Returns the Jenkins argument parser."""
 
-        parser = BackendCommandArgumentParser(archive=True)
+        parser = BackendCommandArgumentParser(archive=True, http_cache=True)
 
         # Jenkins options
         group = parser.parser.add_argument_group('Jenkins arguments')
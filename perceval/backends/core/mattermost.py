@@ -69,15 +69,17 @@ class Mattermost(Backend):
          it will be reset
     :param sleep_time: minimun waiting time to avoid too many request
          exception
+    :param rate_limiter: `SharedRateLimiter` used to share the rate limit
+        with other processes
     """
-    version = '0.1.0'
+    version = '0.2.0'
 
     CATEGORIES = [CATEGORY_POST]
 
     def __init__(self, url, channel, api_token, max_items=MAX_ITEMS,
                  tag=None, archive=None,
                  sleep_for_rate=False, min_rate_to_sleep=MIN_RATE_LIMIT,
-                 sleep_time=DEFAULT_SLEEP_TIME):
+                 sleep_time=DEFAULT_SLEEP_TIME, rate_limiter=None):
         origin = urijoin(url, channel)
 
         super().__init__(origin, tag=tag, archive=archive)
@@ -88,6 +90,7 @@ class Mattermost(Backend):
         self.sleep_for_rate = sleep_for_rate
         self.min_rate_to_sleep = min_rate_to_sleep
         self.sleep_time = sleep_time
+        self.rate_limiter = rate_limiter
         self.client = None
 
         self._users = {}
@@ -229,7 +232,8 @@ class Mattermost(Backend):
                                 sleep_for_rate=self.sleep_for_rate,
                                 min_rate_to_sleep=self.min_rate_to_sleep,
                                 sleep_time=self.sleep_time,
-                                archive=self.archive, from_archive=from_archive)
+                                archive=self.archive, from_archive=from_archive,
+                                rate_limiter=self.rate_limiter)
 
     def _parse_posts(self, raw_posts):
         """Parse posts and returns in order."""
@@ -270,6 +274,8 @@ class MattermostClient(HttpClient, RateLimitHandler):
         of connection problems
     :param archive: an archive to store/read fetched data
     :param from_archive: it tells whether to write/read the archive
+    :param rate_limiter: `SharedRateLimiter` used to share the rate limit
+        with other processes
     """
     API_URL = urijoin('%(base_url)s', 'api', 'v4', '%(entrypoint)s')
 
@@ -283,7 +289,7 @@ class MattermostClient(HttpClient, RateLimitHandler):
     def __init__(self, base_url, api_token, max_items=MAX_ITEMS,
                  sleep_for_rate=False, min_rate_to_sleep=MIN_RATE_LIMIT,
                  sleep_time=DEFAULT_SLEEP_TIME,
-                 archive=None, from_archive=False):
+                 archive=None, from_archive=False, rate_limiter=None):
         self.api_token = api_token
         self.max_items = max_items
 
@@ -292,7 +298,8 @@ class MattermostClient(HttpClient, RateLimitHandler):
                          extra_headers=self._set_extra_headers(),
                          archive=archive, from_archive=from_archive)
         super().setup_rate_limit_handler(sleep_for_rate=sleep_for_rate,
-                                         min_rate_to_sleep=min_rate_to_sleep)
+                                         min_rate_to_sleep=min_rate_to_sleep,
+                                         rate_limiter=rate_limiter)
 
     def posts(self, channel, page=None):
         """Fetch the history of a channel."""
@@ -391,7 +398,8 @@ class MattermostCommand(BackendCommand):
 
         parser = BackendCommandArgumentParser(from_date=True,
                                               token_auth=True,
-                                              archive=True)
+                                              archive=True,
+                                              rate_limiter=True)
 
         # Mattermost options
         group = parser.parser.add_argument_group('Mattermost arguments')
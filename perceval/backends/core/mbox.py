@@ -23,15 +23,23 @@
 # Note: some ot this code was taken from the MailingListStats project
 #
 
+import collections
+import concurrent.futures
+import functools
+import io
+import json
 import logging
 import mailbox
+import mmap
+import multiprocessing
 import os
+import re
+import shutil
 import tempfile
-
-import gzip
-import bz2
 import zipfile
 
+import requests
+
 from grimoirelab_toolkit.datetime import (InvalidDateError,
                                           datetime_to_utc,
                                           str_to_datetime)
@@ -40,8 +48,11 @@ from ...backend import (Backend,
                         BackendCommand,
                         BackendCommandArgumentParser)
 from ...utils import (DEFAULT_DATETIME,
+                      LazyMessage,
                       check_compressed_file_type,
-                      message_to_dict)
+                      message_to_dict,
+                      open_compressed_file,
+                      pool_imap)
 
 CATEGORY_MESSAGE = "message"
 
@@ -61,20 +72,36 @@ class MBox(Backend):
     :param dirpath: directory path where the mboxes are stored
     :param tag: label used to mark the data
     :param archive: archive to store/retrieve items
+    :param parse_workers: number of processes parsing the mboxes; when
+        it is greater than one, each mbox is parsed by a worker and the
+        messages are returned in the same order
+    :param mbox_index: keep an index of the messages of each mbox in a
+        file next to it, to skip the messages sent before `from_date`
+        without parsing them
+    :param headers_only: fetch only the headers of the messages; their
+        bodies are neither parsed nor included in the items
     """
-    version = '0.11.0'
+    version = '0.15.0'
 
     CATEGORIES = [CATEGORY_MESSAGE]
 
     DATE_FIELD = 'Date'
     MESSAGE_ID_FIELD = 'Message-ID'
 
-    def __init__(self, uri, dirpath, tag=None, archive=None):
+    def __init__(self, uri, dirpath, tag=None, archive=None, parse_workers=None,
+                 mbox_index=False, headers_only=False):
         origin = uri
 
+        if parse_workers is not None and parse_workers < 1:
+            msg = "parse_workers must be greater than 0; %s given" % parse_workers
+            raise ValueError(msg)
+
         super().__init__(origin, tag=tag, archive=archive)
         self.uri = uri
         self.dirpath = dirpath
+        self.parse_workers = parse_workers
+        self.mbox_index = mbox_index
+        self.headers_only = headers_only
 
     def fetch(self, category=CATEGORY_MESSAGE, from_date=DEFAULT_DATETIME):
         """Fetch the messages from a set of mbox files.
@@ -166,21 +193,27 @@ class MBox(Backend):
         return CATEGORY_MESSAGE
 
     @staticmethod
-    def parse_mbox(filepath):
+    def parse_mbox(filepath, headers_only=False):
         """Parse a mbox file.
 
         This method parses a mbox file and returns an iterator of dictionaries.
         Each one of this contains an email message.
 
         :param filepath: path of the mbox to parse
+        :param headers_only: parse only the headers of the messages
+
+        The mbox is read in place; compressed files are decompressed
+        on the fly, so no temporary copy of it is written. Only the
+        headers of the messages are parsed at first; their fields are
+        decoded and their bodies parsed when they are accessed.
 
         :returns : generator of messages; each message is stored in a
             dictionary of type `requests.structures.CaseInsensitiveDict`
         """
-        mbox = _MBox(filepath, create=False)
+        mbox = _MBoxReader(MBoxArchive(filepath))
 
-        for msg in mbox:
-            message = message_to_dict(msg)
+        for _, _, data in mbox.read(raw=True):
+            message = _lazy_message_to_dict(data, headers_only=headers_only)
             yield message
 
     def _init_client(self, from_archive=False):
@@ -193,121 +226,377 @@ class MBox(Backend):
 
         nmsgs, imsgs, tmsgs = (0, 0, 0)
 
-        for mbox in mailing_list.mboxes:
-            tmp_path = None
-
-            try:
-                tmp_path = self._copy_mbox(mbox)
-
-                for message in self.parse_mbox(tmp_path):
-                    tmsgs += 1
+        if self.parse_workers and self.parse_workers > 1:
+            mboxes = self.__parse_mboxes_in_parallel(mailing_list.mboxes, from_date)
+        else:
+            mboxes = self.__parse_mboxes(mailing_list.mboxes, from_date)
 
-                    if not self._validate_message(message):
-                        imsgs += 1
-                        continue
+        for message in mboxes:
+            tmsgs += 1
 
-                    # Ignore those messages sent before the given date
-                    dt = str_to_datetime(message[MBox.DATE_FIELD])
+            # Invalid messages are returned as None
+            if message is None:
+                imsgs += 1
+                continue
 
-                    if dt < from_date:
-                        logger.debug("Message %s sent before %s; skipped",
-                                     message['unixfrom'], str(from_date))
-                        tmsgs -= 1
-                        continue
+            nmsgs += 1
+            logger.debug("Message %s parsed", message['unixfrom'])
 
-                    # Convert 'CaseInsensitiveDict' to dict
-                    message = self._casedict_to_dict(message)
+            yield message
 
-                    nmsgs += 1
-                    logger.debug("Message %s parsed", message['unixfrom'])
+        logger.info("Done. %s/%s messages fetched; %s ignored",
+                    nmsgs, tmsgs, imsgs)
 
+    def __parse_mboxes(self, mboxes, from_date):
+        for mbox in mboxes:
+            try:
+                for message in self._parse_mbox_archive(mbox.filepath, from_date,
+                                                        mbox_index=self.mbox_index,
+                                                        headers_only=self.headers_only):
                     yield message
             except (OSError, EOFError) as e:
                 logger.warning("Ignoring %s mbox due to: %s", mbox.filepath, str(e))
-            except Exception as e:
-                if tmp_path and os.path.exists(tmp_path):
-                    os.remove(tmp_path)
-                raise e
-            finally:
-                if tmp_path and os.path.exists(tmp_path):
-                    os.remove(tmp_path)
 
-        logger.info("Done. %s/%s messages fetched; %s ignored",
-                    nmsgs, tmsgs, imsgs)
+    def __parse_mboxes_in_parallel(self, mboxes, from_date):
+        """Parse the mboxes using a pool of processes.
+
+        Each worker parses, validates and filters the messages of
+        one mbox. Results are returned in the order of the mboxes,
+        so messages keep the order of a sequential fetch. No more
+        than twice `parse_workers` parsed mboxes are kept waiting
+        to be consumed.
+        """
+        jobs = [(self.__class__, mbox.filepath, from_date, self.mbox_index, self.headers_only)
+                for mbox in mboxes]
+
+        if not jobs:
+            return
+
+        logger.debug("Parsing %s mboxes from '%s' using %s workers",
+                     len(jobs), self.uri, self.parse_workers)
+
+        workers = min(self.parse_workers, len(jobs))
+        pool = multiprocessing.Pool(processes=workers)
+
+        try:
+            for filepath, messages, ignored in pool_imap(pool, _parse_mbox_job, jobs,
+                                                         max_pending=workers * 2):
+                for message in messages:
+                    yield message
+
+                if ignored:
+                    logger.warning("Ignoring %s mbox due to: %s", filepath, ignored)
+        finally:
+            pool.terminate()
+            pool.join()
+
+    @classmethod
+    def _parse_mbox_archive(cls, filepath, from_date, mbox_index=False, headers_only=False):
+        """Parse the messages of a mbox sent since a given date.
+
+        Invalid messages are returned as None, so they can be counted;
+        messages sent before `from_date` are skipped.
+        """
+        if mbox_index:
+            for message in cls._parse_indexed_mbox_archive(filepath, from_date,
+                                                           headers_only=headers_only):
+                yield message
+            return
+
+        for message in cls.parse_mbox(filepath, headers_only=headers_only):
+            if not cls._validate_message(message):
+                yield None
+                continue
+
+            # Ignore those messages sent before the given date
+            dt = str_to_datetime(message[cls.DATE_FIELD])
+
+            if dt < from_date:
+                logger.debug("Message %s sent before %s; skipped",
+                             message['unixfrom'], str(from_date))
+                continue
+
+            # Convert 'CaseInsensitiveDict' to dict
+            yield cls._casedict_to_dict(message)
+
+    @classmethod
+    def _parse_indexed_mbox_archive(cls, filepath, from_date, headers_only=False):
+        """Parse the messages of a mbox sent since a given date using its index.
+
+        When the index of the mbox is up to date, only the messages
+        sent since `from_date` are read; the mbox is not even opened
+        when there are none. Otherwise, the whole mbox is parsed and
+        its index is written again.
+        """
+        stat = os.stat(filepath)
+        index = MBoxIndex(filepath)
+        entries = index.load(stat)
+
+        if entries is not None:
+            logger.debug("Reading %s mbox using its index", filepath)
+
+            ts = from_date.timestamp()
+
+            # Invalid messages do not have a date
+            selected = [entry for entry in entries
+                        if entry.timestamp is None or entry.timestamp >= ts]
+            positions = [(entry.offset, entry.size) for entry in selected
+                         if entry.timestamp is not None]
+
+            if positions:
+                mbox = _MBoxReader(MBoxArchive(filepath), headers_only=headers_only)
+                msgs = mbox.read_at(positions)
+
+            for entry in selected:
+                if entry.timestamp is None:
+                    yield None
+                    continue
+
+                message = message_to_dict(next(msgs), headers_only=headers_only)
+                yield cls._casedict_to_dict(message)
+            return
+
+        entries = []
+        mbox = _MBoxReader(MBoxArchive(filepath))
+
+        for offset, size, data in mbox.read(raw=True):
+            message = _lazy_message_to_dict(data, headers_only=headers_only)
+
+            if not cls._validate_message(message):
+                entries.append(MBoxIndexEntry(offset, size, None, None))
+                yield None
+                continue
 
-    def _copy_mbox(self, mbox):
-        """Copy the contents of a mbox to a temporary file"""
+            dt = str_to_datetime(message[cls.DATE_FIELD])
+            entries.append(MBoxIndexEntry(offset, size, dt.timestamp(),
+                                          message[cls.MESSAGE_ID_FIELD]))
 
-        tmp_path = tempfile.mktemp(prefix='perceval_')
+            if dt < from_date:
+                logger.debug("Message %s sent before %s; skipped",
+                             message['unixfrom'], str(from_date))
+                continue
 
-        with mbox.container as f_in:
-            with open(tmp_path, mode='wb') as f_out:
-                for l in f_in:
-                    f_out.write(l)
-        return tmp_path
+            yield cls._casedict_to_dict(message)
 
-    def _validate_message(self, message):
+        # Do not index a mbox modified while it was parsed
+        if os.stat(filepath) == stat:
+            index.save(stat, entries)
+
+    @classmethod
+    def _validate_message(cls, message):
         """Check if the given message has the mandatory fields"""
 
         # This check is "case insensitive" because we're
         # using 'CaseInsensitiveDict' from requests.structures
         # module to store the contents of a message.
-        if self.MESSAGE_ID_FIELD not in message:
+        if cls.MESSAGE_ID_FIELD not in message:
             logger.warning("Field 'Message-ID' not found in message %s; ignoring",
                            message['unixfrom'])
             return False
 
-        if not message[self.MESSAGE_ID_FIELD]:
+        if not message[cls.MESSAGE_ID_FIELD]:
             logger.warning("Field 'Message-ID' is empty in message %s; ignoring",
                            message['unixfrom'])
             return False
 
-        if self.DATE_FIELD not in message:
+        if cls.DATE_FIELD not in message:
             logger.warning("Field 'Date' not found in message %s; ignoring",
                            message['unixfrom'])
             return False
 
-        if not message[self.DATE_FIELD]:
+        if not message[cls.DATE_FIELD]:
             logger.warning("Field 'Date' is empty in message %s; ignoring",
                            message['unixfrom'])
             return False
 
         try:
-            str_to_datetime(message[self.DATE_FIELD])
+            str_to_datetime(message[cls.DATE_FIELD])
         except InvalidDateError:
             logger.warning("Invalid date %s in message %s; ignoring",
-                           message[self.DATE_FIELD], message['unixfrom'])
+                           message[cls.DATE_FIELD], message['unixfrom'])
             return False
 
         return True
 
-    def _casedict_to_dict(self, message):
+    @classmethod
+    def _casedict_to_dict(cls, message):
         """Convert a message in CaseInsensitiveDict to dict.
 
         This method also converts well known problematic headers,
         such as Message-ID and Date to a common name.
         """
-        message_id = message.pop(self.MESSAGE_ID_FIELD)
-        date = message.pop(self.DATE_FIELD)
+        message_id = message.pop(cls.MESSAGE_ID_FIELD)
+        date = message.pop(cls.DATE_FIELD)
 
         msg = {k: v for k, v in message.items()}
-        msg[self.MESSAGE_ID_FIELD] = message_id
-        msg[self.DATE_FIELD] = date
+        msg[cls.MESSAGE_ID_FIELD] = message_id
+        msg[cls.DATE_FIELD] = date
 
         return msg
 
 
-class _MBox(mailbox.mbox):
-    """Wrapper of `mailbox.mbox` to catch unhandled errors"""
+class _MBoxReader:
+    """Read the messages of a mbox archive without copying it.
+
+    Messages are split following the rules of `mailbox.mbox`: each
+    message starts on a line beginning with 'From ' and the empty
+    line found before the next 'From ' line is not part of it. Any
+    data before the first 'From ' line is ignored.
+
+    Plain archives are mapped into memory and the 'From ' lines are
+    searched directly on the map. Compressed archives are decompressed
+    on the fly and read line by line using large buffered reads.
+
+    When `headers_only` is set, the body of each message is dropped
+    before building it, so its parts and attachments are not parsed.
+
+    :param mbox: `MBoxArchive` to read
+    :param headers_only: build the messages only with their headers
+    """
+    FROM_LINE = b'From '
+    NEXT_FROM_LINE = b'\nFrom '
+    HEADERS_END = re.compile(b'(?:^|\n)\r?\n')
+
+    # Size of the buffer used to read compressed archives
+    READ_BUFFER_SIZE = 1024 * 1024
+
+    def __init__(self, mbox, headers_only=False):
+        self.mbox = mbox
+        self.headers_only = headers_only
+
+    def __iter__(self):
+        for _, data in self._split_messages():
+            yield self._build_message(data)
+
+    def read(self, raw=False):
+        """Read the messages of the archive and their positions.
 
-    def get_message(self, key):
-        """Return a Message representation or raise a KeyError."""
+        The position of a message is given by its offset and size in
+        the uncompressed data of the archive.
 
-        start, stop = self._lookup(key)
-        self._file.seek(start)
-        from_line = self._file.readline().replace(mailbox.linesep, b'')
-        string = self._file.read(stop - self._file.tell())
-        msg = self._message_factory(string.replace(mailbox.linesep, b'\n'))
+        :param raw: return the raw data of the messages instead of
+            building them; see `build_message`
+
+        :returns: a generator of (offset, size, message) tuples
+        """
+        for offset, data in self._split_messages():
+            message = data if raw else self._build_message(data)
+            yield offset, len(data), message
+
+    def read_at(self, positions):
+        """Read the messages stored on the given positions.
+
+        Messages of plain archives are read directly from their
+        positions. Compressed archives cannot be accessed randomly,
+        so they are split again but only the messages found on
+        the given positions are built.
+
+        :param positions: list of (offset, size) tuples, sorted by offset
+
+        :returns: a generator of messages
+        """
+        if not positions:
+            return
+
+        if self.mbox.is_compressed():
+            offsets = {offset for offset, _ in positions}
+
+            for offset, data in self._split_messages():
+                if offset in offsets:
+                    yield self._build_message(data)
+            return
+
+        with open(self.mbox.filepath, mode='rb') as fd:
+            with mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for offset, size in positions:
+                    yield self._build_message(mapped[offset:offset + size])
+
+    def _split_messages(self):
+        """Get the offset and the raw data of each message of the archive"""
+
+        if self.mbox.is_compressed():
+            with io.BufferedReader(self.mbox.container,
+                                   buffer_size=self.READ_BUFFER_SIZE) as fd:
+                for data in self._split_stream(fd):
+                    yield data
+            return
+
+        with open(self.mbox.filepath, mode='rb') as fd:
+            # Empty files cannot be mapped
+            if os.fstat(fd.fileno()).st_size == 0:
+                return
+
+            with mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for data in self._split_mmap(mapped):
+                    yield data
+
+    def _split_mmap(self, data):
+        size = len(data)
+
+        if data[:len(self.FROM_LINE)] == self.FROM_LINE:
+            start = 0
+        else:
+            start = data.find(self.NEXT_FROM_LINE)
+            if start < 0:
+                return
+            start += 1
+
+        while start < size:
+            end = data.find(self.NEXT_FROM_LINE, start)
+            end = end + 1 if end >= 0 else size
+
+            # Skip the empty line before the next message
+            stop = end - 1 if data[end - 2:end] == b'\n\n' else end
+
+            yield start, data[start:stop]
+            start = end
+
+    def _split_stream(self, fd):
+        lines = None
+        last_was_empty = False
+        offset, pos = 0, 0
+
+        for line in fd:
+            if line.startswith(self.FROM_LINE):
+                if lines:
+                    yield offset, self._join_lines(lines, last_was_empty)
+                lines = [line]
+                last_was_empty = False
+                offset = pos
+            elif lines:
+                lines.append(line)
+                last_was_empty = (line == b'\n')
+            pos += len(line)
+
+        if lines:
+            yield offset, self._join_lines(lines, last_was_empty)
+
+    @staticmethod
+    def _join_lines(lines, last_was_empty):
+        # Skip the empty line before the next message
+        if last_was_empty:
+            lines.pop()
+        return b''.join(lines)
+
+    def _build_message(self, data):
+        return self.build_message(data, headers_only=self.headers_only)
+
+    @classmethod
+    def build_message(cls, data, headers_only=False):
+        """Build a message from its raw data, including its 'From ' line
+
+        :param data: raw data of the message
+        :param headers_only: drop the body before building the message
+        """
+        from_line, _, string = data.partition(b'\n')
+
+        if headers_only:
+            # Headers end on the first empty line
+            match = cls.HEADERS_END.search(string)
+            if match:
+                string = string[:match.start() + 1]
+
+        msg = mailbox.mboxMessage(string)
 
         try:
             msg.set_from(from_line[5:].decode('ascii'))
@@ -323,6 +612,99 @@ class _MBox(mailbox.mbox):
         return msg
 
 
+MBoxIndexEntry = collections.namedtuple('MBoxIndexEntry',
+                                        ['offset', 'size', 'timestamp', 'message_id'])
+
+
+class MBoxIndex:
+    """Index of the messages stored in a mbox archive.
+
+    The index is saved in a file next to the archive, named after it
+    plus the suffix `.mboxidx`. For each message, it stores its offset
+    and size in the uncompressed data of the archive, the timestamp
+    of its date and its Message-ID. Invalid messages are stored with
+    no timestamp.
+
+    An index is only valid while the size and the modification time
+    of its archive do not change.
+
+    :param filepath: path to the mbox file
+    """
+    VERSION = 1
+    SUFFIX = '.mboxidx'
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.index_filepath = filepath + self.SUFFIX
+
+    def load(self, stat):
+        """Load the entries of the index.
+
+        :param stat: `os.stat_result` of the archive
+
+        :returns: a list of `MBoxIndexEntry` or `None` when the
+            index does not exist or it is outdated
+        """
+        try:
+            with open(self.index_filepath, 'r') as fd:
+                index = json.load(fd)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring index of %s mbox due to: %s", self.filepath, str(e))
+            return None
+
+        try:
+            if index['version'] != self.VERSION or \
+                    index['size'] != stat.st_size or \
+                    index['mtime'] != stat.st_mtime_ns:
+                logger.debug("Index of %s mbox is outdated", self.filepath)
+                return None
+
+            entries = [MBoxIndexEntry(*entry) for entry in index['messages']]
+        except (KeyError, TypeError):
+            logger.warning("Ignoring index of %s mbox due to: invalid format", self.filepath)
+            return None
+
+        return entries
+
+    def save(self, stat, entries):
+        """Save the entries of the index.
+
+        The index is written to a temporary file which replaces the
+        previous one, so readers never find a partial index. Errors
+        writing it are logged and ignored.
+
+        :param stat: `os.stat_result` of the archive
+        :param entries: list of `MBoxIndexEntry`
+        """
+        index = {
+            'version': self.VERSION,
+            'size': stat.st_size,
+            'mtime': stat.st_mtime_ns,
+            'messages': entries
+        }
+
+        dirpath, filename = os.path.split(self.index_filepath)
+
+        try:
+            fd, tmp_filepath = tempfile.mkstemp(prefix=filename + '.', suffix=self.SUFFIX,
+                                                dir=dirpath or None)
+        except OSError as e:
+            logger.warning("Index of %s mbox not saved due to: %s", self.filepath, str(e))
+            return
+
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(index, f)
+            os.replace(tmp_filepath, self.index_filepath)
+        except OSError as e:
+            logger.warning("Index of %s mbox not saved due to: %s", self.filepath, str(e))
+            os.remove(tmp_filepath)
+        else:
+            logger.debug("Index of %s mbox saved", self.filepath)
+
+
 class MBoxCommand(BackendCommand):
     """Class to run MBox backend from the command line."""
 
@@ -340,6 +722,18 @@ class MBoxCommand(BackendCommand):
         parser.parser.add_argument('dirpath',
                                    help="Path to the mbox directory")
 
+        # Optional arguments
+        group = parser.parser.add_argument_group('MBox arguments')
+        group.add_argument('--parse-workers', dest='parse_workers',
+                           type=int, default=None,
+                           help="Number of processes parsing the mboxes in parallel")
+        group.add_argument('--mbox-index', dest='mbox_index',
+                           action='store_true',
+                           help="Index the messages of each mbox to speed up incremental fetches")
+        group.add_argument('--headers-only', dest='headers_only',
+                           action='store_true',
+                           help="Fetch only the headers of the messages")
+
         return parser
 
 
@@ -347,7 +741,7 @@ class MBoxArchive(object):
     """Class to access a mbox archive.
 
     MBOX archives can be stored into plain or compressed files
-    (gzip, bz2 or zip).
+    (gzip, bz2, xz, zstd or zip).
 
     :param filepath: path to the mbox file
     """
@@ -361,19 +755,15 @@ class MBoxArchive(object):
 
     @property
     def container(self):
-        if not self.is_compressed():
-            return open(self.filepath, mode='rb')
-
-        if self.compressed_type == 'bz2':
-            return bz2.open(self.filepath, mode='rb')
-        elif self.compressed_type == 'gz':
-            return gzip.open(self.filepath, mode='rb')
-        elif self.compressed_type == "zip":
+        if self.compressed_type == "zip":
             _zip = zipfile.ZipFile(self.filepath)
             if len(_zip.infolist()) > 1:
                 logger.error("Zip %s contains more than one file, only the first uncompressed", self.filepath)
             return _zip.open(_zip.infolist()[0].filename)
 
+        # Readers buffer the content of the container by themselves
+        return open_compressed_file(self.filepath, buffered=False)
+
     @property
     def compressed_type(self):
         return self._compressed
@@ -382,15 +772,224 @@ class MBoxArchive(object):
         return self._compressed is not None
 
 
+class MBoxDownloader:
+    """Download the mbox archives of a mailing list.
+
+    Archives are downloaded by a pool of `max_workers` threads and
+    each one is written to a temporary file which replaces the local
+    copy once it is complete.
+
+    The validators of each response (the `ETag`, `Last-Modified` and
+    `Content-Length` headers) are saved in a file next to the archive,
+    named after it plus `.validators`. The next download of the archive
+    is a conditional request; when the server replies `304 Not Modified`,
+    the local archive is kept as it is. Validators are not sent when
+    the size of the local archive does not match the recorded length.
+    When the server returns neither `ETag` nor `Last-Modified`, no
+    validators are saved and the archive is always downloaded.
+
+    Archives which cannot be requested due to connection errors are
+    ignored; HTTP errors are raised.
+
+    :param fetch: function to request an archive; it receives the URL,
+        the parameters and the headers of the request and returns a
+        streamed `requests.Response`, or `None` to ignore the archive
+    :param write: function to write a response into a file; by default,
+        the raw content of the response is written
+    :param max_workers: maximum number of concurrent downloads
+    """
+    VALIDATORS_SUFFIX = '.validators'
+    PARTIAL_SUFFIX = '.part'
+
+    def __init__(self, fetch, write=None, max_workers=1):
+        if max_workers < 1:
+            msg = "max_workers must be greater than 0; %s given" % max_workers
+            raise ValueError(msg)
+
+        self.fetch = fetch
+        self.write = write or self._write_raw
+        self.max_workers = max_workers
+
+    def download(self, archives):
+        """Download a list of archives.
+
+        :param archives: list of (url, params, filepath) tuples
+
+        :returns: a list with the URL and the path of the archives
+            which are up to date, in the same order they were given;
+            ignored archives are not included
+        """
+        if self.max_workers == 1 or len(archives) < 2:
+            results = [self._download(url, params, filepath)
+                       for url, params, filepath in archives]
+        else:
+            results = self.__download_concurrently(archives)
+
+        fetched = [(url, filepath)
+                   for (url, _, filepath), result in zip(archives, results) if result is not False]
+
+        nmodified = sum(1 for result in results if result is True)
+        logger.debug("%s/%s archives modified", nmodified, len(fetched))
+
+        return fetched
+
+    def __download_concurrently(self, archives):
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers)
+        tasks = []
+
+        try:
+            tasks = [executor.submit(self._download, url, params, filepath)
+                     for url, params, filepath in archives]
+            results = [task.result() for task in tasks]
+        finally:
+            for task in tasks:
+                task.cancel()
+            executor.shutdown(wait=True)
+
+        return results
+
+    def _download(self, url, params, filepath):
+        """Download an archive when it was modified.
+
+        :returns: `True` when the archive was downloaded, `None` when
+            it was not modified and `False` when it was ignored
+        """
+        headers = self._conditional_headers(url, params, filepath)
+
+        try:
+            r = self.fetch(url, params, headers)
+        except requests.exceptions.HTTPError:
+            raise
+        except OSError as e:
+            # Connection errors and timeouts are also OSErrors
+            logger.warning("Ignoring %s archive due to: %s", url, str(e))
+            return False
+
+        if r is None:
+            return False
+
+        try:
+            if r.status_code == 304:
+                logger.debug("%s archive not modified", url)
+                return None
+
+            self._store_archive(r, filepath)
+        except OSError as e:
+            logger.warning("Ignoring %s archive due to: %s", url, str(e))
+            return False
+        finally:
+            r.close()
+
+        self._save_validators(url, params, filepath, r.headers)
+
+        logger.debug("%s archive downloaded and stored in %s", url, filepath)
+
+        return True
+
+    def _store_archive(self, r, filepath):
+        dirpath, filename = os.path.split(filepath)
+
+        fd, tmp_filepath = tempfile.mkstemp(prefix=filename + '.', suffix=self.PARTIAL_SUFFIX,
+                                            dir=dirpath or None)
+        os.close(fd)
+
+        try:
+            self.write(r, tmp_filepath)
+            os.replace(tmp_filepath, filepath)
+        except OSError:
+            if os.path.exists(tmp_filepath):
+                os.remove(tmp_filepath)
+            raise
+
+    def _conditional_headers(self, url, params, filepath):
+        validators = self._load_validators(filepath)
+
+        if not validators or validators['url'] != url or validators['params'] != params:
+            return None
+
+        try:
+            size = os.path.getsize(filepath)
+        except OSError:
+            return None
+
+        length = validators['content_length']
+        if length is not None and length != size:
+            logger.debug("Size of %s does not match; archive will be downloaded", filepath)
+            return None
+
+        headers = {}
+        if validators['etag']:
+            headers['If-None-Match'] = validators['etag']
+        if validators['last_modified']:
+            headers['If-Modified-Since'] = validators['last_modified']
+
+        return headers or None
+
+    def _load_validators(self, filepath):
+        try:
+            with open(filepath + self.VALIDATORS_SUFFIX, 'r') as fd:
+                validators = json.load(fd)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring validators of %s due to: %s", filepath, str(e))
+            return None
+
+        fields = ['url', 'params', 'etag', 'last_modified', 'content_length']
+
+        if not isinstance(validators, dict) or any(field not in validators for field in fields):
+            logger.warning("Ignoring validators of %s due to: invalid format", filepath)
+            return None
+
+        return validators
+
+    def _save_validators(self, url, params, filepath, headers):
+        etag = headers.get('ETag', None)
+        last_modified = headers.get('Last-Modified', None)
+        length = headers.get('Content-Length', None)
+
+        validators_filepath = filepath + self.VALIDATORS_SUFFIX
+
+        try:
+            # Old validators must not be sent along with a new archive
+            if not etag and not last_modified:
+                if os.path.exists(validators_filepath):
+                    os.remove(validators_filepath)
+                return
+
+            validators = {
+                'url': url,
+                'params': params,
+                'etag': etag,
+                'last_modified': last_modified,
+                'content_length': int(length) if length and length.isdigit() else None
+            }
+
+            with open(validators_filepath, 'w') as fd:
+                json.dump(validators, fd)
+        except OSError as e:
+            logger.warning("Validators of %s not saved due to: %s", filepath, str(e))
+
+    @staticmethod
+    def _write_raw(r, filepath):
+        with open(filepath, 'wb') as fd:
+            shutil.copyfileobj(r.raw, fd)
+
+
 class MailingList(object):
     """Manage mailing lists archives.
 
     This class gives access to the local mboxes archives that a
-    mailing list manages.
+    mailing list manages. Index, validators and partial download
+    files of the mboxes are ignored.
 
     :param uri: URI of the mailing lists, usually its URL address
     :param dirpath: path to the mboxes archives
     """
+    IGNORED_SUFFIXES = (MBoxIndex.SUFFIX,
+                        MBoxDownloader.VALIDATORS_SUFFIX,
+                        MBoxDownloader.PARTIAL_SUFFIX)
+
     def __init__(self, uri, dirpath):
         self.uri = uri
         self.dirpath = dirpath
@@ -413,9 +1012,46 @@ class MailingList(object):
         else:
             for root, _, files in os.walk(self.dirpath):
                 for filename in sorted(files):
+                    if filename.endswith(self.IGNORED_SUFFIXES):
+                        continue
                     try:
                         location = os.path.join(root, filename)
                         archives.append(MBoxArchive(location))
                     except OSError as e:
                         logger.warning("Ignoring %s mbox due to: %s", filename, str(e))
         return archives
+
+
+def _lazy_message_to_dict(data, headers_only=False):
+    """Convert the raw data of a message into a `LazyMessage`.
+
+    Only the headers of the message are parsed; the whole message
+    is parsed when its body is accessed.
+    """
+    msg = _MBoxReader.build_message(data, headers_only=True)
+
+    if headers_only:
+        return LazyMessage(msg, headers_only=True)
+
+    return LazyMessage(msg, parse_body=functools.partial(_MBoxReader.build_message, data))
+
+
+def _parse_mbox_job(job):
+    """Parse the messages of a mbox in a worker process.
+
+    When the mbox cannot be read until its end, the messages
+    parsed before the error are returned with its cause.
+    """
+    backend_class, filepath, from_date, mbox_index, headers_only = job
+
+    messages = []
+
+    try:
+        for message in backend_class._parse_mbox_archive(filepath, from_date,
+                                                         mbox_index=mbox_index,
+                                                         headers_only=headers_only):
+            messages.append(message)
+    except (OSError, EOFError) as e:
+        return filepath, messages, str(e)
+
+    return filepath, messages, None
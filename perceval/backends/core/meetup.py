@@ -67,15 +67,17 @@ class Meetup(Backend):
          it will be reset
     :param sleep_time: minimun waiting time to avoid too many request
          exception
+    :param rate_limiter: `SharedRateLimiter` used to share the rate limit
+        with other processes
     """
-    version = '0.11.6'
+    version = '0.12.0'
 
     CATEGORIES = [CATEGORY_EVENT]
 
     def __init__(self, group, api_token, max_items=MAX_ITEMS,
                  tag=None, archive=None,
                  sleep_for_rate=False, min_rate_to_sleep=MIN_RATE_LIMIT,
-                 sleep_time=SLEEP_TIME):
+                 sleep_time=SLEEP_TIME, rate_limiter=None):
         origin = MEETUP_URL
 
         super().__init__(origin, tag=tag, archive=archive)
@@ -85,6 +87,7 @@ class Meetup(Backend):
         self.sleep_for_rate = sleep_for_rate
         self.min_rate_to_sleep = min_rate_to_sleep
         self.sleep_time = sleep_time
+        self.rate_limiter = rate_limiter
 
         self.client = None
 
@@ -224,7 +227,8 @@ class Meetup(Backend):
 
         return MeetupClient(self.api_token, self.max_items,
                             self.sleep_for_rate, self.min_rate_to_sleep, self.sleep_time,
-                            self.archive, from_archive)
+                            self.archive, from_archive,
+                            rate_limiter=self.rate_limiter)
 
     def __fetch_and_parse_comments(self, event_id):
         logger.debug("Fetching and parsing comments from group '%s' event '%s'",
@@ -267,7 +271,8 @@ class MeetupCommand(BackendCommand):
         parser = BackendCommandArgumentParser(from_date=True,
                                               to_date=True,
                                               token_auth=True,
-                                              archive=True)
+                                              archive=True,
+                                              rate_limiter=True)
 
         # Meetup options
         group = parser.parser.add_argument_group('Meetup arguments')
@@ -306,6 +311,8 @@ class MeetupClient(HttpClient, RateLimitHandler):
         of connection problems
     :param archive: an archive to store/read fetched data
     :param from_archive: it tells whether to write/read the archive
+    :param rate_limiter: `SharedRateLimiter` used to share the rate limit
+        with other processes
     """
     EXTRA_STATUS_FORCELIST = [429]
     RCOMMENTS = 'comments'
@@ -332,14 +339,15 @@ class MeetupClient(HttpClient, RateLimitHandler):
 
     def __init__(self, api_key, max_items=MAX_ITEMS,
                  sleep_for_rate=False, min_rate_to_sleep=MIN_RATE_LIMIT, sleep_time=SLEEP_TIME,
-                 archive=None, from_archive=False):
+                 archive=None, from_archive=False, rate_limiter=None):
         self.api_key = api_key
         self.max_items = max_items
 
         super().__init__(MEETUP_API_URL, sleep_time=sleep_time,
                          extra_status_forcelist=self.EXTRA_STATUS_FORCELIST,
                          archive=archive, from_archive=from_archive)
-        super().setup_rate_limit_handler(sleep_for_rate=sleep_for_rate, min_rate_to_sleep=min_rate_to_sleep)
+        super().setup_rate_limit_handler(sleep_for_rate=sleep_for_rate, min_rate_to_sleep=min_rate_to_sleep,
+                                         rate_limiter=rate_limiter)
 
     def calculate_time_to_reset(self):
         """Number of seconds to wait. They are contained in the rate limit reset header"""
@@ -410,6 +418,11 @@ class MeetupClient(HttpClient, RateLimitHandler):
         for page in self._fetch(resource, params):
             yield page
 
+    def _rate_limit_token(self):
+        """Key used to access the API"""
+
+        return self.api_key
+
     @staticmethod
     def sanitize_for_archive(url, headers, payload):
         """Sanitize payload of a HTTP request by removing the token information
@@ -34,7 +34,7 @@ import requests
 from grimoirelab_toolkit.datetime import datetime_to_utc
 from grimoirelab_toolkit.uris import urijoin
 
-from .mbox import MBox, MailingList, CATEGORY_MESSAGE
+from .mbox import MBox, MBoxDownloader, MailingList, CATEGORY_MESSAGE
 from ...backend import (BackendCommand,
                         BackendCommandArgumentParser)
 from ...utils import DEFAULT_DATETIME
@@ -63,15 +63,22 @@ class Pipermail(MBox):
     :param verify: allows to disable SSL verification
     :param tag: label used to mark the data
     :param archive: archive to store/retrieve items
+    :param parse_workers: number of processes parsing the mboxes
+    :param mbox_index: keep an index of the messages of each mbox
+    :param headers_only: fetch only the headers of the messages
+    :param download_workers: number of mboxes downloaded at the same time
     """
-    version = '0.9.0'
+    version = '0.13.0'
 
     CATEGORIES = [CATEGORY_MESSAGE]
 
-    def __init__(self, url, dirpath, verify=True, tag=None, archive=None):
-        super().__init__(url, dirpath, tag=tag, archive=archive)
+    def __init__(self, url, dirpath, verify=True, tag=None, archive=None, parse_workers=None,
+                 mbox_index=False, headers_only=False, download_workers=1):
+        super().__init__(url, dirpath, tag=tag, archive=archive, parse_workers=parse_workers,
+                         mbox_index=mbox_index, headers_only=headers_only)
         self.url = url
         self.verify = verify
+        self.download_workers = download_workers
 
     def fetch(self, category=CATEGORY_MESSAGE, from_date=DEFAULT_DATETIME):
         """Fetch the messages from the Pipermail archiver.
@@ -101,7 +108,8 @@ class Pipermail(MBox):
         logger.info("Looking for messages from '%s' since %s",
                     self.url, str(from_date))
 
-        mailing_list = PipermailList(self.url, self.dirpath, self.verify)
+        mailing_list = PipermailList(self.url, self.dirpath, self.verify,
+                                     download_workers=self.download_workers)
         mailing_list.fetch(from_date=from_date)
 
         messages = self._fetch_and_parse_messages(mailing_list, from_date)
@@ -157,6 +165,18 @@ class PipermailCommand(BackendCommand):
         group.add_argument('--no-verify', dest='verify',
                            action='store_false',
                            help="Value 'True' enable SSL verification")
+        group.add_argument('--parse-workers', dest='parse_workers',
+                           type=int, default=None,
+                           help="Number of processes parsing the mboxes in parallel")
+        group.add_argument('--mbox-index', dest='mbox_index',
+                           action='store_true',
+                           help="Index the messages of each mbox to speed up incremental fetches")
+        group.add_argument('--headers-only', dest='headers_only',
+                           action='store_true',
+                           help="Fetch only the headers of the messages")
+        group.add_argument('--download-workers', dest='download_workers',
+                           type=int, default=1,
+                           help="Number of mboxes downloaded at the same time")
 
         # Required arguments
         parser.parser.add_argument('url',
@@ -172,14 +192,19 @@ class PipermailList(MailingList):
     from a mailing list stored by Pipermail. This class also allows
     to keep them in sync.
 
+    Archives are downloaded with `MBoxDownloader`, so those which
+    were not modified since the last fetch are not downloaded again.
+
     :param url: URL to the Pipermail archiver for this list
     :param dirpath: path to the local mboxes archives
     :param verify: allows to disable SSL verification
+    :param download_workers: number of archives downloaded at the same time
     """
-    def __init__(self, url, dirpath, verify=True):
+    def __init__(self, url, dirpath, verify=True, download_workers=1):
         super().__init__(url, dirpath)
         self.url = url
         self.verify = verify
+        self.download_workers = download_workers
 
     def fetch(self, from_date=DEFAULT_DATETIME):
         """Fetch the mbox files from the remote archiver.
@@ -211,7 +236,7 @@ class PipermailList(MailingList):
 
         links = self._parse_archive_links(r.text)
 
-        fetched = []
+        archives = []
 
         if not os.path.exists(self.dirpath):
             os.makedirs(self.dirpath)
@@ -226,10 +251,11 @@ class PipermailList(MailingList):
                 from_date < mbox_dt):
 
                 filepath = os.path.join(self.dirpath, filename)
-                success = self._download_archive(l, filepath)
+                archives.append((l, None, filepath))
 
-                if success:
-                    fetched.append((l, filepath))
+        downloader = MBoxDownloader(self._fetch_archive, write=self._write_archive,
+                                    max_workers=self.download_workers)
+        fetched = downloader.download(archives)
 
         logger.info("%s/%s MBoxes downloaded", len(fetched), len(links))
 
@@ -296,24 +322,19 @@ class PipermailList(MailingList):
 
         return dt
 
-    def _download_archive(self, url, filepath):
+    def _fetch_archive(self, url, params, headers):
         try:
-            r = requests.get(url, stream=True, verify=self.verify)
+            r = requests.get(url, params=params, headers=headers,
+                             stream=True, verify=self.verify)
             r.raise_for_status()
-            self._write_archive(r, filepath)
         except requests.exceptions.HTTPError as e:
             if e.response.status_code == 403:
                 logger.warning("Ignoring %s archive due to: %s", url, str(e))
-                return False
+                return None
             else:
                 raise e
-        except OSError as e:
-            logger.warning("Ignoring %s archive due to: %s", url, str(e))
-            return False
 
-        logger.debug("%s archive downloaded and stored in %s", url, filepath)
-
-        return True
+        return r
 
     @staticmethod
     def _write_archive(r, filepath):
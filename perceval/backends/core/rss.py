@@ -46,16 +46,18 @@ class RSS(Backend):
     :param url: RSS url
     :param tag: label used to mark the data
     :param archive: archive to store/retrieve items
+    :param http_cache: `HttpCache` used to send conditional requests
     """
-    version = '0.5.2'
+    version = '0.6.0'
 
     CATEGORIES = [CATEGORY_ENTRY]
 
-    def __init__(self, url, tag=None, archive=None):
+    def __init__(self, url, tag=None, archive=None, http_cache=None):
         origin = url
 
         super().__init__(origin, tag=tag, archive=archive)
         self.url = url
+        self.http_cache = http_cache
         self.client = None
 
     def fetch(self, category=CATEGORY_ENTRY):
@@ -145,7 +147,7 @@ class RSS(Backend):
     def _init_client(self, from_archive=False):
         """Init client"""
 
-        return RSSClient(self.url, self.archive, from_archive)
+        return RSSClient(self.url, self.archive, from_archive, cache=self.http_cache)
 
 
 class RSSClient(HttpClient):
@@ -157,12 +159,13 @@ class RSSClient(HttpClient):
     :param url: URL of rss node: https://item.opnfv.org/ci
     :param archive: an archive to store/read fetched data
     :param from_archive: it tells whether to write/read the archive
+    :param cache: `HttpCache` used to send conditional requests
 
     :raises HTTPError: when an error occurs doing the request
     """
 
-    def __init__(self, url, archive=None, from_archive=False):
-        super().__init__(url, archive=archive, from_archive=from_archive)
+    def __init__(self, url, archive=None, from_archive=False, cache=None):
+        super().__init__(url, archive=archive, from_archive=from_archive, cache=cache)
 
     def get_entries(self):
         """ Retrieve all entries from a RSS feed"""
@@ -180,7 +183,7 @@ class RSSCommand(BackendCommand):
     def setup_cmd_parser():
         """Returns the RSS argument parser."""
 
-        parser = BackendCommandArgumentParser(archive=True)
+        parser = BackendCommandArgumentParser(archive=True, http_cache=True)
 
         # Required arguments
         parser.parser.add_argument('url',
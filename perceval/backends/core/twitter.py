@@ -71,15 +71,17 @@ class Twitter(Backend):
          exception
     :param tag: label used to mark the data
     :param archive: archive to store/retrieve items
+    :param rate_limiter: `SharedRateLimiter` used to share the rate limit
+        with other processes
     """
-    version = '0.2.2'
+    version = '0.3.0'
 
     CATEGORIES = [CATEGORY_TWEET]
 
     def __init__(self, query, api_token, max_items=MAX_ITEMS,
                  sleep_for_rate=False, min_rate_to_sleep=MIN_RATE_LIMIT,
                  sleep_time=SLEEP_TIME,
-                 tag=None, archive=None):
+                 tag=None, archive=None, rate_limiter=None):
         origin = TWITTER_URL
 
         if len(query) >= MAX_SEARCH_QUERY:
@@ -93,6 +95,7 @@ class Twitter(Backend):
         self.sleep_for_rate = sleep_for_rate
         self.min_rate_to_sleep = min_rate_to_sleep
         self.sleep_time = sleep_time
+        self.rate_limiter = rate_limiter
 
         self.client = None
 
@@ -216,7 +219,8 @@ class Twitter(Backend):
 
         return TwitterClient(self.api_token, self.max_items,
                              self.sleep_for_rate, self.min_rate_to_sleep, self.sleep_time,
-                             self.archive, from_archive)
+                             self.archive, from_archive,
+                             rate_limiter=self.rate_limiter)
 
 
 class TwitterClient(HttpClient, RateLimitHandler):
@@ -234,10 +238,12 @@ class TwitterClient(HttpClient, RateLimitHandler):
         of connection problems
     :param archive: an archive to store/read fetched data
     :param from_archive: it tells whether to write/read the archive
+    :param rate_limiter: `SharedRateLimiter` used to share the rate limit
+        with other processes
     """
     def __init__(self, api_key, max_items=MAX_ITEMS,
                  sleep_for_rate=False, min_rate_to_sleep=MIN_RATE_LIMIT, sleep_time=SLEEP_TIME,
-                 archive=None, from_archive=False):
+                 archive=None, from_archive=False, rate_limiter=None):
         self.api_key = api_key
         self.max_items = max_items
 
@@ -245,7 +251,8 @@ class TwitterClient(HttpClient, RateLimitHandler):
                          archive=archive, from_archive=from_archive)
         super().setup_rate_limit_handler(sleep_for_rate=sleep_for_rate, min_rate_to_sleep=min_rate_to_sleep,
                                          rate_limit_header=RATE_LIMIT_HEADER,
-                                         rate_limit_reset_header=RATE_LIMIT_RESET_HEADER)
+                                         rate_limit_reset_header=RATE_LIMIT_RESET_HEADER,
+                                         rate_limiter=rate_limiter)
 
     def calculate_time_to_reset(self):
         """Number of seconds to wait. They are contained in the rate limit reset header"""
@@ -255,6 +262,11 @@ class TwitterClient(HttpClient, RateLimitHandler):
 
         return time_to_reset
 
+    def _rate_limit_token(self):
+        """Key used to access the API"""
+
+        return self.api_key
+
     @staticmethod
     def sanitize_for_archive(url, headers, payload):
         """Sanitize payload of a HTTP request by removing the token information
@@ -348,7 +360,8 @@ class TwitterCommand(BackendCommand):
         """Returns the Twitter argument parser."""
 
         parser = BackendCommandArgumentParser(token_auth=True,
-                                              archive=True)
+                                              archive=True,
+                                              rate_limiter=True)
 
         # Backend token is required
         action = parser.parser._option_string_actions['--api-token']
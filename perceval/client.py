@@ -20,13 +20,18 @@
 #     Valerio Cosentino <valcos@bitergia.com>
 #
 
+import hashlib
 import logging
+import os
+import sqlite3
 import time
+import urllib.parse
 
 import requests
 import urllib3.util
 
-from .errors import RateLimitError
+from .archive import Archive, decode_record, encode_record
+from .errors import ArchiveError, RateLimitError
 from ._version import __version__
 
 logger = logging.getLogger(__name__)
@@ -52,6 +57,7 @@ class HttpClient:
         before raising a RetryError exception
     :param sleep_time: time to sleep in case
         of connection problems
+    :param cache: `HttpCache` used to send conditional requests
     """
     version = '0.1.5'
 
@@ -76,9 +82,12 @@ class HttpClient:
     GET = "GET"
     POST = "POST"
 
+    # Headers of a 304 response which must not replace the cached ones
+    NOT_MODIFIED_SKIP_HEADERS = ['content-length', 'content-encoding', 'transfer-encoding']
+
     def __init__(self, base_url, max_retries=MAX_RETRIES, sleep_time=DEFAULT_SLEEP_TIME,
                  extra_headers=None, extra_status_forcelist=None, extra_retry_after_status=None,
-                 archive=None, from_archive=False):
+                 archive=None, from_archive=False, cache=None):
 
         self.base_url = base_url
 
@@ -108,6 +117,7 @@ class HttpClient:
 
         self.archive = archive
         self.from_archive = from_archive
+        self.cache = cache
 
         self._create_http_session()
 
@@ -159,10 +169,28 @@ class HttpClient:
 
     def _fetch_from_remote(self, url, payload, headers, method, stream, verify):
 
+        use_cache = self.cache and method == self.GET and not stream
+        credentials = self._cache_credentials() if use_cache else None
+        cached = self.cache.get(url, payload, headers, credentials) if use_cache else None
+
+        if cached:
+            request_headers = self._conditional_headers(cached, headers)
+        else:
+            request_headers = headers
+
         if method == self.GET:
-            response = self.session.get(url, params=payload, headers=headers, stream=stream, verify=verify)
+            response = self.session.get(url, params=payload, headers=request_headers, stream=stream, verify=verify)
         else:
-            response = self.session.post(url, data=payload, headers=headers, stream=stream, verify=verify)
+            response = self.session.post(url, data=payload, headers=request_headers, stream=stream, verify=verify)
+
+        if cached and response.status_code == 304:
+            logger.debug("%s not modified; cached response used", url)
+            for name, value in response.headers.items():
+                if name.lower() not in self.NOT_MODIFIED_SKIP_HEADERS:
+                    cached.headers[name] = value
+            response = cached
+        elif use_cache:
+            self.cache.store(url, payload, headers, response, credentials)
 
         try:
             response.raise_for_status()
@@ -177,6 +205,19 @@ class HttpClient:
             self.archive.store(url, payload, headers, response)
         return response
 
+    @staticmethod
+    def _conditional_headers(cached, headers):
+        """Add the validators of a cached response to the request headers"""
+
+        request_headers = dict(headers) if headers else {}
+
+        if 'ETag' in cached.headers:
+            request_headers['If-None-Match'] = cached.headers['ETag']
+        if 'Last-Modified' in cached.headers:
+            request_headers['If-Modified-Since'] = cached.headers['Last-Modified']
+
+        return request_headers
+
     def _create_http_session(self):
         """Create a http session and initialize the retry object."""
 
@@ -200,6 +241,17 @@ class HttpClient:
         self.session.mount('http://', requests.adapters.HTTPAdapter(max_retries=retries))
         self.session.mount('https://', requests.adapters.HTTPAdapter(max_retries=retries))
 
+    def _cache_credentials(self):
+        """Credentials of the session; the authorization header and the auth"""
+
+        authorization = self.session.headers.get('Authorization', None)
+        auth = self.session.auth
+
+        if authorization is None and auth is None:
+            return None
+
+        return repr((authorization, auth))
+
     def _close_http_session(self):
         """Close the http session."""
 
@@ -207,13 +259,374 @@ class HttpClient:
             self.session.keep_alive = False
 
 
+class HttpCache:
+    """On-disk cache of HTTP responses.
+
+    The cache is a SQLite database, stored in `dirpath`, which keeps
+    the last response received for each request together with its
+    validators (`ETag` and `Last-Modified` headers). Clients use them
+    to send conditional requests; when the server replies with
+    `304 Not Modified`, the cached response is used instead. Only
+    successful responses with validators are stored.
+
+    Entries are indexed by the request and the credentials used to
+    send it (i.e, the authorization header of the session), so the
+    responses fetched by a user are never returned to other ones.
+    Only the SHA1 of the credentials is stored.
+
+    Entries not used in `max_age` seconds are removed. When the size
+    of the responses stored exceeds `max_size` bytes, the least
+    recently used entries are removed too. Errors accessing the cache
+    are logged and handled as cache misses, so they never stop the
+    fetching process.
+
+    :param dirpath: directory where the cache is stored
+    :param max_size: maximum size, in bytes, of the cached responses
+    :param max_age: number of seconds an entry is kept without being used
+    """
+    CACHE_NAME = 'http_cache.sqlite3'
+    CACHE_TABLE = 'responses'
+    CACHE_TIMEOUT = 60
+    CACHE_COMPRESSION = 'zlib'
+
+    DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+    DEFAULT_MAX_AGE = 30 * 24 * 60 * 60
+
+    # Number of stored responses between evictions
+    EVICTION_INTERVAL = 100
+
+    CACHE_CREATE_STMT = "CREATE TABLE IF NOT EXISTS " + CACHE_TABLE + " ( " \
+                        "hashcode TEXT PRIMARY KEY, " \
+                        "record BLOB, " \
+                        "size INTEGER, " \
+                        "accessed_on REAL)"
+
+    CACHE_INDEX_STMT = "CREATE INDEX IF NOT EXISTS " + CACHE_TABLE + "_accessed " \
+                       "ON " + CACHE_TABLE + " (accessed_on)"
+
+    def __init__(self, dirpath, max_size=DEFAULT_MAX_SIZE, max_age=DEFAULT_MAX_AGE):
+        if not os.path.exists(dirpath):
+            os.makedirs(dirpath)
+
+        self.dirpath = dirpath
+        self.cache_path = os.path.join(dirpath, self.CACHE_NAME)
+        self.max_size = max_size
+        self.max_age = max_age
+        self._nstored = 0
+
+        self._execute([(self.CACHE_CREATE_STMT, ()),
+                       (self.CACHE_INDEX_STMT, ())])
+        self.evict()
+
+    def get(self, url, payload, headers, credentials=None):
+        """Get the cached response of a request.
+
+        :param url: request URL
+        :param payload: request payload
+        :param headers: request headers
+        :param credentials: credentials used to send the request
+
+        :returns: the cached response or `None` when it is not found
+        """
+        hashcode = self.make_hashcode(url, payload, headers, credentials)
+        min_accessed_on = time.time() - self.max_age
+
+        select_stmt = "SELECT record FROM " + self.CACHE_TABLE + " " \
+                      "WHERE hashcode = ? AND accessed_on >= ?"
+        update_stmt = "UPDATE " + self.CACHE_TABLE + " " \
+                      "SET accessed_on = ? WHERE hashcode = ?"
+
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute(select_stmt, (hashcode, min_accessed_on))
+            row = cursor.fetchone()
+            if row:
+                cursor.execute(update_stmt, (time.time(), hashcode))
+                conn.commit()
+            cursor.close()
+            conn.close()
+
+            response = decode_record(row[0]) if row else None
+        except (sqlite3.DatabaseError, ArchiveError) as e:
+            logger.warning("HTTP cache %s error; cause: %s", self.cache_path, str(e))
+            response = None
+
+        return response
+
+    def store(self, url, payload, headers, response, credentials=None):
+        """Store the response of a request.
+
+        Responses without validators or with an status code other
+        than 200 are not stored.
+
+        :param url: request URL
+        :param payload: request payload
+        :param headers: request headers
+        :param response: response to store
+        :param credentials: credentials used to send the request
+        """
+        if response.status_code != 200:
+            return
+        if 'ETag' not in response.headers and 'Last-Modified' not in response.headers:
+            return
+
+        hashcode = self.make_hashcode(url, payload, headers, credentials)
+        record = encode_record(response, compression=self.CACHE_COMPRESSION)
+
+        insert_stmt = "INSERT OR REPLACE INTO " + self.CACHE_TABLE + " " \
+                      "(hashcode, record, size, accessed_on) VALUES (?, ?, ?, ?)"
+
+        if self._execute([(insert_stmt, (hashcode, record, len(record), time.time()))]):
+            self._nstored += 1
+
+        if self._nstored >= self.EVICTION_INTERVAL:
+            self.evict()
+
+    @staticmethod
+    def make_hashcode(url, payload, headers, credentials=None):
+        """Generate the key of a request.
+
+        :param url: request URL
+        :param payload: request payload
+        :param headers: request headers
+        :param credentials: credentials used to send the request
+
+        :returns: a SHA1 hash code
+        """
+        hashcode = Archive.make_hashcode(url, payload, headers)
+
+        if credentials is None:
+            return hashcode
+
+        credentials = hashlib.sha1(credentials.encode('utf-8')).hexdigest()
+        content = ':'.join([hashcode, credentials])
+        return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+    def evict(self):
+        """Remove old entries and those exceeding the size of the cache."""
+
+        delete_stmt = "DELETE FROM " + self.CACHE_TABLE + " WHERE accessed_on < ?"
+        select_stmt = "SELECT accessed_on, size FROM " + self.CACHE_TABLE + " " \
+                      "ORDER BY accessed_on DESC"
+        delete_lru_stmt = "DELETE FROM " + self.CACHE_TABLE + " WHERE accessed_on <= ?"
+
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute(delete_stmt, (time.time() - self.max_age,))
+
+            total_size = 0
+            cursor.execute(select_stmt)
+            for accessed_on, size in cursor.fetchall():
+                total_size += size
+                if total_size > self.max_size:
+                    cursor.execute(delete_lru_stmt, (accessed_on,))
+                    break
+
+            conn.commit()
+            cursor.close()
+            conn.close()
+        except sqlite3.DatabaseError as e:
+            logger.warning("HTTP cache %s error; cause: %s", self.cache_path, str(e))
+
+        self._nstored = 0
+
+    def _connect(self):
+        return sqlite3.connect(self.cache_path, timeout=self.CACHE_TIMEOUT)
+
+    def _execute(self, stmts):
+        """Run a list of statements in a single transaction"""
+
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            for stmt, params in stmts:
+                cursor.execute(stmt, params)
+            conn.commit()
+            cursor.close()
+            conn.close()
+        except sqlite3.DatabaseError as e:
+            logger.warning("HTTP cache %s error; cause: %s", self.cache_path, str(e))
+            return False
+
+        return True
+
+
+class SharedRateLimiter:
+    """Token bucket rate limiter shared by several processes.
+
+    The limiter keeps a token bucket for each rate limit, identified by
+    a key (i.e, the host and the token used by a client). Buckets are
+    stored in a SQLite database in `dirpath`, so every client using the
+    same directory, in this or in other processes, shares them.
+
+    Clients call to `update` with the rate limit reported by the server.
+    The remaining points are spread until the time of the next reset:
+    the bucket refills at that rate and holds up to `burst` tokens.
+    Before each request, clients call to `acquire` to take a token;
+    when the bucket is empty, the client sleeps until its turn. Tokens
+    are reserved in advance, so waiting clients are served in order
+    instead of sending their requests at the same time.
+
+    Buckets without rate limit data do not limit requests. Errors
+    accessing the limiter are logged and ignored.
+
+    :param dirpath: directory where the buckets are stored
+    :param burst: maximum number of requests sent without waiting
+    """
+    LIMITER_NAME = 'rate_limits.sqlite3'
+    BUCKETS_TABLE = 'buckets'
+    LIMITER_TIMEOUT = 60
+
+    DEFAULT_BURST = 10
+
+    BUCKETS_CREATE_STMT = "CREATE TABLE IF NOT EXISTS " + BUCKETS_TABLE + " ( " \
+                          "key TEXT PRIMARY KEY, " \
+                          "tokens REAL, " \
+                          "capacity REAL, " \
+                          "rate REAL, " \
+                          "reset_on REAL, " \
+                          "updated_on REAL)"
+
+    def __init__(self, dirpath, burst=DEFAULT_BURST):
+        if burst < 1:
+            raise ValueError("burst must be greater than 0; %s given" % burst)
+
+        if not os.path.exists(dirpath):
+            os.makedirs(dirpath)
+
+        self.dirpath = dirpath
+        self.limiter_path = os.path.join(dirpath, self.LIMITER_NAME)
+        self.burst = burst
+
+        try:
+            conn = self._connect()
+            conn.execute(self.BUCKETS_CREATE_STMT)
+            conn.close()
+        except sqlite3.DatabaseError as e:
+            logger.warning("Rate limiter %s error; cause: %s", self.limiter_path, str(e))
+
+    def acquire(self, key):
+        """Take a token from a bucket.
+
+        The method sleeps until a token of the bucket `key` is
+        available.
+
+        :param key: identifier of the bucket
+
+        :returns: the number of seconds waited
+        """
+        now = time.time()
+
+        try:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            bucket = self.__read_bucket(conn, key)
+
+            if bucket:
+                tokens, capacity, rate, reset_on = self.__refill(bucket, now)
+                tokens -= 1
+
+                if tokens >= 0:
+                    wait = 0
+                elif rate > 0:
+                    wait = min(-tokens / rate, reset_on - now)
+                else:
+                    wait = reset_on - now
+
+                self.__write_bucket(conn, key, tokens, capacity, rate, reset_on, now)
+            else:
+                wait = 0
+
+            conn.execute("COMMIT")
+            conn.close()
+        except sqlite3.DatabaseError as e:
+            logger.warning("Rate limiter %s error; cause: %s", self.limiter_path, str(e))
+            wait = 0
+
+        if wait > 0:
+            logger.debug("Rate limit %s exhausted; waiting %.2f secs", key, wait)
+            time.sleep(wait)
+
+        return wait
+
+    def update(self, key, remaining, seconds_to_reset):
+        """Update a bucket with the rate limit reported by the server.
+
+        :param key: identifier of the bucket
+        :param remaining: number of requests left until the next reset
+        :param seconds_to_reset: number of seconds to the next reset
+        """
+        now = time.time()
+        seconds_to_reset = max(seconds_to_reset, 1)
+
+        rate = remaining / seconds_to_reset
+        capacity = max(1, min(self.burst, remaining))
+        reset_on = now + seconds_to_reset
+
+        try:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            bucket = self.__read_bucket(conn, key)
+
+            if bucket:
+                tokens, _, _, _ = self.__refill(bucket, now)
+                tokens = min(tokens, capacity, remaining)
+            else:
+                tokens = min(capacity, remaining)
+
+            self.__write_bucket(conn, key, tokens, capacity, rate, reset_on, now)
+            conn.execute("COMMIT")
+            conn.close()
+        except sqlite3.DatabaseError as e:
+            logger.warning("Rate limiter %s error; cause: %s", self.limiter_path, str(e))
+
+    def _connect(self):
+        return sqlite3.connect(self.limiter_path, timeout=self.LIMITER_TIMEOUT,
+                               isolation_level=None)
+
+    def __read_bucket(self, conn, key):
+        select_stmt = "SELECT tokens, capacity, rate, reset_on, updated_on " \
+                      "FROM " + self.BUCKETS_TABLE + " WHERE key = ?"
+        return conn.execute(select_stmt, (key,)).fetchone()
+
+    def __write_bucket(self, conn, key, tokens, capacity, rate, reset_on, updated_on):
+        insert_stmt = "INSERT OR REPLACE INTO " + self.BUCKETS_TABLE + " " \
+                      "(key, tokens, capacity, rate, reset_on, updated_on) " \
+                      "VALUES (?, ?, ?, ?, ?, ?)"
+        conn.execute(insert_stmt, (key, tokens, capacity, rate, reset_on, updated_on))
+
+    @staticmethod
+    def __refill(bucket, now):
+        """Add the tokens generated since the last update of a bucket"""
+
+        tokens, capacity, rate, reset_on, updated_on = bucket
+
+        if now >= reset_on:
+            # The limit was reset; the bucket is full until the
+            # server reports the new rate limit
+            tokens = max(tokens, capacity)
+        else:
+            tokens = min(capacity, tokens + (now - updated_on) * rate)
+
+        return tokens, capacity, rate, reset_on
+
+
 class RateLimitHandler:
     """Class to handle rate limit for HTTP clients.
 
+    When a `SharedRateLimiter` is given, the rate limit is shared
+    with the rest of clients using the same limiter and token (see
+    `rate_limit_key`). The client takes a token from the limiter
+    before each request and updates it with the rate limit data
+    received from the server.
+
     :param sleep_for_rate: sleep until rate limit is reset
     :param min_rate_to_sleep: minimun rate needed to sleep until it will be rese
     :param rate_limit_header: header to know the current rate limit
     :param rate_limit_reset_header: header to know the next rate limit reset
+    :param rate_limiter: `SharedRateLimiter` used by the client
     """
     version = '0.2'
 
@@ -224,19 +637,22 @@ class RateLimitHandler:
 
     def setup_rate_limit_handler(self, sleep_for_rate=False, min_rate_to_sleep=MIN_RATE_LIMIT,
                                  rate_limit_header=RATE_LIMIT_HEADER,
-                                 rate_limit_reset_header=RATE_LIMIT_RESET_HEADER):
+                                 rate_limit_reset_header=RATE_LIMIT_RESET_HEADER,
+                                 rate_limiter=None):
         """Setup the rate limit handler.
 
         :param sleep_for_rate: sleep until rate limit is reset
         :param min_rate_to_sleep: minimun rate needed to make the fecthing process sleep
         :param rate_limit_header: header from where extract the rate limit data
         :param rate_limit_reset_header: header from where extract the rate limit reset data
+        :param rate_limiter: `SharedRateLimiter` used to share the rate limit
         """
         self.rate_limit = None
         self.rate_limit_reset_ts = None
         self.sleep_for_rate = sleep_for_rate
         self.rate_limit_header = rate_limit_header
         self.rate_limit_reset_header = rate_limit_reset_header
+        self.rate_limiter = rate_limiter
 
         if min_rate_to_sleep > self.MAX_RATE_LIMIT:
             msg = "Minimum rate to sleep value exceeded (%d)."
@@ -250,20 +666,43 @@ class RateLimitHandler:
     def sleep_for_rate_limit(self):
         """The fetching process sleeps until the rate limit is restored or
            raises a RateLimitError exception if sleep_for_rate flag is disabled.
+
+           When a shared rate limiter is set, the process also waits
+           for its turn to send the next request.
         """
-        if self.rate_limit is not None and self.rate_limit <= self.min_rate_to_sleep:
-            seconds_to_reset = self.calculate_time_to_reset()
+        if self.rate_limiter:
+            self.rate_limiter.acquire(self.rate_limit_key())
 
-            if seconds_to_reset < 0:
-                logger.warning("Value of sleep for rate limit is negative, reset it to 0")
-                seconds_to_reset = 0
+        seconds_to_reset = self._check_rate_limit()
 
-            cause = "Rate limit exhausted."
-            if self.sleep_for_rate:
-                logger.info("%s Waiting %i secs for rate limit reset.", cause, seconds_to_reset)
-                time.sleep(seconds_to_reset)
-            else:
-                raise RateLimitError(cause=cause, seconds_to_reset=seconds_to_reset)
+        if seconds_to_reset is not None:
+            time.sleep(seconds_to_reset)
+
+    def _check_rate_limit(self):
+        """Check whether the rate limit is exhausted.
+
+        :returns: the number of seconds to sleep until the rate limit
+            is reset or `None` when it is not exhausted
+
+        :raises RateLimitError: when the rate limit is exhausted and
+            `sleep_for_rate` flag is disabled
+        """
+        if self.rate_limit is None or self.rate_limit > self.min_rate_to_sleep:
+            return None
+
+        seconds_to_reset = self.calculate_time_to_reset()
+
+        if seconds_to_reset < 0:
+            logger.warning("Value of sleep for rate limit is negative, reset it to 0")
+            seconds_to_reset = 0
+
+        cause = "Rate limit exhausted."
+        if self.sleep_for_rate:
+            logger.info("%s Waiting %i secs for rate limit reset.", cause, seconds_to_reset)
+        else:
+            raise RateLimitError(cause=cause, seconds_to_reset=seconds_to_reset)
+
+        return seconds_to_reset
 
     def calculate_time_to_reset(self):
         """Calculate the seconds to reset the token requests."""
@@ -287,3 +726,24 @@ class RateLimitHandler:
             logger.debug("Rate limit reset: %s", self.calculate_time_to_reset())
         else:
             self.rate_limit_reset_ts = None
+
+        if self.rate_limiter and self.rate_limit is not None and self.rate_limit_reset_ts is not None:
+            self.rate_limiter.update(self.rate_limit_key(), self.rate_limit,
+                                     self.calculate_time_to_reset())
+
+    def rate_limit_key(self):
+        """Identify the rate limit consumed by the client.
+
+        The key is built with the host of the client and the SHA1
+        of the token used to access it (see `_rate_limit_token`).
+
+        :returns: the key of the rate limit
+        """
+        host = urllib.parse.urlparse(self.base_url).netloc
+        token = self._rate_limit_token() or ''
+        return host + ':' + hashlib.sha1(token.encode('utf-8')).hexdigest()
+
+    def _rate_limit_token(self):
+        """Token used to access the server; by default, the authorization header"""
+
+        return self.session.headers.get('Authorization', None)
@@ -31,11 +31,21 @@ class BaseError(Exception):
 
     def __init__(self, **kwargs):
         super().__init__()
+        self._kwargs = kwargs
         self.msg = self.message % kwargs
 
     def __str__(self):
         return self.msg
 
+    def __reduce__(self):
+        # Errors are rebuilt from their arguments, so they can
+        # be sent between processes
+        return _build_error, (self.__class__, self._kwargs)
+
+
+def _build_error(error_class, kwargs):
+    return error_class(**kwargs)
+
 
 class ArchiveError(BaseError):
     """Generic error for archive objects"""
@@ -0,0 +1,606 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2019 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, 51 Franklin Street, Fifth Floor, Boston, MA 02110-1335, USA.
+#
+# Authors:
+#     Santiago Dueñas <sduenas@bitergia.com>
+#
+
+import argparse
+import collections
+import json
+import logging
+import multiprocessing
+import os
+import queue as queue_module
+import urllib.parse
+
+from grimoirelab_toolkit.datetime import datetime_utcnow
+from grimoirelab_toolkit.introspect import find_signature_parameters
+
+from .backend import find_backends
+from .errors import BackendError
+
+
+logger = logging.getLogger(__name__)
+
+
+FetchJob = collections.namedtuple('FetchJob', ['backend', 'args', 'category'])
+FetchJobResult = collections.namedtuple('FetchJobResult',
+                                        ['job', 'origin', 'host', 'status',
+                                         'nitems', 'error'])
+
+GitMirror = collections.namedtuple('GitMirror', ['uri', 'gitpath'])
+GitMirrorJob = collections.namedtuple('GitMirrorJob',
+                                      FetchJob._fields + ('mirror',))
+
+JOB_SUCCESS = 'success'
+JOB_FAILURE = 'failure'
+
+# Types of the messages sent by the workers
+(_MSG_ITEM,
+ _MSG_DONE,
+ _MSG_FAILED) = range(3)
+
+_Worker = collections.namedtuple('_Worker', ['process', 'inbox'])
+
+
+class FetchOrchestrator:
+    """Run several fetch jobs in parallel.
+
+    This class runs a list of fetch jobs across a pool of worker
+    processes. Each job is defined by a `FetchJob` object, where
+    `backend` is the name of the backend command (i.e, 'git',
+    'github'), `args` is the list of arguments as they would be
+    given to that command on the command line and `category` the
+    type of the items to fetch (`None` for the default one).
+
+    Jobs which fetch data from the same host will not run more than
+    `max_jobs_per_host` at the same time. The host of a job is
+    obtained from the origin of its backend, which is found parsing
+    the arguments of the job, so no command is run in the main
+    process; output files are not opened until the job runs.
+
+    Items fetched by the workers are sent back to the main process
+    using a queue of `queue_size` elements. When the queue is full,
+    the workers wait until the main process consumes some of them,
+    so the memory used by the fetching process is bounded.
+
+    Worker processes are reused between jobs, so modules and backends
+    are only imported once per worker. When no message is received
+    during `POLL_INTERVAL` seconds, the state of the running jobs is
+    checked; jobs whose worker process died (i.e, killed by the
+    system when running out of memory) are reported as failed and
+    their workers are replaced by new ones.
+
+    :param jobs: list of `FetchJob` to run
+    :param workers: number of worker processes
+    :param max_jobs_per_host: maximum number of jobs running at the
+        same time on the same host
+    :param queue_size: maximum number of items waiting to be consumed
+    :param commands: dict of backend commands indexed by name; when
+        `None`, Perceval core backends will be used
+    """
+    DEFAULT_WORKERS = multiprocessing.cpu_count()
+    DEFAULT_MAX_JOBS_PER_HOST = 2
+    DEFAULT_QUEUE_SIZE = 1000
+    POLL_INTERVAL = 1
+
+    def __init__(self, jobs, workers=DEFAULT_WORKERS,
+                 max_jobs_per_host=DEFAULT_MAX_JOBS_PER_HOST,
+                 queue_size=DEFAULT_QUEUE_SIZE, commands=None):
+        if workers < 1:
+            raise ValueError("workers must be greater than 0; %s given" % workers)
+        if max_jobs_per_host < 1:
+            raise ValueError("max_jobs_per_host must be greater than 0; %s given"
+                             % max_jobs_per_host)
+
+        self.jobs = jobs
+        self.workers = workers
+        self.max_jobs_per_host = max_jobs_per_host
+        self.queue_size = queue_size
+        self.commands = commands
+        self.results = []
+
+    def run(self):
+        """Run the jobs and fetch their items.
+
+        The method returns a generator of the items fetched by
+        the jobs, in the order they were received. Items from
+        different jobs will be interleaved.
+
+        Once the generator is exhausted, the attribute `results`
+        stores the outcome of each job as a list of `FetchJobResult`
+        objects, in the same order the jobs were given.
+
+        :returns: a generator of items
+        """
+        commands = self.commands
+        if commands is None:
+            import perceval.backends
+            _, commands = find_backends(perceval.backends)
+
+        results = {}
+        pending = collections.deque()
+
+        for job_id, job in enumerate(self.jobs):
+            try:
+                origin, host = self._find_origin(commands, job)
+            except (Exception, SystemExit) as e:
+                logger.warning("Unable to initialize job %s (%s); cause: %s",
+                               job_id, job.backend, str(e))
+                results[job_id] = FetchJobResult(job, None, None,
+                                                 JOB_FAILURE, 0, str(e))
+                continue
+            pending.append((job_id, job, origin, host))
+
+        queue = multiprocessing.Queue(maxsize=self.queue_size)
+        idle = [self._start_worker(queue) for _ in range(min(self.workers, len(pending)))]
+
+        running = {}
+        hosts = collections.Counter()
+        nitems = collections.Counter()
+
+        try:
+            self._dispatch(idle, pending, running, hosts)
+
+            while running:
+                try:
+                    msg_type, job_id, value = queue.get(timeout=self.POLL_INTERVAL)
+                except queue_module.Empty:
+                    lost = self._find_lost_jobs(running)
+                    messages = [(_MSG_FAILED, job_id, (nitems[job_id], error))
+                                for job_id, error in lost]
+                else:
+                    messages = [(msg_type, job_id, value)]
+
+                for msg_type, job_id, value in messages:
+                    if job_id not in running:
+                        # The job was already reported as failed
+                        continue
+
+                    if msg_type == _MSG_ITEM:
+                        nitems[job_id] += 1
+                        yield value
+                        continue
+
+                    job, origin, host, worker = running.pop(job_id)
+                    hosts[host] -= 1
+
+                    if worker.process.is_alive():
+                        idle.append(worker)
+                    else:
+                        worker.process.join()
+                        idle.append(self._start_worker(queue))
+
+                    if msg_type == _MSG_DONE:
+                        results[job_id] = FetchJobResult(job, origin, host,
+                                                         JOB_SUCCESS, value, None)
+                        logger.info("Job %s (%s) completed: %s items fetched from %s",
+                                    job_id, job.backend, value, origin)
+                    else:
+                        njob_items, error = value
+                        results[job_id] = FetchJobResult(job, origin, host,
+                                                         JOB_FAILURE, njob_items, error)
+                        logger.warning("Job %s (%s) failed after fetching %s items from %s; cause: %s",
+                                       job_id, job.backend, njob_items, origin, error)
+
+                self._dispatch(idle, pending, running, hosts)
+        finally:
+            workers = idle + [worker for _, _, _, worker in running.values()]
+
+            for worker in workers:
+                worker.process.terminate()
+            for worker in workers:
+                worker.process.join()
+
+            self.results = [results[job_id] for job_id in sorted(results)]
+
+    def _start_worker(self, queue):
+        """Start a new worker process waiting for jobs"""
+
+        inbox = multiprocessing.SimpleQueue()
+        process = multiprocessing.Process(target=_work,
+                                          args=(inbox, queue, self.commands),
+                                          daemon=True)
+        process.start()
+
+        return _Worker(process, inbox)
+
+    def _dispatch(self, idle, pending, running, hosts):
+        """Send to the idle workers the pending jobs whose host has free slots"""
+
+        waiting = collections.deque()
+
+        while pending and idle:
+            job_id, job, origin, host = pending.popleft()
+
+            if hosts[host] >= self.max_jobs_per_host:
+                waiting.append((job_id, job, origin, host))
+                continue
+
+            hosts[host] += 1
+            worker = idle.pop()
+            worker.inbox.put((job_id, job))
+            running[job_id] = (job, origin, host, worker)
+
+            logger.debug("Job %s (%s) dispatched; origin: %s",
+                         job_id, job.backend, origin)
+
+        # Keep the original order of the jobs not dispatched yet
+        waiting.extend(pending)
+        pending.clear()
+        pending.extend(waiting)
+
+    @staticmethod
+    def _find_lost_jobs(running):
+        """Find the running jobs which will not send any other message.
+
+        A job is lost when the worker process running it is not alive,
+        even when the job had not started yet.
+
+        :returns: a list of (job_id, error) tuples
+        """
+        lost = []
+
+        for job_id, (_, _, _, worker) in running.items():
+            process = worker.process
+
+            if not process.is_alive():
+                lost.append((job_id, "worker process %s died; exit code %s"
+                             % (process.pid, process.exitcode)))
+
+        return lost
+
+    @staticmethod
+    def _find_origin(commands, job):
+        """Find the origin and the host of the given job"""
+
+        if job.backend not in commands:
+            raise BackendError(cause="unknown backend %s" % job.backend)
+
+        command_class = commands[job.backend]
+        parsed_args = _parse_job_args(command_class, job)
+
+        backend_class = command_class.BACKEND
+        init_args = find_signature_parameters(backend_class.__init__,
+                                              vars(parsed_args))
+        init_args['archive'] = None
+        backend = backend_class(**init_args)
+        origin = backend.origin
+
+        host = urllib.parse.urlparse(origin).hostname
+        host = host if host else origin
+
+        return origin, host
+
+
+class GitFleet:
+    """Keep a fleet of Git mirrors in sync.
+
+    This class syncs a list of Git mirrors, defined by `GitMirror`
+    objects, running the Git backend with `--latest-items` on each
+    one of them. Mirrors that do not exist yet are cloned. Jobs are
+    run by a `FetchOrchestrator`, so no more than `workers` mirrors
+    are synced at the same time, nor more than `max_jobs_per_host`
+    from the same remote host. The new commits of all the mirrors
+    are returned as a single stream of items.
+
+    The outcome of each run is stored in the JSON file `state_path`.
+    Mirrors are synced following the time they changed for the last
+    time, from the most recent to the oldest, so the ones which
+    change more often get their new commits first. Mirrors without
+    any previous state are synced before the rest.
+
+    :param mirrors: list of `GitMirror` to sync
+    :param workers: number of worker processes
+    :param max_jobs_per_host: maximum number of mirrors synced at the
+        same time from the same host
+    :param queue_size: maximum number of items waiting to be consumed
+    :param state_path: path to the file where the state of the mirrors
+        is stored between runs; when `None`, no state is kept
+    :param machine_log: read the commits using the machine-readable
+        log format
+    :param maintenance: write the commit-graph of the mirrors and
+        repack them when they have too many packs
+    :param commands: dict of backend commands indexed by name; when
+        `None`, Perceval core backends will be used
+    """
+    def __init__(self, mirrors, workers=FetchOrchestrator.DEFAULT_WORKERS,
+                 max_jobs_per_host=FetchOrchestrator.DEFAULT_MAX_JOBS_PER_HOST,
+                 queue_size=FetchOrchestrator.DEFAULT_QUEUE_SIZE,
+                 state_path=None, machine_log=False, maintenance=False,
+                 commands=None):
+        self.mirrors = mirrors
+        self.workers = workers
+        self.max_jobs_per_host = max_jobs_per_host
+        self.queue_size = queue_size
+        self.state_path = state_path
+        self.machine_log = machine_log
+        self.maintenance = maintenance
+        self.commands = commands
+        self.results = []
+
+    def run(self):
+        """Sync the mirrors and fetch their new commits.
+
+        The method returns a generator of the new commits of the
+        mirrors. Commits of the same mirror keep their order; commits
+        from different mirrors will be interleaved.
+
+        Once the generator is exhausted, the attribute `results`
+        stores the outcome of each job as a list of `FetchJobResult`
+        objects, in the order the mirrors were synced. Their jobs are
+        `GitMirrorJob` objects, which also keep the synced mirror in
+        the field `mirror`. The state of the mirrors is updated with
+        those results.
+
+        :returns: a generator of items
+        """
+        state = self.read_state()
+        mirrors = self.schedule(self.mirrors, state)
+
+        jobs = [GitMirrorJob('git', self._job_args(mirror), None, mirror)
+                for mirror in mirrors]
+        orchestrator = FetchOrchestrator(jobs,
+                                         workers=self.workers,
+                                         max_jobs_per_host=self.max_jobs_per_host,
+                                         queue_size=self.queue_size,
+                                         commands=self.commands)
+
+        logger.info("Syncing %s Git mirrors", len(mirrors))
+
+        try:
+            for item in orchestrator.run():
+                yield item
+        finally:
+            self.results = orchestrator.results
+            self._update_state(state, self.results)
+
+    @staticmethod
+    def schedule(mirrors, state):
+        """Sort the mirrors by the last time they changed.
+
+        Mirrors without state go first, keeping their order. The
+        rest are sorted from the most recently changed to the
+        least; those that never changed go last.
+
+        :param mirrors: list of `GitMirror`
+        :param state: dict with the state of the mirrors
+
+        :returns: a sorted list of `GitMirror`
+        """
+        def priority(mirror):
+            if mirror.gitpath not in state:
+                return 0, 0
+            last_change = state[mirror.gitpath].get('last_change', None)
+            return 1, -(last_change or 0)
+
+        return sorted(mirrors, key=priority)
+
+    def read_state(self):
+        """Read the state of the mirrors stored by previous runs.
+
+        :returns: a dict with the state of each mirror, indexed by
+            its path
+        """
+        if not self.state_path or not os.path.exists(self.state_path):
+            return {}
+
+        with open(self.state_path, 'r') as fd:
+            try:
+                state = json.load(fd)
+            except ValueError as e:
+                logger.warning("Unable to read fleet state %s; state ignored. Cause: %s",
+                               self.state_path, str(e))
+                return {}
+
+        return state
+
+    def _update_state(self, state, results):
+        """Update and write the state of the mirrors synced"""
+
+        if not self.state_path:
+            return
+
+        now = datetime_utcnow().timestamp()
+
+        for result in results:
+            mirror = result.job.mirror
+
+            mstate = state.setdefault(mirror.gitpath, {'last_change': None})
+            mstate['uri'] = mirror.uri
+            mstate['status'] = result.status
+
+            if result.status == JOB_SUCCESS:
+                mstate['last_sync'] = now
+                mstate['ncommits'] = result.nitems
+
+                if result.nitems > 0:
+                    mstate['last_change'] = now
+
+        tmp_path = self.state_path + '.tmp'
+
+        with open(tmp_path, 'w') as fd:
+            json.dump(state, fd, indent=4, sort_keys=True)
+
+        os.replace(tmp_path, self.state_path)
+
+        logger.debug("Fleet state stored in %s", self.state_path)
+
+    def _job_args(self, mirror):
+        args = [mirror.uri, '--git-path', mirror.gitpath, '--latest-items']
+        if self.machine_log:
+            args.append('--machine-log')
+        if self.maintenance:
+            args.append('--maintenance')
+        return args
+
+
+def read_fleet(filepath):
+    """Read a list of Git mirrors from a fleet file.
+
+    The fleet file is a JSON file which contains a list of objects.
+    Each object defines a mirror, using the keys `uri`, the URI of
+    the remote repository, and `gitpath`, the path of the mirror.
+    For example:
+
+        [
+            {
+                "uri": "https://github.com/chaoss/grimoirelab-perceval.git",
+                "gitpath": "/mirrors/chaoss/grimoirelab-perceval.git"
+            }
+        ]
+
+    :param filepath: path to the fleet file
+
+    :returns: a list of `GitMirror` objects
+
+    :raises BackendError: when the fleet file is invalid
+    """
+    with open(filepath, 'r') as fd:
+        try:
+            entries = json.load(fd)
+        except ValueError as e:
+            raise BackendError(cause="invalid fleet %s; %s" % (filepath, str(e)))
+
+    if not isinstance(entries, list):
+        raise BackendError(cause="invalid fleet %s; list of mirrors expected" % filepath)
+
+    mirrors = []
+
+    for entry in entries:
+        try:
+            mirror = GitMirror(str(entry['uri']), str(entry['gitpath']))
+        except (KeyError, TypeError):
+            raise BackendError(cause="invalid mirror %s in fleet %s" % (str(entry), filepath))
+        mirrors.append(mirror)
+
+    return mirrors
+
+
+def read_manifest(filepath):
+    """Read a list of jobs from a manifest file.
+
+    The manifest is a JSON file which contains a list of objects.
+    Each object defines a fetch job, using the keys `backend`, `args`
+    and, optionally, `category`. For example:
+
+        [
+            {
+                "backend": "git",
+                "args": ["https://github.com/chaoss/grimoirelab-perceval.git",
+                         "--latest-items"]
+            },
+            {
+                "backend": "github",
+                "args": ["chaoss", "grimoirelab-perceval", "-t", "mytoken"],
+                "category": "pull_request"
+            }
+        ]
+
+    :param filepath: path to the manifest file
+
+    :returns: a list of `FetchJob` objects
+
+    :raises BackendError: when the manifest is invalid
+    """
+    with open(filepath, 'r') as fd:
+        try:
+            entries = json.load(fd)
+        except ValueError as e:
+            raise BackendError(cause="invalid manifest %s; %s" % (filepath, str(e)))
+
+    if not isinstance(entries, list):
+        raise BackendError(cause="invalid manifest %s; list of jobs expected" % filepath)
+
+    jobs = []
+
+    for entry in entries:
+        try:
+            job = FetchJob(entry['backend'],
+                           [str(arg) for arg in entry.get('args', [])],
+                           entry.get('category', None))
+        except (KeyError, TypeError):
+            raise BackendError(cause="invalid job %s in manifest %s" % (str(entry), filepath))
+        jobs.append(job)
+
+    return jobs
+
+
+def _job_args(job):
+    args = list(job.args)
+    if job.category:
+        args.extend(['--category', job.category])
+    return args
+
+
+def _parse_job_args(command_class, job):
+    """Parse the arguments of a job without initializing its command.
+
+    The output file is removed from the arguments, so it is not
+    opened, and neither archives nor clients are created. Only the
+    arguments set by `_pre_init` are added to the parsed ones.
+    """
+    output_parser = argparse.ArgumentParser(add_help=False)
+    output_parser.add_argument('-o', '--output')
+    _, args = output_parser.parse_known_args(_job_args(job))
+
+    cmd = command_class.__new__(command_class)
+    cmd.parsed_args = command_class.setup_cmd_parser().parse(*args)
+    cmd._pre_init()
+
+    return cmd.parsed_args
+
+
+# Worker state; it is set once per worker process
+_worker_queue = None
+_worker_commands = None
+
+
+def _init_worker(queue, commands):
+    global _worker_queue
+    global _worker_commands
+
+    if commands is None:
+        import perceval.backends
+        _, commands = find_backends(perceval.backends)
+
+    _worker_queue = queue
+    _worker_commands = commands
+
+
+def _work(inbox, queue, commands):
+    _init_worker(queue, commands)
+
+    for job_id, job in iter(inbox.get, None):
+        _run_job(job_id, job)
+
+
+def _run_job(job_id, job):
+    nitems = 0
+
+    try:
+        cmd = _worker_commands[job.backend](*_job_args(job))
+
+        for item in cmd.fetch():
+            _worker_queue.put((_MSG_ITEM, job_id, item))
+            nitems += 1
+    except (Exception, SystemExit) as e:
+        _worker_queue.put((_MSG_FAILED, job_id, (nitems, str(e))))
+    else:
+        _worker_queue.put((_MSG_DONE, job_id, nitems))
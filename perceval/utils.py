@@ -21,10 +21,17 @@
 #     Germán Poo-Caamaño <gpoo@gnome.org>
 #
 
+import bz2
 import datetime
 import email
+import functools
+import gzip
+import io
+import itertools
 import logging
+import lzma
 import mailbox
+import queue
 import re
 import sys
 
@@ -36,6 +43,11 @@ import dateutil.tz
 
 import requests
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 from .errors import ParseError
 
 
@@ -47,23 +59,30 @@ DEFAULT_DATETIME = datetime.datetime(1970, 1, 1, 0, 0, 0,
 DEFAULT_LAST_DATETIME = datetime.datetime(2100, 1, 1, 0, 0, 0,
                                           tzinfo=dateutil.tz.tzutc())
 
+# Size of the blocks read from compressed files
+COMPRESSED_READ_SIZE = 1024 * 1024
+
 
 def check_compressed_file_type(filepath):
     """Check if filename is a compressed file supported by the tool.
 
-    This function uses magic numbers (first four bytes) to determine
-    the type of the file. Supported types are 'gz' and 'bz2'. When
-    the filetype is not supported, the function returns `None`.
+    This function uses magic numbers (first six bytes) to determine
+    the type of the file. Supported types are 'gz', 'bz2', 'zip', 'xz'
+    and 'zst'. When the filetype is not supported, the function returns
+    `None`.
 
     :param filepath: path to the file
 
-    :returns: 'gz' or 'bz2'; `None` if the type is not supported
+    :returns: 'gz', 'bz2', 'zip', 'xz' or 'zst'; `None` if the type
+        is not supported
     """
     def compressed_file_type(content):
         magic_dict = {
             b'\x1f\x8b\x08': 'gz',
             b'\x42\x5a\x68': 'bz2',
-            b'PK\x03\x04': 'zip'
+            b'PK\x03\x04': 'zip',
+            b'\xfd7zXZ\x00': 'xz',
+            b'\x28\xb5\x2f\xfd': 'zst'
         }
 
         for magic, filetype in magic_dict.items():
@@ -73,10 +92,115 @@ def check_compressed_file_type(filepath):
         return None
 
     with open(filepath, mode='rb') as f:
-        magic_number = f.read(4)
+        magic_number = f.read(6)
     return compressed_file_type(magic_number)
 
 
+def open_compressed_file(filepath, buffered=True):
+    """Open a file to read its content, decompressing it on the fly.
+
+    The type of the file is checked with `check_compressed_file_type`.
+    Files compressed with gzip, bz2, xz or zstd are decompressed as
+    a stream, so no uncompressed copy is written. Reading zstd files
+    requires the `zstandard` package; files with several frames are
+    read until the last one. Any other file is read as it is. Files
+    are read in blocks of `COMPRESSED_READ_SIZE` bytes.
+
+    Callers which buffer the content by themselves can set `buffered`
+    to `False`; compressed files are then returned as the decompressing
+    file objects of their modules, reading the small blocks these use.
+
+    :param filepath: path to the file
+    :param buffered: read compressed files in large blocks
+
+    :returns: a binary file object with the uncompressed content
+
+    :raises ValueError: when the file is a zip archive or when it is
+        compressed with zstd and `zstandard` is not installed
+    """
+    filetype = check_compressed_file_type(filepath)
+
+    if filetype == 'gz':
+        reader = gzip.open(filepath, mode='rb')
+    elif filetype == 'bz2':
+        reader = bz2.open(filepath, mode='rb')
+    elif filetype == 'xz':
+        reader = lzma.open(filepath, mode='rb')
+    elif filetype == 'zst':
+        if not zstandard:
+            msg = "zstandard package is needed to read %s" % filepath
+            raise ValueError(msg)
+        fd = open(filepath, mode='rb')
+        dctx = zstandard.ZstdDecompressor()
+        reader = dctx.stream_reader(fd, read_size=COMPRESSED_READ_SIZE,
+                                    read_across_frames=True, closefd=True)
+    elif filetype == 'zip':
+        msg = "zip archives are not supported; %s given" % filepath
+        raise ValueError(msg)
+    else:
+        return open(filepath, mode='rb', buffering=COMPRESSED_READ_SIZE)
+
+    if not buffered:
+        return reader
+
+    return io.BufferedReader(reader, buffer_size=COMPRESSED_READ_SIZE)
+
+
+def pool_imap(pool, func, jobs, max_pending, ordered=True):
+    """Run a list of jobs in a pool of processes, bounding their results.
+
+    Generator of the results of calling `func` with each job of
+    `jobs` in the given `multiprocessing.Pool`. Unlike `Pool.imap`,
+    no more than `max_pending` jobs are submitted and not consumed
+    at the same time, so the results waiting to be consumed do not
+    pile up in memory when the workers are faster than the consumer.
+
+    Results are returned in the order of the jobs unless `ordered`
+    is not set; in that case, they are returned as they finish.
+    Exceptions raised by `func` are raised again when its result
+    is consumed.
+
+    :param pool: pool of processes
+    :param func: function to call with each job
+    :param jobs: iterable of jobs
+    :param max_pending: maximum number of jobs submitted and not consumed
+    :param ordered: return the results in the order of the jobs
+
+    :returns: a generator of results
+    """
+    if max_pending < 1:
+        raise ValueError("max_pending must be greater than 0; %s given" % max_pending)
+
+    jobs = enumerate(jobs)
+    tasks = {}
+    finished = queue.Queue()
+
+    def submit():
+        for index, job in itertools.islice(jobs, max_pending - len(tasks)):
+            if ordered:
+                tasks[index] = pool.apply_async(func, (job,))
+            else:
+                notify = functools.partial(_notify_task, finished, index)
+                tasks[index] = pool.apply_async(func, (job,), callback=notify,
+                                                error_callback=notify)
+
+    submit()
+    nconsumed = 0
+
+    while tasks:
+        index = nconsumed if ordered else finished.get()
+        nconsumed += 1
+
+        result = tasks.pop(index).get()
+        submit()
+
+        yield result
+
+
+def _notify_task(finished, index, _):
+    finished.put(index)
+
+
 def months_range(from_date, to_date):
     """Generate a months range.
 
@@ -103,7 +227,7 @@ def months_range(from_date, to_date):
         pos = x
 
 
-def message_to_dict(msg):
+def message_to_dict(msg, lazy=False, headers_only=False):
     """Convert an email message into a dictionary.
 
     This function transforms an `email.message.Message` object
@@ -116,80 +240,164 @@ def message_to_dict(msg):
     due to same headers with different case formats can appear in
     the same message.
 
+    When `lazy` is set, the message is returned as a `LazyMessage`,
+    which decodes the headers and the body when they are accessed.
+    With `headers_only`, the body is not decoded nor included.
+
     :param msg: email message of type `email.message.Message`
+    :param lazy: decode the headers and the body on access
+    :param headers_only: do not include the body of the message
 
     :returns : dictionary of type `requests.structures.CaseInsensitiveDict`
 
     :raises ParseError: when an error occurs transforming the message
         to a dictionary
     """
-    def parse_headers(msg):
-        headers = {}
+    if lazy:
+        return LazyMessage(msg, headers_only=headers_only)
 
-        for header, value in msg.items():
-            hv = []
-
-            for text, charset in email.header.decode_header(value):
-                if type(text) == bytes:
-                    charset = charset if charset else 'utf-8'
-                    try:
-                        text = text.decode(charset, errors='surrogateescape')
-                    except (UnicodeError, LookupError):
-                        # Try again with a 7bit encoding
-                        text = text.decode('ascii', errors='surrogateescape')
-                hv.append(text)
-
-            v = ' '.join(hv)
-            headers[header] = v if v else None
-
-        return headers
-
-    def parse_payload(msg):
-        body = {}
-
-        if not msg.is_multipart():
-            payload = decode_payload(msg)
-            subtype = msg.get_content_subtype()
-            body[subtype] = [payload]
-        else:
-            # Include all the attached texts if it is multipart
-            # Ignores binary parts by default
-            for part in email.iterators.typed_subpart_iterator(msg):
-                payload = decode_payload(part)
-                subtype = part.get_content_subtype()
-                body.setdefault(subtype, []).append(payload)
-
-        return {k: '\n'.join(v) for k, v in body.items()}
-
-    def decode_payload(msg_or_part):
-        charset = msg_or_part.get_content_charset('utf-8')
-        payload = msg_or_part.get_payload(decode=True)
-
-        try:
-            payload = payload.decode(charset, errors='surrogateescape')
-        except (UnicodeError, LookupError):
-            # Try again with a 7bit encoding
-            payload = payload.decode('ascii', errors='surrogateescape')
-        return payload
-
-    # The function starts here
     message = requests.structures.CaseInsensitiveDict()
-
-    if isinstance(msg, mailbox.mboxMessage):
-        message['unixfrom'] = msg.get_from()
-    else:
-        message['unixfrom'] = None
+    message['unixfrom'] = _get_unixfrom(msg)
 
     try:
-        for k, v in parse_headers(msg).items():
-            message[k] = v
-        message['body'] = parse_payload(msg)
+        for header, value in msg.items():
+            message[header] = _decode_header(value)
+        if not headers_only:
+            message['body'] = _parse_payload(msg)
     except UnicodeError as e:
         raise ParseError(cause=str(e))
 
     return message
 
 
+class LazyMessage(requests.structures.CaseInsensitiveDict):
+    """Dictionary of an email message decoded on access.
+
+    It stores the same keys `message_to_dict` returns but the
+    value of each header is decoded the first time it is accessed,
+    and the body, including its text subparts, is not decoded until
+    the `body` key is read. Messages that are discarded after
+    checking a few headers never pay for decoding the rest.
+
+    Parsing the body can be deferred too. In that case, `msg` only
+    needs to have the headers and `parse_body` has to return the
+    whole message when the body is accessed.
+
+    Take into account a `ParseError` is raised when a value is
+    accessed and not when the message is created.
+
+    :param msg: email message of type `email.message.Message`
+    :param headers_only: do not include the body of the message
+    :param parse_body: function that returns the whole email message
+    """
+    def __init__(self, msg, headers_only=False, parse_body=None):
+        super().__init__()
+
+        self['unixfrom'] = _get_unixfrom(msg)
+
+        for header, value in msg.items():
+            self[header] = _LazyValue(_decode_header, value)
+
+        if headers_only:
+            return
+        elif parse_body:
+            self['body'] = _LazyValue(_parse_deferred_payload, parse_body)
+        else:
+            self['body'] = _LazyValue(_parse_payload, msg)
+
+    def __getitem__(self, key):
+        name, value = self._store[key.lower()]
+
+        if isinstance(value, _LazyValue):
+            try:
+                value = value.decode()
+            except UnicodeError as e:
+                raise ParseError(cause=str(e))
+            self._store[key.lower()] = (name, value)
+
+        return value
+
+    def __contains__(self, key):
+        return key.lower() in self._store
+
+    def lower_items(self):
+        return ((key.lower(), self[key]) for key in self)
+
+    def copy(self):
+        return requests.structures.CaseInsensitiveDict(self.items())
+
+
+class _LazyValue:
+    """Value of a message decoded when it is needed"""
+
+    __slots__ = ['func', 'data']
+
+    def __init__(self, func, data):
+        self.func = func
+        self.data = data
+
+    def decode(self):
+        return self.func(self.data)
+
+
+def _get_unixfrom(msg):
+    if isinstance(msg, mailbox.mboxMessage):
+        return msg.get_from()
+    else:
+        return None
+
+
+def _decode_header(value):
+    hv = []
+
+    for text, charset in email.header.decode_header(value):
+        if type(text) == bytes:
+            charset = charset if charset else 'utf-8'
+            try:
+                text = text.decode(charset, errors='surrogateescape')
+            except (UnicodeError, LookupError):
+                # Try again with a 7bit encoding
+                text = text.decode('ascii', errors='surrogateescape')
+        hv.append(text)
+
+    v = ' '.join(hv)
+    return v if v else None
+
+
+def _parse_payload(msg):
+    body = {}
+
+    if not msg.is_multipart():
+        payload = _decode_payload(msg)
+        subtype = msg.get_content_subtype()
+        body[subtype] = [payload]
+    else:
+        # Include all the attached texts if it is multipart
+        # Ignores binary parts by default
+        for part in email.iterators.typed_subpart_iterator(msg):
+            payload = _decode_payload(part)
+            subtype = part.get_content_subtype()
+            body.setdefault(subtype, []).append(payload)
+
+    return {k: '\n'.join(v) for k, v in body.items()}
+
+
+def _parse_deferred_payload(parse_body):
+    return _parse_payload(parse_body())
+
+
+def _decode_payload(msg_or_part):
+    charset = msg_or_part.get_content_charset('utf-8')
+    payload = msg_or_part.get_payload(decode=True)
+
+    try:
+        payload = payload.decode(charset, errors='surrogateescape')
+    except (UnicodeError, LookupError):
+        # Try again with a 7bit encoding
+        payload = payload.decode('ascii', errors='surrogateescape')
+    return payload
+
+
 def remove_invalid_xml_chars(raw_xml):
     """Remove control and invalid characters from an xml stream.
 
@@ -111,7 +111,10 @@ setup(name="perceval",
           'grimoirelab-toolkit>=0.1.4'
       ],
       scripts=[
-          'bin/perceval'
+          'bin/perceval',
+          'bin/perceval-archive',
+          'bin/perceval-orchestrator',
+          'bin/perceval-git-fleet'
       ],
       cmdclass=cmdclass,
       zip_safe=False)
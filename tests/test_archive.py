@@ -22,6 +22,7 @@
 #     Santiago Dueñas <sduenas@bitergia.com>
 #
 
+import hashlib
 import os
 import pickle
 import shutil
@@ -29,16 +30,34 @@ import sqlite3
 import tempfile
 import unittest
 import unittest.mock
+import zlib
 
 import httpretty
 import requests
 
 from grimoirelab_toolkit.datetime import datetime_utcnow, datetime_to_utc
 
-from perceval.archive import Archive, ArchiveManager
+from perceval.archive import (Archive,
+                              ArchiveBlobStore,
+                              ArchiveCatalog,
+                              ArchiveManager,
+                              ArchivedResponse,
+                              decode_record,
+                              encode_record)
 from perceval.errors import ArchiveError, ArchiveManagerError
 
 
+def make_response(url, content):
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response.reason = 'OK'
+    response.encoding = 'utf-8'
+    response.headers['Content-Type'] = 'application/json'
+    response._content = content
+    return response
+
+
 def count_number_rows(db, table_name):
     conn = sqlite3.connect(db)
     cursor = conn.cursor()
@@ -189,7 +208,7 @@ class TestArchive(unittest.TestCase):
         ds = data_stored[0]
         dr = data_requests[0]
         self.assertEqual(ds[0], '0fa4ce047340780f08efca92f22027514263521d')
-        self.assertEqual(pickle.loads(ds[1]).url, responses[0].url)
+        self.assertEqual(decode_record(ds[1]).url, responses[0].url)
         self.assertEqual(ds[2], dr[0])
         self.assertEqual(pickle.loads(ds[3]), dr[1])
         self.assertEqual(pickle.loads(ds[4]), dr[2])
@@ -197,7 +216,7 @@ class TestArchive(unittest.TestCase):
         ds = data_stored[1]
         dr = data_requests[1]
         self.assertEqual(ds[0], '3879a6f12828b7ac3a88b7167333e86168f2f5d2')
-        self.assertEqual(pickle.loads(ds[1]).url, responses[1].url)
+        self.assertEqual(decode_record(ds[1]).url, responses[1].url)
         self.assertEqual(ds[2], dr[0])
         self.assertEqual(pickle.loads(ds[3]), dr[1])
         self.assertEqual(pickle.loads(ds[4]), dr[2])
@@ -205,7 +224,7 @@ class TestArchive(unittest.TestCase):
         ds = data_stored[2]
         dr = data_requests[2]
         self.assertEqual(ds[0], 'ef38f574a0745b63a056e7befdb7a06e7cf1549b')
-        self.assertEqual(pickle.loads(ds[1]).url, responses[2].url)
+        self.assertEqual(decode_record(ds[1]).url, responses[2].url)
         self.assertEqual(ds[2], dr[0])
         self.assertEqual(pickle.loads(ds[3]), dr[1])
         self.assertEqual(pickle.loads(ds[4]), dr[2])
@@ -255,6 +274,310 @@ class TestArchive(unittest.TestCase):
 
         self.assertEqual(data.url, response.url)
 
+    def test_create_wal(self):
+        """Test whether an archive is created in write-ahead log mode"""
+
+        archive_path = os.path.join(self.test_path, 'myarchive')
+        archive = Archive.create(archive_path, wal=True)
+
+        db = sqlite3.connect(archive.archive_path)
+        cursor = db.cursor()
+        cursor.execute("PRAGMA journal_mode")
+        journal_mode = cursor.fetchone()[0]
+        cursor.close()
+        db.close()
+
+        self.assertEqual(journal_mode, 'wal')
+
+        cursor = archive._db.cursor()
+        cursor.execute("PRAGMA synchronous")
+        synchronous = cursor.fetchone()[0]
+        cursor.close()
+
+        # NORMAL synchronous mode
+        self.assertEqual(synchronous, 1)
+
+    def test_invalid_batch_size(self):
+        """Test whether an exception is raised when the batch size is invalid"""
+
+        archive_path = os.path.join(self.test_path, 'myarchive')
+
+        with self.assertRaisesRegex(ArchiveError, "batch size must be greater than 0"):
+            _ = Archive.create(archive_path, batch_size=0)
+
+    def test_store_batch(self):
+        """Test whether items are committed in batches"""
+
+        archive_path = os.path.join(self.test_path, 'myarchive')
+        archive = Archive.create(archive_path, wal=True, batch_size=3)
+
+        for x in range(4):
+            archive.store('http://example.com/', {'page': x}, {}, {'data': x})
+
+        # Only the items of the first batch are visible
+        nrows = count_number_rows(archive_path, Archive.ARCHIVE_TABLE)
+        self.assertEqual(nrows, 3)
+
+        # Items not committed yet can be retrieved
+        data = archive.retrieve('http://example.com/', {'page': 3}, {})
+        self.assertDictEqual(data, {'data': 3})
+
+        archive.flush()
+
+        nrows = count_number_rows(archive_path, Archive.ARCHIVE_TABLE)
+        self.assertEqual(nrows, 4)
+
+        # Nothing to flush
+        archive.flush()
+
+        nrows = count_number_rows(archive_path, Archive.ARCHIVE_TABLE)
+        self.assertEqual(nrows, 4)
+
+    def test_discard(self):
+        """Test whether pending items are discarded"""
+
+        archive_path = os.path.join(self.test_path, 'myarchive')
+        archive = Archive.create(archive_path, wal=True, batch_size=3)
+
+        for x in range(4):
+            archive.store('http://example.com/', {'page': x}, {}, {'data': x})
+
+        archive.discard()
+
+        with self.assertRaisesRegex(ArchiveError, "not found"):
+            archive.retrieve('http://example.com/', {'page': 3}, {})
+
+        # Nothing is written when flushing or closing the archive
+        archive.flush()
+        archive.close()
+
+        nrows = count_number_rows(archive_path, Archive.ARCHIVE_TABLE)
+        self.assertEqual(nrows, 3)
+
+    @unittest.mock.patch('time.time')
+    def test_store_batch_timeout(self, mock_time):
+        """Test whether a transaction is committed when the timeout expires"""
+
+        mock_time.side_effect = [0, 1, 5, 8, 12, 20, 21]
+
+        archive_path = os.path.join(self.test_path, 'myarchive')
+        archive = Archive.create(archive_path, batch_size=100, batch_timeout=10)
+
+        for x in range(3):
+            archive.store('http://example.com/', {'page': x}, {}, {'data': x})
+
+        nrows = count_number_rows(archive_path, Archive.ARCHIVE_TABLE)
+        self.assertEqual(nrows, 0)
+
+        # 12 seconds after the first item was stored
+        archive.store('http://example.com/', {'page': 3}, {}, {'data': 3})
+
+        nrows = count_number_rows(archive_path, Archive.ARCHIVE_TABLE)
+        self.assertEqual(nrows, 4)
+
+        # A new transaction starts here
+        archive.store('http://example.com/', {'page': 4}, {}, {'data': 4})
+
+        nrows = count_number_rows(archive_path, Archive.ARCHIVE_TABLE)
+        self.assertEqual(nrows, 4)
+
+    @httpretty.activate
+    def test_retrieve_compressed(self):
+        """Test whether compressed data is properly retrieved from the archive"""
+
+        url = "https://example.com/tasks"
+        payload = {'task_id': 10}
+        headers = {'Accept': 'application/json'}
+
+        httpretty.register_uri(httpretty.GET,
+                               url,
+                               body='{"hey": "there"}',
+                               status=200,
+                               link='<https://example.com/tasks?page=2>; rel="next"')
+        response = requests.get(url, params=payload, headers=headers)
+
+        for compression in [None, 'zlib', 'lzma']:
+            archive_path = os.path.join(self.test_path, 'myarchive-%s' % compression)
+            archive = Archive.create(archive_path, compression=compression)
+            archive.store(url, payload, headers, response)
+            archive.store(url, {}, headers, {'data': [1, 2, 3]})
+
+            self.assertEqual(archive.format_version, Archive.FORMAT_VERSION)
+            self.assertEqual(archive.compression, compression)
+
+            data = archive.retrieve(url, payload, headers)
+
+            self.assertIsInstance(data, ArchivedResponse)
+            self.assertIsInstance(data, requests.Response)
+            self.assertEqual(data.status_code, 200)
+            self.assertEqual(data.url, response.url)
+            self.assertEqual(data.encoding, response.encoding)
+            self.assertEqual(data.headers['link'], response.headers['Link'])
+            self.assertEqual(data.links['next']['url'], 'https://example.com/tasks?page=2')
+            self.assertEqual(data.content, b'{"hey": "there"}')
+            self.assertEqual(data.text, '{"hey": "there"}')
+            self.assertDictEqual(data.json(), {'hey': 'there'})
+
+            data = archive.retrieve(url, {}, headers)
+            self.assertDictEqual(data, {'data': [1, 2, 3]})
+
+    def test_invalid_compression(self):
+        """Test whether an exception is raised when the compression is not supported"""
+
+        archive_path = os.path.join(self.test_path, 'myarchive')
+
+        with self.assertRaisesRegex(ArchiveError, "compression bzip not supported"):
+            _ = Archive.create(archive_path, compression='bzip')
+
+    def test_retrieve_dedup(self):
+        """Test whether the bodies of the responses are shared using a blob store"""
+
+        url = "https://example.com/users"
+        content = b'{"login": "jsmith"}' * 100
+
+        blob_store = ArchiveBlobStore(self.test_path)
+        blobs_path = blob_store.blob_store_path
+
+        archives = []
+
+        for name in ['first', 'second']:
+            archive_dir = os.path.join(self.test_path, name)
+            os.makedirs(archive_dir)
+
+            archive = Archive.create(os.path.join(archive_dir, 'myarchive'),
+                                     compression='zlib', blob_store=blob_store)
+            archive.init_metadata(url, 'github', '0.8', 'user', {})
+            self.assertEqual(archive.format_version, Archive.DEDUP_FORMAT_VERSION)
+            self.assertEqual(archive.blob_store.blob_store_path,
+                             os.path.join(archive_dir, '..', ArchiveBlobStore.BLOB_STORE_NAME))
+
+            archive.store(url, {}, {}, make_response(url, content))
+            archive.store(url, {'page': 2}, {}, make_response(url, b'[]'))
+            archive.store(url, {'page': 3}, {}, {'data': [1, 2, 3]})
+            archives.append(archive)
+
+        # Bodies are only stored once
+        self.assertEqual(count_number_rows(blobs_path, ArchiveBlobStore.BLOBS_TABLE), 2)
+
+        for archive in archives:
+            archive = Archive(archive.archive_path)
+            self.assertEqual(archive.format_version, Archive.DEDUP_FORMAT_VERSION)
+
+            data = archive.retrieve(url, {}, {})
+            self.assertIsInstance(data, ArchivedResponse)
+            self.assertEqual(data.url, url)
+            self.assertEqual(data.headers['content-type'], 'application/json')
+            self.assertEqual(data.content, content)
+
+            data = archive.retrieve(url, {'page': 2}, {})
+            self.assertListEqual(data.json(), [])
+
+            data = archive.retrieve(url, {'page': 3}, {})
+            self.assertDictEqual(data, {'data': [1, 2, 3]})
+
+    def test_store_dedup_pending_batch(self):
+        """Test whether the blob store is not locked while a batch is pending"""
+
+        url = "https://example.com/users"
+
+        blob_store = ArchiveBlobStore(self.test_path)
+        archive_path = os.path.join(self.test_path, 'myarchive')
+        archive = Archive.create(archive_path, wal=True, batch_size=100,
+                                 blob_store=blob_store)
+        archive.init_metadata(url, 'github', '0.8', 'user', {})
+        archive.store(url, {}, {}, make_response(url, b'first'))
+
+        # The blob is already written, while the entry is pending
+        blobs_path = blob_store.blob_store_path
+        self.assertEqual(count_number_rows(blobs_path, ArchiveBlobStore.BLOBS_TABLE), 1)
+        self.assertEqual(count_number_rows(archive_path, Archive.ARCHIVE_TABLE), 0)
+
+        # Other fetchers can add blobs without waiting for the batch
+        db = sqlite3.connect(blobs_path, timeout=0)
+        db.execute("INSERT INTO " + ArchiveBlobStore.BLOBS_TABLE + " VALUES ('abcd', 0, x'00')")
+        db.commit()
+        db.close()
+
+        other = ArchiveBlobStore(self.test_path)
+        other.put(b'second')
+        other.close()
+
+        archive.store(url, {'page': 2}, {}, make_response(url, b'third'))
+        archive.flush()
+
+        self.assertEqual(count_number_rows(blobs_path, ArchiveBlobStore.BLOBS_TABLE), 4)
+        self.assertEqual(count_number_rows(archive_path, Archive.ARCHIVE_TABLE), 2)
+
+    def test_dedup_blob_store_not_found(self):
+        """Test whether an exception is raised when the blob store path is missing"""
+
+        archive_path = os.path.join(self.test_path, 'myarchive')
+        blob_store = ArchiveBlobStore(self.test_path)
+        _ = Archive.create(archive_path, blob_store=blob_store)
+
+        db = sqlite3.connect(archive_path)
+        db.execute("DELETE FROM " + Archive.BLOB_STORE_TABLE)
+        db.commit()
+        db.close()
+
+        with self.assertRaisesRegex(ArchiveError, "blob store not found"):
+            _ = Archive(archive_path)
+
+    @httpretty.activate
+    def test_retrieve_pickle_format(self):
+        """Test whether data stored in version 0 archives is retrieved"""
+
+        url = "https://example.com/tasks"
+        payload = {'task_id': 10}
+        headers = {'Accept': 'application/json'}
+
+        httpretty.register_uri(httpretty.GET,
+                               url,
+                               body='{"hey": "there"}',
+                               status=200)
+        response = requests.get(url, params=payload, headers=headers)
+
+        archive_path = os.path.join(self.test_path, 'myarchive')
+        _ = Archive.create(archive_path)
+
+        # Downgrade the archive to version 0
+        db = sqlite3.connect(archive_path)
+        db.execute("PRAGMA user_version=0")
+        db.commit()
+        db.close()
+
+        archive = Archive(archive_path, compression='zlib')
+        self.assertEqual(archive.format_version, Archive.PICKLE_FORMAT_VERSION)
+
+        archive.store(url, payload, headers, response)
+
+        db = sqlite3.connect(archive.archive_path)
+        cursor = db.cursor()
+        cursor.execute("SELECT data FROM archive")
+        data_stored = cursor.fetchone()
+        cursor.close()
+
+        self.assertEqual(pickle.loads(data_stored[0]).url, response.url)
+
+        data = archive.retrieve(url, payload, headers)
+        self.assertNotIsInstance(data, ArchivedResponse)
+        self.assertEqual(data.url, response.url)
+        self.assertDictEqual(data.json(), {'hey': 'there'})
+
+    def test_unsupported_format_version(self):
+        """Test whether an exception is raised when the format version is not supported"""
+
+        archive_path = os.path.join(self.test_path, 'myarchive')
+        _ = Archive.create(archive_path)
+
+        db = sqlite3.connect(archive_path)
+        db.execute("PRAGMA user_version=1000")
+        db.commit()
+        db.close()
+
+        with self.assertRaisesRegex(ArchiveError, "format version 1000 not supported"):
+            _ = Archive(archive_path)
+
     def test_retrieve_missing(self):
         """Test whether the retrieval of non archived data throws an error
 
@@ -269,6 +592,142 @@ class TestArchive(unittest.TestCase):
             _ = archive.retrieve("http://wrong", payload={}, headers={})
 
 
+class TestRecord(unittest.TestCase):
+    """Tests for encode_record and decode_record functions"""
+
+    def test_encode_response(self):
+        """Test whether responses are encoded as minimal records"""
+
+        response = requests.Response()
+        response.status_code = 404
+        response.url = 'https://example.com/'
+        response.reason = 'Not Found'
+        response.encoding = 'utf-8'
+        response.headers['Content-Type'] = 'text/plain'
+        response._content = b'Not found' * 100
+
+        for compression in [None, 'zlib', 'lzma']:
+            record = encode_record(response, compression=compression)
+            self.assertLess(len(record), len(pickle.dumps(response, 0)))
+
+            decoded = decode_record(record)
+            self.assertIsInstance(decoded, ArchivedResponse)
+            self.assertEqual(decoded.status_code, 404)
+            self.assertEqual(decoded.url, 'https://example.com/')
+            self.assertEqual(decoded.reason, 'Not Found')
+            self.assertEqual(decoded.encoding, 'utf-8')
+            self.assertEqual(decoded.headers['content-type'], 'text/plain')
+
+            # Body is decoded on the first access
+            self.assertEqual(decoded._content, False)
+            self.assertEqual(decoded.content, b'Not found' * 100)
+            self.assertEqual(decoded._body, None)
+
+            chunks = [chunk for chunk in decoded.iter_content(chunk_size=300)]
+            self.assertEqual(len(chunks), 3)
+
+            with self.assertRaises(requests.exceptions.HTTPError):
+                decoded.raise_for_status()
+
+            # Rebuilt responses can be stored again
+            decoded = decode_record(encode_record(decoded, compression=compression))
+            self.assertEqual(decoded.content, b'Not found' * 100)
+
+    def test_encode_objects(self):
+        """Test whether any other object is encoded"""
+
+        objs = ['text', b'bytes', {'a': 1}, [1, 2, 3], None]
+
+        for compression in [None, 'zlib', 'lzma']:
+            for obj in objs:
+                decoded = decode_record(encode_record(obj, compression=compression))
+                self.assertEqual(decoded, obj)
+
+            error = requests.exceptions.HTTPError('error')
+            decoded = decode_record(encode_record(error, compression=compression))
+            self.assertIsInstance(decoded, requests.exceptions.HTTPError)
+
+    def test_decode_invalid_record(self):
+        """Test whether an exception is raised decoding invalid records"""
+
+        with self.assertRaisesRegex(ArchiveError, "unknown codec"):
+            decode_record(b'rkabcd')
+
+        with self.assertRaisesRegex(ArchiveError, "unknown type"):
+            decode_record(b'tnabcd')
+
+    def test_encode_blob_response(self):
+        """Test whether the bodies of the responses are encoded as references"""
+
+        test_path = tempfile.mkdtemp(prefix='perceval_')
+        self.addCleanup(shutil.rmtree, test_path)
+
+        blob_store = ArchiveBlobStore(test_path)
+        response = make_response('https://example.com/', b'Found' * 100)
+
+        record = encode_record(response, compression='lzma', blob_store=blob_store)
+        self.assertLess(len(record), 200)
+
+        decoded = decode_record(record, blob_store=blob_store)
+        self.assertIsInstance(decoded, ArchivedResponse)
+        self.assertEqual(decoded.url, 'https://example.com/')
+        self.assertEqual(decoded.content, b'Found' * 100)
+
+        # Other objects are stored in the record
+        decoded = decode_record(encode_record([1, 2], blob_store=blob_store))
+        self.assertListEqual(decoded, [1, 2])
+
+        with self.assertRaisesRegex(ArchiveError, "blob store not available"):
+            decode_record(record)
+
+
+class TestArchiveBlobStore(unittest.TestCase):
+    """Tests for ArchiveBlobStore class"""
+
+    def setUp(self):
+        self.test_path = tempfile.mkdtemp(prefix='perceval_')
+
+    def tearDown(self):
+        shutil.rmtree(self.test_path)
+
+    def test_put(self):
+        """Test whether blobs are stored once"""
+
+        blob_store = ArchiveBlobStore(self.test_path)
+        self.assertEqual(blob_store.blob_store_path,
+                         os.path.join(self.test_path, ArchiveBlobStore.BLOB_STORE_NAME))
+
+        hashcode = blob_store.put(b'data' * 10, compression='zlib')
+        self.assertEqual(hashcode, hashlib.sha256(b'data' * 10).hexdigest())
+
+        # The same content is not stored again, even compressed
+        # using a different algorithm
+        self.assertEqual(blob_store.put(b'data' * 10, compression='lzma'), hashcode)
+        other = blob_store.put(b'other', compression='lzma')
+        self.assertNotEqual(other, hashcode)
+
+        blobs_path = blob_store.blob_store_path
+        self.assertEqual(count_number_rows(blobs_path, ArchiveBlobStore.BLOBS_TABLE), 2)
+
+        blob, compression = blob_store.get(hashcode)
+        self.assertEqual(compression, 'zlib')
+        self.assertEqual(zlib.decompress(blob), b'data' * 10)
+
+        blob, compression = blob_store.get(other)
+        self.assertEqual(compression, 'lzma')
+
+        self.assertEqual(blob_store.put(None), None)
+        self.assertEqual(blob_store.get(None), (None, None))
+
+    def test_get_not_found(self):
+        """Test whether an exception is raised when a blob is not found"""
+
+        blob_store = ArchiveBlobStore(self.test_path)
+
+        with self.assertRaisesRegex(ArchiveError, "blob abcd not found"):
+            blob_store.get('abcd')
+
+
 ARCHIVE_TEST_DIR = 'archivedir'
 
 
@@ -341,6 +800,111 @@ class TestArchiveManager(unittest.TestCase):
         with self.assertRaisesRegex(ArchiveManagerError, 'archive .+ already exists'):
             _ = manager.create_archive()
 
+    def test_create_archive_dedup(self):
+        """Test if new archives share the blob store of the manager"""
+
+        archive_mng_path = os.path.join(self.test_path, ARCHIVE_TEST_DIR)
+        manager = ArchiveManager(archive_mng_path, compression='zlib', dedup=True)
+        self.assertEqual(manager.dedup, True)
+
+        url = 'https://example.com/'
+
+        for _ in range(2):
+            archive = manager.create_archive()
+            self.assertEqual(archive.format_version, Archive.DEDUP_FORMAT_VERSION)
+            self.assertEqual(os.path.realpath(archive.blob_store.blob_store_path),
+                             os.path.realpath(manager.blob_store_path))
+
+            archive.init_metadata(url, 'git', '0.8', 'commit', {})
+            archive.store(url, {}, {}, make_response(url, b'content'))
+
+        nblobs = count_number_rows(manager.blob_store_path, ArchiveBlobStore.BLOBS_TABLE)
+        self.assertEqual(nblobs, 1)
+
+        # The blob store is not indexed as an archive
+        self.assertEqual(manager.rebuild_catalog(), 2)
+
+    def test_compact(self):
+        """Test if archives are moved to the deduplicated layout"""
+
+        archive_mng_path = os.path.join(self.test_path, ARCHIVE_TEST_DIR)
+        manager = ArchiveManager(archive_mng_path)
+
+        url = 'https://example.com/'
+        content = b'{"login": "jsmith"}' * 1000
+
+        dt = datetime_utcnow()
+        archive_paths = []
+
+        for x in range(3):
+            archive = manager.create_archive()
+            archive.init_metadata(url, 'github', '0.8', 'issue', {'x': x})
+
+            # Version 0 archives are compacted too
+            if x == 0:
+                archive.close()
+                db = sqlite3.connect(archive.archive_path)
+                db.execute("PRAGMA user_version=0")
+                db.commit()
+                db.close()
+                archive = Archive(archive.archive_path)
+
+            archive.store(url, {'page': 1}, {}, make_response(url, content))
+            archive.store(url, {'page': 2}, {}, make_response(url, b'page %s' % str(x).encode()))
+            archive.store(url, {'page': 3}, {}, {'data': x})
+            archive_paths.append(archive.archive_path)
+
+        # Empty and invalid archives are compacted or ignored
+        empty_archive = manager.create_archive()
+        invalid_path = os.path.join(archive_mng_path, 'invalid.sqlite3')
+        with open(invalid_path, 'w') as fd:
+            fd.write("invalid")
+
+        old_archive = Archive(archive_paths[1])
+        created_on = old_archive.created_on
+        old_archive.close()
+
+        manng = ArchiveManager(archive_mng_path, compression='lzma')
+        narchives, size_before, size_after = manng.compact()
+
+        self.assertEqual(narchives, 4)
+        self.assertLess(size_after, size_before)
+        self.assertEqual(os.path.exists(invalid_path), True)
+
+        nblobs = count_number_rows(manng.blob_store_path, ArchiveBlobStore.BLOBS_TABLE)
+        self.assertEqual(nblobs, 4)
+
+        for x, archive_path in enumerate(archive_paths):
+            archive = Archive(archive_path)
+            self.assertEqual(archive.format_version, Archive.DEDUP_FORMAT_VERSION)
+            self.assertEqual(archive.origin, url)
+            self.assertEqual(archive.backend_name, 'github')
+            self.assertEqual(archive.backend_version, '0.8')
+            self.assertEqual(archive.category, 'issue')
+            self.assertDictEqual(archive.backend_params, {'x': x})
+
+            data = archive.retrieve(url, {'page': 1}, {})
+            self.assertEqual(data.content, content)
+            data = archive.retrieve(url, {'page': 2}, {})
+            self.assertEqual(data.content, b'page %s' % str(x).encode())
+            data = archive.retrieve(url, {'page': 3}, {})
+            self.assertDictEqual(data, {'data': x})
+
+        # Creation dates are kept, so archives are still found
+        archive = Archive(archive_paths[1])
+        self.assertEqual(archive.created_on, created_on)
+
+        archives = manng.search(url, 'github', 'issue', dt)
+        self.assertListEqual(sorted(archives), sorted(archive_paths))
+
+        archive = Archive(empty_archive.archive_path)
+        self.assertEqual(archive.format_version, Archive.DEDUP_FORMAT_VERSION)
+        self.assertEqual(archive.origin, None)
+
+        # Compacted archives are not converted again
+        narchives, _, _ = manng.compact()
+        self.assertEqual(narchives, 0)
+
     def test_remove_archive(self):
         """Test if an archive is removed by the archive manager"""
 
@@ -362,6 +926,25 @@ class TestArchiveManager(unittest.TestCase):
         with self.assertRaisesRegex(ArchiveManagerError, 'archive mockarchive does not exist'):
             manager.remove_archive('mockarchive')
 
+    def test_remove_archive_wal(self):
+        """Test if the journal files of an archive are removed too"""
+
+        archive_mng_path = os.path.join(self.test_path, ARCHIVE_TEST_DIR)
+        manager = ArchiveManager(archive_mng_path, wal=True, batch_size=5)
+
+        archive = manager.create_archive()
+        archive.init_metadata('marvel.com', 'marvel-comics-backend', '0.1.0',
+                              'issue', {})
+        archive.store('http://example.com/', {}, {}, {'data': 0})
+        archive.flush()
+
+        self.assertEqual(os.path.exists(archive.archive_path + '-wal'), True)
+
+        manager.remove_archive(archive.archive_path)
+        self.assertEqual(os.path.exists(archive.archive_path), False)
+        self.assertEqual(os.path.exists(archive.archive_path + '-wal'), False)
+        self.assertEqual(os.path.exists(archive.archive_path + '-shm'), False)
+
     def test_search(self):
         """Test if a set of archives is found based on the given criteria"""
 
@@ -514,6 +1097,170 @@ class TestArchiveManager(unittest.TestCase):
         archives = manager.search('https://example.com', 'bugzilla', 'commit', dt)
         self.assertListEqual(archives, [])
 
+    def test_catalog(self):
+        """Test whether the catalog is kept up to date"""
+
+        archive_mng_path = os.path.join(self.test_path, ARCHIVE_TEST_DIR)
+        manager = ArchiveManager(archive_mng_path)
+
+        catalog_path = os.path.join(archive_mng_path, ArchiveCatalog.CATALOG_NAME)
+        self.assertEqual(manager.catalog.catalog_path, catalog_path)
+        self.assertEqual(os.path.exists(catalog_path), True)
+
+        archive = manager.create_archive()
+        self.assertEqual(archive.catalog, manager.catalog)
+
+        # The archive is indexed but it does not have metadata yet
+        nrows = count_number_rows(catalog_path, ArchiveCatalog.CATALOG_TABLE)
+        self.assertEqual(nrows, 1)
+
+        archive.init_metadata('https://example.com', 'git', '0.8', 'commit', {})
+
+        db = sqlite3.connect(catalog_path)
+        cursor = db.cursor()
+        cursor.execute("SELECT archive_path, origin, backend_name, category, created_on FROM catalog")
+        rows = cursor.fetchall()
+        cursor.close()
+        db.close()
+
+        expected = (os.path.relpath(archive.archive_path, archive_mng_path),
+                    'https://example.com', 'git', 'commit',
+                    archive.created_on.timestamp())
+        self.assertListEqual(rows, [expected])
+
+        manager.remove_archive(archive.archive_path)
+
+        nrows = count_number_rows(catalog_path, ArchiveCatalog.CATALOG_TABLE)
+        self.assertEqual(nrows, 0)
+
+    def test_search_does_not_open_archives(self):
+        """Test whether archives are not opened during the search"""
+
+        archive_mng_path = os.path.join(self.test_path, ARCHIVE_TEST_DIR)
+        manager = ArchiveManager(archive_mng_path)
+
+        dt = datetime_utcnow()
+        archive = manager.create_archive()
+        archive.init_metadata('https://example.com', 'git', '0.8', 'commit', {})
+
+        with unittest.mock.patch('perceval.archive.Archive.__init__') as mock_init:
+            archives = manager.search('https://example.com', 'git', 'commit', dt)
+            self.assertEqual(mock_init.called, False)
+
+        self.assertListEqual(archives, [archive.archive_path])
+
+    def test_search_removed_archives(self):
+        """Test whether archives which no longer exist are removed from the catalog"""
+
+        archive_mng_path = os.path.join(self.test_path, ARCHIVE_TEST_DIR)
+        manager = ArchiveManager(archive_mng_path)
+
+        dt = datetime_utcnow()
+        filepaths = []
+
+        for _ in range(2):
+            archive = manager.create_archive()
+            archive.init_metadata('https://example.com', 'git', '0.8', 'commit', {})
+            filepaths.append(archive.archive_path)
+
+        os.remove(filepaths[0])
+
+        archives = manager.search('https://example.com', 'git', 'commit', dt)
+        self.assertListEqual(archives, [filepaths[1]])
+
+        catalog_path = os.path.join(archive_mng_path, ArchiveCatalog.CATALOG_NAME)
+        nrows = count_number_rows(catalog_path, ArchiveCatalog.CATALOG_TABLE)
+        self.assertEqual(nrows, 1)
+
+    def test_rebuild_catalog(self):
+        """Test whether the catalog of an existing directory is rebuilt"""
+
+        archive_mng_path = os.path.join(self.test_path, ARCHIVE_TEST_DIR)
+        manager = ArchiveManager(archive_mng_path)
+
+        dt = datetime_utcnow()
+        filepaths = []
+
+        for origin in ['https://example.com', 'https://example.org', 'https://example.com']:
+            archive = manager.create_archive()
+            archive.init_metadata(origin, 'git', '0.8', 'commit', {})
+            filepaths.append(archive.archive_path)
+
+        # Invalid files are ignored
+        invalid_path = os.path.join(archive_mng_path, 'invalid.sqlite3')
+        with open(invalid_path, 'w') as fd:
+            fd.write("Invalid archive file")
+
+        # Directories without catalog are indexed when they are managed
+        os.remove(manager.catalog.catalog_path)
+
+        manager = ArchiveManager(archive_mng_path)
+        archives = manager.search('https://example.com', 'git', 'commit', dt)
+        self.assertListEqual(archives, [filepaths[0], filepaths[2]])
+
+        # Archives copied by other means are found after rebuilding the catalog
+        archive = Archive.create(os.path.join(archive_mng_path, 'copied.sqlite3'))
+        archive.init_metadata('https://example.com', 'git', '0.8', 'commit', {})
+
+        archives = manager.search('https://example.com', 'git', 'commit', dt)
+        self.assertListEqual(archives, [filepaths[0], filepaths[2]])
+
+        narchives = manager.rebuild_catalog()
+        self.assertEqual(narchives, 4)
+
+        archives = manager.search('https://example.com', 'git', 'commit', dt)
+        self.assertListEqual(archives, [filepaths[0], filepaths[2], archive.archive_path])
+
+    def test_catalog_concurrent_archives(self):
+        """Test whether archives added while the catalog is created are kept"""
+
+        archive_mng_path = os.path.join(self.test_path, ARCHIVE_TEST_DIR)
+        manager = ArchiveManager(archive_mng_path)
+
+        dt = datetime_utcnow()
+        archive = manager.create_archive()
+        archive.init_metadata('https://example.com', 'git', '0.8', 'commit', {})
+        filepaths = [archive.archive_path]
+
+        os.remove(manager.catalog.catalog_path)
+
+        search_files = ArchiveManager._search_files
+
+        def create_while_walking(mng):
+            # Another manager creates an archive once the walk started
+            for filepath in search_files(mng):
+                yield filepath
+
+            other = ArchiveManager(archive_mng_path)
+            archive = other.create_archive()
+            archive.init_metadata('https://example.com', 'git', '0.8', 'commit', {})
+            filepaths.append(archive.archive_path)
+
+        with unittest.mock.patch.object(ArchiveManager, '_search_files',
+                                        create_while_walking):
+            manager = ArchiveManager(archive_mng_path)
+
+        archives = manager.search('https://example.com', 'git', 'commit', dt)
+        self.assertListEqual(archives, filepaths)
+
+    def test_moved_directory(self):
+        """Test whether archives are found after moving the directory"""
+
+        archive_mng_path = os.path.join(self.test_path, ARCHIVE_TEST_DIR)
+        manager = ArchiveManager(archive_mng_path)
+
+        dt = datetime_utcnow()
+        archive = manager.create_archive()
+        archive.init_metadata('https://example.com', 'git', '0.8', 'commit', {})
+        relpath = os.path.relpath(archive.archive_path, archive_mng_path)
+
+        new_path = os.path.join(self.test_path, 'newdir')
+        shutil.move(archive_mng_path, new_path)
+
+        manager = ArchiveManager(new_path)
+        archives = manager.search('https://example.com', 'git', 'commit', dt)
+        self.assertListEqual(archives, [os.path.join(new_path, relpath)])
+
 
 if __name__ == "__main__":
     unittest.main()
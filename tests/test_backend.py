@@ -39,13 +39,14 @@ from grimoirelab_toolkit.datetime import (InvalidDateError,
                                           str_to_datetime)
 
 from perceval.backends.core import __version__
-from perceval.archive import Archive, ArchiveManager
+from perceval.archive import Archive, ArchiveCatalog, ArchiveManager
 from perceval.backend import (Backend,
                               BackendCommandArgumentParser,
                               BackendCommand,
                               uuid,
                               fetch,
                               fetch_from_archive)
+from perceval.client import HttpCache, SharedRateLimiter
 from perceval.errors import ArchiveError, BackendError
 from perceval.utils import DEFAULT_DATETIME
 from base import TestCaseBackendArchive
@@ -140,6 +141,60 @@ class MockedBackendCommand(BackendCommand):
         return parser
 
 
+class RateLimiterBackend(CommandBackend):
+    """Backend which supports shared rate limiters"""
+
+    def __init__(self, origin, tag=None, archive=None, rate_limiter=None):
+        super().__init__(origin, tag=tag, archive=archive)
+        self.rate_limiter = rate_limiter
+
+    def fetch_items(self, category, **kwargs):
+        for item in super().fetch_items(category, **kwargs):
+            item['rate_limiter'] = self.rate_limiter.limiter_path if self.rate_limiter else None
+            yield item
+
+
+class RateLimiterBackendCommand(MockedBackendCommand):
+    """Mocked backend command class used for testing shared rate limiters"""
+
+    BACKEND = RateLimiterBackend
+
+    @staticmethod
+    def setup_cmd_parser():
+        parser = BackendCommandArgumentParser(archive=True,
+                                              rate_limiter=True)
+        parser.parser.add_argument('origin')
+
+        return parser
+
+
+class HttpCacheBackend(CommandBackend):
+    """Backend which supports HTTP caches"""
+
+    def __init__(self, origin, tag=None, archive=None, http_cache=None):
+        super().__init__(origin, tag=tag, archive=archive)
+        self.http_cache = http_cache
+
+    def fetch_items(self, category, **kwargs):
+        for item in super().fetch_items(category, **kwargs):
+            item['http_cache'] = self.http_cache.cache_path if self.http_cache else None
+            yield item
+
+
+class HttpCacheBackendCommand(MockedBackendCommand):
+    """Mocked backend command class used for testing HTTP caches"""
+
+    BACKEND = HttpCacheBackend
+
+    @staticmethod
+    def setup_cmd_parser():
+        parser = BackendCommandArgumentParser(archive=True,
+                                              http_cache=True)
+        parser.parser.add_argument('origin')
+
+        return parser
+
+
 class NoArchiveBackendCommand(BackendCommand):
     """Mocked backend command class used for testing which does not support archive"""
 
@@ -506,6 +561,81 @@ class TestBackendCommandArgumentParser(unittest.TestCase):
         self.assertEqual(parsed_args.fetch_archive, True)
         self.assertEqual(parsed_args.no_archive, False)
         self.assertEqual(parsed_args.archived_since, expected_dt)
+        self.assertEqual(parsed_args.archive_wal, False)
+        self.assertEqual(parsed_args.archive_batch_size, 1)
+        self.assertEqual(parsed_args.archive_batch_timeout, None)
+        self.assertEqual(parsed_args.archive_compression, None)
+        self.assertEqual(parsed_args.archive_dedup, False)
+        self.assertEqual(parsed_args.fetch_archive_workers, None)
+        self.assertEqual(parsed_args.fetch_archive_unordered, False)
+
+    def test_parse_archive_write_mode_args(self):
+        """Test if archive write mode arguments are parsed"""
+
+        args = ['--archive-path', '/tmp/archive',
+                '--archive-wal',
+                '--archive-batch-size', '100',
+                '--archive-batch-timeout', '2.5',
+                '--archive-compression', 'lzma',
+                '--archive-dedup']
+
+        parser = BackendCommandArgumentParser(archive=True)
+        parsed_args = parser.parse(*args)
+
+        self.assertEqual(parsed_args.archive_wal, True)
+        self.assertEqual(parsed_args.archive_batch_size, 100)
+        self.assertEqual(parsed_args.archive_batch_timeout, 2.5)
+        self.assertEqual(parsed_args.archive_compression, 'lzma')
+        self.assertEqual(parsed_args.archive_dedup, True)
+
+    def test_parse_fetch_archive_workers_args(self):
+        """Test if parallel fetch from archive arguments are parsed"""
+
+        args = ['--category', 'mocked', '--fetch-archive',
+                '--fetch-archive-workers', '4',
+                '--fetch-archive-unordered']
+
+        parser = BackendCommandArgumentParser(archive=True)
+        parsed_args = parser.parse(*args)
+
+        self.assertEqual(parsed_args.fetch_archive, True)
+        self.assertEqual(parsed_args.fetch_archive_workers, 4)
+        self.assertEqual(parsed_args.fetch_archive_unordered, True)
+
+    def test_parse_http_cache_args(self):
+        """Test if HTTP cache arguments are parsed"""
+
+        parser = BackendCommandArgumentParser(http_cache=True)
+        parsed_args = parser.parse()
+
+        self.assertEqual(parsed_args.http_cache_path, None)
+        self.assertEqual(parsed_args.http_cache_max_size, 256)
+        self.assertEqual(parsed_args.http_cache_max_age, 30)
+
+        args = ['--http-cache-path', '/tmp/cache',
+                '--http-cache-max-size', '10',
+                '--http-cache-max-age', '2']
+        parsed_args = parser.parse(*args)
+
+        self.assertEqual(parsed_args.http_cache_path, '/tmp/cache')
+        self.assertEqual(parsed_args.http_cache_max_size, 10)
+        self.assertEqual(parsed_args.http_cache_max_age, 2)
+
+    def test_parse_rate_limiter_args(self):
+        """Test if shared rate limiter arguments are parsed"""
+
+        parser = BackendCommandArgumentParser(rate_limiter=True)
+        parsed_args = parser.parse()
+
+        self.assertEqual(parsed_args.rate_limiter_path, None)
+        self.assertEqual(parsed_args.rate_limiter_burst, SharedRateLimiter.DEFAULT_BURST)
+
+        args = ['--rate-limiter-path', '/tmp/limiter',
+                '--rate-limiter-burst', '3']
+        parsed_args = parser.parse(*args)
+
+        self.assertEqual(parsed_args.rate_limiter_path, '/tmp/limiter')
+        self.assertEqual(parsed_args.rate_limiter_burst, 3)
 
     def test_incompatible_fetch_archive_and_no_archive(self):
         """Test if fetch-archive and no-archive arguments are incompatible"""
@@ -635,6 +765,96 @@ class TestBackendCommand(unittest.TestCase):
         cmd = MockedBackendCommand(*args)
         self.assertEqual(cmd.archive_manager, None)
 
+        # Write mode parameters are set
+        args = ['--archive-wal', '--archive-batch-size', '50',
+                '--archive-batch-timeout', '10', '--archive-compression', 'zlib',
+                '--archive-dedup', '--output', self.fout_path, 'http://example.com/']
+
+        cmd = MockedBackendCommand(*args)
+
+        manager = cmd.archive_manager
+        self.assertEqual(manager.wal, True)
+        self.assertEqual(manager.batch_size, 50)
+        self.assertEqual(manager.batch_timeout, 10)
+        self.assertEqual(manager.compression, 'zlib')
+        self.assertEqual(manager.dedup, True)
+
+    def test_http_cache_on_init(self):
+        """Test if the HTTP cache is set and given to the backend"""
+
+        cache_path = os.path.join(self.test_path, 'cache')
+
+        args = ['--no-archive', '--output', self.fout_path, 'http://example.com/']
+        cmd = HttpCacheBackendCommand(*args)
+        self.assertEqual(cmd.http_cache, None)
+
+        items = [item for item in cmd.fetch()]
+        self.assertEqual(items[0]['data']['http_cache'], None)
+
+        args = ['--http-cache-path', cache_path,
+                '--http-cache-max-size', '10', '--http-cache-max-age', '2',
+                '--no-archive', '--output', self.fout_path, 'http://example.com/']
+        cmd = HttpCacheBackendCommand(*args)
+
+        cache = cmd.http_cache
+        self.assertIsInstance(cache, HttpCache)
+        self.assertEqual(cache.dirpath, cache_path)
+        self.assertEqual(cache.max_size, 10 * 1024 * 1024)
+        self.assertEqual(cache.max_age, 2 * 24 * 60 * 60)
+
+        items = [item for item in cmd.fetch()]
+        self.assertEqual(len(items), 5)
+        self.assertEqual(items[0]['data']['http_cache'], cache.cache_path)
+
+        # Cache is not used when fetching from the archive
+        args = ['--http-cache-path', cache_path, '--fetch-archive',
+                '--category', 'mock_item', '--archive-path', self.test_path,
+                '--output', self.fout_path, 'http://example.com/']
+        cmd = HttpCacheBackendCommand(*args)
+        self.assertEqual(cmd.http_cache, None)
+
+        # Commands which do not support caches
+        args = ['--no-archive', '--output', self.fout_path, 'http://example.com/']
+        cmd = MockedBackendCommand(*args)
+        self.assertEqual(cmd.http_cache, None)
+
+    def test_rate_limiter_on_init(self):
+        """Test if the shared rate limiter is set and given to the backend"""
+
+        limiter_path = os.path.join(self.test_path, 'limiter')
+
+        args = ['--no-archive', '--output', self.fout_path, 'http://example.com/']
+        cmd = RateLimiterBackendCommand(*args)
+        self.assertEqual(cmd.rate_limiter, None)
+
+        items = [item for item in cmd.fetch()]
+        self.assertEqual(items[0]['data']['rate_limiter'], None)
+
+        args = ['--rate-limiter-path', limiter_path, '--rate-limiter-burst', '3',
+                '--no-archive', '--output', self.fout_path, 'http://example.com/']
+        cmd = RateLimiterBackendCommand(*args)
+
+        limiter = cmd.rate_limiter
+        self.assertIsInstance(limiter, SharedRateLimiter)
+        self.assertEqual(limiter.dirpath, limiter_path)
+        self.assertEqual(limiter.burst, 3)
+
+        items = [item for item in cmd.fetch()]
+        self.assertEqual(len(items), 5)
+        self.assertEqual(items[0]['data']['rate_limiter'], limiter.limiter_path)
+
+        # The limiter is not used when fetching from the archive
+        args = ['--rate-limiter-path', limiter_path, '--fetch-archive',
+                '--category', 'mock_item', '--archive-path', self.test_path,
+                '--output', self.fout_path, 'http://example.com/']
+        cmd = RateLimiterBackendCommand(*args)
+        self.assertEqual(cmd.rate_limiter, None)
+
+        # Commands which do not support rate limiters
+        args = ['--no-archive', '--output', self.fout_path, 'http://example.com/']
+        cmd = MockedBackendCommand(*args)
+        self.assertEqual(cmd.rate_limiter, None)
+
     def test_pre_init(self):
         """Test if pre_init method is called during initialization"""
 
@@ -985,6 +1205,58 @@ class TestFetch(unittest.TestCase):
         archive = Archive(filepaths[0])
         self.assertEqual(archive._count_table_rows('archive'), 5)
 
+    def test_items_storing_archive_batch(self):
+        """Test whether batched items are written to the archive"""
+
+        manager = ArchiveManager(self.test_path, wal=True, batch_size=2)
+
+        category = 'mock_item'
+        args = {
+            'origin': 'http://example.com/',
+            'tag': 'test',
+            'subtype': 'mocksubtype',
+            'from-date': str_to_datetime('2015-01-01')
+        }
+
+        items = fetch(CommandBackend, args, category, manager=manager)
+        items = [item for item in items]
+
+        self.assertEqual(len(items), 5)
+
+        filepaths = manager.search('http://example.com/', 'CommandBackend',
+                                   'mock_item', str_to_datetime('1970-01-01'))
+
+        self.assertEqual(len(filepaths), 1)
+
+        archive = Archive(filepaths[0])
+        self.assertEqual(archive._count_table_rows('archive'), 5)
+
+    def test_flush_archive_on_close(self):
+        """Test whether pending items are written when the generator is closed"""
+
+        manager = ArchiveManager(self.test_path, batch_size=10)
+
+        category = 'mock_item'
+        args = {
+            'origin': 'http://example.com/',
+            'tag': 'test',
+            'subtype': 'mocksubtype',
+            'from-date': str_to_datetime('2015-01-01')
+        }
+
+        items = fetch(CommandBackend, args, category, manager=manager)
+        _ = next(items)
+        _ = next(items)
+        items.close()
+
+        filepaths = manager.search('http://example.com/', 'CommandBackend',
+                                   'mock_item', str_to_datetime('1970-01-01'))
+
+        self.assertEqual(len(filepaths), 1)
+
+        archive = Archive(filepaths[0])
+        self.assertEqual(archive._count_table_rows('archive'), 2)
+
     def test_remove_archive_on_error(self):
         """Test whether an archive is removed when an unhandled exception occurs"""
 
@@ -1008,6 +1280,37 @@ class TestFetch(unittest.TestCase):
 
         self.assertEqual(len(filepaths), 0)
 
+    def test_remove_archive_batch_on_error(self):
+        """Test whether an archive in WAL mode is removed when an exception occurs"""
+
+        manager = ArchiveManager(self.test_path, wal=True, batch_size=10)
+
+        category = 'mock_item'
+        args = {
+            'origin': 'http://example.com/',
+            'tag': 'test',
+            'subtype': 'mocksubtype',
+            'from-date': str_to_datetime('2015-01-01')
+        }
+
+        items = fetch(ErrorCommandBackend, args, category, manager=manager)
+
+        # Pending items are discarded, not written to the removed archive
+        with unittest.mock.patch.object(Archive, 'flush') as mock_flush:
+            with self.assertRaises(BackendError):
+                _ = [item for item in items]
+
+        mock_flush.assert_not_called()
+
+        filepaths = manager.search('http://example.com/', 'ErrorCommandBackend',
+                                   'mock_item', str_to_datetime('1970-01-01'))
+
+        self.assertEqual(len(filepaths), 0)
+
+        # No file is left behind but the catalog
+        files = [f for _, _, fs in os.walk(self.test_path) for f in fs]
+        self.assertListEqual(files, [ArchiveCatalog.CATALOG_NAME])
+
 
 class TestFetchFromArchive(unittest.TestCase):
     """Unit tests for fetch_from_archive function"""
@@ -1059,6 +1362,70 @@ class TestFetchFromArchive(unittest.TestCase):
                 self.assertEqual(item['uuid'], expected_uuid)
                 self.assertEqual(item['tag'], 'test')
 
+    def test_archive_workers(self):
+        """Test whether archives are replayed by several processes"""
+
+        manager = ArchiveManager(self.test_path)
+
+        category = 'mock_item'
+        args = {
+            'origin': 'http://example.com/',
+            'tag': 'test',
+            'subtype': 'mocksubtype',
+            'from-date': str_to_datetime('2015-01-01')
+        }
+
+        for _ in range(4):
+            items = fetch(CommandBackend, args, category, manager=manager)
+            items = [item for item in items]
+            self.assertEqual(len(items), 5)
+
+        expected = fetch_from_archive(CommandBackend, args, manager,
+                                      category, str_to_datetime('1970-01-01'))
+        expected = [(item['uuid'], item['data']) for item in expected]
+        self.assertEqual(len(expected), 20)
+
+        # Items are returned in the same order
+        items = fetch_from_archive(CommandBackend, args, manager,
+                                   category, str_to_datetime('1970-01-01'),
+                                   workers=3)
+        items = [(item['uuid'], item['data']) for item in items]
+        self.assertListEqual(items, expected)
+
+        # Items of the same archive keep their order
+        items = fetch_from_archive(CommandBackend, args, manager,
+                                   category, str_to_datetime('1970-01-01'),
+                                   workers=3, ordered=False)
+        items = [item for item in items]
+        self.assertEqual(len(items), 20)
+
+        for x in range(4):
+            data = [item['data']['item'] for item in items[x * 5:(x + 1) * 5]]
+            self.assertListEqual(data, [0, 1, 2, 3, 4])
+
+    def test_archive_workers_closed(self):
+        """Test whether the generator can be closed before it is exhausted"""
+
+        manager = ArchiveManager(self.test_path)
+
+        category = 'mock_item'
+        args = {
+            'origin': 'http://example.com/',
+            'tag': 'test',
+            'subtype': 'mocksubtype',
+            'from-date': str_to_datetime('2015-01-01')
+        }
+
+        for _ in range(3):
+            items = [item for item in fetch(CommandBackend, args, category, manager=manager)]
+
+        items = fetch_from_archive(CommandBackend, args, manager,
+                                   category, str_to_datetime('1970-01-01'),
+                                   workers=2)
+        item = next(items)
+        self.assertEqual(item['data']['item'], 0)
+        items.close()
+
     def test_archived_after(self):
         """Test if only those items archived after a date are returned"""
 
@@ -1156,22 +1523,24 @@ class TestFetchFromArchive(unittest.TestCase):
         to_remove = filepaths[0]
         delete_rows(to_remove, 'archive')
 
-        # Fetch items from the archive
-        items = fetch_from_archive(CommandBackend, args, manager,
-                                   category, str_to_datetime('1970-01-01'))
-        items = [item for item in items]
+        # Fetch items from the archive, also using several processes
+        for workers in [None, 2]:
+            items = fetch_from_archive(CommandBackend, args, manager,
+                                       category, str_to_datetime('1970-01-01'),
+                                       workers=workers)
+            items = [item for item in items]
 
-        self.assertEqual(len(items), 5)
+            self.assertEqual(len(items), 5)
 
-        for x in range(5):
-            item = items[x]
-            expected_uuid = uuid('http://example.com/', str(x))
+            for x in range(5):
+                item = items[x]
+                expected_uuid = uuid('http://example.com/', str(x))
 
-            self.assertEqual(item['data']['item'], x)
-            self.assertEqual(item['data']['archive'], True)
-            self.assertEqual(item['origin'], 'http://example.com/')
-            self.assertEqual(item['uuid'], expected_uuid)
-            self.assertEqual(item['tag'], 'test')
+                self.assertEqual(item['data']['item'], x)
+                self.assertEqual(item['data']['archive'], True)
+                self.assertEqual(item['origin'], 'http://example.com/')
+                self.assertEqual(item['uuid'], expected_uuid)
+                self.assertEqual(item['tag'], 'test')
 
 
 if __name__ == "__main__":
@@ -21,11 +21,14 @@
 #     Valerio Cosentino <valcos@bitergia.com>
 #
 
+import hashlib
 import os
 import shutil
+import sqlite3
 import time
 import tempfile
 import unittest
+import unittest.mock
 
 import httpretty
 import pkg_resources
@@ -35,8 +38,8 @@ pkg_resources.declare_namespace('perceval.backends')
 
 from grimoirelab_toolkit.datetime import datetime_utcnow
 
-from perceval.archive import Archive
-from perceval.client import HttpClient, RateLimitHandler
+from perceval.archive import Archive, ArchivedResponse
+from perceval.client import HttpCache, HttpClient, RateLimitHandler, SharedRateLimiter
 
 
 CLIENT_API_URL = "https://gateway.marvel.com/v1/"
@@ -59,18 +62,21 @@ class MockedClient(HttpClient, RateLimitHandler):
                  rate_limit_header=RateLimitHandler.RATE_LIMIT_HEADER,
                  rate_limit_reset_header=RateLimitHandler.RATE_LIMIT_RESET_HEADER,
                  define_calculate_time_to_reset=True,
-                 archive=None, from_archive=False, sanitize=False):
+                 archive=None, from_archive=False, sanitize=False, cache=None,
+                 rate_limiter=None):
 
         self.define_calculate_time_to_reset = define_calculate_time_to_reset
         MockedClient.sanitize = sanitize
         super().__init__(base_url, sleep_time=sleep_time, max_retries=max_retries,
                          extra_status_forcelist=extra_status_forcelist,
                          extra_retry_after_status=extra_retry_after_status,
-                         extra_headers=extra_headers, archive=archive, from_archive=from_archive)
+                         extra_headers=extra_headers, archive=archive, from_archive=from_archive,
+                         cache=cache)
         super().setup_rate_limit_handler(sleep_for_rate=sleep_for_rate,
                                          min_rate_to_sleep=min_rate_to_sleep,
                                          rate_limit_header=rate_limit_header,
-                                         rate_limit_reset_header=rate_limit_reset_header)
+                                         rate_limit_reset_header=rate_limit_reset_header,
+                                         rate_limiter=rate_limiter)
 
     def calculate_time_to_reset(self):
         if self.define_calculate_time_to_reset:
@@ -313,6 +319,131 @@ class TestHttpClient(unittest.TestCase):
         with self.assertRaises(requests.exceptions.HTTPError):
             _ = client.fetch(CLIENT_SPIDERMAN_URL)
 
+    @httpretty.activate
+    def test_fetch_cache(self):
+        """Test whether cached responses are used when they were not modified"""
+
+        requests_headers = []
+
+        def request_callback(method, uri, headers):
+            requests_headers.append(method.headers)
+
+            if method.headers.get('If-None-Match') == '"v1"':
+                return (304, {'X-RateLimit-Remaining': '20'}, '')
+
+            headers.update({'ETag': '"v1"', 'X-RateLimit-Remaining': '10'})
+            return (200, headers, 'Spiderman')
+
+        httpretty.register_uri(httpretty.GET,
+                               CLIENT_SPIDERMAN_URL,
+                               body=request_callback)
+
+        cache = HttpCache(os.path.join(self.test_path, 'cache'))
+
+        client = MockedClient(CLIENT_API_URL, sleep_time=0.1, max_retries=1, cache=cache)
+        self.assertEqual(client.cache, cache)
+
+        response = client.fetch(CLIENT_SPIDERMAN_URL, payload={'page': 1})
+        self.assertEqual(response.text, 'Spiderman')
+        self.assertNotIn('If-None-Match', requests_headers[0])
+
+        # Validators are sent and the cached response is returned
+        archive = Archive.create(os.path.join(self.test_path, 'myarchive'))
+        client = MockedClient(CLIENT_API_URL, sleep_time=0.1, max_retries=1,
+                              archive=archive, cache=cache)
+
+        response = client.fetch(CLIENT_SPIDERMAN_URL, payload={'page': 1})
+        self.assertEqual(requests_headers[1]['If-None-Match'], '"v1"')
+        self.assertIsInstance(response, ArchivedResponse)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.text, 'Spiderman')
+        self.assertEqual(response.headers['ETag'], '"v1"')
+        self.assertEqual(response.headers['X-RateLimit-Remaining'], '20')
+
+        # Responses of other requests are not used
+        response = client.fetch(CLIENT_SPIDERMAN_URL, payload={'page': 2})
+        self.assertNotIn('If-None-Match', requests_headers[2])
+
+        # The same response is used when fetching from the archive
+        client = MockedClient(CLIENT_API_URL, archive=archive, from_archive=True, cache=cache)
+        response = client.fetch(CLIENT_SPIDERMAN_URL, payload={'page': 1})
+        self.assertEqual(response.text, 'Spiderman')
+        self.assertEqual(len(requests_headers), 3)
+
+    @httpretty.activate
+    def test_fetch_cache_credentials(self):
+        """Test whether cached responses are not shared between credentials"""
+
+        requests_headers = []
+
+        def request_callback(method, uri, headers):
+            requests_headers.append(method.headers)
+            headers.update({'ETag': '"v1"'})
+            return (200, headers, 'Spiderman')
+
+        httpretty.register_uri(httpretty.GET,
+                               CLIENT_SPIDERMAN_URL,
+                               body=request_callback)
+
+        cache = HttpCache(self.test_path)
+
+        client = MockedClient(CLIENT_API_URL, sleep_time=0.1, max_retries=1, cache=cache)
+        client.session.headers.update({'Authorization': 'token aaaa'})
+        client.fetch(CLIENT_SPIDERMAN_URL)
+        client.fetch(CLIENT_SPIDERMAN_URL)
+        self.assertEqual(requests_headers[1]['If-None-Match'], '"v1"')
+
+        # Responses fetched with other credentials are not used
+        client.session.headers.update({'Authorization': 'token bbbb'})
+        client.fetch(CLIENT_SPIDERMAN_URL)
+        self.assertNotIn('If-None-Match', requests_headers[2])
+
+        client.session.headers.pop('Authorization')
+        client.fetch(CLIENT_SPIDERMAN_URL)
+        self.assertNotIn('If-None-Match', requests_headers[3])
+
+        client.session.auth = ('jsmith', 'secret')
+        client.fetch(CLIENT_SPIDERMAN_URL)
+        self.assertNotIn('If-None-Match', requests_headers[4])
+
+        client.fetch(CLIENT_SPIDERMAN_URL)
+        self.assertEqual(requests_headers[5]['If-None-Match'], '"v1"')
+
+    @httpretty.activate
+    def test_fetch_cache_last_modified(self):
+        """Test whether Last-Modified validator is sent"""
+
+        last_modified = 'Wed, 21 Oct 2015 07:28:00 GMT'
+
+        httpretty.register_uri(httpretty.GET,
+                               CLIENT_SPIDERMAN_URL,
+                               body='Spiderman',
+                               status=200,
+                               last_modified=last_modified)
+
+        cache = HttpCache(self.test_path)
+        client = MockedClient(CLIENT_API_URL, sleep_time=0.1, max_retries=1, cache=cache)
+
+        client.fetch(CLIENT_SPIDERMAN_URL)
+        self.assertNotIn('If-Modified-Since', httpretty.last_request().headers)
+
+        response = client.fetch(CLIENT_SPIDERMAN_URL)
+        self.assertEqual(httpretty.last_request().headers['If-Modified-Since'], last_modified)
+        self.assertEqual(response.text, 'Spiderman')
+
+        # Streams and POST requests are not cached
+        client.fetch(CLIENT_SPIDERMAN_URL, stream=True)
+        self.assertNotIn('If-Modified-Since', httpretty.last_request().headers)
+
+        httpretty.register_uri(httpretty.POST,
+                               CLIENT_SPIDERMAN_URL,
+                               body='Spiderman',
+                               status=200,
+                               last_modified=last_modified)
+        client.fetch(CLIENT_SPIDERMAN_URL, method=HttpClient.POST)
+        client.fetch(CLIENT_SPIDERMAN_URL, method=HttpClient.POST)
+        self.assertNotIn('If-Modified-Since', httpretty.last_request().headers)
+
     def test_sanitize_for_archive(self):
         """Test whether the default sanitize method works properly"""
 
@@ -323,6 +454,262 @@ class TestHttpClient(unittest.TestCase):
         self.assertEqual(payload, "payload")
 
 
+def make_response(content, status_code=200, headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response.url = CLIENT_SPIDERMAN_URL
+    response.headers.update(headers or {})
+    response._content = content
+    return response
+
+
+class TestHttpCache(unittest.TestCase):
+    """HttpCache tests"""
+
+    def setUp(self):
+        self.test_path = tempfile.mkdtemp(prefix='perceval_')
+
+    def tearDown(self):
+        shutil.rmtree(self.test_path)
+
+    def test_initialization(self):
+        """Test whether attributes are initializated"""
+
+        dirpath = os.path.join(self.test_path, 'cache')
+        cache = HttpCache(dirpath, max_size=100, max_age=10)
+
+        self.assertEqual(cache.dirpath, dirpath)
+        self.assertEqual(cache.cache_path, os.path.join(dirpath, HttpCache.CACHE_NAME))
+        self.assertEqual(cache.max_size, 100)
+        self.assertEqual(cache.max_age, 10)
+        self.assertEqual(os.path.exists(cache.cache_path), True)
+
+        cache = HttpCache(dirpath)
+        self.assertEqual(cache.max_size, HttpCache.DEFAULT_MAX_SIZE)
+        self.assertEqual(cache.max_age, HttpCache.DEFAULT_MAX_AGE)
+
+    def test_store(self):
+        """Test whether only responses with validators are stored"""
+
+        cache = HttpCache(self.test_path)
+
+        cache.store('http://example.com/a', None, None,
+                    make_response(b'a', headers={'ETag': '"a"'}))
+        cache.store('http://example.com/b', {'page': 1}, None,
+                    make_response(b'b', headers={'Last-Modified': 'Wed, 21 Oct 2015 07:28:00 GMT'}))
+        cache.store('http://example.com/c', None, None, make_response(b'c'))
+        cache.store('http://example.com/d', None, None,
+                    make_response(b'd', status_code=404, headers={'ETag': '"d"'}))
+
+        response = cache.get('http://example.com/a', None, None)
+        self.assertEqual(response.content, b'a')
+        self.assertEqual(response.headers['etag'], '"a"')
+
+        response = cache.get('http://example.com/b', {'page': 1}, None)
+        self.assertEqual(response.content, b'b')
+
+        self.assertEqual(cache.get('http://example.com/b', {'page': 2}, None), None)
+        self.assertEqual(cache.get('http://example.com/c', None, None), None)
+        self.assertEqual(cache.get('http://example.com/d', None, None), None)
+
+    def test_store_credentials(self):
+        """Test whether responses are stored for the credentials used"""
+
+        cache = HttpCache(self.test_path)
+
+        cache.store('http://example.com/a', None, None,
+                    make_response(b'a', headers={'ETag': '"a"'}), 'token aaaa')
+
+        response = cache.get('http://example.com/a', None, None, 'token aaaa')
+        self.assertEqual(response.content, b'a')
+
+        self.assertEqual(cache.get('http://example.com/a', None, None, 'token bbbb'), None)
+        self.assertEqual(cache.get('http://example.com/a', None, None), None)
+
+    @unittest.mock.patch('perceval.client.time.time')
+    def test_evict_max_age(self, mock_time):
+        """Test whether the entries not used for a while are removed"""
+
+        mock_time.return_value = 1000
+        cache = HttpCache(self.test_path, max_age=100)
+
+        cache.store('http://example.com/a', None, None,
+                    make_response(b'a', headers={'ETag': '"a"'}))
+        cache.store('http://example.com/b', None, None,
+                    make_response(b'b', headers={'ETag': '"b"'}))
+
+        mock_time.return_value = 1050
+        self.assertNotEqual(cache.get('http://example.com/a', None, None), None)
+
+        # Expired entries are not returned
+        mock_time.return_value = 1120
+        self.assertNotEqual(cache.get('http://example.com/a', None, None), None)
+        self.assertEqual(cache.get('http://example.com/b', None, None), None)
+
+        cache.evict()
+        self.assertEqual(self.count_entries(cache), 1)
+
+    @unittest.mock.patch('perceval.client.time.time')
+    def test_evict_max_size(self, mock_time):
+        """Test whether the least recently used entries are removed"""
+
+        cache = HttpCache(self.test_path)
+
+        for x in range(4):
+            mock_time.return_value = 1000 + x
+            cache.store('http://example.com/%s' % x, None, None,
+                        make_response(b'data', headers={'ETag': '"%s"' % x}))
+
+        mock_time.return_value = 1010
+        self.assertNotEqual(cache.get('http://example.com/0', None, None), None)
+
+        # Keep the size of two entries
+        conn = sqlite3.connect(cache.cache_path)
+        size = conn.execute("SELECT MAX(size) FROM responses").fetchone()[0]
+        conn.close()
+
+        cache.max_size = size * 2
+        cache.evict()
+
+        self.assertEqual(self.count_entries(cache), 2)
+        self.assertNotEqual(cache.get('http://example.com/0', None, None), None)
+        self.assertNotEqual(cache.get('http://example.com/3', None, None), None)
+
+    def test_evict_on_store(self):
+        """Test whether entries are evicted after storing some responses"""
+
+        cache = HttpCache(self.test_path, max_size=0)
+
+        for x in range(HttpCache.EVICTION_INTERVAL - 1):
+            cache.store('http://example.com/%s' % x, None, None,
+                        make_response(b'data', headers={'ETag': '"%s"' % x}))
+
+        self.assertEqual(self.count_entries(cache), HttpCache.EVICTION_INTERVAL - 1)
+
+        cache.store('http://example.com/last', None, None,
+                    make_response(b'data', headers={'ETag': '"last"'}))
+        self.assertEqual(self.count_entries(cache), 0)
+
+    def test_errors(self):
+        """Test whether errors accessing the cache are handled as misses"""
+
+        cache = HttpCache(self.test_path)
+        os.remove(cache.cache_path)
+        os.makedirs(cache.cache_path)
+
+        with self.assertLogs('perceval.client', level='WARNING') as cm:
+            cache.store('http://example.com/a', None, None,
+                        make_response(b'a', headers={'ETag': '"a"'}))
+            self.assertEqual(cache.get('http://example.com/a', None, None), None)
+            self.assertRegex(cm.output[0], 'HTTP cache .+ error')
+
+    @staticmethod
+    def count_entries(cache):
+        conn = sqlite3.connect(cache.cache_path)
+        nentries = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        conn.close()
+        return nentries
+
+
+class TestSharedRateLimiter(unittest.TestCase):
+    """SharedRateLimiter tests"""
+
+    def setUp(self):
+        self.test_path = tempfile.mkdtemp(prefix='perceval_')
+
+    def tearDown(self):
+        shutil.rmtree(self.test_path)
+
+    def test_initialization(self):
+        """Test whether attributes are initializated"""
+
+        dirpath = os.path.join(self.test_path, 'limiter')
+        limiter = SharedRateLimiter(dirpath, burst=5)
+
+        self.assertEqual(limiter.dirpath, dirpath)
+        self.assertEqual(limiter.limiter_path, os.path.join(dirpath, SharedRateLimiter.LIMITER_NAME))
+        self.assertEqual(limiter.burst, 5)
+        self.assertEqual(os.path.exists(limiter.limiter_path), True)
+
+        limiter = SharedRateLimiter(dirpath)
+        self.assertEqual(limiter.burst, SharedRateLimiter.DEFAULT_BURST)
+
+    def test_invalid_initialization(self):
+        """Test whether an exception is raised with an invalid burst"""
+
+        with self.assertRaisesRegex(ValueError, "burst must be greater than 0"):
+            SharedRateLimiter(self.test_path, burst=0)
+
+    @unittest.mock.patch('perceval.client.time.sleep')
+    @unittest.mock.patch('perceval.client.time.time')
+    def test_acquire(self, mock_time, mock_sleep):
+        """Test whether requests wait once the burst is consumed"""
+
+        mock_time.return_value = 1000
+        limiter = SharedRateLimiter(self.test_path, burst=2)
+
+        # Unknown limits do not wait
+        self.assertEqual(limiter.acquire('example.com:a'), 0)
+
+        # 50 requests in 100 seconds: a token each 2 seconds
+        limiter.update('example.com:a', 50, 100)
+
+        self.assertEqual(limiter.acquire('example.com:a'), 0)
+        self.assertEqual(limiter.acquire('example.com:a'), 0)
+        self.assertEqual(limiter.acquire('example.com:a'), 2)
+        self.assertEqual(limiter.acquire('example.com:a'), 4)
+        mock_sleep.assert_called_with(4)
+
+        # Tokens are refilled with time
+        mock_time.return_value = 1010
+        self.assertEqual(limiter.acquire('example.com:a'), 0)
+
+        # Other keys are not affected
+        self.assertEqual(limiter.acquire('example.com:b'), 0)
+
+    @unittest.mock.patch('perceval.client.time.sleep')
+    @unittest.mock.patch('perceval.client.time.time')
+    def test_acquire_exhausted(self, mock_time, mock_sleep):
+        """Test whether requests wait until the reset when no points are left"""
+
+        mock_time.return_value = 1000
+        limiter = SharedRateLimiter(self.test_path)
+
+        limiter.update('example.com:a', 0, 60)
+        self.assertEqual(limiter.acquire('example.com:a'), 60)
+        mock_sleep.assert_called_once_with(60)
+
+        # After the reset, the bucket is full again
+        mock_time.return_value = 1100
+        self.assertEqual(limiter.acquire('example.com:a'), 0)
+
+    @unittest.mock.patch('perceval.client.time.sleep')
+    @unittest.mock.patch('perceval.client.time.time')
+    def test_shared(self, mock_time, mock_sleep):
+        """Test whether instances on the same directory share the buckets"""
+
+        mock_time.return_value = 1000
+        limiter_a = SharedRateLimiter(self.test_path, burst=1)
+        limiter_b = SharedRateLimiter(self.test_path, burst=1)
+
+        limiter_a.update('example.com:a', 10, 10)
+
+        self.assertEqual(limiter_a.acquire('example.com:a'), 0)
+        self.assertEqual(limiter_b.acquire('example.com:a'), 1)
+
+    def test_errors(self):
+        """Test whether errors accessing the limiter do not block requests"""
+
+        limiter = SharedRateLimiter(self.test_path)
+        os.remove(limiter.limiter_path)
+        os.makedirs(limiter.limiter_path)
+
+        with self.assertLogs('perceval.client', level='WARNING') as cm:
+            limiter.update('example.com:a', 0, 60)
+            self.assertEqual(limiter.acquire('example.com:a'), 0)
+            self.assertRegex(cm.output[0], 'Rate limiter .+ error')
+
+
 class TestRateLimitHandler(unittest.TestCase):
     """RateLimit handler tests"""
 
@@ -415,6 +802,53 @@ class TestRateLimitHandler(unittest.TestCase):
         with self.assertRaises(NotImplementedError):
             client.update_rate_limit(response)
 
+    @httpretty.activate
+    @unittest.mock.patch('perceval.client.time.sleep')
+    def test_shared_rate_limiter(self, mock_sleep):
+        """Test whether the rate limit is shared using a rate limiter"""
+
+        httpretty.register_uri(httpretty.GET,
+                               CLIENT_SPIDERMAN_URL,
+                               body="",
+                               status=200,
+                               forcing_headers={
+                                   'X-RateLimit-Remaining': '0',
+                                   'X-RateLimit-Reset': '15'
+                               })
+
+        test_path = tempfile.mkdtemp(prefix='perceval_')
+        self.addCleanup(shutil.rmtree, test_path)
+
+        limiter = SharedRateLimiter(test_path)
+        client = MockedClient(CLIENT_API_URL, sleep_time=0.1, max_retries=1,
+                              extra_headers={'Authorization': 'token aaaa'},
+                              rate_limiter=limiter)
+        self.assertEqual(client.rate_limiter, limiter)
+
+        key = client.rate_limit_key()
+        self.assertEqual(key, 'gateway.marvel.com:' + hashlib.sha1(b'token aaaa').hexdigest())
+
+        client.sleep_for_rate_limit()
+        mock_sleep.assert_not_called()
+
+        response = client.fetch(CLIENT_SPIDERMAN_URL)
+        client.update_rate_limit(response)
+
+        # No points left; other clients with the same token wait
+        other = MockedClient(CLIENT_API_URL, sleep_time=0.1, max_retries=1,
+                             extra_headers={'Authorization': 'token aaaa'},
+                             rate_limiter=limiter)
+        other.sleep_for_rate_limit()
+        self.assertEqual(mock_sleep.call_count, 1)
+
+        # Clients with other tokens are not affected
+        other = MockedClient(CLIENT_API_URL, sleep_time=0.1, max_retries=1,
+                             extra_headers={'Authorization': 'token bbbb'},
+                             rate_limiter=limiter)
+        self.assertNotEqual(other.rate_limit_key(), key)
+        other.sleep_for_rate_limit()
+        self.assertEqual(mock_sleep.call_count, 1)
+
     def test_sleep_for_rate_limit(self):
         """Test whether the time to reset is zero if the sleep time is negative"""
 
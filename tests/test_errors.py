@@ -21,6 +21,7 @@
 #     Santiago Dueñas <sduenas@bitergia.com>
 #
 
+import pickle
 import unittest
 
 import perceval.errors as errors
@@ -54,6 +55,21 @@ class TestBaseError(unittest.TestCase):
         self.assertEqual("Mock error with args. Error: 1 Fatal error",
                          str(e))
 
+    def test_pickle(self):
+        """Check whether errors are rebuilt with their arguments when they are unpickled"""
+
+        e = MockErrorArgs(code=1, msg='Fatal error')
+        e = pickle.loads(pickle.dumps(e))
+
+        self.assertIsInstance(e, MockErrorArgs)
+        self.assertEqual("Mock error with args. Error: 1 Fatal error",
+                         str(e))
+
+        e = errors.RateLimitError(cause="client rate exhausted",
+                                  seconds_to_reset=10)
+        e = pickle.loads(pickle.dumps(e))
+        self.assertEqual(e.seconds_to_reset, 10)
+
     def test_subclass_invalid_args(self):
         """Check when required arguments are not given.
 
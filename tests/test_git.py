@@ -21,7 +21,10 @@
 #     Santiago Dueñas <sduenas@bitergia.com>
 #
 
+import bz2
 import datetime
+import gzip
+import lzma
 import os
 import shutil
 import subprocess
@@ -35,11 +38,16 @@ import pkg_resources
 pkg_resources.declare_namespace('perceval.backends')
 
 from perceval.backend import BackendCommandArgumentParser, uuid
-from perceval.errors import RepositoryError
+from perceval.errors import ParseError, RepositoryError
 from perceval.utils import DEFAULT_DATETIME, DEFAULT_LAST_DATETIME
-from perceval.backends.core.git import (EmptyRepositoryError,
+from perceval.backends.core.git import (DETAIL_COMMITS,
+                                        DETAIL_FILES,
+                                        DETAIL_FULL,
+                                        EmptyRepositoryError,
                                         Git,
                                         GitCommand,
+                                        GitRef,
+                                        GitMachineParser,
                                         GitParser,
                                         GitRepository)
 
@@ -113,6 +121,24 @@ class TestGitBackend(TestCaseGit):
         git = Git('http://example.com', self.git_path, tag='')
         self.assertEqual(git.origin, 'http://example.com')
         self.assertEqual(git.tag, 'http://example.com')
+        self.assertIsNone(git.log_workers)
+
+        self.assertFalse(git.maintenance)
+        self.assertEqual(git.max_packs, GitRepository.DEFAULT_MAX_PACKS)
+        self.assertEqual(git.detail, DETAIL_FULL)
+
+        git = Git('http://example.com', self.git_path, log_workers=4,
+                  maintenance=True, max_packs=10, detail=DETAIL_COMMITS)
+        self.assertEqual(git.log_workers, 4)
+        self.assertTrue(git.maintenance)
+        self.assertEqual(git.max_packs, 10)
+        self.assertEqual(git.detail, DETAIL_COMMITS)
+
+        with self.assertRaises(ValueError):
+            _ = Git('http://example.com', self.git_path, log_workers=0)
+
+        with self.assertRaises(ValueError):
+            _ = Git('http://example.com', self.git_path, detail='diffs')
 
     def test_has_archiving(self):
         """Test if it returns False when has_archiving is called"""
@@ -173,6 +199,161 @@ class TestGitBackend(TestCaseGit):
 
         shutil.rmtree(new_path)
 
+    def test_fetch_machine_log(self):
+        """Test whether commits read with the machine-readable log are the same"""
+
+        new_path = os.path.join(self.tmp_path, 'newgit')
+
+        git = Git(self.git_path, new_path)
+        expected = [commit['data'] for commit in git.fetch()]
+
+        git = Git(self.git_path, new_path, machine_log=True)
+        self.assertTrue(git.machine_log)
+
+        commits = [commit for commit in git.fetch()]
+
+        self.assertEqual(len(commits), 9)
+        self.assertListEqual([commit['data'] for commit in commits], expected)
+        self.assertEqual(commits[-1]['uuid'], uuid(self.git_path, '456a68ee1407a77f3e804a30dff245bb6c6b872f'))
+
+        shutil.rmtree(new_path)
+
+    @unittest.mock.patch.object(Git, 'LOG_SHARD_SIZE', 2)
+    def test_fetch_log_workers(self):
+        """Test whether commits read in shards keep the order of the log"""
+
+        new_path = os.path.join(self.tmp_path, 'newgit')
+
+        git = Git(self.git_path, new_path)
+        expected = [commit['data'] for commit in git.fetch()]
+
+        for machine_log in [False, True]:
+            git = Git(self.git_path, new_path, machine_log=machine_log, log_workers=3)
+            commits = [commit for commit in git.fetch()]
+
+            self.assertEqual(len(commits), 9)
+            self.assertListEqual([commit['data'] for commit in commits], expected)
+
+        from_date = datetime.datetime(2014, 2, 11, 22, 7, 49)
+        git = Git(self.git_path, new_path)
+        expected = [commit['data'] for commit in git.fetch(from_date=from_date)]
+
+        git = Git(self.git_path, new_path, log_workers=3)
+        commits = [commit['data'] for commit in git.fetch(from_date=from_date)]
+
+        self.assertEqual(len(commits), 3)
+        self.assertListEqual(commits, expected)
+
+        # A single shard is read in the same process
+        git = Git(self.git_path, new_path)
+        expected = [commit['data'] for commit in git.fetch(branches=['lzp'])]
+
+        with unittest.mock.patch.object(Git, 'LOG_SHARD_SIZE', 100):
+            git = Git(self.git_path, new_path, log_workers=3)
+            commits = [commit['data'] for commit in git.fetch(branches=['lzp'])]
+
+        self.assertListEqual(commits, expected)
+
+        shutil.rmtree(new_path)
+
+    @unittest.mock.patch.object(Git, 'LOG_SHARD_SIZE', 2)
+    def test_fetch_log_workers_error(self):
+        """Test whether the errors of the workers are raised with their original arguments"""
+
+        new_path = os.path.join(self.tmp_path, 'newgit')
+
+        git = Git(self.git_path, new_path)
+        _ = [commit for commit in git.fetch()]
+
+        git = Git(self.git_path, new_path, log_workers=3)
+
+        # Empty repositories are rebuilt with their arguments, so they are
+        # handled as if they were raised in the same process
+        error = EmptyRepositoryError(repository=new_path)
+
+        with unittest.mock.patch.object(GitRepository, 'log', side_effect=error):
+            commits = [commit for commit in git.fetch()]
+            self.assertListEqual(commits, [])
+
+        error = RepositoryError(cause="git command - fatal: bad object")
+
+        with unittest.mock.patch.object(GitRepository, 'log', side_effect=error):
+            with self.assertRaisesRegex(RepositoryError, "git command - fatal: bad object"):
+                _ = [commit for commit in git.fetch()]
+
+        shutil.rmtree(new_path)
+
+    @unittest.mock.patch.object(Git, 'LOG_SHARD_SIZE', 2)
+    def test_fetch_detail(self):
+        """Test whether commits are fetched with less detail"""
+
+        def without_files(commit):
+            return {k: v for k, v in commit.items() if k != 'files'}
+
+        new_path = os.path.join(self.tmp_path, 'newgit')
+
+        git = Git(self.git_path, new_path)
+        expected = [commit['data'] for commit in git.fetch()]
+
+        for machine_log in [False, True]:
+            for log_workers in [None, 3]:
+                git = Git(self.git_path, new_path, machine_log=machine_log,
+                          log_workers=log_workers, detail=DETAIL_COMMITS)
+                commits = [commit['data'] for commit in git.fetch()]
+
+                self.assertEqual(len(commits), 9)
+                self.assertListEqual([commit['files'] for commit in commits], [[]] * 9)
+                self.assertListEqual([without_files(commit) for commit in commits],
+                                     [without_files(commit) for commit in expected])
+
+                git = Git(self.git_path, new_path, machine_log=machine_log,
+                          log_workers=log_workers, detail=DETAIL_FILES)
+                commits = [commit['data'] for commit in git.fetch()]
+
+                self.assertEqual(len(commits), 9)
+                self.assertListEqual([without_files(commit) for commit in commits],
+                                     [without_files(commit) for commit in expected])
+
+                # Renamed files are reported as deleted and added
+                files = commits[3]['files']
+                self.assertEqual(commits[3]['commit'], 'c0d66f92a95e31c77be08dc9d0f11a16715d1885')
+                self.assertListEqual([(f['action'], f['file']) for f in files],
+                                     [('D', 'bbb/bthing'), ('D', 'bbb/something'),
+                                      ('A', 'bbb/something.renamed')])
+                self.assertNotIn('newfile', files[0])
+
+        shutil.rmtree(new_path)
+
+    def test_fetch_maintenance(self):
+        """Test whether the repository is maintained before reading its log"""
+
+        new_path = os.path.join(self.tmp_path, 'newgit')
+        graph_path = os.path.join(new_path, 'objects', 'info', 'commit-graphs', 'commit-graph-chain')
+
+        git = Git(self.git_path, new_path)
+        expected = [commit['data'] for commit in git.fetch()]
+        self.assertFalse(os.path.exists(graph_path))
+
+        git = Git(self.git_path, new_path, maintenance=True, max_packs=0)
+        commits = [commit['data'] for commit in git.fetch()]
+
+        self.assertListEqual(commits, expected)
+        self.assertTrue(os.path.exists(graph_path))
+
+        shutil.rmtree(new_path)
+
+    def test_fetch_log_workers_empty_repository(self):
+        """Test whether no commits are read in shards from an empty repository"""
+
+        new_path = os.path.join(self.tmp_path, 'newgit')
+
+        git = Git(self.git_empty_path, new_path, log_workers=3)
+        commits = [commit for commit in git.fetch()]
+
+        self.assertListEqual(commits, [])
+
+        shutil.rmtree(new_path)
+
     def test_fetch_till_date(self):
         """Test whether commits are fetched from a Git repository before the given date"""
 
@@ -708,6 +889,32 @@ class TestGitBackend(TestCaseGit):
 
         self.assertListEqual(result, expected)
 
+    def test_git_parser_compressed(self):
+        """Test if the static method parses compressed git log files"""
+
+        log_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data/git/git_log.txt")
+
+        with open(log_path, 'rb') as f:
+            content = f.read()
+
+        expected = [commit for commit in Git.parse_git_log_from_file(log_path)]
+        self.assertEqual(len(expected), 10)
+
+        for mod, ext in [(gzip, 'gz'), (bz2, 'bz2'), (lzma, 'xz')]:
+            filepath = os.path.join(self.tmp_path, 'git_log.txt.' + ext)
+
+            with mod.open(filepath, 'wb') as f:
+                f.write(content)
+
+            commits = [commit for commit in Git.parse_git_log_from_file(filepath)]
+            self.assertListEqual(commits, expected)
+
+            git = Git('http://example.com.git', filepath)
+            commits = [commit['data'] for commit in git.fetch()]
+            self.assertListEqual(commits, expected)
+
+            os.remove(filepath)
+
     def test_git_encoding_error(self):
         """Test if encoding errors are escaped when a git log is parsed"""
 
@@ -815,7 +1022,12 @@ class TestGitCommand(TestCaseGit):
                 '--tag', 'test',
                 '--from-date', '1970-01-01',
                 '--to-date', '2100-01-01',
-                '--no-update']
+                '--no-update',
+                '--machine-log',
+                '--log-workers', '4',
+                '--maintenance',
+                '--max-packs', '10',
+                '--detail', 'commits']
 
         parsed_args = parser.parse(*args)
         self.assertEqual(parsed_args.uri, 'http://example.com/')
@@ -826,6 +1038,11 @@ class TestGitCommand(TestCaseGit):
         self.assertEqual(parsed_args.to_date, DEFAULT_LAST_DATETIME)
         self.assertEqual(parsed_args.branches, None)
         self.assertTrue(parsed_args.no_update)
+        self.assertTrue(parsed_args.machine_log)
+        self.assertEqual(parsed_args.log_workers, 4)
+        self.assertTrue(parsed_args.maintenance)
+        self.assertEqual(parsed_args.max_packs, 10)
+        self.assertEqual(parsed_args.detail, DETAIL_COMMITS)
 
         args = ['http://example.com/',
                 '--git-path', '/tmp/gitpath',
@@ -836,6 +1053,11 @@ class TestGitCommand(TestCaseGit):
         self.assertEqual(parsed_args.uri, 'http://example.com/')
         self.assertEqual(parsed_args.branches, ['master', 'testing'])
         self.assertFalse(parsed_args.no_update)
+        self.assertFalse(parsed_args.machine_log)
+        self.assertIsNone(parsed_args.log_workers)
+        self.assertFalse(parsed_args.maintenance)
+        self.assertIsNone(parsed_args.max_packs)
+        self.assertEqual(parsed_args.detail, DETAIL_FULL)
 
     def test_mutual_exclusive_update(self):
         """Test whether an exception is thrown when no-update and latest-items flags are set"""
@@ -1059,6 +1281,24 @@ class TestGitParser(TestCaseGit):
 
         self.assertDictEqual(commits[0], expected)
 
+    def test_parser_commits_log(self):
+        """Test if it parses a log without the files of the commits"""
+
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "data/git/git_log.txt"), 'r') as f:
+            parser = GitParser(f)
+            expected = [commit for commit in parser.parse()]
+
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "data/git/git_log_commits.txt"), 'r') as f:
+            parser = GitParser(f)
+            commits = [commit for commit in parser.parse()]
+
+        self.assertEqual(len(commits), 10)
+
+        for commit, expected_commit in zip(commits, expected):
+            self.assertListEqual(commit.pop('files'), [])
+            expected_commit.pop('files')
+            self.assertDictEqual(commit, expected_commit)
+
     def test_parser_empty_log(self):
         """Test if it parsers an empty git log stream"""
 
@@ -1186,6 +1426,137 @@ class TestGitParser(TestCaseGit):
         self.assertIsNotNone(m)
 
 
+class TestGitMachineParser(TestCaseGit):
+    """Git machine-readable log parser tests"""
+
+    def test_parser(self):
+        """Test if it parses a machine-readable git log stream"""
+
+        fields = [
+            'bc57a9209f096a130dcc5ba7089a8663f758a703', '', '', '',
+            'John Smith <jsmith@example.com>', 'Tue Aug 14 14:30:13 2012 -0300',
+            'John Smith <jsmith@example.com>', 'Tue Aug 14 14:30:13 2012 -0300',
+            '\n  Commit for\ttesting  \n\nSigned-off-by: John Smith <jsmith@example.com>\n\n',
+            '\n:000000 100644 0000000 e69de29 A', 'aaa/otherthing',
+            ':100644 100644 e69de29 e69de29 R100', 'aaa/something', 'bbb/\u00f1and\u00fa',
+            '0\t0\taaa/otherthing',
+            '0\t0\t', 'aaa/something', 'bbb/\u00f1and\u00fa',
+            '456a68ee1407a77f3e804a30dff245bb6c6b872f',
+            'ce8e0b86a1e9877f42fe9453ede418519115f367 51a3b654f252210572297f47597b31527c475fb8',
+            'ce8e0b8 51a3b65', 'HEAD -> refs/heads/master, tag: refs/tags/v1',
+            'John Smith <jsmith@example.com>', 'Tue Feb 11 22:10:39 2014 -0800',
+            'John Smith <jsmith@example.com>', 'Tue Feb 11 22:10:39 2014 -0800',
+            "Merge branch 'lzp'\n", '',
+            '1\t0\taaa/"file"',
+            '::100644 100644 100644 e69de29 58a6c75 58a6c75 MR', 'aaa/"file"',
+            '51a3b654f252210572297f47597b31527c475fb8', 'bc57a9209f096a130dcc5ba7089a8663f758a703',
+            'bc57a92', '', 'John Smith <jsmith@example.com>', 'Tue Feb 11 22:09:26 2014 -0800',
+            'John Smith <jsmith@example.com>', 'Tue Feb 11 22:09:26 2014 -0800', '\n'
+        ]
+
+        parser = GitMachineParser(fields)
+        commits = [commit for commit in parser.parse()]
+
+        self.assertEqual(len(commits), 3)
+
+        expected = {
+            'commit': 'bc57a9209f096a130dcc5ba7089a8663f758a703',
+            'parents': [],
+            'refs': [],
+            'Author': 'John Smith <jsmith@example.com>',
+            'AuthorDate': 'Tue Aug 14 14:30:13 2012 -0300',
+            'Commit': 'John Smith <jsmith@example.com>',
+            'CommitDate': 'Tue Aug 14 14:30:13 2012 -0300',
+            'message': '  Commit for    testing\n\nSigned-off-by: John Smith <jsmith@example.com>',
+            'Signed-off-by': ['John Smith <jsmith@example.com>'],
+            'files': [
+                {
+                    'file': 'aaa/otherthing',
+                    'added': '0',
+                    'removed': '0',
+                    'modes': ['000000', '100644'],
+                    'indexes': ['0000000', 'e69de29'],
+                    'action': 'A'
+                },
+                {
+                    'file': 'aaa/something',
+                    'added': '0',
+                    'removed': '0',
+                    'modes': ['100644', '100644'],
+                    'indexes': ['e69de29', 'e69de29'],
+                    'action': 'R100',
+                    'newfile': '"bbb/\\303\\261and\\303\\272"'
+                }
+            ]
+        }
+        self.assertDictEqual(commits[0], expected)
+
+        expected = {
+            'commit': '456a68ee1407a77f3e804a30dff245bb6c6b872f',
+            'parents': ['ce8e0b86a1e9877f42fe9453ede418519115f367',
+                        '51a3b654f252210572297f47597b31527c475fb8'],
+            'refs': ['HEAD -> refs/heads/master', 'tag: refs/tags/v1'],
+            'Merge': 'ce8e0b8 51a3b65',
+            'Author': 'John Smith <jsmith@example.com>',
+            'AuthorDate': 'Tue Feb 11 22:10:39 2014 -0800',
+            'Commit': 'John Smith <jsmith@example.com>',
+            'CommitDate': 'Tue Feb 11 22:10:39 2014 -0800',
+            'message': "Merge branch 'lzp'",
+            'files': [
+                {
+                    'file': '"aaa/\\"file\\""',
+                    'added': '1',
+                    'removed': '0',
+                    'modes': ['100644', '100644', '100644'],
+                    'indexes': ['e69de29', '58a6c75', '58a6c75'],
+                    'action': 'MR'
+                }
+            ]
+        }
+        self.assertDictEqual(commits[1], expected)
+
+        # Commits without message nor files
+        self.assertEqual(commits[2]['commit'], '51a3b654f252210572297f47597b31527c475fb8')
+        self.assertNotIn('message', commits[2])
+        self.assertNotIn('Merge', commits[2])
+        self.assertListEqual(commits[2]['files'], [])
+
+    def test_parser_empty_log(self):
+        """Test if it parses an empty git log stream"""
+
+        parser = GitMachineParser([])
+        commits = [commit for commit in parser.parse()]
+
+        self.assertListEqual(commits, [])
+
+    def test_parser_invalid_log(self):
+        """Test if it raises an exception when the log is invalid"""
+
+        fields = ['bc57a9209f096a130dcc5ba7089a8663f758a703', '', '', '']
+        parser = GitMachineParser(fields)
+
+        with self.assertRaisesRegex(ParseError, "commit 1 is incomplete"):
+            _ = [commit for commit in parser.parse()]
+
+        fields = ['commit bc57a9209f096a130dcc5ba7089a8663f758a703', '', '', '',
+                  'John Smith <jsmith@example.com>', 'Tue Aug 14 14:30:13 2012 -0300',
+                  'John Smith <jsmith@example.com>', 'Tue Aug 14 14:30:13 2012 -0300',
+                  'Commit for testing\n']
+        parser = GitMachineParser(fields)
+
+        with self.assertRaisesRegex(ParseError, "commit expected on commit 1"):
+            _ = [commit for commit in parser.parse()]
+
+        fields = ['bc57a9209f096a130dcc5ba7089a8663f758a703', '', '', '',
+                  'John Smith <jsmith@example.com>', 'Tue Aug 14 14:30:13 2012 -0300',
+                  'John Smith <jsmith@example.com>', 'Tue Aug 14 14:30:13 2012 -0300',
+                  'Commit for testing\n', '\n:000000 100644 0000000 e69de29 A']
+        parser = GitMachineParser(fields)
+
+        with self.assertRaisesRegex(ParseError, "file name expected on commit 1"):
+            _ = [commit for commit in parser.parse()]
+
+
 class TestEmptyRepositoryError(TestCaseGit):
     """EmptyRepositoryError tests"""
 
@@ -1422,6 +1793,68 @@ class TestGitRepository(TestCaseGit):
 
         shutil.rmtree(new_path)
 
+    def test_is_empty_cached(self):
+        """Test if the state of the repository is cached until it is modified"""
+
+        new_path = os.path.join(self.tmp_path, 'newgit')
+        repo = GitRepository.clone(self.git_path, new_path)
+
+        with unittest.mock.patch.object(repo, 'count_objects',
+                                        wraps=repo.count_objects) as mock_count:
+            self.assertFalse(repo.is_empty())
+            _ = [line for line in repo.rev_list()]
+            _ = [line for line in repo.log()]
+            _ = [line for line in repo.show()]
+            self.assertEqual(mock_count.call_count, 1)
+
+            repo.update()
+            self.assertFalse(repo.is_empty())
+            self.assertEqual(mock_count.call_count, 2)
+
+            # Nothing new is fetched, so the state is still valid
+            repo.sync()
+            self.assertEqual(mock_count.call_count, 2)
+
+        shutil.rmtree(new_path)
+
+        # Once the repository has data, it is not empty anymore
+        origin_path = os.path.join(self.tmp_path, 'editgit')
+        new_path = os.path.join(self.tmp_path, 'newgit')
+
+        shutil.copytree(self.git_empty_path, origin_path)
+        repo = GitRepository.clone(origin_path, new_path)
+        self.assertTrue(repo.is_empty())
+
+        shutil.rmtree(origin_path)
+        shutil.copytree(self.git_path, origin_path)
+
+        repo.update()
+        self.assertFalse(repo.is_empty())
+
+        shutil.rmtree(origin_path)
+        shutil.rmtree(new_path)
+
+    def test_spawned_processes(self):
+        """Test if the processes spawned are counted by command"""
+
+        new_path = os.path.join(self.tmp_path, 'newgit')
+        repo = GitRepository.clone(self.git_path, new_path)
+
+        GitRepository.spawned_processes.clear()
+
+        _ = [line for line in repo.log()]
+        _ = [line for line in repo.log()]
+        repo.update()
+
+        expected = {
+            'count-objects': 1,
+            'log': 2,
+            'fetch': 1
+        }
+        self.assertDictEqual(dict(GitRepository.spawned_processes), expected)
+
+        shutil.rmtree(new_path)
+
     def test_update(self):
         """Test if the repository is updated to 'origin' status"""
 
@@ -1569,6 +2002,181 @@ class TestGitRepository(TestCaseGit):
 
         shutil.rmtree(new_path)
 
+    def test_maintain(self):
+        """Test whether the repository is repacked and its commit-graph written"""
+
+        new_path = os.path.join(self.tmp_path, 'newgit')
+        graph_path = os.path.join(new_path, 'objects', 'info', 'commit-graphs', 'commit-graph-chain')
+
+        repo = GitRepository.clone(self.git_path, new_path)
+
+        # Split the objects of the repository in several packs
+        hashes = [line for line in repo.rev_list(reverse=True)]
+        pack_path = os.path.join(new_path, 'objects', 'pack')
+
+        for commit in hashes:
+            cmd = ['git', 'pack-objects', '-q', '--revs', os.path.join(pack_path, 'pack')]
+            subprocess.check_output(cmd, input=(commit + '\n').encode('utf-8'),
+                                    stderr=subprocess.STDOUT, cwd=new_path,
+                                    env={'LANG': 'C'})
+
+        npacks = repo.count_packs()
+        self.assertGreater(npacks, 2)
+
+        # The number of packs is below the limit
+        GitRepository.spawned_processes.clear()
+        repo.maintain(max_packs=npacks)
+
+        self.assertEqual(repo.count_packs(), npacks)
+        self.assertNotIn('repack', GitRepository.spawned_processes)
+        self.assertEqual(GitRepository.spawned_processes['commit-graph'], 1)
+        self.assertTrue(os.path.exists(graph_path))
+
+        repo.maintain(max_packs=2)
+        self.assertEqual(repo.count_packs(), 1)
+        self.assertEqual(GitRepository.spawned_processes['repack'], 1)
+
+        # The log does not change
+        commits = [commit['commit'] for commit in GitParser(repo.log()).parse()]
+        self.assertListEqual(commits, hashes)
+
+        # Existing commits are not written again
+        with open(graph_path, 'r') as fd:
+            chain = fd.read()
+
+        repo.maintain(max_packs=2)
+
+        with open(graph_path, 'r') as fd:
+            self.assertEqual(fd.read(), chain)
+
+        shutil.rmtree(new_path)
+
+    def test_maintain_commit_graph_error(self):
+        """Test whether errors writing the commit-graph are ignored"""
+
+        new_path = os.path.join(self.tmp_path, 'newgit')
+
+        repo = GitRepository.clone(self.git_path, new_path)
+        self.assertFalse(repo.is_empty())
+
+        with unittest.mock.patch.object(GitRepository, '_exec',
+                                        side_effect=RepositoryError(cause="unknown subcommand")):
+            with self.assertLogs(level='WARNING') as cm:
+                repo.maintain()
+                self.assertRegex(cm.output[0], "commit-graph could not be written")
+
+        shutil.rmtree(new_path)
+
+    def test_maintain_empty_repository(self):
+        """Test whether empty repositories are not maintained"""
+
+        new_path = os.path.join(self.tmp_path, 'newgit')
+
+        repo = GitRepository.clone(self.git_empty_path, new_path)
+        self.assertEqual(repo.count_packs(), 0)
+
+        GitRepository.spawned_processes.clear()
+        repo.maintain(max_packs=0)
+
+        self.assertDictEqual(dict(GitRepository.spawned_processes), {'count-objects': 1})
+
+        shutil.rmtree(new_path)
+
+    def test_read_commits_from_pack(self):
+        """Test whether the commits of a pack are read in-process"""
+
+        new_path = os.path.join(self.tmp_path, 'newgit')
+
+        repo = GitRepository.clone(self.git_path, new_path)
+
+        # Repack the objects to have deltas of commits in the pack
+        cmd = ['git', 'repack', '-a', '-d', '-f', '-q']
+        subprocess.check_output(cmd, stderr=subprocess.STDOUT,
+                                cwd=new_path, env={'LANG': 'C'})
+
+        pack_path = os.path.join(new_path, 'objects', 'pack')
+        packs = [name for name in os.listdir(pack_path) if name.endswith('.pack')]
+        self.assertEqual(len(packs), 1)
+
+        pack_name = packs[0][len('pack-'):-len('.pack')]
+
+        with unittest.mock.patch('subprocess.Popen') as mock_popen:
+            commits = repo._read_commits_from_pack(pack_name)
+            mock_popen.assert_not_called()
+
+        expected = ['bc57a9209f096a130dcc5ba7089a8663f758a703',
+                    '87783129c3f00d2c81a3a8e585eb86a47e39891a',
+                    '7debcf8a2f57f86663809c58b5c07a398be7674c',
+                    'c0d66f92a95e31c77be08dc9d0f11a16715d1885',
+                    'c6ba8f7a1058db3e6b4bc6f1090e932b107605fb',
+                    '589bb080f059834829a2a5955bebfd7c2baa110a',
+                    'ce8e0b86a1e9877f42fe9453ede418519115f367',
+                    '51a3b654f252210572297f47597b31527c475fb8',
+                    '456a68ee1407a77f3e804a30dff245bb6c6b872f']
+        self.assertListEqual(commits, expected)
+
+        shutil.rmtree(new_path)
+
+    def test_update_references(self):
+        """Test whether references are updated in a single transaction"""
+
+        new_path = os.path.join(self.tmp_path, 'newgit')
+
+        repo = GitRepository.clone(self.git_path, new_path)
+
+        current_refs = discover_refs(new_path)
+        master = current_refs['refs/heads/master']
+
+        refs = [GitRef(master, 'refs/heads/master'),
+                GitRef(master, 'refs/heads/newbranch'),
+                GitRef(master, 'refs/tags/v1.0'),
+                GitRef(master, 'refs/tags/v1.0^{}'),
+                GitRef(master, 'refs/pull/1/head')]
+
+        with unittest.mock.patch('subprocess.Popen', wraps=subprocess.Popen) as mock_popen:
+            repo._update_references(refs)
+
+        cmds = [call[0][0] for call in mock_popen.call_args_list]
+        self.assertEqual(len([cmd for cmd in cmds if 'update-ref' in cmd]), 1)
+        self.assertIn(['git', 'update-ref', '--stdin'], cmds)
+
+        expected = {
+            'refs/heads/master': master,
+            'refs/heads/newbranch': master,
+            'refs/tags/v1.0': master
+        }
+        self.assertDictEqual(discover_refs(new_path), expected)
+
+        shutil.rmtree(new_path)
+
+    def test_update_references_error(self):
+        """Test whether references are updated one by one when the transaction fails"""
+
+        new_path = os.path.join(self.tmp_path, 'newgit')
+
+        repo = GitRepository.clone(self.git_path, new_path)
+
+        current_refs = discover_refs(new_path)
+        master = current_refs['refs/heads/master']
+
+        refs = [GitRef(master, 'refs/heads/master'),
+                GitRef(master, 'refs/heads/newbranch'),
+                GitRef('1' * 40, 'refs/heads/broken')]
+
+        with self.assertLogs(level='WARNING') as cm:
+            repo._update_references(refs)
+
+        self.assertEqual(len(cm.output), 1)
+        self.assertRegex(cm.output[0], "Git refs/heads/broken ref could not be updated to 1{40}")
+
+        expected = {
+            'refs/heads/master': master,
+            'refs/heads/newbranch': master
+        }
+        self.assertDictEqual(discover_refs(new_path), expected)
+
+        shutil.rmtree(new_path)
+
     def test_rev_list(self):
         """Test rev-list command"""
 
@@ -1595,6 +2203,32 @@ class TestGitRepository(TestCaseGit):
 
         shutil.rmtree(new_path)
 
+    def test_rev_list_reverse_dates(self):
+        """Test rev-list command using dates and reverse order"""
+
+        new_path = os.path.join(self.tmp_path, 'newgit')
+
+        repo = GitRepository.clone(self.git_path, new_path)
+
+        from_date = datetime.datetime(2014, 2, 11, 22, 7, 49,
+                                      tzinfo=dateutil.tz.tzutc())
+        gitrev = [line for line in repo.rev_list(from_date=from_date, reverse=True)]
+
+        expected = ['ce8e0b86a1e9877f42fe9453ede418519115f367',
+                    '51a3b654f252210572297f47597b31527c475fb8',
+                    '456a68ee1407a77f3e804a30dff245bb6c6b872f']
+        self.assertListEqual(gitrev, expected)
+
+        to_date = datetime.datetime(2012, 8, 14, 17, 33, 0,
+                                    tzinfo=dateutil.tz.tzutc())
+        gitrev = [line for line in repo.rev_list(to_date=to_date, reverse=True)]
+
+        expected = ['bc57a9209f096a130dcc5ba7089a8663f758a703',
+                    '87783129c3f00d2c81a3a8e585eb86a47e39891a']
+        self.assertListEqual(gitrev, expected)
+
+        shutil.rmtree(new_path)
+
     def test_rev_list_from_empty_repository(self):
         """Test if an exception is raised when the repository is empty"""
 
@@ -1621,6 +2255,58 @@ class TestGitRepository(TestCaseGit):
 
         shutil.rmtree(new_path)
 
+    def test_log_commits(self):
+        """Test log command reading a list of commits"""
+
+        new_path = os.path.join(self.tmp_path, 'newgit')
+
+        repo = GitRepository.clone(self.git_path, new_path)
+
+        hashes = ['c0d66f92a95e31c77be08dc9d0f11a16715d1885',
+                  'bc57a9209f096a130dcc5ba7089a8663f758a703',
+                  '456a68ee1407a77f3e804a30dff245bb6c6b872f']
+        gitlog = repo.log(commits=hashes)
+        commits = [commit['commit'] for commit in GitParser(gitlog).parse()]
+        self.assertListEqual(commits, hashes)
+
+        # Dates and branches are ignored
+        gitlog = repo.log(branches=[], commits=hashes[:1])
+        commits = [commit['commit'] for commit in GitParser(gitlog).parse()]
+        self.assertListEqual(commits, hashes[:1])
+
+        # The history of all the commits is the same as the log
+        hashes = [line for line in repo.rev_list(reverse=True)]
+        gitlog = [line for line in repo.log(commits=hashes)]
+        self.assertListEqual(gitlog, [line for line in repo.log()])
+
+        gitlog = repo.log(commits=['0' * 40])
+        with self.assertRaises(RepositoryError):
+            _ = [line for line in gitlog]
+
+        shutil.rmtree(new_path)
+
+    def test_log_machine(self):
+        """Test log command using the machine-readable format"""
+
+        new_path = os.path.join(self.tmp_path, 'newgit')
+
+        repo = GitRepository.clone(self.git_path, new_path)
+        gitlog = [field for field in repo.log(machine=True)]
+        self.assertEqual(gitlog[0], "bc57a9209f096a130dcc5ba7089a8663f758a703")
+        self.assertEqual(gitlog[8], "Initial commit on test repository\n")
+
+        commits = [commit for commit in GitMachineParser(gitlog).parse()]
+        expected = [commit for commit in GitParser(repo.log()).parse()]
+
+        self.assertEqual(len(commits), 9)
+        self.assertListEqual(commits, expected)
+
+        # Fields are the same when they are read in small blocks
+        repo.READ_BLOCK_SIZE = 7
+        self.assertListEqual([field for field in repo.log(machine=True)], gitlog)
+
+        shutil.rmtree(new_path)
+
     def test_log_to_date(self):
         """Test if commits are returned before the given date"""
 
@@ -1718,6 +2404,103 @@ class TestGitRepository(TestCaseGit):
 
         shutil.rmtree(new_path)
 
+    def test_show_machine(self):
+        """Test show command using the machine-readable format"""
+
+        new_path = os.path.join(self.tmp_path, 'newgit')
+
+        repo = GitRepository.clone(self.git_path, new_path)
+        hashes = ['51a3b65', '8778312']
+
+        gitshow = repo.show(commits=hashes, machine=True)
+        commits = [commit for commit in GitMachineParser(gitshow).parse()]
+
+        gitshow = repo.show(commits=hashes)
+        expected = [commit for commit in GitParser(gitshow).parse()]
+
+        self.assertEqual(len(commits), 2)
+        self.assertEqual(commits[0]['commit'], '51a3b654f252210572297f47597b31527c475fb8')
+        self.assertEqual(commits[1]['commit'], '87783129c3f00d2c81a3a8e585eb86a47e39891a')
+        self.assertListEqual(commits, expected)
+
+        shutil.rmtree(new_path)
+
+    def test_log_show_detail(self):
+        """Test log and show commands with less detail"""
+
+        new_path = os.path.join(self.tmp_path, 'newgit')
+
+        repo = GitRepository.clone(self.git_path, new_path)
+
+        for detail in [DETAIL_FULL, DETAIL_FILES, DETAIL_COMMITS]:
+            expected = [commit for commit in GitParser(repo.log(detail=detail)).parse()]
+            hashes = [commit['commit'] for commit in expected]
+
+            gitlog = repo.log(machine=True, detail=detail)
+            commits = [commit for commit in GitMachineParser(gitlog).parse()]
+            self.assertListEqual(commits, expected)
+
+            gitshow = repo.show(commits=hashes, detail=detail)
+            commits = [commit for commit in GitParser(gitshow).parse()]
+            self.assertListEqual(commits, expected)
+
+            gitshow = repo.show(commits=hashes, machine=True, detail=detail)
+            commits = [commit for commit in GitMachineParser(gitshow).parse()]
+            self.assertListEqual(commits, expected)
+
+        nfiles = {}
+        for detail in [DETAIL_FULL, DETAIL_FILES, DETAIL_COMMITS]:
+            gitlog = repo.log(detail=detail)
+            nfiles[detail] = sum(len(commit['files']) for commit in GitParser(gitlog).parse())
+
+        self.assertDictEqual(nfiles, {DETAIL_FULL: 12, DETAIL_FILES: 15, DETAIL_COMMITS: 0})
+
+        shutil.rmtree(new_path)
+
+    def test_show_chunks(self):
+        """Test if the commits are sent to show in chunks keeping their order"""
+
+        new_path = os.path.join(self.tmp_path, 'newgit')
+
+        repo = GitRepository.clone(self.git_path, new_path)
+        hashes = [commit for commit in repo.rev_list()]
+        hashes.reverse()
+
+        expected = [commit['commit'] for commit in GitParser(repo.show(commits=hashes)).parse()]
+        self.assertListEqual(expected, hashes)
+
+        GitRepository.spawned_processes.clear()
+        repo.SHOW_CHUNK_SIZE = 2
+
+        gitshow = repo.show(commits=hashes)
+        commits = [commit['commit'] for commit in GitParser(gitshow).parse()]
+
+        self.assertListEqual(commits, hashes)
+        self.assertEqual(GitRepository.spawned_processes['show'], 5)
+
+        gitshow = repo.show(commits=hashes, machine=True)
+        commits = [commit['commit'] for commit in GitMachineParser(gitshow).parse()]
+
+        self.assertListEqual(commits, hashes)
+
+        shutil.rmtree(new_path)
+
+    def test_show_chunks_error(self):
+        """Test if an exception is raised when a chunk fails"""
+
+        new_path = os.path.join(self.tmp_path, 'newgit')
+
+        repo = GitRepository.clone(self.git_path, new_path)
+        repo.SHOW_CHUNK_SIZE = 2
+        hashes = ['51a3b65', '8778312', '0000000000000000000000000000000000000000']
+
+        gitshow = repo.show(commits=hashes)
+
+        with self.assertRaises(RepositoryError):
+            _ = [line for line in gitshow]
+
+        shutil.rmtree(new_path)
+
     def test_git_show_from_emtpy_repository(self):
         """Test if an exception is raised when the repository is empty"""
 
@@ -21,9 +21,12 @@
 #     Quan Zhou <quan@bitergia.com>
 #
 
+import concurrent.futures
 import datetime
 import dateutil
+import json
 import os
+import threading
 import time
 import unittest
 import unittest.mock
@@ -37,11 +40,12 @@ pkg_resources.declare_namespace('perceval.backends')
 from grimoirelab_toolkit.datetime import datetime_utcnow
 from perceval.backend import BackendCommandArgumentParser
 from perceval.client import RateLimitHandler
-from perceval.errors import RateLimitError
+from perceval.errors import BackendError, RateLimitError
 from perceval.utils import (DEFAULT_DATETIME, DEFAULT_LAST_DATETIME)
 from perceval.backends.core.github import (GitHub,
                                            GitHubCommand,
                                            GitHubClient,
+                                           GitHubGraphQLClient,
                                            CATEGORY_ISSUE,
                                            CATEGORY_PULL_REQUEST,
                                            CATEGORY_REPO)
@@ -70,6 +74,7 @@ GITHUB_PULL_REQUEST_2_REQUESTED_REVIEWERS_URL = GITHUB_PULL_REQUEST_2_URL + "/re
 GITHUB_USER_URL = GITHUB_API_URL + "/users/zhquan_example"
 GITHUB_ORGS_URL = GITHUB_API_URL + "/users/zhquan_example/orgs"
 GITHUB_COMMAND_URL = GITHUB_API_URL + "/command"
+GITHUB_GRAPHQL_URL = GITHUB_API_URL + "/graphql"
 
 GITHUB_ENTERPRISE_URL = "https://example.com"
 GITHUB_ENTERPRISE_API_URL = "https://example.com/api/v3"
@@ -97,6 +102,118 @@ def read_file(filename, mode='r'):
     return content
 
 
+def setup_issues_server():
+    """Register the URLs of two issues with comments, reactions and users"""
+
+    rate_limit_headers = {
+        'X-RateLimit-Remaining': '20',
+        'X-RateLimit-Reset': '15'
+    }
+
+    httpretty.register_uri(httpretty.GET,
+                           GITHUB_RATE_LIMIT,
+                           body=read_file('data/github/rate_limit'),
+                           status=200,
+                           forcing_headers=rate_limit_headers)
+    httpretty.register_uri(httpretty.GET,
+                           GITHUB_ISSUES_URL,
+                           body=read_file('data/github/github_issue_1'),
+                           status=200,
+                           forcing_headers={
+                               'X-RateLimit-Remaining': '20',
+                               'X-RateLimit-Reset': '15',
+                               'Link': '<' + GITHUB_ISSUES_URL + '/?&page=2>; rel="next", <' +
+                                       GITHUB_ISSUES_URL + '/?&page=3>; rel="last"'
+                           })
+
+    uris = [
+        (GITHUB_ISSUES_URL + '/?&page=2', 'data/github/github_issue_2'),
+        (GITHUB_ISSUE_1_COMMENTS_URL, 'data/github/github_issue_comments_1'),
+        (GITHUB_ISSUE_2_COMMENTS_URL, 'data/github/github_issue_comments_2'),
+        (GITHUB_ISSUE_2_REACTION_URL, 'data/github/github_issue_2_reactions'),
+        (GITHUB_ISSUE_COMMENT_1_REACTION_URL, 'data/github/github_issue_comment_1_reactions'),
+        (GITHUB_ISSUE_COMMENT_2_REACTION_URL, 'data/github/github_empty_request'),
+        (GITHUB_USER_URL, 'data/github/github_login'),
+        (GITHUB_ORGS_URL, 'data/github/github_orgs')
+    ]
+
+    for uri, filename in uris:
+        httpretty.register_uri(httpretty.GET, uri,
+                               body=read_file(filename), status=200,
+                               forcing_headers=rate_limit_headers)
+
+
+def setup_graphql_server(users='data/github/github_graphql_users'):
+    """Register the URLs of two issues and the GraphQL API endpoint.
+
+    Returns the list where the GraphQL queries received are stored.
+    """
+    rate_limit_headers = {
+        'X-RateLimit-Remaining': '20',
+        'X-RateLimit-Reset': '15'
+    }
+
+    httpretty.register_uri(httpretty.GET,
+                           GITHUB_RATE_LIMIT,
+                           body=read_file('data/github/rate_limit'),
+                           status=200,
+                           forcing_headers=rate_limit_headers)
+    httpretty.register_uri(httpretty.GET,
+                           GITHUB_ISSUES_URL,
+                           body=read_file('data/github/github_issue_1'),
+                           status=200,
+                           forcing_headers={
+                               'X-RateLimit-Remaining': '20',
+                               'X-RateLimit-Reset': '15',
+                               'Link': '<' + GITHUB_ISSUES_URL + '/?&page=2>; rel="next", <' +
+                                       GITHUB_ISSUES_URL + '/?&page=3>; rel="last"'
+                           })
+    httpretty.register_uri(httpretty.GET,
+                           GITHUB_ISSUES_URL + '/?&page=2',
+                           body=read_file('data/github/github_issue_2'),
+                           status=200,
+                           forcing_headers=rate_limit_headers)
+
+    queries = []
+    responses = [
+        ('user(login:', users),
+        ('node(id: $n0)', 'data/github/github_graphql_comment_reactions'),
+        ('node(id: $id)', 'data/github/github_graphql_issue_2_reactions'),
+        ('repository(owner:', 'data/github/github_graphql_issues_data')
+    ]
+
+    def request_callback(request, uri, headers):
+        query = json.loads(request.body.decode('utf-8'))['query']
+        queries.append(query)
+
+        filename = [filename for text, filename in responses if text in query][0]
+        headers.update(rate_limit_headers)
+
+        return (200, headers, read_file(filename))
+
+    httpretty.register_uri(httpretty.POST,
+                           GITHUB_GRAPHQL_URL,
+                           responses=[httpretty.Response(body=request_callback)])
+
+    return queries
+
+
+def assert_rest_subset(test_case, rest, graphql):
+    """Check whether the data returned by REST API is included in GraphQL's"""
+
+    if isinstance(rest, dict):
+        test_case.assertIsInstance(graphql, dict)
+        for key, value in rest.items():
+            test_case.assertIn(key, graphql)
+            assert_rest_subset(test_case, value, graphql[key])
+    elif isinstance(rest, list):
+        test_case.assertEqual(len(rest), len(graphql))
+        for rest_value, graphql_value in zip(rest, graphql):
+            assert_rest_subset(test_case, rest_value, graphql_value)
+    else:
+        test_case.assertEqual(rest, graphql)
+
+
 class TestGitHubBackend(unittest.TestCase):
     """ GitHub backend tests """
 
@@ -136,6 +253,12 @@ class TestGitHubBackend(unittest.TestCase):
         self.assertEqual(github.origin, 'https://github.com/zhquan_example/repo')
         self.assertEqual(github.tag, 'https://github.com/zhquan_example/repo')
 
+    def test_invalid_enrich_workers(self):
+        """Test whether an exception is raised when the number of workers is invalid"""
+
+        with self.assertRaisesRegex(BackendError, "enrich_workers must be greater than 0"):
+            GitHub('zhquan_example', 'repo', ['aaa'], enrich_workers=0)
+
     def test_pool_of_tokens_initialization(self):
         """Test whether tokens parameter is initialized"""
 
@@ -530,6 +653,110 @@ class TestGitHubBackend(unittest.TestCase):
         self.assertEqual(issue['data']['comments_data'][0]['reactions']['total_count'],
                          len(issue['data']['comments_data'][0]['reactions_data']))
 
+    @httpretty.activate
+    def test_fetch_issues_enrich_workers(self):
+        """Test whether issues fetched by several threads keep their order"""
+
+        setup_issues_server()
+
+        github = GitHub("zhquan_example", "repo", ["aaa"])
+        expected = [issue['data'] for issue in github.fetch()]
+
+        self.assertEqual(len(expected), 2)
+
+        github = GitHub("zhquan_example", "repo", ["aaa"], enrich_workers=4)
+        self.assertEqual(github.enrich_workers, 4)
+
+        issues = [issue for issue in github.fetch()]
+
+        self.assertEqual(len(issues), 2)
+        self.assertEqual(issues[0]['uuid'], '58c073fd2a388c44043b9cc197c73c5c540270ac')
+        self.assertEqual(issues[1]['uuid'], '4236619ac2073491640f1698b5c4e169895aaf69')
+        self.assertListEqual([issue['data'] for issue in issues], expected)
+
+        issue = issues[0]
+        self.assertEqual(issue['data']['user_data']['login'], 'zhquan_example')
+        self.assertEqual(len(issue['data']['comments_data']), 1)
+        self.assertEqual(issue['data']['comments_data'][0]['user_data']['login'], 'zhquan_example')
+
+    @httpretty.activate
+    def test_fetch_issues_enrich_workers_error(self):
+        """Test whether errors fetching the data of the items are raised"""
+
+        setup_issues_server()
+        httpretty.register_uri(httpretty.GET,
+                               GITHUB_ISSUE_2_COMMENTS_URL,
+                               body="", status=401,
+                               forcing_headers={
+                                   'X-RateLimit-Remaining': '20',
+                                   'X-RateLimit-Reset': '15'
+                               })
+
+        github = GitHub("zhquan_example", "repo", ["aaa"], enrich_workers=4)
+        issues = github.fetch()
+
+        issue = next(issues)
+        self.assertEqual(issue['uuid'], '58c073fd2a388c44043b9cc197c73c5c540270ac')
+
+        with self.assertRaises(requests.exceptions.HTTPError):
+            next(issues)
+
+    @httpretty.activate
+    def test_fetch_issues_graphql(self):
+        """Test whether issues fetched with GraphQL include the data REST API returns"""
+
+        setup_issues_server()
+
+        github = GitHub("zhquan_example", "repo", ["aaa"])
+        expected = [issue['data'] for issue in github.fetch()]
+
+        queries = setup_graphql_server()
+
+        github = GitHub("zhquan_example", "repo", ["aaa"], graphql=True)
+        self.assertTrue(github.graphql)
+
+        issues = [issue for issue in github.fetch()]
+
+        self.assertEqual(len(issues), 2)
+        self.assertEqual(issues[0]['uuid'], '58c073fd2a388c44043b9cc197c73c5c540270ac')
+        self.assertEqual(issues[1]['uuid'], '4236619ac2073491640f1698b5c4e169895aaf69')
+
+        for rest_issue, issue in zip(expected, issues):
+            assert_rest_subset(self, rest_issue, issue['data'])
+
+        issue = issues[1]['data']
+        self.assertEqual(len(issue['reactions_data']), 2)
+        self.assertEqual(issue['reactions_data'][1]['id'], 2)
+        self.assertEqual(issue['comments_data'][0]['reactions']['rocket'], 0)
+        self.assertEqual(issue['user_data']['organizations'][1]['login'], 'Orgs_2')
+
+        # Both issues are requested at once: one query for their data,
+        # one for the second page of reactions, one for the reactions
+        # of the comments and one for the users
+        self.assertEqual(len(queries), 4)
+        self.assertIn('node_id', github._users['zhquan_example'])
+
+    @httpretty.activate
+    def test_fetch_issues_graphql_user_not_found(self):
+        """Test whether users not found with GraphQL are fetched with REST API"""
+
+        setup_issues_server()
+
+        github = GitHub("zhquan_example", "repo", ["aaa"])
+        expected = [issue['data'] for issue in github.fetch()]
+
+        setup_graphql_server(users='data/github/github_graphql_users_not_found')
+
+        github = GitHub("zhquan_example", "repo", ["aaa"], graphql=True)
+        issues = [issue['data'] for issue in github.fetch()]
+
+        self.assertEqual(len(issues), 2)
+        for rest_issue, issue in zip(expected, issues):
+            assert_rest_subset(self, rest_issue, issue)
+
+        # The user was fetched using REST API
+        self.assertNotIn('node_id', github._users['zhquan_example'])
+
     @httpretty.activate
     def test_fetch_more_pulls(self):
         """Test when return two pulls"""
@@ -1686,6 +1913,29 @@ class TestGitHubBackendArchive(TestCaseBackendArchive):
 
         self._test_fetch_from_archive(from_date=None)
 
+    def test_fetch_issues_from_archive_enrich_workers(self):
+        """Test whether issues fetched by several threads are returned from archive"""
+
+        self.backend_write_archive = GitHub("zhquan_example", "repo", ["aaa"],
+                                            archive=self.archive, enrich_workers=4)
+        self.backend_read_archive = GitHub("zhquan_example", "repo", ["aaa"],
+                                           archive=self.archive, enrich_workers=4)
+
+        self.test_fetch_issues_from_archive()
+
+    @httpretty.activate
+    def test_fetch_issues_from_archive_graphql(self):
+        """Test whether issues fetched with GraphQL are returned from archive"""
+
+        setup_graphql_server()
+
+        self.backend_write_archive = GitHub("zhquan_example", "repo", ["aaa"],
+                                            archive=self.archive, graphql=True)
+        self.backend_read_archive = GitHub("zhquan_example", "repo", ["aaa"],
+                                           archive=self.archive, graphql=True)
+
+        self._test_fetch_from_archive(from_date=None)
+
     @httpretty.activate
     def test_fetch_pulls_from_archive(self):
         """Test whether a list of pull requests is returned from archive"""
@@ -2586,6 +2836,47 @@ class TestGitHubClient(unittest.TestCase):
         response = client.user("zhquan_example")
         self.assertEqual(response, login)
 
+    @httpretty.activate
+    def test_get_user_concurrently(self):
+        """Test whether the data of a user is fetched once by several threads"""
+
+        setup_issues_server()
+
+        GitHubClient._users.pop('zhquan_example', None)
+        GitHubClient._users_orgs.pop('zhquan_example', None)
+
+        client = GitHubClient("zhquan_example", "repo", ["aaa"], None)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+            users = list(executor.map(client.user, ['zhquan_example'] * 8))
+
+        self.assertListEqual(users, [read_file('data/github/github_login')] * 8)
+
+        requests_users = [req for req in httpretty.HTTPretty.latest_requests
+                          if req.path == '/users/zhquan_example']
+        self.assertEqual(len(requests_users), 1)
+
+    @httpretty.activate
+    def test_concurrency_budget(self):
+        """Test whether the number of concurrent requests depends on the rate limit"""
+
+        setup_issues_server()
+
+        client = GitHubClient("zhquan_example", "repo", ["aaa"], None,
+                              min_rate_to_sleep=5)
+
+        client.rate_limit = None
+        self.assertEqual(client.concurrency_budget(8), 8)
+
+        client.rate_limit = 20
+        self.assertEqual(client.concurrency_budget(8), 8)
+
+        client.rate_limit = 10
+        self.assertEqual(client.concurrency_budget(8), 5)
+
+        client.rate_limit = 5
+        self.assertEqual(client.concurrency_budget(8), 1)
+
     @httpretty.activate
     def test_get_user_orgs(self):
         """Test get_user_orgs API call"""
@@ -2886,6 +3177,55 @@ class TestGitHubClient(unittest.TestCase):
         self.assertDictEqual(httpretty.last_request().querystring, expected)
         self.assertEqual(httpretty.last_request().headers["Authorization"], "token aaa")
 
+    @httpretty.activate
+    def test_sleep_for_rate_unlocked(self):
+        """Test whether other threads can use the client while it sleeps for the rate limit"""
+
+        rate_limit = read_file('data/github/rate_limit')
+        httpretty.register_uri(httpretty.GET,
+                               GITHUB_RATE_LIMIT,
+                               body=rate_limit,
+                               status=200,
+                               forcing_headers={
+                                   'X-RateLimit-Remaining': '20',
+                                   'X-RateLimit-Reset': '15'
+                               })
+
+        client = GitHubClient("zhquan_example", "repo", ["aaa"], sleep_for_rate=True)
+        client.rate_limit = 0
+        client.rate_limit_reset_ts = int(time.time()) + 60
+
+        sleeping = threading.Event()
+        wake_up = threading.Event()
+        slept = []
+
+        def mock_sleep(seconds):
+            slept.append(seconds)
+            if len(slept) == 1:
+                sleeping.set()
+                wake_up.wait(10)
+
+        with unittest.mock.patch('perceval.backends.core.github.time.sleep',
+                                 side_effect=mock_sleep):
+            thread = threading.Thread(target=client._wait_for_rate_limit)
+            thread.start()
+
+            self.assertTrue(sleeping.wait(10))
+
+            # The lock of the client is free while sleeping
+            self.assertTrue(client._lock.acquire(timeout=1))
+
+            # Other thread found the rate limit exhausted again
+            client.rate_limit_reset_ts += 60
+            client._lock.release()
+
+            wake_up.set()
+            thread.join(10)
+
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(len(slept), 2)
+        self.assertGreater(slept[1], slept[0])
+
     @httpretty.activate
     def test_rate_limit_error(self):
         """Test get_page_issue API call"""
@@ -2930,6 +3270,169 @@ class TestGitHubClient(unittest.TestCase):
         self.assertEqual(httpretty.last_request().headers["Authorization"], "token aaa")
 
 
+class TestGitHubGraphQLClient(unittest.TestCase):
+    """GitHub GraphQL API client unit tests"""
+
+    @staticmethod
+    def register_rate_limit():
+        httpretty.register_uri(httpretty.GET,
+                               GITHUB_RATE_LIMIT,
+                               body=read_file('data/github/rate_limit'),
+                               status=200,
+                               forcing_headers={
+                                   'X-RateLimit-Remaining': '20',
+                                   'X-RateLimit-Reset': '15'
+                               })
+
+    @httpretty.activate
+    def test_init(self):
+        """Test whether the GraphQL endpoint is set"""
+
+        self.register_rate_limit()
+
+        client = GitHubGraphQLClient('zhquan_example', 'repo', ['aaa'])
+        self.assertEqual(client.graphql_url, GITHUB_GRAPHQL_URL)
+        self.assertEqual(client.base_url, GITHUB_API_URL)
+
+        httpretty.register_uri(httpretty.GET,
+                               GITHUB_ENTREPRISE_RATE_LIMIT,
+                               body=read_file('data/github/rate_limit'),
+                               status=200,
+                               forcing_headers={
+                                   'X-RateLimit-Remaining': '20',
+                                   'X-RateLimit-Reset': '15'
+                               })
+
+        client = GitHubGraphQLClient('zhquan_example', 'repo', ['aaa'],
+                                     base_url=GITHUB_ENTERPRISE_URL)
+        self.assertEqual(client.graphql_url, GITHUB_ENTERPRISE_URL + '/api/graphql')
+        self.assertEqual(client.base_url, GITHUB_ENTERPRISE_API_URL)
+
+    @httpretty.activate
+    def test_query(self):
+        """Test whether queries and their variables are sent"""
+
+        self.register_rate_limit()
+
+        httpretty.register_uri(httpretty.POST,
+                               GITHUB_GRAPHQL_URL,
+                               body='{"data": {"viewer": {"login": "zhquan_example"}}}',
+                               status=200,
+                               forcing_headers={
+                                   'X-RateLimit-Remaining': '20',
+                                   'X-RateLimit-Reset': '15'
+                               })
+
+        client = GitHubGraphQLClient('zhquan_example', 'repo', ['aaa'])
+        data = client.query("query($n: Int!) { viewer { login } }", {'n': 1})
+
+        self.assertDictEqual(data, {'viewer': {'login': 'zhquan_example'}})
+
+        req = httpretty.last_request()
+        self.assertEqual(req.method, 'POST')
+        self.assertEqual(req.headers['Authorization'], 'token aaa')
+        self.assertEqual(req.headers['Content-Type'], 'application/json')
+
+        payload = json.loads(req.body.decode('utf-8'))
+        self.assertDictEqual(payload, {'query': "query($n: Int!) { viewer { login } }",
+                                       'variables': {'n': 1}})
+
+    @httpretty.activate
+    def test_query_error(self):
+        """Test whether an exception is raised when a query fails"""
+
+        self.register_rate_limit()
+
+        httpretty.register_uri(httpretty.POST,
+                               GITHUB_GRAPHQL_URL,
+                               body='{"errors": [{"message": "Field \'foo\' doesn\'t exist"}]}',
+                               status=200,
+                               forcing_headers={
+                                   'X-RateLimit-Remaining': '20',
+                                   'X-RateLimit-Reset': '15'
+                               })
+
+        client = GitHubGraphQLClient('zhquan_example', 'repo', ['aaa'])
+
+        with self.assertRaisesRegex(BackendError, "GraphQL query error; cause: Field 'foo'"):
+            client.query("query { foo }")
+
+    @httpretty.activate
+    def test_users_not_found(self):
+        """Test whether users not found are set to None"""
+
+        self.register_rate_limit()
+
+        httpretty.register_uri(httpretty.POST,
+                               GITHUB_GRAPHQL_URL,
+                               body=read_file('data/github/github_graphql_users_not_found'),
+                               status=200,
+                               forcing_headers={
+                                   'X-RateLimit-Remaining': '20',
+                                   'X-RateLimit-Reset': '15'
+                               })
+
+        client = GitHubGraphQLClient('zhquan_example', 'repo', ['aaa'])
+
+        users = client.users(['dependabot'])
+        self.assertDictEqual(users, {'dependabot': None})
+
+        self.assertDictEqual(client.users([]), {})
+
+    @httpretty.activate
+    def test_pulls_data(self):
+        """Test whether review comments and commits are converted to REST format"""
+
+        self.register_rate_limit()
+
+        httpretty.register_uri(httpretty.POST,
+                               GITHUB_GRAPHQL_URL,
+                               body=read_file('data/github/github_graphql_pulls_data'),
+                               status=200,
+                               forcing_headers={
+                                   'X-RateLimit-Remaining': '20',
+                                   'X-RateLimit-Reset': '15'
+                               })
+
+        client = GitHubGraphQLClient('zhquan_example', 'repo', ['aaa'])
+        data = client.pulls_data([1])
+
+        self.assertListEqual(list(data.keys()), [1])
+        self.assertListEqual(data[1]['commits'],
+                             ['53b970ee04bbc435842c14a2cbfdd623faf74a65',
+                              'd0d5d2bf0b43da8e1fbcd2ac21b35ed2e3ff2338'])
+
+        # Comments of every review are sorted by update time
+        comments = data[1]['review_comments']
+        self.assertListEqual([comment['id'] for comment in comments], [1, 2, 3])
+
+        comment = comments[0]
+        self.assertEqual(comment['url'], GITHUB_PULL_REQUEST_URL + '/comments/1')
+        self.assertEqual(comment['html_url'], 'https://github.com/zhquan_example/repo/pull/1#discussion_r1')
+        self.assertEqual(comment['pull_request_url'], GITHUB_PULL_REQUEST_1_URL)
+        self.assertEqual(comment['pull_request_review_id'], 11)
+        self.assertEqual(comment['commit_id'], 'cc134f32fa8c518abe5f0501836af69741b25a64')
+        self.assertEqual(comment['original_commit_id'], 'b030dbf53d3ecaae2f080018073c9bdafb6b4166')
+        self.assertEqual(comment['position'], None)
+        self.assertEqual(comment['original_position'], 2)
+        self.assertEqual(comment['user']['login'], 'zhquan_example')
+        self.assertEqual(comment['user']['url'], GITHUB_USER_URL)
+        self.assertEqual(comment['user']['type'], 'User')
+        self.assertEqual(comment['reactions']['total_count'], 0)
+        self.assertListEqual(comment['reactions_data'], [])
+        self.assertNotIn('in_reply_to_id', comment)
+
+        comment = comments[2]
+        self.assertEqual(comment['in_reply_to_id'], 2)
+        self.assertEqual(comment['user']['login'], 'dependabot')
+        self.assertEqual(comment['user']['type'], 'Bot')
+        self.assertEqual(comment['user']['site_admin'], False)
+
+        # Reactions are not requested when comments have none
+        self.assertEqual(httpretty.last_request().method, 'POST')
+        self.assertIn('pullRequest(number: 1)', json.loads(httpretty.last_request().body)['query'])
+
+
 class TestGitHubCommand(unittest.TestCase):
     """GitHubCommand unit tests"""
 
@@ -2953,6 +3456,8 @@ class TestGitHubCommand(unittest.TestCase):
                 '--from-date', '1970-01-01',
                 '--to-date', '2100-01-01',
                 '--enterprise-url', 'https://example.com',
+                '--enrich-workers', '4',
+                '--graphql',
                 'zhquan_example', 'repo']
 
         parsed_args = parser.parse(*args)
@@ -2967,6 +3472,8 @@ class TestGitHubCommand(unittest.TestCase):
         self.assertEqual(parsed_args.to_date, DEFAULT_LAST_DATETIME)
         self.assertEqual(parsed_args.no_archive, True)
         self.assertEqual(parsed_args.api_token, ['abcdefgh', 'ijklmnop'])
+        self.assertEqual(parsed_args.enrich_workers, 4)
+        self.assertEqual(parsed_args.graphql, True)
 
 
 if __name__ == "__main__":
@@ -405,7 +405,10 @@ class TestGroupsioCommand(unittest.TestCase):
                 '--tag', 'test',
                 '--from-date', '1970-01-01',
                 '--no-verify',
-                '--api-token', 'aaaaa']
+                '--api-token', 'aaaaa',
+                '--parse-workers', '4',
+                '--mbox-index',
+                '--headers-only']
 
         parsed_args = parser.parse(*args)
         self.assertEqual(parsed_args.group_name, 'acme_group')
@@ -414,6 +417,9 @@ class TestGroupsioCommand(unittest.TestCase):
         self.assertEqual(parsed_args.from_date, DEFAULT_DATETIME)
         self.assertFalse(parsed_args.verify)
         self.assertEqual(parsed_args.api_token, 'aaaaa')
+        self.assertEqual(parsed_args.parse_workers, 4)
+        self.assertTrue(parsed_args.mbox_index)
+        self.assertTrue(parsed_args.headers_only)
 
 
 if __name__ == "__main__":
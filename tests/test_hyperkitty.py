@@ -70,6 +70,10 @@ class TestHyperKittyList(unittest.TestCase):
         self.assertEqual(hkls.uri, HYPERKITTY_URL)
         self.assertEqual(hkls.dirpath, self.tmp_path)
         self.assertEqual(hkls.client.base_url, HYPERKITTY_URL)
+        self.assertEqual(hkls.download_workers, 1)
+
+        hkls = HyperKittyList(HYPERKITTY_URL, self.tmp_path, download_workers=4)
+        self.assertEqual(hkls.download_workers, 4)
 
     @httpretty.activate
     @unittest.mock.patch('perceval.backends.core.hyperkitty.datetime_utcnow')
@@ -109,6 +113,67 @@ class TestHyperKittyList(unittest.TestCase):
         self.assertEqual(mboxes[0].filepath, os.path.join(self.tmp_path, '2016-03.mbox.gz'))
         self.assertEqual(mboxes[1].filepath, os.path.join(self.tmp_path, '2016-04.mbox.gz'))
 
+    @httpretty.activate
+    @unittest.mock.patch('perceval.backends.core.hyperkitty.datetime_utcnow')
+    def test_fetch_not_modified(self, mock_utcnow):
+        """Test whether archives not modified since the last fetch are not downloaded again"""
+
+        mock_utcnow.return_value = datetime.datetime(2016, 4, 10,
+                                                     tzinfo=dateutil.tz.tzutc())
+
+        mbox_march = read_file('data/hyperkitty/hyperkitty_2016_march.mbox')
+        mbox_april = read_file('data/hyperkitty/hyperkitty_2016_april.mbox')
+
+        requests_march = []
+
+        def archive_callback(body, etag):
+            def request_callback(request, uri, response_headers):
+                if '2016-03' in uri:
+                    requests_march.append(request)
+                if request.headers.get('If-None-Match', None) == etag:
+                    return 304, response_headers, ''
+                response_headers['ETag'] = etag
+                return 200, response_headers, body
+            return request_callback
+
+        httpretty.register_uri(httpretty.GET,
+                               HYPERKITTY_URL,
+                               body="")
+        httpretty.register_uri(httpretty.GET,
+                               HYPERKITTY_URL + 'export/2016-03.mbox.gz',
+                               body=archive_callback(mbox_march, '"march"'))
+        httpretty.register_uri(httpretty.GET,
+                               HYPERKITTY_URL + 'export/2016-04.mbox.gz',
+                               body=archive_callback(mbox_april, '"april"'))
+
+        from_date = datetime.datetime(2016, 3, 10)
+
+        hkls = HyperKittyList('http://example.com/archives/list/test@example.com/',
+                              self.tmp_path, download_workers=2)
+        hkls.fetch(from_date=from_date)
+
+        filepath = os.path.join(self.tmp_path, '2016-03.mbox.gz')
+        self.assertTrue(os.path.exists(filepath + '.validators'))
+        mtime = os.stat(filepath).st_mtime_ns
+
+        fetched = hkls.fetch(from_date=from_date)
+
+        self.assertEqual(len(fetched), 2)
+        self.assertEqual(fetched[0][0], HYPERKITTY_URL + 'export/2016-03.mbox.gz')
+        self.assertEqual(fetched[0][1], filepath)
+        self.assertEqual(fetched[1][0], HYPERKITTY_URL + 'export/2016-04.mbox.gz')
+        self.assertEqual(fetched[1][1], os.path.join(self.tmp_path, '2016-04.mbox.gz'))
+
+        self.assertEqual(os.stat(filepath).st_mtime_ns, mtime)
+        self.assertEqual(len(requests_march), 2)
+        self.assertNotIn('If-None-Match', requests_march[0].headers)
+        self.assertEqual(requests_march[1].headers['If-None-Match'], '"march"')
+
+        mboxes = hkls.mboxes
+        self.assertEqual(len(mboxes), 2)
+        self.assertEqual(mboxes[0].filepath, filepath)
+        self.assertEqual(mboxes[1].filepath, os.path.join(self.tmp_path, '2016-04.mbox.gz'))
+
     @httpretty.activate
     @unittest.mock.patch('perceval.backends.core.hyperkitty.datetime_utcnow')
     def test_fetch_from_date_after_current_day(self, mock_utcnow):
@@ -175,6 +240,10 @@ class TestHyperKittyBackend(unittest.TestCase):
         backend = HyperKitty('http://example.com/', self.tmp_path, tag='')
         self.assertEqual(backend.origin, 'http://example.com/')
         self.assertEqual(backend.tag, 'http://example.com/')
+        self.assertEqual(backend.download_workers, 1)
+
+        backend = HyperKitty('http://example.com/', self.tmp_path, download_workers=4)
+        self.assertEqual(backend.download_workers, 4)
 
     def test_has_archiving(self):
         """Test if it returns False when has_archiving is called"""
@@ -310,13 +379,21 @@ class TestHyperKittyCommand(unittest.TestCase):
         args = ['http://example.com/archives/list/test@example.com/',
                 '--mboxes-path', '/tmp/perceval/',
                 '--tag', 'test',
-                '--from-date', '1970-01-01']
+                '--from-date', '1970-01-01',
+                '--parse-workers', '4',
+                '--mbox-index',
+                '--headers-only',
+                '--download-workers', '4']
 
         parsed_args = parser.parse(*args)
         self.assertEqual(parsed_args.url, 'http://example.com/archives/list/test@example.com/')
         self.assertEqual(parsed_args.mboxes_path, '/tmp/perceval/')
         self.assertEqual(parsed_args.tag, 'test')
         self.assertEqual(parsed_args.from_date, DEFAULT_DATETIME)
+        self.assertEqual(parsed_args.parse_workers, 4)
+        self.assertTrue(parsed_args.mbox_index)
+        self.assertTrue(parsed_args.headers_only)
+        self.assertEqual(parsed_args.download_workers, 4)
 
 
 if __name__ == "__main__":
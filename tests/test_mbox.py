@@ -24,6 +24,8 @@
 import bz2
 import datetime
 import gzip
+import lzma
+import mailbox
 import os
 import pkg_resources
 import shutil
@@ -32,6 +34,9 @@ import unittest
 import unittest.mock
 import zipfile
 
+import httpretty
+import requests
+
 pkg_resources.declare_namespace('perceval.backends')
 
 from perceval.backend import BackendCommandArgumentParser
@@ -40,7 +45,11 @@ from perceval.backends.core.mbox import (logger,
                                          MBox,
                                          MBoxCommand,
                                          MBoxArchive,
-                                         MailingList)
+                                         MBoxDownloader,
+                                         MBoxIndex,
+                                         MBoxIndexEntry,
+                                         MailingList,
+                                         _MBoxReader)
 
 
 class TestBaseMBox(unittest.TestCase):
@@ -159,6 +168,27 @@ class TestMBoxArchive(TestBaseMBox):
         self.assertIsInstance(container, gzip.GzipFile)
         container.close()
 
+    def test_container_xz(self):
+        """Check the type xz of the container of an archive"""
+
+        filepath = os.path.join(self.tmp_path, 'xz')
+
+        with open(self.files['single'], 'rb') as f_in:
+            with lzma.open(filepath, 'wb') as f_out:
+                shutil.copyfileobj(f_in, f_out)
+
+        mbox = MBoxArchive(filepath)
+        self.assertEqual(mbox.compressed_type, 'xz')
+
+        container = mbox.container
+        self.assertIsInstance(container, lzma.LZMAFile)
+
+        with open(self.files['single'], 'rb') as f_in:
+            self.assertEqual(container.read(), f_in.read())
+        container.close()
+
+        os.remove(filepath)
+
     def test_container_zip(self):
         """Check the type zip of the container of an archive"""
 
@@ -207,6 +237,21 @@ class TestMailingList(TestBaseMBox):
         self.assertEqual(mboxes[7].filepath, self.files['unknown'])
         self.assertEqual(mboxes[8].filepath, self.cfiles['zip'])
 
+    def test_mboxes_ignored_files(self):
+        """Check whether index, validators and partial files are ignored"""
+
+        for filename in ['mbox_single.mbox.mboxidx', 'mbox_single.mbox.validators',
+                         'mbox_single.mbox.abcd.part']:
+            with open(os.path.join(self.tmp_path, filename), 'w') as fd:
+                fd.write('{}')
+
+        mls = MailingList('test', self.tmp_path)
+
+        mboxes = mls.mboxes
+        self.assertEqual(len(mboxes), 9)
+        self.assertNotIn(os.path.join(self.tmp_path, 'mbox_single.mbox.validators'),
+                         [mbox.filepath for mbox in mboxes])
+
     @unittest.mock.patch('perceval.backends.core.mbox.check_compressed_file_type')
     def test_mboxes_error(self, mock_check_compressed_file_type):
         """Check whether OSError exceptions are properly handled"""
@@ -250,6 +295,18 @@ class TestMBoxBackend(TestBaseMBox):
         backend = MBox('http://example.com/', self.tmp_path, tag='')
         self.assertEqual(backend.origin, 'http://example.com/')
         self.assertEqual(backend.tag, 'http://example.com/')
+        self.assertIsNone(backend.parse_workers)
+        self.assertFalse(backend.mbox_index)
+        self.assertFalse(backend.headers_only)
+
+        backend = MBox('http://example.com/', self.tmp_path, parse_workers=4,
+                       mbox_index=True, headers_only=True)
+        self.assertEqual(backend.parse_workers, 4)
+        self.assertTrue(backend.mbox_index)
+        self.assertTrue(backend.headers_only)
+
+        with self.assertRaises(ValueError):
+            _ = MBox('http://example.com/', self.tmp_path, parse_workers=0)
 
     def test_has_archiving(self):
         """Test if it returns False when has_archiving is called"""
@@ -322,6 +379,139 @@ class TestMBoxBackend(TestBaseMBox):
             self.assertEqual(message['category'], 'message')
             self.assertEqual(message['tag'], 'http://example.com/')
 
+    @unittest.mock.patch.object(_MBoxReader, 'READ_BUFFER_SIZE', 4096)
+    def test_fetch_parse_workers(self):
+        """Test whether mboxes parsed in parallel keep the order of the messages"""
+
+        for from_date in [None, datetime.datetime(2008, 1, 1)]:
+            backend = MBox('http://example.com/', self.tmp_path)
+            expected = [m['data'] for m in backend.fetch(from_date=from_date)]
+
+            backend = MBox('http://example.com/', self.tmp_path, parse_workers=3)
+            messages = [m['data'] for m in backend.fetch(from_date=from_date)]
+
+            self.assertListEqual(messages, expected)
+
+        # Invalid messages are ignored by the workers
+        backend = MBox('http://example.com/', self.tmp_error_path, parse_workers=2)
+        messages = [m for m in backend.fetch()]
+        self.assertEqual(len(messages), 2)
+
+        # Messages read before an error are returned as in a sequential fetch
+        bad_path = os.path.join(self.tmp_error_path, 'mbox_bad.mbox.gz')
+        data = b''
+        for name in ['complex', 'multipart', 'single'] * 4:
+            with open(self.files[name], 'rb') as fd:
+                data += fd.read() + b'\n'
+        data = gzip.compress(data)
+        with open(bad_path, 'wb') as fd:
+            fd.write(data[:len(data) * 8 // 10])
+
+        backend = MBox('http://example.com/', self.tmp_error_path)
+
+        with self.assertLogs(logger, level='WARNING') as cm:
+            expected = [m['data'] for m in backend.fetch()]
+            self.assertIn('WARNING:perceval.backends.core.mbox:Ignoring %s mbox due to: '
+                          'Compressed file ended before the end-of-stream marker was reached' % bad_path,
+                          cm.output)
+
+        backend = MBox('http://example.com/', self.tmp_error_path, parse_workers=2)
+
+        with self.assertLogs(logger, level='WARNING') as cm:
+            messages = [m['data'] for m in backend.fetch()]
+            self.assertIn('WARNING:perceval.backends.core.mbox:Ignoring %s mbox due to: '
+                          'Compressed file ended before the end-of-stream marker was reached' % bad_path,
+                          cm.output)
+
+        self.assertGreater(len(messages), 2)
+        self.assertListEqual(messages, expected)
+
+    def test_fetch_mbox_index(self):
+        """Test whether messages are read using the index of the mboxes"""
+
+        tmp_path = tempfile.mkdtemp(prefix='perceval_')
+
+        for filepath in [self.files['single'], self.files['complex'],
+                         self.files['multipart'], self.cfiles['gz']]:
+            shutil.copy(filepath, tmp_path)
+        shutil.copy(os.path.join(self.tmp_error_path, 'mbox_no_fields.mbox'), tmp_path)
+
+        from_date = datetime.datetime(2008, 1, 1)
+
+        backend = MBox('http://example.com/', tmp_path)
+        expected = [m['data'] for m in backend.fetch()]
+        expected_from_date = [m['data'] for m in backend.fetch(from_date=from_date)]
+
+        # The first fetch parses all the mboxes and writes their indexes
+        backend = MBox('http://example.com/', tmp_path, mbox_index=True)
+        messages = [m['data'] for m in backend.fetch(from_date=from_date)]
+        self.assertListEqual(messages, expected_from_date)
+
+        for filename in ['mbox_single.mbox', 'mbox_complex.mbox', 'mbox_multipart.mbox',
+                         'mbox_no_fields.mbox', 'gz']:
+            filepath = os.path.join(tmp_path, filename)
+            self.assertTrue(os.path.exists(filepath + MBoxIndex.SUFFIX))
+
+        mboxes = [mbox.filepath for mbox in MailingList('http://example.com/', tmp_path).mboxes]
+        self.assertEqual(len(mboxes), 5)
+
+        # Next ones do not parse the mboxes but read the selected messages
+        with unittest.mock.patch.object(_MBoxReader, 'read',
+                                        side_effect=AssertionError("mbox parsed")):
+            messages = [m['data'] for m in backend.fetch()]
+            self.assertListEqual(messages, expected)
+
+            messages = [m['data'] for m in backend.fetch(from_date=from_date)]
+            self.assertListEqual(messages, expected_from_date)
+
+            backend = MBox('http://example.com/', tmp_path, parse_workers=2, mbox_index=True)
+            messages = [m['data'] for m in backend.fetch(from_date=from_date)]
+            self.assertListEqual(messages, expected_from_date)
+
+        # Mboxes with no messages since the given date are not opened
+        with unittest.mock.patch('perceval.backends.core.mbox._MBoxReader') as mock_reader:
+            backend = MBox('http://example.com/', tmp_path, mbox_index=True)
+            messages = [m for m in backend.fetch(from_date=datetime.datetime(2100, 1, 1))]
+            self.assertListEqual(messages, [])
+            mock_reader.assert_not_called()
+
+        # Modified mboxes are parsed again
+        filepath = os.path.join(tmp_path, 'mbox_single.mbox')
+        stat = os.stat(filepath)
+        os.utime(filepath, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+
+        with unittest.mock.patch.object(_MBoxReader, 'read', autospec=True,
+                                        side_effect=_MBoxReader.read) as mock_read:
+            messages = [m['data'] for m in backend.fetch()]
+            self.assertListEqual(messages, expected)
+            self.assertEqual(mock_read.call_count, 1)
+            self.assertEqual(mock_read.call_args[0][0].mbox.filepath, filepath)
+
+        shutil.rmtree(tmp_path)
+
+    def test_fetch_headers_only(self):
+        """Test whether it fetches only the headers of the messages"""
+
+        tmp_path = tempfile.mkdtemp(prefix='perceval_')
+
+        for filepath in [self.files['single'], self.files['complex'],
+                         self.files['multipart'], self.cfiles['gz']]:
+            shutil.copy(filepath, tmp_path)
+
+        backend = MBox('http://example.com/', tmp_path)
+        expected = [m['data'] for m in backend.fetch()]
+
+        for message in expected:
+            message.pop('body')
+
+        # The index is written by the first indexed fetch and read by the second one
+        for kwargs in [{}, {'parse_workers': 2}, {'mbox_index': True}, {'mbox_index': True}]:
+            backend = MBox('http://example.com/', tmp_path, headers_only=True, **kwargs)
+            messages = [m['data'] for m in backend.fetch()]
+            self.assertListEqual(messages, expected)
+
+        shutil.rmtree(tmp_path)
+
     @unittest.mock.patch('perceval.backends.core.mbox.str_to_datetime')
     def test_fetch_exception(self, mock_str_to_datetime):
         """Test whether an exception is thrown when the the fetch_items method fails"""
@@ -368,33 +558,28 @@ class TestMBoxBackend(TestBaseMBox):
 
         tmp_path_ign = tempfile.mkdtemp(prefix='perceval_')
 
-        def copy_mbox_side_effect(*args, **kwargs):
-            """Copy a mbox archive or raise IO error for 'mbox_multipart.mbox' archive"""
+        parse_mbox = MBox.parse_mbox
+
+        def parse_mbox_side_effect(filepath, headers_only=False):
+            """Parse a mbox archive or raise IO error for 'mbox_multipart.mbox' archive"""
 
             error_file = os.path.join(tmp_path_ign, 'mbox_multipart.mbox')
-            mbox = args[0]
 
-            if mbox.filepath == error_file:
+            if filepath == error_file:
                 raise OSError('Mock error')
 
-            tmp_path = tempfile.mktemp(prefix='perceval_')
-
-            with mbox.container as f_in:
-                with open(tmp_path, mode='wb') as f_out:
-                    for l in f_in:
-                        f_out.write(l)
-            return tmp_path
+            return parse_mbox(filepath, headers_only=headers_only)
 
         shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data/mbox/mbox_single.mbox'),
                     tmp_path_ign)
         shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data/mbox/mbox_multipart.mbox'),
                     tmp_path_ign)
 
-        # Mock 'copy_mbox' method for forcing to raise an OSError
+        # Mock 'parse_mbox' method for forcing to raise an OSError
         # with file 'data/mbox/mbox_multipart.mbox' to check if
         # the code ignores this file
-        with unittest.mock.patch('perceval.backends.core.mbox.MBox._copy_mbox') as mock_copy_mbox:
-            mock_copy_mbox.side_effect = copy_mbox_side_effect
+        with unittest.mock.patch('perceval.backends.core.mbox.MBox.parse_mbox') as mock_parse_mbox:
+            mock_parse_mbox.side_effect = parse_mbox_side_effect
 
             backend = MBox('http://example.com/', tmp_path_ign)
             messages = [m for m in backend.fetch()]
@@ -542,6 +727,495 @@ class TestMBoxBackend(TestBaseMBox):
         messages = MBox.parse_mbox(self.files['iso8859'])
         _ = [msg for msg in messages]
 
+    def test_parse_compressed_mbox(self):
+        """Check whether it parses compressed mboxes"""
+
+        expected = [msg for msg in MBox.parse_mbox(self.files['single'])]
+
+        for ftype in ['bz2', 'gz', 'zip']:
+            messages = MBox.parse_mbox(self.cfiles[ftype])
+            result = [msg for msg in messages]
+            self.assertListEqual(result, expected)
+
+
+class TestMBoxIndex(unittest.TestCase):
+    """Tests for MBoxIndex class"""
+
+    def setUp(self):
+        self.tmp_path = tempfile.mkdtemp(prefix='perceval_')
+        self.filepath = os.path.join(self.tmp_path, 'mbox')
+        shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data/mbox/mbox_single.mbox'),
+                    self.filepath)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_path)
+
+    def test_save_load(self):
+        """Test whether entries are saved and loaded"""
+
+        entries = [
+            MBoxIndexEntry(0, 100, 1291210000.0, '<1@example.com>'),
+            MBoxIndexEntry(100, 50, None, None)
+        ]
+
+        index = MBoxIndex(self.filepath)
+        self.assertEqual(index.index_filepath, self.filepath + '.mboxidx')
+
+        stat = os.stat(self.filepath)
+        self.assertIsNone(index.load(stat))
+
+        index.save(stat, entries)
+        self.assertListEqual(sorted(os.listdir(self.tmp_path)), ['mbox', 'mbox.mboxidx'])
+
+        result = index.load(stat)
+        self.assertListEqual(result, entries)
+        self.assertIsInstance(result[0], MBoxIndexEntry)
+
+    def test_outdated(self):
+        """Test whether indexes of modified mboxes are not loaded"""
+
+        index = MBoxIndex(self.filepath)
+        index.save(os.stat(self.filepath), [MBoxIndexEntry(0, 100, 1291210000.0, '<1@example.com>')])
+
+        with open(self.filepath, 'ab') as fd:
+            fd.write(b'\n')
+
+        self.assertIsNone(index.load(os.stat(self.filepath)))
+
+    def test_invalid_index(self):
+        """Test whether invalid indexes are ignored"""
+
+        index = MBoxIndex(self.filepath)
+        stat = os.stat(self.filepath)
+
+        for data in ['not a json', '[]', '{"version": 1}']:
+            with open(index.index_filepath, 'w') as fd:
+                fd.write(data)
+
+            with self.assertLogs(logger, level='WARNING') as cm:
+                self.assertIsNone(index.load(stat))
+                self.assertIn('Ignoring index of %s mbox' % self.filepath, cm.output[-1])
+
+    def test_save_error(self):
+        """Test whether errors saving the index are ignored"""
+
+        index = MBoxIndex(os.path.join(self.tmp_path, 'missing', 'mbox'))
+
+        with self.assertLogs(logger, level='WARNING') as cm:
+            index.save(os.stat(self.filepath), [])
+            self.assertIn('not saved', cm.output[-1])
+
+
+MBOX_URL = 'http://example.com/archives/'
+MBOX_ETAG = '"5c1a-58b3"'
+MBOX_LAST_MODIFIED = 'Sat, 02 Mar 2019 10:00:00 GMT'
+
+
+class TestMBoxDownloader(unittest.TestCase):
+    """Tests for MBoxDownloader class"""
+
+    def setUp(self):
+        self.tmp_path = tempfile.mkdtemp(prefix='perceval_')
+        self.requests = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_path)
+
+    def fetch(self, url, params, headers):
+        r = requests.get(url, params=params, headers=headers, stream=True)
+        r.raise_for_status()
+        return r
+
+    def register_archive(self, name, body, validators=True):
+        """Register an archive which is not modified when its validators match"""
+
+        def request_callback(request, uri, response_headers):
+            self.requests.append((name, request.headers))
+
+            etag = request.headers.get('If-None-Match', None)
+            since = request.headers.get('If-Modified-Since', None)
+
+            if validators and (etag == MBOX_ETAG or since == MBOX_LAST_MODIFIED):
+                return 304, response_headers, ''
+
+            if validators:
+                response_headers['ETag'] = MBOX_ETAG
+                response_headers['Last-Modified'] = MBOX_LAST_MODIFIED
+            return 200, response_headers, body
+
+        httpretty.register_uri(httpretty.GET,
+                               MBOX_URL + name,
+                               body=request_callback)
+
+    def test_init(self):
+        """Test whether the number of workers is checked"""
+
+        downloader = MBoxDownloader(self.fetch)
+        self.assertEqual(downloader.fetch, self.fetch)
+        self.assertEqual(downloader.max_workers, 1)
+
+        with self.assertRaisesRegex(ValueError, 'max_workers must be greater than 0'):
+            MBoxDownloader(self.fetch, max_workers=0)
+
+    @httpretty.activate
+    def test_download(self):
+        """Test whether archives are downloaded and their validators saved"""
+
+        self.register_archive('2019-01.mbox', 'January')
+        self.register_archive('2019-02.mbox', 'February')
+
+        filepath_jan = os.path.join(self.tmp_path, '2019-01.mbox')
+        filepath_feb = os.path.join(self.tmp_path, '2019-02.mbox')
+        archives = [
+            (MBOX_URL + '2019-01.mbox', None, filepath_jan),
+            (MBOX_URL + '2019-02.mbox', {'month': 2}, filepath_feb)
+        ]
+
+        downloader = MBoxDownloader(self.fetch)
+        fetched = downloader.download(archives)
+
+        self.assertListEqual(fetched, [(MBOX_URL + '2019-01.mbox', filepath_jan),
+                                       (MBOX_URL + '2019-02.mbox', filepath_feb)])
+        self.assertListEqual(sorted(os.listdir(self.tmp_path)),
+                             ['2019-01.mbox', '2019-01.mbox.validators',
+                              '2019-02.mbox', '2019-02.mbox.validators'])
+
+        with open(filepath_feb, 'r') as fd:
+            self.assertEqual(fd.read(), 'February')
+
+        validators = downloader._load_validators(filepath_feb)
+        expected = {
+            'url': MBOX_URL + '2019-02.mbox',
+            'params': {'month': 2},
+            'etag': MBOX_ETAG,
+            'last_modified': MBOX_LAST_MODIFIED,
+            'content_length': 8
+        }
+        self.assertDictEqual(validators, expected)
+
+        for _, headers in self.requests:
+            self.assertNotIn('If-None-Match', headers)
+            self.assertNotIn('If-Modified-Since', headers)
+
+    @httpretty.activate
+    def test_download_not_modified(self):
+        """Test whether archives are not written again when they were not modified"""
+
+        self.register_archive('2019-01.mbox', 'January')
+
+        filepath = os.path.join(self.tmp_path, '2019-01.mbox')
+        archives = [(MBOX_URL + '2019-01.mbox', None, filepath)]
+
+        downloader = MBoxDownloader(self.fetch)
+        downloader.download(archives)
+
+        mtime = os.stat(filepath).st_mtime_ns
+        fetched = downloader.download(archives)
+
+        self.assertListEqual(fetched, [(MBOX_URL + '2019-01.mbox', filepath)])
+        self.assertEqual(os.stat(filepath).st_mtime_ns, mtime)
+
+        headers = self.requests[-1][1]
+        self.assertEqual(headers['If-None-Match'], MBOX_ETAG)
+        self.assertEqual(headers['If-Modified-Since'], MBOX_LAST_MODIFIED)
+
+        with open(filepath, 'r') as fd:
+            self.assertEqual(fd.read(), 'January')
+
+    @httpretty.activate
+    def test_download_size_mismatch(self):
+        """Test whether archives are downloaded when their local size does not match"""
+
+        self.register_archive('2019-01.mbox', 'January')
+
+        filepath = os.path.join(self.tmp_path, '2019-01.mbox')
+        archives = [(MBOX_URL + '2019-01.mbox', None, filepath)]
+
+        downloader = MBoxDownloader(self.fetch)
+        downloader.download(archives)
+
+        with open(filepath, 'w') as fd:
+            fd.write('Jan')
+
+        downloader.download(archives)
+
+        headers = self.requests[-1][1]
+        self.assertNotIn('If-None-Match', headers)
+        self.assertNotIn('If-Modified-Since', headers)
+
+        with open(filepath, 'r') as fd:
+            self.assertEqual(fd.read(), 'January')
+
+    @httpretty.activate
+    def test_download_params_changed(self):
+        """Test whether validators are not sent when the parameters changed"""
+
+        self.register_archive('2019-01.mbox', 'January')
+
+        filepath = os.path.join(self.tmp_path, '2019-01.mbox')
+
+        downloader = MBoxDownloader(self.fetch)
+        downloader.download([(MBOX_URL + '2019-01.mbox', {'end': '2019-01-15'}, filepath)])
+        downloader.download([(MBOX_URL + '2019-01.mbox', {'end': '2019-02-01'}, filepath)])
+
+        headers = self.requests[-1][1]
+        self.assertNotIn('If-None-Match', headers)
+
+    @httpretty.activate
+    def test_download_without_validators(self):
+        """Test whether archives are always downloaded when the server sends no validators"""
+
+        self.register_archive('2019-01.mbox', 'January', validators=False)
+
+        filepath = os.path.join(self.tmp_path, '2019-01.mbox')
+        archives = [(MBOX_URL + '2019-01.mbox', None, filepath)]
+
+        downloader = MBoxDownloader(self.fetch)
+        downloader.download(archives)
+        downloader.download(archives)
+
+        self.assertListEqual(os.listdir(self.tmp_path), ['2019-01.mbox'])
+
+        headers = self.requests[-1][1]
+        self.assertNotIn('If-None-Match', headers)
+        self.assertNotIn('If-Modified-Since', headers)
+
+    @httpretty.activate
+    def test_download_concurrently(self):
+        """Test whether archives are downloaded concurrently keeping their order"""
+
+        names = ['2019-%02d.mbox' % month for month in range(1, 13)]
+        for name in names:
+            self.register_archive(name, name)
+
+        archives = [(MBOX_URL + name, None, os.path.join(self.tmp_path, name))
+                    for name in names]
+
+        downloader = MBoxDownloader(self.fetch, max_workers=4)
+        fetched = downloader.download(archives)
+
+        self.assertListEqual(fetched, [(url, filepath) for url, _, filepath in archives])
+
+        for name in names:
+            with open(os.path.join(self.tmp_path, name), 'r') as fd:
+                self.assertEqual(fd.read(), name)
+
+    @httpretty.activate
+    def test_download_ignored(self):
+        """Test whether archives are ignored when they cannot be fetched or written"""
+
+        self.register_archive('2019-01.mbox', 'January')
+        self.register_archive('2019-02.mbox', 'February')
+
+        def fetch(url, params, headers):
+            return None if url.endswith('2019-01.mbox') else self.fetch(url, params, headers)
+
+        def write(r, filepath):
+            raise OSError("disk full")
+
+        archives = [
+            (MBOX_URL + '2019-01.mbox', None, os.path.join(self.tmp_path, '2019-01.mbox')),
+            (MBOX_URL + '2019-02.mbox', None, os.path.join(self.tmp_path, '2019-02.mbox'))
+        ]
+
+        downloader = MBoxDownloader(fetch, write=write)
+
+        with self.assertLogs(logger, level='WARNING') as cm:
+            fetched = downloader.download(archives)
+            self.assertEqual(cm.output[-1],
+                             'WARNING:perceval.backends.core.mbox:Ignoring ' +
+                             MBOX_URL + '2019-02.mbox archive due to: disk full')
+
+        self.assertListEqual(fetched, [])
+        self.assertListEqual(os.listdir(self.tmp_path), [])
+
+    @httpretty.activate
+    def test_download_connection_error(self):
+        """Test whether archives are ignored when there are connection errors"""
+
+        self.register_archive('2019-02.mbox', 'February')
+
+        def fetch(url, params, headers):
+            if url.endswith('2019-01.mbox'):
+                raise requests.exceptions.ConnectionError("Connection aborted")
+            return self.fetch(url, params, headers)
+
+        filepath = os.path.join(self.tmp_path, '2019-02.mbox')
+        archives = [
+            (MBOX_URL + '2019-01.mbox', None, os.path.join(self.tmp_path, '2019-01.mbox')),
+            (MBOX_URL + '2019-02.mbox', None, filepath)
+        ]
+
+        for max_workers in [1, 2]:
+            downloader = MBoxDownloader(fetch, max_workers=max_workers)
+
+            with self.assertLogs(logger, level='WARNING') as cm:
+                fetched = downloader.download(archives)
+                self.assertEqual(cm.output[0],
+                                 'WARNING:perceval.backends.core.mbox:Ignoring ' +
+                                 MBOX_URL + '2019-01.mbox archive due to: Connection aborted')
+
+            self.assertListEqual(fetched, [(MBOX_URL + '2019-02.mbox', filepath)])
+
+    @httpretty.activate
+    def test_download_http_error(self):
+        """Test whether HTTP errors are propagated"""
+
+        httpretty.register_uri(httpretty.GET,
+                               MBOX_URL + '2019-01.mbox',
+                               status=500)
+
+        archives = [
+            (MBOX_URL + '2019-01.mbox', None, os.path.join(self.tmp_path, '2019-01.mbox')),
+            (MBOX_URL + '2019-01.mbox', None, os.path.join(self.tmp_path, '2019-01.mbox'))
+        ]
+
+        downloader = MBoxDownloader(self.fetch, max_workers=2)
+
+        with self.assertRaises(requests.exceptions.HTTPError):
+            downloader.download(archives)
+
+    def test_invalid_validators(self):
+        """Test whether invalid validators files are ignored"""
+
+        filepath = os.path.join(self.tmp_path, '2019-01.mbox')
+
+        with open(filepath, 'w') as fd:
+            fd.write('January')
+
+        downloader = MBoxDownloader(self.fetch)
+
+        for data in ['not a json', '[]', '{"url": "http://example.com/"}']:
+            with open(filepath + '.validators', 'w') as fd:
+                fd.write(data)
+
+            with self.assertLogs(logger, level='WARNING') as cm:
+                headers = downloader._conditional_headers(MBOX_URL + '2019-01.mbox', None, filepath)
+                self.assertIsNone(headers)
+                self.assertIn('Ignoring validators of %s' % filepath, cm.output[-1])
+
+
+class TestMBoxReader(TestBaseMBox):
+    """Tests for _MBoxReader class"""
+
+    def read_messages(self, filepath):
+        return [(msg.get_from(), msg.as_bytes()) for msg in _MBoxReader(MBoxArchive(filepath))]
+
+    def test_read(self):
+        """Check whether messages are split like mailbox.mbox does"""
+
+        for name in ['single', 'complex', 'multipart']:
+            filepath = self.files[name]
+            expected = [(msg.get_from(), msg.as_bytes()) for msg in mailbox.mbox(filepath, create=False)]
+
+            result = self.read_messages(filepath)
+            self.assertGreater(len(result), 0)
+            self.assertListEqual(result, expected)
+
+    def test_split_messages(self):
+        """Check how messages are split on plain and compressed archives"""
+
+        data = b"Ignored line\n" \
+               b"From john@example.com Mon Jan  1 00:00:00 2018\n" \
+               b"Subject: First\n\nBody of the first message\n\n\n" \
+               b"From jane@example.com Mon Jan  1 00:00:01 2018\n" \
+               b"Subject: Second\n\nBody\n" \
+               b"From no-blank-line@example.com Mon Jan  1 00:00:02 2018\n" \
+               b"Subject: Third\n\nLast line without a new line"
+
+        expected = [
+            ("john@example.com Mon Jan  1 00:00:00 2018", b"Subject: First\n\nBody of the first message\n\n"),
+            ("jane@example.com Mon Jan  1 00:00:01 2018", b"Subject: Second\n\nBody\n"),
+            ("no-blank-line@example.com Mon Jan  1 00:00:02 2018", b"Subject: Third\n\nLast line without a new line")
+        ]
+
+        plain_path = os.path.join(self.tmp_path, 'split.mbox')
+        gz_path = os.path.join(self.tmp_path, 'split.mbox.gz')
+
+        with open(plain_path, 'wb') as fd:
+            fd.write(data)
+        with gzip.open(gz_path, 'wb') as fd:
+            fd.write(data)
+
+        expected = [(unixfrom, mailbox.mboxMessage(raw).as_bytes()) for unixfrom, raw in expected]
+
+        for filepath in [plain_path, gz_path]:
+            result = self.read_messages(filepath)
+            self.assertListEqual(result, expected)
+
+        os.remove(plain_path)
+        os.remove(gz_path)
+
+    def test_read_at(self):
+        """Check whether messages are read from their positions"""
+
+        for filepath in [self.files['complex'], self.cfiles['gz'], self.cfiles['bz2']]:
+            mbox = _MBoxReader(MBoxArchive(filepath))
+            expected = [(msg.get_from(), msg.as_bytes()) for msg in mbox]
+
+            read = [(offset, size, msg) for offset, size, msg in mbox.read()]
+            self.assertListEqual([(msg.get_from(), msg.as_bytes()) for _, _, msg in read], expected)
+
+            positions = [(offset, size) for offset, size, _ in read]
+            self.assertEqual(positions[0][0], 0)
+
+            result = [(msg.get_from(), msg.as_bytes()) for msg in mbox.read_at(positions[1:])]
+            self.assertListEqual(result, expected[1:])
+
+            result = [msg for msg in mbox.read_at([])]
+            self.assertListEqual(result, [])
+
+    def test_headers_only(self):
+        """Check whether the bodies of the messages are dropped"""
+
+        for name in ['single', 'complex', 'multipart']:
+            filepath = self.files[name]
+            expected = [msg for msg in _MBoxReader(MBoxArchive(filepath))]
+            result = [msg for msg in _MBoxReader(MBoxArchive(filepath), headers_only=True)]
+
+            self.assertEqual(len(result), len(expected))
+
+            for msg, expected_msg in zip(result, expected):
+                self.assertEqual(msg.get_from(), expected_msg.get_from())
+                self.assertListEqual(msg.items(), expected_msg.items())
+                self.assertFalse(msg.is_multipart())
+                self.assertEqual(msg.get_payload(), '')
+
+    def test_headers_only_split(self):
+        """Check where the headers of a message end"""
+
+        data = b"From john@example.com Mon Jan  1 00:00:00 2018\n" \
+               b"Subject: First\r\n\r\nBody\n\n" \
+               b"From jane@example.com Mon Jan  1 00:00:01 2018\n" \
+               b"\nSubject: Not a header\n\n" \
+               b"From no-body@example.com Mon Jan  1 00:00:02 2018\n" \
+               b"Subject: Third\n"
+
+        filepath = os.path.join(self.tmp_path, 'headers.mbox')
+
+        with open(filepath, 'wb') as fd:
+            fd.write(data)
+
+        result = [msg for msg in _MBoxReader(MBoxArchive(filepath), headers_only=True)]
+        self.assertEqual(len(result), 3)
+        self.assertListEqual(result[0].items(), [('Subject', 'First')])
+        self.assertEqual(result[0].get_payload(), '')
+        self.assertListEqual(result[1].items(), [])
+        self.assertEqual(result[1].get_payload(), '')
+        self.assertListEqual(result[2].items(), [('Subject', 'Third')])
+
+        os.remove(filepath)
+
+    def test_empty_mbox(self):
+        """Check whether empty archives have no messages"""
+
+        filepath = os.path.join(self.tmp_path, 'empty.mbox')
+        open(filepath, 'wb').close()
+
+        self.assertListEqual(self.read_messages(filepath), [])
+
+        os.remove(filepath)
+
 
 class TestMBoxCommand(unittest.TestCase):
     """MBoxCommand unit tests"""
@@ -559,13 +1233,19 @@ class TestMBoxCommand(unittest.TestCase):
 
         args = ['http://example.com/', '/tmp/perceval/',
                 '--tag', 'test',
-                '--from-date', '1970-01-01']
+                '--from-date', '1970-01-01',
+                '--parse-workers', '4',
+                '--mbox-index',
+                '--headers-only']
 
         parsed_args = parser.parse(*args)
         self.assertEqual(parsed_args.uri, 'http://example.com/')
         self.assertEqual(parsed_args.dirpath, '/tmp/perceval/')
         self.assertEqual(parsed_args.tag, 'test')
         self.assertEqual(parsed_args.from_date, DEFAULT_DATETIME)
+        self.assertEqual(parsed_args.parse_workers, 4)
+        self.assertTrue(parsed_args.mbox_index)
+        self.assertTrue(parsed_args.headers_only)
 
 
 if __name__ == "__main__":
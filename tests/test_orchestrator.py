@@ -0,0 +1,653 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2019 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, 51 Franklin Street, Fifth Floor, Boston, MA 02110-1335, USA.
+#
+# Authors:
+#     Santiago Dueñas <sduenas@bitergia.com>
+#
+
+import collections
+import json
+import os
+import time
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from perceval.backend import (Backend,
+                              BackendCommand,
+                              BackendCommandArgumentParser)
+from perceval.backends.core.git import GitCommand
+from perceval.errors import BackendError
+from perceval.orchestrator import (FetchJob,
+                                   FetchOrchestrator,
+                                   GitFleet,
+                                   GitMirror,
+                                   JOB_FAILURE,
+                                   JOB_SUCCESS,
+                                   read_fleet,
+                                   read_manifest,
+                                   _Worker)
+
+
+class MockedBackend(Backend):
+    """Mocked backend for testing"""
+
+    version = '0.1.0'
+    CATEGORIES = ['mock_item', 'alt_item']
+
+    def __init__(self, origin, nitems=5, tag=None, archive=None):
+        super().__init__(origin, tag=tag, archive=archive)
+        self.nitems = nitems
+
+    def fetch(self, category='mock_item'):
+        return super().fetch(category)
+
+    def fetch_items(self, category, **kwargs):
+        for x in range(self.nitems):
+            yield {'item': x, 'category': category}
+
+    def _init_client(self, from_archive=False):
+        return None
+
+    @staticmethod
+    def metadata_id(item):
+        return str(item['item'])
+
+    @staticmethod
+    def metadata_updated_on(item):
+        return '2016-01-01'
+
+    @staticmethod
+    def metadata_category(item):
+        return item['category']
+
+
+class ErrorBackend(MockedBackend):
+    """Backend which raises an exception while fetching items"""
+
+    def fetch_items(self, category, **kwargs):
+        for item in super().fetch_items(category, **kwargs):
+            yield item
+            raise BackendError(cause="Unhandled exception")
+
+
+class CrashBackend(MockedBackend):
+    """Backend which kills its process while fetching items"""
+
+    def fetch_items(self, category, **kwargs):
+        for item in super().fetch_items(category, **kwargs):
+            yield item
+            # Give the worker time to send the item
+            time.sleep(0.1)
+            os._exit(1)
+
+
+class MockedBackendCommand(BackendCommand):
+    """Mocked backend command class used for testing"""
+
+    BACKEND = MockedBackend
+
+    @staticmethod
+    def setup_cmd_parser():
+        parser = BackendCommandArgumentParser(archive=True)
+        parser.parser.add_argument('origin')
+        parser.parser.add_argument('--nitems', dest='nitems', type=int, default=5)
+
+        return parser
+
+
+class ErrorBackendCommand(MockedBackendCommand):
+    """Mocked backend command class which fails fetching items"""
+
+    BACKEND = ErrorBackend
+
+
+class CrashBackendCommand(MockedBackendCommand):
+    """Mocked backend command class whose worker dies fetching items"""
+
+    BACKEND = CrashBackend
+
+
+class AbortBackendCommand(MockedBackendCommand):
+    """Mocked backend command class whose worker dies before fetching items"""
+
+    def __init__(self, *args):
+        os._exit(1)
+
+
+COMMANDS = {
+    'mock': MockedBackendCommand,
+    'error': ErrorBackendCommand,
+    'crash': CrashBackendCommand,
+    'abort': AbortBackendCommand
+}
+
+
+class MockedInbox:
+    """Mocked inbox which stores the jobs sent to the workers"""
+
+    def __init__(self):
+        self.jobs = []
+
+    def put(self, obj):
+        self.jobs.append(obj[0])
+
+
+class TestFetchOrchestrator(unittest.TestCase):
+    """Unit tests for FetchOrchestrator"""
+
+    def setUp(self):
+        self.test_path = tempfile.mkdtemp(prefix='perceval_')
+
+    def tearDown(self):
+        shutil.rmtree(self.test_path)
+
+    def test_initialization(self):
+        """Test whether attributes are initializated"""
+
+        jobs = [FetchJob('mock', ['http://example.com/'], None)]
+        orchestrator = FetchOrchestrator(jobs, workers=4, max_jobs_per_host=1,
+                                         queue_size=10, commands=COMMANDS)
+
+        self.assertListEqual(orchestrator.jobs, jobs)
+        self.assertEqual(orchestrator.workers, 4)
+        self.assertEqual(orchestrator.max_jobs_per_host, 1)
+        self.assertEqual(orchestrator.queue_size, 10)
+        self.assertDictEqual(orchestrator.commands, COMMANDS)
+        self.assertListEqual(orchestrator.results, [])
+
+    def test_invalid_initialization(self):
+        """Test whether an exception is raised with invalid values"""
+
+        with self.assertRaisesRegex(ValueError, "workers must be greater than 0"):
+            FetchOrchestrator([], workers=0)
+
+        with self.assertRaisesRegex(ValueError, "max_jobs_per_host must be greater than 0"):
+            FetchOrchestrator([], max_jobs_per_host=0)
+
+    def test_run(self):
+        """Test whether the items of every job are fetched"""
+
+        jobs = [
+            FetchJob('mock', ['http://example.com/a', '--no-archive'], None),
+            FetchJob('mock', ['http://example.com/b', '--no-archive', '--nitems', '3'], 'alt_item'),
+            FetchJob('mock', ['http://example.org/', '--no-archive', '--nitems', '0'], None)
+        ]
+
+        orchestrator = FetchOrchestrator(jobs, workers=2, max_jobs_per_host=1,
+                                         queue_size=2, commands=COMMANDS)
+        items = [item for item in orchestrator.run()]
+
+        self.assertEqual(len(items), 8)
+
+        origins = collections.Counter([item['origin'] for item in items])
+        self.assertEqual(origins['http://example.com/a'], 5)
+        self.assertEqual(origins['http://example.com/b'], 3)
+
+        categories = [item['category'] for item in items
+                      if item['origin'] == 'http://example.com/b']
+        self.assertListEqual(categories, ['alt_item'] * 3)
+
+        # Items from the same job are received in order
+        data = [item['data']['item'] for item in items
+                if item['origin'] == 'http://example.com/a']
+        self.assertListEqual(data, [0, 1, 2, 3, 4])
+
+        results = orchestrator.results
+        self.assertEqual(len(results), 3)
+
+        expected = [
+            ('http://example.com/a', 'example.com', 5),
+            ('http://example.com/b', 'example.com', 3),
+            ('http://example.org/', 'example.org', 0)
+        ]
+
+        for x in range(len(expected)):
+            result = results[x]
+            self.assertEqual(result.job, jobs[x])
+            self.assertEqual(result.origin, expected[x][0])
+            self.assertEqual(result.host, expected[x][1])
+            self.assertEqual(result.status, JOB_SUCCESS)
+            self.assertEqual(result.nitems, expected[x][2])
+            self.assertEqual(result.error, None)
+
+    def test_run_failures(self):
+        """Test whether failed jobs are reported without stopping the rest"""
+
+        jobs = [
+            FetchJob('error', ['http://example.com/a', '--no-archive'], None),
+            FetchJob('unknown', ['http://example.com/b'], None),
+            FetchJob('mock', ['http://example.com/c', '--no-archive'], None),
+            FetchJob('mock', [], None)
+        ]
+
+        orchestrator = FetchOrchestrator(jobs, workers=2, commands=COMMANDS)
+        items = [item for item in orchestrator.run()]
+
+        self.assertEqual(len(items), 6)
+
+        results = orchestrator.results
+        self.assertEqual(len(results), 4)
+
+        self.assertEqual(results[0].status, JOB_FAILURE)
+        self.assertEqual(results[0].nitems, 1)
+        self.assertEqual(results[0].error, "Unhandled exception")
+
+        self.assertEqual(results[1].status, JOB_FAILURE)
+        self.assertEqual(results[1].origin, None)
+        self.assertEqual(results[1].error, "unknown backend unknown")
+
+        self.assertEqual(results[2].status, JOB_SUCCESS)
+        self.assertEqual(results[2].nitems, 5)
+
+        # Invalid arguments
+        self.assertEqual(results[3].status, JOB_FAILURE)
+        self.assertEqual(results[3].nitems, 0)
+
+    def test_run_worker_died(self):
+        """Test whether jobs are reported as failed when their worker dies"""
+
+        jobs = [
+            FetchJob('crash', ['http://example.com/a', '--no-archive'], None),
+            FetchJob('mock', ['http://example.com/b', '--no-archive'], None),
+            FetchJob('mock', ['http://example.org/', '--no-archive'], None)
+        ]
+
+        orchestrator = FetchOrchestrator(jobs, workers=1, commands=COMMANDS)
+        items = [item for item in orchestrator.run()]
+
+        self.assertEqual(len(items), 11)
+
+        results = orchestrator.results
+        self.assertEqual(len(results), 3)
+
+        self.assertEqual(results[0].status, JOB_FAILURE)
+        self.assertEqual(results[0].nitems, 1)
+        self.assertRegex(results[0].error, "worker process [0-9]+ died")
+
+        self.assertEqual(results[1].status, JOB_SUCCESS)
+        self.assertEqual(results[1].nitems, 5)
+        self.assertEqual(results[2].status, JOB_SUCCESS)
+        self.assertEqual(results[2].nitems, 5)
+
+    def test_run_worker_died_on_start(self):
+        """Test whether jobs are reported as failed when their worker dies before starting"""
+
+        jobs = [
+            FetchJob('abort', ['http://example.com/a', '--no-archive'], None),
+            FetchJob('mock', ['http://example.com/b', '--no-archive'], None)
+        ]
+
+        orchestrator = FetchOrchestrator(jobs, workers=1, commands=COMMANDS)
+        items = [item for item in orchestrator.run()]
+
+        self.assertEqual(len(items), 5)
+
+        results = orchestrator.results
+        self.assertEqual(results[0].status, JOB_FAILURE)
+        self.assertEqual(results[0].nitems, 0)
+        self.assertRegex(results[0].error, "worker process [0-9]+ died; exit code 1")
+
+        self.assertEqual(results[1].status, JOB_SUCCESS)
+        self.assertEqual(results[1].nitems, 5)
+
+    def test_find_origin(self):
+        """Test whether the origin is found without initializing the command"""
+
+        output_path = os.path.join(self.test_path, 'items.json')
+        archive_path = os.path.join(self.test_path, 'archives')
+
+        job = FetchJob('mock', ['http://example.com/a', '-o', output_path,
+                                '--archive-path', archive_path], None)
+
+        origin, host = FetchOrchestrator._find_origin(COMMANDS, job)
+        self.assertEqual(origin, 'http://example.com/a')
+        self.assertEqual(host, 'example.com')
+
+        # Neither the output file nor the archive are created
+        self.assertFalse(os.path.exists(output_path))
+        self.assertFalse(os.path.exists(archive_path))
+
+    def test_run_archive(self):
+        """Test whether items are archived by the workers"""
+
+        archive_path = os.path.join(self.test_path, 'archives')
+
+        jobs = [
+            FetchJob('mock', ['http://example.com/a', '--archive-path', archive_path], None),
+        ]
+
+        orchestrator = FetchOrchestrator(jobs, workers=1, commands=COMMANDS)
+        items = [item for item in orchestrator.run()]
+        self.assertEqual(len(items), 5)
+
+        jobs = [
+            FetchJob('mock', ['http://example.com/a', '--archive-path', archive_path,
+                              '--fetch-archive'], 'mock_item'),
+        ]
+
+        orchestrator = FetchOrchestrator(jobs, workers=1, commands=COMMANDS)
+        items = [item for item in orchestrator.run()]
+        self.assertEqual(len(items), 5)
+        self.assertEqual(orchestrator.results[0].status, JOB_SUCCESS)
+
+    def test_dispatch_max_jobs_per_host(self):
+        """Test whether the number of jobs running per host is limited"""
+
+        job = FetchJob('mock', [], None)
+        jobs = [
+            (0, job, 'http://example.com/a', 'example.com'),
+            (1, job, 'http://example.com/b', 'example.com'),
+            (2, job, 'http://example.com/c', 'example.com'),
+            (3, job, 'http://example.org/a', 'example.org'),
+            (4, job, 'http://example.net/a', 'example.net'),
+            (5, job, 'http://example.net/b', 'example.net')
+        ]
+
+        orchestrator = FetchOrchestrator([], workers=4, max_jobs_per_host=2)
+
+        inbox = MockedInbox()
+        idle = [_Worker(None, inbox) for _ in range(4)]
+        pending = collections.deque(jobs)
+        running = {}
+        hosts = collections.Counter()
+
+        orchestrator._dispatch(idle, pending, running, hosts)
+
+        self.assertListEqual(inbox.jobs, [0, 1, 3, 4])
+        self.assertListEqual(idle, [])
+        self.assertEqual(hosts['example.com'], 2)
+        self.assertEqual(hosts['example.org'], 1)
+        self.assertEqual(hosts['example.net'], 1)
+
+        # Pending jobs keep their order
+        self.assertListEqual([job[0] for job in pending], [2, 5])
+
+        # Free a slot of 'example.com'
+        idle.append(running.pop(0)[3])
+        hosts['example.com'] -= 1
+
+        orchestrator._dispatch(idle, pending, running, hosts)
+
+        self.assertListEqual(inbox.jobs, [0, 1, 3, 4, 2])
+        self.assertListEqual([job[0] for job in pending], [5])
+
+
+class TestGitFleet(unittest.TestCase):
+    """Unit tests for GitFleet"""
+
+    def setUp(self):
+        self.test_path = tempfile.mkdtemp(prefix='perceval_')
+
+        data_path = os.path.dirname(os.path.abspath(__file__))
+        tar_path = os.path.join(data_path, 'data/git/gittest.tar.gz')
+        subprocess.check_call(['tar', '-xzf', tar_path, '-C', self.test_path])
+
+        self.origin_path = os.path.join(self.test_path, 'gittest')
+        self.state_path = os.path.join(self.test_path, 'state.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.test_path)
+
+    def test_initialization(self):
+        """Test whether attributes are initializated"""
+
+        mirrors = [GitMirror('http://example.com/repo.git', '/tmp/repo.git')]
+        fleet = GitFleet(mirrors, workers=4, max_jobs_per_host=1, queue_size=10,
+                         state_path=self.state_path, machine_log=True,
+                         maintenance=True)
+
+        self.assertListEqual(fleet.mirrors, mirrors)
+        self.assertEqual(fleet.workers, 4)
+        self.assertEqual(fleet.max_jobs_per_host, 1)
+        self.assertEqual(fleet.queue_size, 10)
+        self.assertEqual(fleet.state_path, self.state_path)
+        self.assertTrue(fleet.machine_log)
+        self.assertTrue(fleet.maintenance)
+        self.assertIsNone(fleet.commands)
+        self.assertListEqual(fleet.results, [])
+
+    def test_run(self):
+        """Test whether the mirrors are synced and their new commits fetched"""
+
+        mirrors = [
+            GitMirror(self.origin_path, os.path.join(self.test_path, 'mirror_a')),
+            GitMirror(self.origin_path, os.path.join(self.test_path, 'mirror_b'))
+        ]
+
+        fleet = GitFleet(mirrors, workers=2, state_path=self.state_path,
+                         commands={'git': GitCommand})
+        items = [item for item in fleet.run()]
+
+        self.assertEqual(len(items), 18)
+        self.assertEqual(len(fleet.results), 2)
+
+        for result, mirror in zip(fleet.results, mirrors):
+            self.assertEqual(result.job.mirror, mirror)
+            self.assertEqual(result.status, JOB_SUCCESS)
+            self.assertEqual(result.nitems, 9)
+
+        # Commits of the same mirror keep their order
+        commits = [item['data']['commit'] for item in items
+                   if item['tag'] == self.origin_path]
+        self.assertEqual(commits[0], 'bc57a9209f096a130dcc5ba7089a8663f758a703')
+        self.assertEqual(commits[-1], '456a68ee1407a77f3e804a30dff245bb6c6b872f')
+
+        with open(self.state_path, 'r') as fd:
+            state = json.load(fd)
+
+        for mirror in mirrors:
+            mstate = state[mirror.gitpath]
+            self.assertEqual(mstate['uri'], self.origin_path)
+            self.assertEqual(mstate['status'], JOB_SUCCESS)
+            self.assertEqual(mstate['ncommits'], 9)
+            self.assertEqual(mstate['last_change'], mstate['last_sync'])
+
+        # Nothing changed on the second run
+        fleet = GitFleet(mirrors, workers=2, state_path=self.state_path,
+                         machine_log=True, maintenance=True,
+                         commands={'git': GitCommand})
+        items = [item for item in fleet.run()]
+
+        self.assertEqual(len(items), 0)
+
+        with open(self.state_path, 'r') as fd:
+            new_state = json.load(fd)
+
+        for mirror in mirrors:
+            mstate = new_state[mirror.gitpath]
+            self.assertEqual(mstate['ncommits'], 0)
+            self.assertEqual(mstate['last_change'], state[mirror.gitpath]['last_change'])
+            self.assertGreater(mstate['last_sync'], mstate['last_change'])
+
+    def test_run_failures(self):
+        """Test whether failed mirrors are stored in the state"""
+
+        mirrors = [
+            GitMirror(os.path.join(self.test_path, 'notfound'),
+                      os.path.join(self.test_path, 'mirror_a'))
+        ]
+
+        fleet = GitFleet(mirrors, workers=1, state_path=self.state_path,
+                         commands={'git': GitCommand})
+        items = [item for item in fleet.run()]
+
+        self.assertEqual(len(items), 0)
+        self.assertEqual(fleet.results[0].status, JOB_FAILURE)
+
+        with open(self.state_path, 'r') as fd:
+            state = json.load(fd)
+
+        mstate = state[mirrors[0].gitpath]
+        self.assertEqual(mstate['status'], JOB_FAILURE)
+        self.assertIsNone(mstate['last_change'])
+        self.assertNotIn('last_sync', mstate)
+
+    def test_schedule(self):
+        """Test whether mirrors are sorted by the last time they changed"""
+
+        mirrors = [GitMirror('http://example.com/%s.git' % name, '/tmp/%s.git' % name)
+                   for name in ['a', 'b', 'c', 'd', 'e']]
+        state = {
+            '/tmp/a.git': {'last_change': None, 'last_sync': 100},
+            '/tmp/b.git': {'last_change': 10, 'last_sync': 100},
+            '/tmp/d.git': {'last_change': 50, 'last_sync': 100}
+        }
+
+        sorted_mirrors = GitFleet.schedule(mirrors, state)
+        names = [mirror.gitpath for mirror in sorted_mirrors]
+
+        expected = ['/tmp/c.git', '/tmp/e.git', '/tmp/d.git', '/tmp/b.git', '/tmp/a.git']
+        self.assertListEqual(names, expected)
+
+    def test_read_state(self):
+        """Test whether the state is read from the state file"""
+
+        fleet = GitFleet([], state_path=self.state_path)
+        self.assertDictEqual(fleet.read_state(), {})
+
+        fleet = GitFleet([])
+        self.assertDictEqual(fleet.read_state(), {})
+
+        with open(self.state_path, 'w') as fd:
+            fd.write("invalid json")
+
+        fleet = GitFleet([], state_path=self.state_path)
+
+        with self.assertLogs(level='WARNING') as cm:
+            self.assertDictEqual(fleet.read_state(), {})
+            self.assertRegex(cm.output[0], "Unable to read fleet state")
+
+
+class TestReadFleet(unittest.TestCase):
+    """Unit tests for read_fleet function"""
+
+    def setUp(self):
+        self.test_path = tempfile.mkdtemp(prefix='perceval_')
+
+    def tearDown(self):
+        shutil.rmtree(self.test_path)
+
+    def test_read_fleet(self):
+        """Test whether the mirrors are read from a fleet file"""
+
+        fleet = [
+            {'uri': 'http://example.com/a.git', 'gitpath': '/mirrors/a.git'},
+            {'uri': 'http://example.com/b.git', 'gitpath': '/mirrors/b.git'}
+        ]
+
+        filepath = os.path.join(self.test_path, 'fleet.json')
+        with open(filepath, 'w') as fd:
+            json.dump(fleet, fd)
+
+        mirrors = read_fleet(filepath)
+
+        expected = [
+            GitMirror('http://example.com/a.git', '/mirrors/a.git'),
+            GitMirror('http://example.com/b.git', '/mirrors/b.git')
+        ]
+        self.assertListEqual(mirrors, expected)
+
+    def test_read_invalid_fleet(self):
+        """Test whether an exception is raised when the fleet file is invalid"""
+
+        filepath = os.path.join(self.test_path, 'fleet.json')
+
+        with open(filepath, 'w') as fd:
+            fd.write("invalid json")
+
+        with self.assertRaisesRegex(BackendError, "invalid fleet"):
+            read_fleet(filepath)
+
+        with open(filepath, 'w') as fd:
+            json.dump({'uri': 'http://example.com/a.git'}, fd)
+
+        with self.assertRaisesRegex(BackendError, "list of mirrors expected"):
+            read_fleet(filepath)
+
+        with open(filepath, 'w') as fd:
+            json.dump([{'uri': 'http://example.com/a.git'}], fd)
+
+        with self.assertRaisesRegex(BackendError, "invalid mirror"):
+            read_fleet(filepath)
+
+
+class TestReadManifest(unittest.TestCase):
+    """Unit tests for read_manifest function"""
+
+    def setUp(self):
+        self.test_path = tempfile.mkdtemp(prefix='perceval_')
+
+    def tearDown(self):
+        shutil.rmtree(self.test_path)
+
+    def test_read_manifest(self):
+        """Test whether the jobs are read from a manifest file"""
+
+        manifest = [
+            {
+                'backend': 'git',
+                'args': ['http://example.com/repo.git', '--latest-items']
+            },
+            {
+                'backend': 'github',
+                'args': ['owner', 'repo', '--sleep-time', 10],
+                'category': 'pull_request'
+            }
+        ]
+
+        filepath = os.path.join(self.test_path, 'manifest.json')
+        with open(filepath, 'w') as fd:
+            json.dump(manifest, fd)
+
+        jobs = read_manifest(filepath)
+
+        expected = [
+            FetchJob('git', ['http://example.com/repo.git', '--latest-items'], None),
+            FetchJob('github', ['owner', 'repo', '--sleep-time', '10'], 'pull_request')
+        ]
+        self.assertListEqual(jobs, expected)
+
+    def test_read_invalid_manifest(self):
+        """Test whether an exception is raised when the manifest is invalid"""
+
+        filepath = os.path.join(self.test_path, 'manifest.json')
+
+        with open(filepath, 'w') as fd:
+            fd.write("invalid json")
+
+        with self.assertRaisesRegex(BackendError, "invalid manifest"):
+            read_manifest(filepath)
+
+        with open(filepath, 'w') as fd:
+            json.dump({'backend': 'git'}, fd)
+
+        with self.assertRaisesRegex(BackendError, "list of jobs expected"):
+            read_manifest(filepath)
+
+        with open(filepath, 'w') as fd:
+            json.dump([{'args': []}], fd)
+
+        with self.assertRaisesRegex(BackendError, "invalid job"):
+            read_manifest(filepath)
+
+
+if __name__ == "__main__":
+    unittest.main()
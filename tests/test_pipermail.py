@@ -34,7 +34,7 @@ pkg_resources.declare_namespace('perceval.backends')
 
 from perceval.backend import BackendCommandArgumentParser
 from perceval.utils import DEFAULT_DATETIME
-from perceval.backends.core.mbox import MailingList
+from perceval.backends.core.mbox import MailingList, logger as mbox_logger
 from perceval.backends.core.pipermail import (Pipermail,
                                               PipermailCommand,
                                               PipermailList)
@@ -75,14 +75,16 @@ class TestPipermailList(unittest.TestCase):
         self.assertEqual(pmls.dirpath, self.tmp_path)
         self.assertEqual(pmls.url, PIPERMAIL_URL)
         self.assertTrue(pmls.verify)
+        self.assertEqual(pmls.download_workers, 1)
 
-        pmls = PipermailList(PIPERMAIL_URL, self.tmp_path, verify=False)
+        pmls = PipermailList(PIPERMAIL_URL, self.tmp_path, verify=False, download_workers=4)
 
         self.assertIsInstance(pmls, MailingList)
         self.assertEqual(pmls.uri, PIPERMAIL_URL)
         self.assertEqual(pmls.dirpath, self.tmp_path)
         self.assertEqual(pmls.url, PIPERMAIL_URL)
         self.assertFalse(pmls.verify)
+        self.assertEqual(pmls.download_workers, 4)
 
     @httpretty.activate
     def test_fetch(self):
@@ -123,6 +125,104 @@ class TestPipermailList(unittest.TestCase):
         self.assertEqual(mboxes[1].filepath, os.path.join(self.tmp_path, '2016-March.txt'))
         self.assertEqual(mboxes[2].filepath, os.path.join(self.tmp_path, '2016-April.txt'))
 
+    @httpretty.activate
+    def test_fetch_not_modified(self):
+        """Test whether archives not modified since the last fetch are not downloaded again"""
+
+        pipermail_index = read_file('data/pipermail/pipermail_index.html')
+        mbox_march = read_file('data/pipermail/pipermail_2016_march.mbox')
+        mbox_april = read_file('data/pipermail/pipermail_2016_april.mbox')
+
+        requests_march = []
+
+        def archive_callback(body, last_modified):
+            def request_callback(request, uri, response_headers):
+                if uri.endswith('2016-March.txt'):
+                    requests_march.append(request)
+                if request.headers.get('If-Modified-Since', None) == last_modified:
+                    return 304, response_headers, ''
+                response_headers['Last-Modified'] = last_modified
+                return 200, response_headers, body
+            return request_callback
+
+        httpretty.register_uri(httpretty.GET,
+                               PIPERMAIL_URL,
+                               body=pipermail_index)
+        httpretty.register_uri(httpretty.GET,
+                               PIPERMAIL_URL + '2015-November.txt.gz',
+                               status=403)
+        httpretty.register_uri(httpretty.GET,
+                               PIPERMAIL_URL + '2016-March.txt',
+                               body=archive_callback(mbox_march, 'Thu, 31 Mar 2016 23:59:59 GMT'))
+        httpretty.register_uri(httpretty.GET,
+                               PIPERMAIL_URL + '2016-April.txt',
+                               body=archive_callback(mbox_april, 'Fri, 15 Apr 2016 10:00:00 GMT'))
+
+        pmls = PipermailList('http://example.com/', self.tmp_path, download_workers=2)
+
+        pmls.fetch()
+
+        filepath = os.path.join(self.tmp_path, '2016-March.txt')
+        self.assertTrue(os.path.exists(filepath + '.validators'))
+        mtime = os.stat(filepath).st_mtime_ns
+
+        links = pmls.fetch()
+
+        self.assertEqual(len(links), 2)
+        self.assertEqual(links[0][0], PIPERMAIL_URL + '2016-April.txt')
+        self.assertEqual(links[0][1], os.path.join(self.tmp_path, '2016-April.txt'))
+        self.assertEqual(links[1][0], PIPERMAIL_URL + '2016-March.txt')
+        self.assertEqual(links[1][1], filepath)
+
+        self.assertEqual(os.stat(filepath).st_mtime_ns, mtime)
+        self.assertEqual(len(requests_march), 2)
+        self.assertNotIn('If-Modified-Since', requests_march[0].headers)
+        self.assertEqual(requests_march[1].headers['If-Modified-Since'],
+                         'Thu, 31 Mar 2016 23:59:59 GMT')
+
+        mboxes = pmls.mboxes
+        self.assertEqual(len(mboxes), 2)
+        self.assertEqual(mboxes[0].filepath, filepath)
+        self.assertEqual(mboxes[1].filepath, os.path.join(self.tmp_path, '2016-April.txt'))
+
+    @httpretty.activate
+    def test_fetch_connection_error(self):
+        """Test whether archives which cannot be requested are ignored"""
+
+        pipermail_index = read_file('data/pipermail/pipermail_index.html')
+        mbox_nov = read_file('data/pipermail/pipermail_2015_november.mbox')
+        mbox_april = read_file('data/pipermail/pipermail_2016_april.mbox')
+
+        httpretty.register_uri(httpretty.GET,
+                               PIPERMAIL_URL,
+                               body=pipermail_index)
+        httpretty.register_uri(httpretty.GET,
+                               PIPERMAIL_URL + '2015-November.txt.gz',
+                               body=mbox_nov)
+        httpretty.register_uri(httpretty.GET,
+                               PIPERMAIL_URL + '2016-April.txt',
+                               body=mbox_april)
+
+        requests_get = requests.get
+
+        def get(url, *args, **kwargs):
+            if url.endswith('2016-March.txt'):
+                raise requests.exceptions.ConnectionError("Connection aborted")
+            return requests_get(url, *args, **kwargs)
+
+        pmls = PipermailList('http://example.com/', self.tmp_path)
+
+        with unittest.mock.patch('perceval.backends.core.pipermail.requests.get', side_effect=get):
+            with self.assertLogs(mbox_logger, level='WARNING') as cm:
+                links = pmls.fetch()
+                self.assertEqual(cm.output[-1],
+                                 'WARNING:perceval.backends.core.mbox:Ignoring '
+                                 'http://example.com/2016-March.txt archive due to: Connection aborted')
+
+        self.assertEqual(len(links), 2)
+        self.assertEqual(links[0][0], PIPERMAIL_URL + '2016-April.txt')
+        self.assertEqual(links[1][0], PIPERMAIL_URL + '2015-November.txt.gz')
+
     @httpretty.activate
     def test_fetch_http_403_error(self):
         """Test whether 403 HTTP errors are properly handled"""
@@ -322,6 +422,10 @@ class TestPipermailBackend(unittest.TestCase):
         self.assertEqual(backend.origin, 'http://example.com/')
         self.assertEqual(backend.tag, 'http://example.com/')
         self.assertTrue(backend.verify)
+        self.assertEqual(backend.download_workers, 1)
+
+        backend = Pipermail('http://example.com/', self.tmp_path, download_workers=4)
+        self.assertEqual(backend.download_workers, 4)
 
     def test_has_archiving(self):
         """Test if it returns False when has_archiving is called"""
@@ -570,7 +674,11 @@ class TestPipermailCommand(unittest.TestCase):
                 '--mboxes-path', '/tmp/perceval/',
                 '--tag', 'test',
                 '--from-date', '1970-01-01',
-                '--no-verify']
+                '--no-verify',
+                '--parse-workers', '4',
+                '--mbox-index',
+                '--headers-only',
+                '--download-workers', '4']
 
         parsed_args = parser.parse(*args)
         self.assertEqual(parsed_args.url, 'http://example.com/')
@@ -578,6 +686,10 @@ class TestPipermailCommand(unittest.TestCase):
         self.assertEqual(parsed_args.tag, 'test')
         self.assertEqual(parsed_args.from_date, DEFAULT_DATETIME)
         self.assertFalse(parsed_args.verify)
+        self.assertEqual(parsed_args.parse_workers, 4)
+        self.assertTrue(parsed_args.mbox_index)
+        self.assertTrue(parsed_args.headers_only)
+        self.assertEqual(parsed_args.download_workers, 4)
 
 
 if __name__ == "__main__":
@@ -25,16 +25,27 @@ import bz2
 import datetime
 import email
 import gzip
+import io
+import lzma
+import multiprocessing
 import os
 import shutil
 import tempfile
 import unittest
+import unittest.mock
 import zipfile
 
+import requests
+
 from perceval.errors import ParseError
-from perceval.utils import (check_compressed_file_type,
+import perceval.utils
+
+from perceval.utils import (LazyMessage,
+                            check_compressed_file_type,
                             message_to_dict,
                             months_range,
+                            open_compressed_file,
+                            pool_imap,
                             remove_invalid_xml_chars,
                             xml_to_dict)
 
@@ -55,7 +66,8 @@ class TestCheckCompressedFileType(unittest.TestCase):
         cls.files = {
             'bz2': os.path.join(cls.tmp_path, 'bz2'),
             'gz': os.path.join(cls.tmp_path, 'gz'),
-            'zip': os.path.join(cls.tmp_path, 'zip')
+            'zip': os.path.join(cls.tmp_path, 'zip'),
+            'xz': os.path.join(cls.tmp_path, 'xz')
         }
 
         # Copy compressed files
@@ -64,6 +76,8 @@ class TestCheckCompressedFileType(unittest.TestCase):
                 mod = bz2
             elif ftype == 'gz':
                 mod = gzip
+            elif ftype == 'xz':
+                mod = lzma
             else:
                 mod = zipfile
 
@@ -80,6 +94,11 @@ class TestCheckCompressedFileType(unittest.TestCase):
         shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)),
                                  'data/utils/mbox_single.mbox'), cls.tmp_path)
 
+        # Zstandard frames start with its magic number
+        cls.zst_file = os.path.join(cls.tmp_path, 'zst')
+        with open(cls.zst_file, 'wb') as f_out:
+            f_out.write(b'\x28\xb5\x2f\xfd' + b'\x00' * 16)
+
     @classmethod
     def tearDownClass(cls):
         shutil.rmtree(cls.tmp_path)
@@ -91,6 +110,65 @@ class TestCheckCompressedFileType(unittest.TestCase):
             filetype = check_compressed_file_type(fname)
             self.assertEqual(filetype, ftype)
 
+        filetype = check_compressed_file_type(self.zst_file)
+        self.assertEqual(filetype, 'zst')
+
+    def test_open_compressed_file(self):
+        """Test if the content of compressed files is read uncompressed"""
+
+        with open(os.path.join(self.tmp_path, 'mbox_single.mbox'), 'rb') as f:
+            expected = f.read()
+
+        for ftype in ['bz2', 'gz', 'xz']:
+            with open_compressed_file(self.files[ftype]) as f:
+                self.assertEqual(f.read(), expected)
+
+        with open_compressed_file(os.path.join(self.tmp_path, 'mbox_single.mbox')) as f:
+            self.assertEqual(f.read(), expected)
+
+        # Compressed files are read using a buffer unless it is not needed
+        for ftype in ['bz2', 'gz', 'xz']:
+            with open_compressed_file(self.files[ftype]) as f:
+                self.assertIsInstance(f, io.BufferedReader)
+
+            with open_compressed_file(self.files[ftype], buffered=False) as f:
+                self.assertNotIsInstance(f, io.BufferedReader)
+                self.assertEqual(f.read(), expected)
+
+    @unittest.skipIf(perceval.utils.zstandard is None, "zstandard package is not installed")
+    def test_open_compressed_file_zst(self):
+        """Test if the content of zstd files is read uncompressed, including all their frames"""
+
+        with open(os.path.join(self.tmp_path, 'mbox_single.mbox'), 'rb') as f:
+            expected = f.read()
+
+        # Write each half of the file in a different frame
+        cctx = perceval.utils.zstandard.ZstdCompressor()
+        half = len(expected) // 2
+
+        filepath = os.path.join(self.tmp_path, 'frames.zst')
+        with open(filepath, 'wb') as f:
+            f.write(cctx.compress(expected[:half]))
+            f.write(cctx.compress(expected[half:]))
+
+        self.assertEqual(check_compressed_file_type(filepath), 'zst')
+
+        with open_compressed_file(filepath) as f:
+            self.assertEqual(f.read(), expected)
+
+        with open_compressed_file(filepath) as f:
+            self.assertListEqual([line for line in f], expected.splitlines(keepends=True))
+
+    def test_open_compressed_file_not_supported(self):
+        """Test if an exception is raised when the compression is not supported"""
+
+        with self.assertRaises(ValueError):
+            open_compressed_file(self.files['zip'])
+
+        with unittest.mock.patch('perceval.utils.zstandard', None):
+            with self.assertRaises(ValueError):
+                open_compressed_file(self.zst_file)
+
     def test_not_supported_type(self):
         """Test a non supported file"""
 
@@ -141,6 +219,74 @@ class TestMonthsRange(unittest.TestCase):
         self.assertListEqual(result, [])
 
 
+def square(x):
+    if x < 0:
+        raise ParseError(cause="negative number %s" % x)
+    return x * x
+
+
+class TestPoolImap(unittest.TestCase):
+    """Unit tests for pool_imap function"""
+
+    def setUp(self):
+        self.pool = multiprocessing.Pool(processes=2)
+
+    def tearDown(self):
+        self.pool.terminate()
+        self.pool.join()
+
+    def test_ordered(self):
+        """Check if the results are returned in the order of the jobs"""
+
+        results = [r for r in pool_imap(self.pool, square, range(20), max_pending=3)]
+        self.assertListEqual(results, [x * x for x in range(20)])
+
+    def test_unordered(self):
+        """Check if all the results are returned when they are not ordered"""
+
+        results = [r for r in pool_imap(self.pool, square, range(20), max_pending=3,
+                                        ordered=False)]
+        self.assertListEqual(sorted(results), [x * x for x in range(20)])
+
+    def test_max_pending(self):
+        """Check if no more than max_pending jobs are submitted and not consumed"""
+
+        submitted = []
+
+        def jobs():
+            for x in range(10):
+                submitted.append(x)
+                yield x
+
+        for ordered in [True, False]:
+            submitted.clear()
+            results = pool_imap(self.pool, square, jobs(), max_pending=3, ordered=ordered)
+
+            nconsumed = 0
+            for _ in results:
+                nconsumed += 1
+                self.assertLessEqual(len(submitted), nconsumed + 3)
+
+            self.assertEqual(nconsumed, 10)
+
+    def test_error(self):
+        """Check if the errors of the jobs are raised when their result is consumed"""
+
+        results = pool_imap(self.pool, square, [1, 2, -3, 4], max_pending=2)
+
+        self.assertEqual(next(results), 1)
+        self.assertEqual(next(results), 4)
+
+        with self.assertRaisesRegex(ParseError, "negative number -3"):
+            next(results)
+
+    def test_invalid_max_pending(self):
+        """Check if an exception is raised when max_pending is not valid"""
+
+        with self.assertRaisesRegex(ValueError, "max_pending must be greater than 0"):
+            next(pool_imap(self.pool, square, range(2), max_pending=0))
+
+
 class TestMessagetoDict(unittest.TestCase):
     """Unit tests for message_to_dict"""
 
@@ -216,6 +362,103 @@ class TestMessagetoDict(unittest.TestCase):
                                      'Thanks,\n\nDaniel Nehren\n\n')
         self.assertEqual(len(html_body), 1557)
 
+    def test_convert_headers_only(self):
+        """Test whether the body is not included when only headers are requested"""
+
+        raw_email = read_file('data/utils/email_multipart_encoding.txt')
+        msg = email.message_from_string(raw_email)
+
+        expected = message_to_dict(msg)
+        expected.pop('body')
+
+        for lazy in [False, True]:
+            message = message_to_dict(msg, lazy=lazy, headers_only=True)
+            self.assertNotIn('body', message)
+            self.assertDictEqual(dict(message.items()), dict(expected.items()))
+
+    def test_convert_lazy_message(self):
+        """Test whether lazy messages are equal to the converted ones"""
+
+        for filename in ['email_single.txt', 'email_multipart_encoding.txt',
+                         'email_multipart_no_encoding.txt']:
+            raw_email = read_file('data/utils/' + filename)
+            msg = email.message_from_string(raw_email)
+
+            expected = message_to_dict(msg)
+            message = message_to_dict(msg, lazy=True)
+
+            self.assertIsInstance(message, LazyMessage)
+            self.assertIsInstance(message, requests.structures.CaseInsensitiveDict)
+            self.assertListEqual(list(message.keys()), list(expected.keys()))
+            self.assertEqual(message, expected)
+            self.assertDictEqual({k: v for k, v in message.items()},
+                                 {k: v for k, v in expected.items()})
+
+            copy = message.copy()
+            self.assertNotIsInstance(copy, LazyMessage)
+            self.assertEqual(copy, expected)
+
+
+class TestLazyMessage(unittest.TestCase):
+    """Unit tests for LazyMessage"""
+
+    def test_decode_on_access(self):
+        """Test whether the fields are decoded when they are accessed"""
+
+        raw_email = read_file('data/utils/email_multipart_encoding.txt')
+        msg = email.message_from_string(raw_email)
+
+        with unittest.mock.patch('perceval.utils._parse_payload') as mock_payload:
+            mock_payload.return_value = {'plain': 'body'}
+
+            message = LazyMessage(msg)
+            self.assertIn('body', message)
+            self.assertIn('message-id', message)
+            mock_payload.assert_not_called()
+
+            self.assertEqual(message['Message-Id'], '<019801ca633f$f4376140$dca623c0$@yang@example.com>')
+            mock_payload.assert_not_called()
+
+            self.assertDictEqual(message['body'], {'plain': 'body'})
+            self.assertDictEqual(message['BODY'], {'plain': 'body'})
+            self.assertEqual(mock_payload.call_count, 1)
+
+    def test_deferred_body(self):
+        """Test whether the body is parsed when it is accessed"""
+
+        raw_email = read_file('data/utils/email_multipart_encoding.txt')
+        msg = email.message_from_string(raw_email)
+        headers = email.message_from_string(raw_email.split('\n\n', 1)[0] + '\n')
+
+        expected = message_to_dict(msg)
+
+        parse_body = unittest.mock.Mock(return_value=msg)
+        message = LazyMessage(headers, parse_body=parse_body)
+
+        self.assertEqual(message['Subject'], expected['Subject'])
+        parse_body.assert_not_called()
+
+        self.assertEqual(message, expected)
+        self.assertEqual(parse_body.call_count, 1)
+
+    def test_parse_error(self):
+        """Test whether decoding errors are raised when the field is accessed"""
+
+        raw_email = read_file('data/utils/email_single.txt')
+        msg = email.message_from_string(raw_email)
+
+        with unittest.mock.patch('perceval.utils._parse_payload') as mock_payload:
+            mock_payload.side_effect = UnicodeError('invalid payload')
+
+            message = LazyMessage(msg)
+            self.assertEqual(message['Subject'], '[List-name] Protocol Buffers anyone?')
+
+            with self.assertRaises(ParseError):
+                _ = message['body']
+
+            with self.assertRaises(ParseError):
+                message_to_dict(msg)
+
 
 class TestRemoveInvalidXMLChars(unittest.TestCase):
     """Unit tests for remove_invalid_xml_characters"""